@@ -0,0 +1,289 @@
+"""
+Timing and memory benchmarks for the data pipeline and the figure builders,
+run on synthetic WHO/IHME data generated at a chosen scale (see hcare/synthetic.py).
+
+Usage (from the project folder):
+    python benchmarks/bench_pipeline.py --scale medium --out benchmarks/results/
+    python benchmarks/bench_pipeline.py --compare results/old.json results/new.json
+
+Each result records the best and median wall time over --repeat runs and the peak
+memory allocated by python during one extra run (tracemalloc), so JSON files from
+different commits can be compared.
+"""
+import argparse
+import gzip
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import zipfile
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+# pylint: disable=wrong-import-position
+from hcare import data_prep
+from hcare.ranking import process_ranking_pipeline
+from hcare.synthetic import write_synthetic_data, Scale
+from hcare import plots
+from hcare.correlation import correlation_table, outcome_panel
+from hcare.panel import cause_panel, lagged_regressions
+from hcare.manifest import load_manifest
+from hcare.scenarios import expand_grid, run_grid
+from hcare.uncertainty import score_intervals
+from hcare.cube import IHMECube, ranking_age
+from hcare.regional import RegionalViews
+from hcare.forecast import MODELS as FORECAST_MODELS, forecast_table
+
+# locations, causes, sexes, ages (the years come from --years)
+SCALES = {
+    "small": (50, 2, 3, 1),
+    "medium": (200, 10, 3, 1),
+    "large": (200, 10, 3, 6),
+}
+
+
+def measure(func, *args, repeat=3, **kwargs):
+    """
+    Times func(*args, **kwargs) repeat times and measures its peak python memory once
+    Returns: dict with best and median seconds and peak MiB
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args, **kwargs)
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    func(*args, **kwargs)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"seconds_min": round(min(times), 5),
+            "seconds_median": round(float(np.median(times)), 5),
+            "peak_mib": round(peak / 2**20, 2)}
+
+
+def pipeline_inputs(data_dir):
+    """Intermediate frames of process_healthcare_data, to benchmark each step on its own"""
+    who = {name: data_prep.import_data(os.path.join(data_dir, name))
+           for name in ("medical-doctors.csv", "nursery-midwifery.csv",
+                        "pharmacists.csv", "dentistry.csv")}
+    ihme = pd.concat([data_prep.import_data(os.path.join(data_dir, name))
+                      for name in ("IHME-1.csv", "IHME-2.csv")], ignore_index=True)
+    ihme = ihme.drop(["age", "metric"], axis=1)
+    pivot = data_prep.pivot_ihme(ihme)
+    workforce = data_prep.make_medical_data_df(*who.values())
+    workforce, pivot = data_prep.reconcile_locations(workforce, "Location", pivot, "location")
+    by_country = data_prep.ag_over_cause(data_prep.drop_sex(pivot))
+    merged = pd.merge(by_country, workforce, how="inner", left_on=["location", "year"],
+                      right_on=["Location", "Period"]).drop(["Location", "Period"], axis=1)
+    return who, ihme, pivot, merged
+
+
+def compressed_copies(data_dir, out_dir, name="IHME-1.csv"):
+    """Writes name.gz and name.zip copies of a source file, as the exports are stored"""
+    source = os.path.join(data_dir, name)
+    with open(source, "rb") as plain, gzip.open(os.path.join(out_dir, f"{name}.gz"), "wb") as gz:
+        shutil.copyfileobj(plain, gz)
+    with zipfile.ZipFile(os.path.join(out_dir, f"{name}.zip"), "w",
+                         zipfile.ZIP_DEFLATED) as archive:
+        archive.write(source, name)
+    return {suffix: os.path.join(out_dir, f"{name}.{suffix}") for suffix in ("gz", "zip")}
+
+
+def pipeline_benchmarks(data_dir, repeat=3):
+    """Benchmarks every step of process_healthcare_data and the ranking pipeline"""
+    who, ihme, pivot, merged = pipeline_inputs(data_dir)
+    with tempfile.TemporaryDirectory() as tmp:
+        # streaming decompression, to compare with reading the plain CSV
+        compressed = {f"import_data[ihme.{suffix}]": measure(data_prep.import_data, path,
+                                                             repeat=repeat)
+                      for suffix, path in compressed_copies(data_dir, tmp).items()}
+    return {
+        "import_data[who]": measure(data_prep.import_data,
+                                    os.path.join(data_dir, "medical-doctors.csv"),
+                                    repeat=repeat),
+        "import_data[ihme]": measure(data_prep.import_data,
+                                     os.path.join(data_dir, "IHME-1.csv"), repeat=repeat),
+        **compressed,
+        "pivot_ihme": measure(data_prep.pivot_ihme, ihme, repeat=repeat),
+        "ag_over_cause": measure(lambda: data_prep.ag_over_cause(data_prep.drop_sex(pivot)),
+                                 repeat=repeat),
+        "make_medical_data_df": measure(data_prep.make_medical_data_df, *who.values(),
+                                        repeat=repeat),
+        "process_ranking_pipeline": measure(lambda: process_ranking_pipeline(merged.copy()),
+                                            repeat=repeat),
+        "score_intervals": measure(score_intervals, merged, data_prep.WORKFORCE_COLUMNS,
+                                   ["Deaths", "Incidence"], repeat=repeat),
+        "process_healthcare_data": measure(data_prep.process_healthcare_data, data_dir,
+                                           repeat=repeat),
+    }
+
+
+def figure_benchmarks(data_dir, repeat=3):
+    """Benchmarks every figure builder of the dashboard on the processed data"""
+    df_ihme, df_who, df_metrics = data_prep.load_dashboard_data(data_dir)
+    year = int(df_metrics["year"].max())
+    locations = sorted(df_metrics["location"].unique())[:10]
+    ihme_selection = {"select_yr_and_sex": (year, ["Both"]), "selected_location": locations,
+                      "selected_cause": sorted(df_ihme["cause"].unique())[:2]}
+    cube = IHMECube.from_frame(df_ihme)
+    regional = RegionalViews.build({"who": df_who, "metrics": df_metrics}, "bench")
+    figure_calls = {
+        "plot_compscore_over_time": (plots.plot_compscore_over_time, df_metrics,
+                                     {"selected_location": locations}),
+        "plot_death_vs_docs": (plots.plot_death_vs_docs, df_metrics,
+                               {"selected_location": locations}),
+        "plot_ihme_data": (plots.plot_ihme_data, df_ihme, ihme_selection),
+        "plot_ihme_data[cube]": (plots.plot_ihme_data, df_ihme,
+                                 dict(ihme_selection, cube=cube)),
+        "plot_who_data": (plots.plot_who_data, df_who,
+                          {"select_year": year, "selected_location": locations}),
+        "plot_metrics_by_country": (plots.plot_metrics_by_country, df_metrics,
+                                    {"selected_yr": year, "selected_place": (locations, None)}),
+        "plot_metrics_over_time": (plots.plot_metrics_over_time, df_metrics,
+                                   {"selected_location": locations[:3]}),
+        "plot_metrics_over_time[regional]": (plots.plot_metrics_over_time, df_metrics,
+                                             {"selected_location": locations[:3],
+                                              "regional": regional}),
+        "country_spider": (plots.country_spider, df_who,
+                           {"ctry": locations[0], "year": year}),
+    }
+    results = {name: measure(builder, df, repeat=repeat, **kwargs)
+               for name, (builder, df, kwargs) in figure_calls.items()}
+    results["IHMECube.from_frame"] = measure(IHMECube.from_frame, df_ihme, repeat=repeat)
+    # total over causes and sexes of every location-year, without scanning the frame
+    results["IHMECube.frame"] = measure(cube.frame, ["location", "year"],
+                                        age=ranking_age(cube.labels("age")), repeat=repeat)
+    # full build of the regional aggregates, then a refresh where only the last year changed
+    frames = {"who": df_who, "metrics": df_metrics}
+    changed = dict(frames, who=df_who.assign(
+        dentists_per_10000=df_who["dentists_per_10000"].where(df_who["year"] < year, 0.0)))
+    results["RegionalViews.build"] = measure(RegionalViews.build, frames, "v1", repeat=repeat)
+    results["RegionalViews.build[refresh]"] = measure(RegionalViews.build, changed, "v2",
+                                                      regional, repeat=repeat)
+    return results
+
+
+def scenario_grid(merged):
+    """Runs a 48-scenario grid in one process into a fresh folder"""
+    grid = expand_grid({"indicators": [None, ["deaths", "medical doctors per 10,000"]],
+                        "normalization": ["minmax", "zscore", "rank"],
+                        "weighting": ["pca", "equal"],
+                        "years": [None, [2005, 2010], [2010, 2015], [2015, 2020]]})
+    with tempfile.TemporaryDirectory() as tmp:
+        run_grid(merged, grid, tmp, workers=1)
+
+
+def analysis_benchmarks(data_dir, repeat=3):
+    """Benchmarks the correlation and lagged panel regression tables, the scenario grid and
+    the forecasts"""
+    df_ihme, df_who, df_metrics = data_prep.load_dashboard_data(data_dir)
+    raw_panel = outcome_panel(df_who, df_ihme)
+    panel, outcomes = cause_panel(df_who, df_ihme)
+    _, _, merged = data_prep.merge_sources(data_dir, load_manifest(data_dir))
+    return {
+        "correlation_table": measure(correlation_table, raw_panel, repeat=repeat),
+        "lagged_regressions": measure(lagged_regressions, raw_panel, repeat=repeat),
+        "lagged_regressions[causes]": measure(lagged_regressions, panel, outcomes=outcomes,
+                                              repeat=repeat),
+        "scenario_grid[48]": measure(scenario_grid, merged, repeat=repeat),
+        **{f"forecast_table[{model}]": measure(forecast_table, df_metrics, model=model,
+                                                repeat=repeat) for model in FORECAST_MODELS},
+    }
+
+
+def run_benchmarks(data_dir, repeat=3):
+    """
+    Benchmarks every pipeline step, figure builder and analysis table on the data in data_dir
+    Returns: dict of benchmark name -> measurements
+    """
+    return {**pipeline_benchmarks(data_dir, repeat), **figure_benchmarks(data_dir, repeat),
+            **analysis_benchmarks(data_dir, repeat)}
+
+
+def git_commit():
+    """Current git commit of the project, or None outside a checkout"""
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(old_path, new_path):
+    """Prints the median time and peak memory ratios (new / old) of two result files"""
+    with open(old_path, encoding="utf-8") as handle:
+        old = json.load(handle)["results"]
+    with open(new_path, encoding="utf-8") as handle:
+        new = json.load(handle)["results"]
+    print(f"{'benchmark':32} {'old s':>9} {'new s':>9} {'time x':>7} {'mem x':>7}")
+    for name in sorted(set(old) & set(new)):
+        before, after = old[name], new[name]
+        time_ratio = after["seconds_median"] / max(before["seconds_median"], 1e-9)
+        mem_ratio = after["peak_mib"] / max(before["peak_mib"], 1e-9)
+        print(f"{name:32} {before['seconds_median']:9.4f} {after['seconds_median']:9.4f} "
+              f"{time_ratio:7.2f} {mem_ratio:7.2f}")
+
+
+def save_report(out_dir, scale_name, params, results):
+    """Writes the results with the commit and library versions to <commit>_<scale>.json"""
+    commit = git_commit()
+    report = {
+        "commit": commit,
+        "scale": scale_name,
+        "params": params,
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "results": results,
+    }
+    os.makedirs(out_dir, exist_ok=True)
+    path = os.path.join(out_dir, f"{commit or 'local'}_{scale_name or 'data'}.json")
+    with open(path, "w", encoding="utf-8") as handle:
+        json.dump(report, handle, indent=2)
+    return path
+
+
+def main(argv=None):
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n", maxsplit=1)[0])
+    parser.add_argument("--scale", choices=sorted(SCALES), default="small")
+    parser.add_argument("--years", type=int, default=34, help="number of years from 1990")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--data", help="benchmark an existing data folder instead")
+    parser.add_argument("--out", default=os.path.join(os.path.dirname(__file__), "results"),
+                        help="folder for the JSON results")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"),
+                        help="compare two result files instead of running")
+    args = parser.parse_args(argv)
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    locations, causes, sexes, ages = SCALES[args.scale]
+    scale = Scale(locations, range(1990, 1990 + args.years), causes, sexes, ages)
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir = args.data
+        if data_dir is None:
+            data_dir = os.path.join(tmp, "data")
+            write_synthetic_data(data_dir, scale, args.seed)
+        results = run_benchmarks(data_dir, args.repeat)
+    params = {**scale._asdict(), "years": args.years, "seed": args.seed} \
+        if args.data is None else {"data": args.data}
+    path = save_report(args.out, args.scale if args.data is None else None, params, results)
+    for name, result in results.items():
+        print(f"{name:32} {result['seconds_median']:9.4f} s {result['peak_mib']:9.2f} MiB")
+    print(f"Saved {path}")
+
+
+if __name__ == '__main__':
+    main()
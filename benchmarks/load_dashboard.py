@@ -0,0 +1,238 @@
+"""
+Multi-session load test of the streamlit dashboard, run headless with streamlit's AppTest.
+Every simulated session is one AppTest of hcare/hcare.py running in its own thread, so all
+sessions share the process-wide caches like the sessions of one dashboard worker do.
+Each session clicks through all the tabs, setting one widget at a time to a random value,
+and every rerun is timed. Runs fully offline on synthetic data (see hcare/synthetic.py).
+
+AppTest swaps a process-global (mocked) streamlit Runtime in and out around every run, so
+runs of different sessions cannot overlap; they take turns behind a lock. The latency of a
+rerun is measured from the click, i.e. it includes the wait for the other sessions' reruns,
+which models a worker whose reruns all compete for the same interpreter (the GIL). Real
+servers overlap some numpy/pandas work, so these latencies are an upper bound. The pure
+run time of each rerun is reported separately as the service time.
+
+Usage (from the project folder):
+    python benchmarks/load_dashboard.py --sessions 1 4 8 16 --steps 30
+    python benchmarks/load_dashboard.py --sessions 8 --data data/ --out results/
+
+For each number of concurrent sessions the report gives rerun latency and service time
+percentiles (latency also per tab), the share of reruns slower than one second, the process
+memory growth and the figure cache hit rate.
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+APP_PATH = os.path.join(ROOT, "hcare", "hcare.py")
+# the dashboard runs as a script, so its modules are imported from the hcare folder
+sys.path.insert(0, os.path.join(ROOT, "hcare"))
+sys.path.insert(0, ROOT)
+# AppTest sessions run outside a server, keep streamlit's bare-mode warnings out of the report
+os.environ.setdefault("STREAMLIT_LOGGER_LEVEL", "error")
+
+# pylint: disable=wrong-import-position
+from streamlit.testing.v1 import AppTest
+from hcare.synthetic import write_synthetic_data, Scale
+
+# widget keys of each dashboard tab, in tab order
+TAB_WIDGETS = {
+    "Home": ["home_year", "home_metric", "home_loc", "home_forecast", "country1"],
+    "IHME Data": ["ihme_measure", "ihme_year", "ihme_loc", "ihm_cause", "ihm_sex", "ihme_age"],
+    "WHO Data": ["who_year", "who_region", "who_loc"],
+    "Data by Country": ["country_met_one", "country_met_two", "country_year",
+                        "country_region", "country_loc"],
+    "Data Over Time": ["over_time_primary", "over_time_secondary", "over_time_region",
+                       "over_time_loc"],
+    "Country Overview": ["country_country", "spider_year"],
+    "Correlations": ["corr_method", "corr_scope", "corr_year", "corr_region", "lag_outcome"],
+}
+SLOW_RERUN_SECONDS = 1.0
+# one AppTest run at a time (see the module docstring)
+RUN_LOCK = threading.Lock()
+
+
+def rss_mib():
+    """Current resident memory of the process in MiB (peak memory where /proc is missing)"""
+    try:
+        with open("/proc/self/statm", encoding="ascii") as handle:
+            pages = int(handle.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError):
+        # ru_maxrss is in KiB on Linux and in bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+
+def figure_cache():
+    """The figure cache the dashboard script uses (imported the same way the script does)"""
+    return sys.modules["figure_cache"].FIGURE_CACHE
+
+
+def randomize_widget(app, key, rng):
+    """
+    Sets one widget of a running AppTest to a random value among its options
+    Returns: False when the widget is not on the page (e.g. no options for the selection)
+    """
+    selectboxes = [widget for widget in app.selectbox if widget.key == key]
+    if selectboxes:
+        if not selectboxes[0].options:
+            return False
+        selectboxes[0].select_index(rng.randrange(len(selectboxes[0].options)))
+        return True
+    multiselects = [widget for widget in app.multiselect if widget.key == key]
+    if not multiselects or not multiselects[0].options:
+        return False
+    options = multiselects[0].options
+    multiselects[0].set_value(rng.sample(options, rng.randint(1, min(3, len(options)))))
+    return True
+
+
+def timed_run(app):
+    """
+    Runs one AppTest rerun once it is this session's turn
+    Returns: (latency including the wait, service time, whether the run failed)
+    """
+    start = time.perf_counter()
+    with RUN_LOCK:
+        service_start = time.perf_counter()
+        try:
+            app.run()
+            failed = len(app.exception) > 0
+        except RuntimeError:
+            # AppTest raises when a run does not finish within the timeout
+            failed = True
+        end = time.perf_counter()
+    return end - start, end - service_start, failed
+
+
+def run_session(number, steps, seed, timeout, think=0.0):
+    """
+    One simulated user: opens the dashboard, then changes one random widget per step,
+    going through the tabs in order and pausing a random think time (mean think seconds)
+    between clicks
+    Returns: dict with the first run time, whether it ran without errors and a list of
+        (tab, latency, service time, failed) per rerun
+    """
+    rng = random.Random(seed * 10_000 + number)
+    app = AppTest.from_file(APP_PATH, default_timeout=timeout)
+    first_run, _, first_failed = timed_run(app)
+    tabs = list(TAB_WIDGETS)
+    reruns = []
+    for step in range(steps):
+        if think > 0:
+            time.sleep(rng.expovariate(1 / think))
+        tab = tabs[step % len(tabs)]
+        # widgets without options (e.g. locations before a region is picked) are skipped
+        keys = rng.sample(TAB_WIDGETS[tab], len(TAB_WIDGETS[tab]))
+        if not any(randomize_widget(app, key, rng) for key in keys):
+            continue
+        reruns.append((tab, *timed_run(app)))
+    return {"first_run": first_run, "opened": not first_failed, "reruns": reruns}
+
+
+def percentiles(seconds):
+    """Latency percentiles in milliseconds"""
+    if not seconds:
+        return {}
+    values = np.asarray(seconds) * 1000
+    return {f"p{pct}_ms": round(float(np.percentile(values, pct)), 1)
+            for pct in (50, 90, 95, 99)} | {"max_ms": round(float(values.max()), 1)}
+
+
+def run_load(n_sessions, steps=30, seed=0, timeout=120, think=0.0):
+    """
+    Runs n_sessions concurrent sessions of the dashboard in this process (see run_session)
+    Returns: dict with rerun latency percentiles, memory growth and cache hit rate
+    """
+    cache = figure_cache()
+    cache.clear()
+    memory_start = rss_mib()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=n_sessions) as pool:
+        futures = [pool.submit(run_session, number, steps, seed, timeout, think)
+                   for number in range(n_sessions)]
+        sessions = [future.result() for future in futures]
+    elapsed = time.perf_counter() - start
+    memory_end = rss_mib()
+    reruns = [rerun for session in sessions for rerun in session["reruns"]]
+    seconds = [latency for _, latency, _, _ in reruns]
+    return {
+        "sessions": n_sessions,
+        "reruns": len(reruns),
+        "failed_reruns": sum(failed for *_, failed in reruns),
+        "failed_sessions": sum(not session["opened"] for session in sessions),
+        "seconds": round(elapsed, 2),
+        "reruns_per_second": round(len(reruns) / elapsed, 2),
+        "first_run": percentiles([session["first_run"] for session in sessions]),
+        "rerun": percentiles(seconds),
+        "service": percentiles([service for _, _, service, _ in reruns]),
+        "slow_rerun_share": round(float(np.mean(np.asarray(seconds) > SLOW_RERUN_SECONDS)), 3)
+                            if seconds else 0.0,
+        "by_tab": {tab: percentiles([latency for name, latency, _, _ in reruns if name == tab])
+                   for tab in TAB_WIDGETS},
+        "memory_mib": {"start": round(memory_start, 1), "end": round(memory_end, 1),
+                       "growth": round(memory_end - memory_start, 1)},
+        "figure_cache": cache.stats(),
+    }
+
+
+def main(argv=None):
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n", maxsplit=1)[0])
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 4, 8],
+                        help="numbers of concurrent sessions to test, one run each")
+    parser.add_argument("--steps", type=int, default=30, help="widget changes per session")
+    parser.add_argument("--locations", type=int, default=200, help="synthetic locations")
+    parser.add_argument("--causes", type=int, default=10, help="synthetic causes")
+    parser.add_argument("--think", type=float, default=0.0,
+                        help="mean pause between clicks in seconds (0 = click continuously)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--timeout", type=float, default=120, help="seconds per rerun")
+    parser.add_argument("--data", help="test an existing data folder instead")
+    parser.add_argument("--out", help="folder for a JSON copy of the report")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir = args.data
+        if data_dir is None:
+            data_dir = os.path.join(tmp, "data")
+            write_synthetic_data(data_dir, Scale(args.locations, causes=args.causes),
+                                 args.seed)
+        os.environ["HCARE_DATA_DIR"] = os.path.abspath(data_dir)
+        # one warm-up session loads the data, so every level starts from a warm worker
+        run_session(0, 0, args.seed, args.timeout)
+        report = [run_load(n_sessions, args.steps, args.seed, args.timeout, args.think)
+                  for n_sessions in args.sessions]
+
+    for level in report:
+        print(f"{level['sessions']:3d} sessions: {level['reruns']:4d} reruns, "
+              f"p50 {level['rerun'].get('p50_ms', 0):7.1f} ms, "
+              f"p95 {level['rerun'].get('p95_ms', 0):7.1f} ms, "
+              f"p99 {level['rerun'].get('p99_ms', 0):7.1f} ms "
+              f"(service p50 {level['service'].get('p50_ms', 0):6.1f} ms), "
+              f"{level['slow_rerun_share']:.1%} over {SLOW_RERUN_SECONDS:.0f} s, "
+              f"memory +{level['memory_mib']['growth']:.1f} MiB, "
+              f"figure cache hit rate {level['figure_cache']['hit_rate']:.0%}, "
+              f"{level['failed_reruns']} failed reruns, "
+              f"{level['failed_sessions']} sessions failed to open")
+    if args.out:
+        os.makedirs(args.out, exist_ok=True)
+        path = os.path.join(args.out, f"load_dashboard_{int(time.time())}.json")
+        with open(path, "w", encoding="utf-8") as handle:
+            json.dump(report, handle, indent=2)
+        print(f"Saved {path}")
+
+
+if __name__ == '__main__':
+    main()
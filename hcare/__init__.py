@@ -4,6 +4,8 @@ hcare package for processing healthcare-related data.
 
 from .data_prep import (
     import_data, pivot_ihme, drop_sex, ag_over_cause, reconcile_locations,
-    make_medical_data_df, process_healthcare_data
+    make_medical_data_df, merge_sources, process_healthcare_data, data_version,
+    standardize_columns, load_dashboard_data
 )
 from .ranking import process_ranking_pipeline
+from .dataset import Dataset
@@ -0,0 +1,257 @@
+"""
+Data-quality screen for the indicator series, run at ingest on the merged WHO workforce
+data and the pivoted IHME data.
+The rows are laid out as a series x year x indicator matrix (a series is one location, or
+one location/sex/cause for IHME), and every cell is checked two ways, all series at once:
+- robust z-score: on the log scale for series without zero or negative values, and after
+  taking out the series' median yearly change, the value is compared with two baselines
+  that leave it out: the median of the SIDE_POINTS reported values before it and the median
+  of the SIDE_POINTS values after it. The distances are divided by the series' noise (from
+  the absolute changes between reported values, capped at TRIM times their median) and the
+  cell is flagged when it is more than z_threshold (3.5, after Iglewicz and Hoaglin) away from
+  both sides, in the same direction. A spike differs from both sides; a level shift (a
+  break in the series) agrees with the values on one side and is not flagged, and the
+  medians keep a spike from moving the baselines of its neighbours. The first and last
+  values only have one side, where a break cannot be told from a spike, and get no z-score.
+- year-over-year ratio: value / previous reported value of the series, flagged above
+  ratio_threshold or below its inverse (an order of magnitude by default, e.g. a unit change).
+  The value after a flagged spike is not flagged for the jump back.
+Flagged cells are listed in a report and, depending on the policy, kept as they are ("keep"),
+set to missing ("null") or, for the cells the ratio check flags, clipped into the range it
+allows ("winsorize"; cells only the z-score flags are reported and kept).
+"""
+import numpy as np
+import pandas as pd
+
+POLICIES = ("keep", "null", "winsorize")
+Z_THRESHOLD = 3.5
+RATIO_THRESHOLD = 10.0
+# reported values on each side of a cell that its baselines are the median of
+SIDE_POINTS = 3
+# variance of the median of 0, 1, 2 and 3 normal values, in variances of one value
+MEDIAN_VARIANCE = np.array([np.nan, 1.0, 0.5, 0.449])
+# series with fewer reported values are not z-scored
+MIN_POINTS = 5
+REPORT_COLUMNS = ["source", "series", "year", "column", "value", "robust_z", "ratio",
+                  "reason", "new_value"]
+# absolute changes are capped at TRIM times their median before they are averaged
+TRIM = 3.5
+# scale a mean absolute deviation (capped at TRIM median absolute deviations) to a standard
+# deviation for normal data
+MEAN_AD_SCALE = 0.7979
+TRIMMED_SCALE = 0.7917
+
+
+def series_codes(df, keys):
+    """
+    Series number of every row. The rows of a series usually come together (the pivot and
+    merge outputs are sorted), which comparing neighbouring rows finds much faster than
+    hashing every key; otherwise the keys are grouped
+    """
+    if len(df) > 1:
+        change = np.ones(len(df), dtype=bool)
+        change[1:] = False
+        for key in keys:
+            values = df[key].to_numpy()
+            change[1:] |= values[1:] != values[:-1]
+        starts = np.flatnonzero(change)
+        # every run of rows must be a different series
+        if len(set(zip(*(df[key].to_numpy()[starts] for key in keys)))) == len(starts):
+            return np.cumsum(change) - 1
+    return df.groupby(keys, sort=False, observed=True, dropna=False).ngroup().to_numpy()
+
+
+def series_cube(df, columns, keys, time):
+    """
+    Lays the indicator columns out as a series x year x column matrix
+    Returns: (float matrix with NaN for missing cells, series number of each row,
+        year offset of each row)
+    """
+    codes = series_codes(df, keys)
+    years = df[time].to_numpy(dtype=np.int64)
+    offsets = years - years.min()
+    cube = np.full((codes.max() + 1, offsets.max() + 1, len(columns)), np.nan)
+    cube[codes, offsets] = df[columns].to_numpy(dtype=np.float64)
+    return cube, codes, offsets
+
+
+def nanmedian_last(values):
+    """Median over the last axis ignoring NaN (NaN where all are missing), by sorting"""
+    size = values.shape[-1]
+    ordered = np.sort(values, axis=-1).reshape(-1, size)
+    # NaN sorts last
+    count = (~np.isnan(ordered)).sum(axis=1)
+    rows = np.arange(len(ordered))
+    low = ordered[rows, np.maximum(count - 1, 0) // 2]
+    high = ordered[rows, np.minimum(count // 2, size - 1)]
+    return ((low + high) / 2).reshape(values.shape[:-1])
+
+
+def previous_index(cube):
+    """Year position of the previous reported value of every cell's series (-1 = none)"""
+    years = np.arange(cube.shape[1])[None, :, None]
+    last_seen = np.maximum.accumulate(np.where(np.isnan(cube), -1, years), axis=1)
+    return np.concatenate([np.full_like(last_seen[:, :1], -1), last_seen[:, :-1]], axis=1)
+
+
+def _at(cube, index):
+    """Values of cube at year positions index (NaN where index is -1)"""
+    return np.where(index >= 0, np.take_along_axis(cube, np.maximum(index, 0), axis=1), np.nan)
+
+
+def previous_values(cube):
+    """
+    Previous reported value of every cell's series and the years since it
+    Returns: (values, years) matrices like cube, NaN for the first value of a series
+    """
+    previous = previous_index(cube)
+    years = np.arange(cube.shape[1])[None, :, None]
+    return _at(cube, previous), np.where(previous >= 0, years - previous, np.nan)
+
+
+def side_median(cube):
+    """
+    Median of the SIDE_POINTS reported values before every cell (ignoring the cell itself)
+    Returns: (medians, number of values) matrices like cube
+    """
+    previous = previous_index(cube)
+    index, values = previous, []
+    for _ in range(SIDE_POINTS):
+        values.append(_at(cube, index))
+        index = np.where(index >= 0, np.take_along_axis(previous, np.maximum(index, 0),
+                                                        axis=1), -1)
+    values = np.stack(values, axis=-1)
+    return nanmedian_last(values), (~np.isnan(values)).sum(axis=-1)
+
+
+def series_noise(detrended):
+    """
+    Noise of one value of every series of a detrended series x year x column matrix: the
+    mean absolute change between reported values, capped at TRIM times their median
+    Returns: matrix of shape (series, 1, columns)
+    """
+    # the changes between reported values have twice the variance of one value
+    changes = np.abs(detrended - previous_values(detrended)[0])
+    median_change = nanmedian_last(np.moveaxis(changes, 1, -1))[:, None]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        # the mean of the capped changes varies less than their median, and the cap keeps
+        # the jumps to and from a spike small; when more than half of the changes are zero,
+        # the mean of all of them is used
+        clipped = np.minimum(changes, np.where(median_change > 0, TRIM * median_change, np.inf))
+        present = ~np.isnan(changes)
+        mean_change = np.where(present, clipped, 0.0).sum(axis=1, keepdims=True) / \
+            present.sum(axis=1, keepdims=True)
+        return mean_change / np.where(median_change > 0, TRIMMED_SCALE, MEAN_AD_SCALE) / \
+            np.sqrt(2)
+
+
+def side_z(detrended, noise, flipped):
+    """
+    z-score of every cell against the median of the SIDE_POINTS reported values before it
+    (after it when flipped)
+    Returns: matrix like detrended, NaN where there is no value on that side
+    """
+    values = detrended[:, ::-1] if flipped else detrended
+    median, count = side_median(values)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        # the distance to a median of count values has 1 + MEDIAN_VARIANCE[count] noise
+        # variances
+        side = np.where(values == median, 0.0,
+                        (values - median) / (noise * np.sqrt(1 + MEDIAN_VARIANCE[count])))
+    return side[:, ::-1] if flipped else side
+
+
+def robust_z(cube, previous, gaps):
+    """
+    Robust z-score of every cell of a series x year x column matrix against the values
+    before and after it (see the module docstring)
+    Args: the matrix, previous values and years since them (see previous_values)
+    Returns: z-score matrix like cube, 0 where the two sides disagree on the direction and
+        NaN for the first and last value of a series and series shorter than MIN_POINTS
+    """
+    # series without zero or negative values are compared on the log scale, where a change by
+    # a factor is the same distance at any level
+    positive = np.all(np.isnan(cube) | (cube > 0), axis=1, keepdims=True)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        cube = np.where(positive, np.log(cube), cube)
+        previous = np.where(positive, np.log(previous), previous)
+    # the median yearly change removes the trend, so values are not flagged for following it
+    slope = nanmedian_last(np.moveaxis((cube - previous) / gaps, 1, -1))[:, None]
+    detrended = cube - np.nan_to_num(slope) * np.arange(cube.shape[1])[None, :, None]
+    noise = series_noise(detrended)
+    before, after = side_z(detrended, noise, False), side_z(detrended, noise, True)
+    nearer = np.where(np.abs(before) <= np.abs(after), before, after)
+    # NaN without a value on one side
+    z = np.where(before * after > 0, nearer, np.where(np.isnan(before * after), np.nan, 0.0))
+    short = (~np.isnan(cube)).sum(axis=1, keepdims=True) < MIN_POINTS
+    return np.where(short | np.isnan(cube), np.nan, z)
+
+
+def _series_labels(df, keys):
+    """Readable series names of the rows of df: the key values joined with ' / '"""
+    if len(keys) == 1:
+        return df[keys[0]].astype(str)
+    return df[keys].astype(str).agg(" / ".join, axis=1)
+
+
+# pylint: disable-next=too-many-arguments,too-many-locals
+def screen_anomalies(df, columns, keys, time, *, policy="keep", z_threshold=Z_THRESHOLD,
+                     ratio_threshold=RATIO_THRESHOLD, source=None):
+    """
+    Screens indicator columns for outliers and jumps along each series
+    Args: pandas DataFrame with one row per series and year, indicator columns, columns
+        identifying a series, the year column, policy ("keep", "null" or "winsorize"),
+        thresholds, source name for the report
+    Returns: (screened DataFrame, report DataFrame with one row per flagged cell)
+    """
+    if policy not in POLICIES:
+        raise ValueError(f"anomaly policy must be one of {POLICIES}, not {policy!r}")
+    columns = [col for col in columns if col in df.columns]
+    if df.empty or not columns:
+        return df, pd.DataFrame(columns=REPORT_COLUMNS)
+
+    cube, codes, offsets = series_cube(df, columns, list(keys), time)
+    previous, gaps = previous_values(cube)
+    z = robust_z(cube, previous, gaps)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        ratio = np.where((previous > 0) & (cube >= 0), cube / previous, np.nan)
+    z_flag = np.abs(z) > z_threshold
+    ratio_flag = (ratio > ratio_threshold) | (ratio < 1 / ratio_threshold)
+    # the jump back from a spike belongs to the spike
+    after_spike = _at(z_flag.astype(np.float64), previous_index(cube)) == 1
+    ratio_flag &= ~(after_spike & ~z_flag)
+    flagged = (z_flag | ratio_flag)[codes, offsets]
+    rows, cols = np.nonzero(flagged)
+    if not rows.size:
+        return df, pd.DataFrame(columns=REPORT_COLUMNS)
+
+    values = df[columns].to_numpy(dtype=np.float64)
+    new_values = values.copy()
+    if policy == "null":
+        new_values[rows, cols] = np.nan
+    elif policy == "winsorize":
+        # only the cells the ratio check flags are clipped, into the range it allows
+        cells = (codes[rows], offsets[rows], cols)
+        clipped = np.clip(values[rows, cols], previous[cells] / ratio_threshold,
+                          previous[cells] * ratio_threshold)
+        new_values[rows, cols] = np.where(ratio_flag[cells], clipped, values[rows, cols])
+
+    cells = (codes[rows], offsets[rows], cols)
+    reason = np.where(z_flag[cells], np.where(ratio_flag[cells], "robust_z+ratio", "robust_z"),
+                      "ratio")
+    report = pd.DataFrame({
+        "source": source,
+        "series": _series_labels(df.iloc[rows], list(keys)).to_numpy(),
+        "year": df[time].to_numpy()[rows],
+        "column": np.asarray(columns, dtype=object)[cols],
+        "value": values[rows, cols],
+        "robust_z": z[cells],
+        "ratio": ratio[cells],
+        "reason": reason,
+        "new_value": new_values[rows, cols],
+    }, columns=REPORT_COLUMNS)
+    if policy == "keep":
+        return df, report
+    screened = df.copy()
+    screened[columns] = new_values
+    return screened, report
@@ -0,0 +1,343 @@
+"""
+Small HTTP query service over the processed data, for other services that need the same
+rankings and indicator slices as the dashboard without going through streamlit.
+
+Endpoints (GET only, answer JSON by default, Arrow with ?format=arrow or an Accept header):
+    /version                                 data version and row counts (one row in Arrow)
+    /rankings?year=2020                      composite score and rank of every country
+    /top?year=2020&k=5                       the k best ranked countries
+    /timeseries?location=India               all years of one country (ranked data)
+    /indicators?source=who&region=Africa&year=2020&location=...&columns=...
+                                             indicator slice (source: who, metrics or ihme)
+The year defaults to the latest one. Repeat a parameter to pass several values.
+
+Serve:      python -m hcare.api serve --data data/ --port 8000
+Benchmark:  python -m hcare.api bench --url http://127.0.0.1:8000 --requests 2000
+"""
+import argparse
+import hashlib
+import io
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+try:
+    from .data_prep import data_version, load_dashboard_data
+    from .data_handle import DataHandle
+    from .compact import widen_floats
+    from .filter_index import select_rows
+except ImportError:
+    from data_prep import data_version, load_dashboard_data
+    from data_handle import DataHandle
+    from compact import widen_floats
+    from filter_index import select_rows
+
+JSON_TYPE = "application/json"
+ARROW_TYPE = "application/vnd.apache.arrow.stream"
+RANKING_COLUMNS = ["location", "region", "year", "composite_score", "rank"]
+SOURCES = {"ihme": 0, "who": 1, "metrics": 2}
+DEFAULT_BENCH_PATHS = ["/rankings", "/top?k=10", "/indicators?region=Africa",
+                       "/timeseries?location=India"]
+
+
+class QueryError(Exception):
+    """A request that cannot be answered, with the HTTP status to send back"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _first(params, name, default=None, cast=str):
+    """First value of a query parameter, converted with cast"""
+    values = params.get(name)
+    if not values:
+        return default
+    try:
+        return cast(values[0])
+    except ValueError as err:
+        raise QueryError(400, f"invalid value for {name}: {values[0]}") from err
+
+
+def _columns(df, params, default=None):
+    """Keeps the requested (or default) columns that exist in df"""
+    wanted = params.get("columns") or default
+    if not wanted:
+        return df
+    missing = set(wanted) - set(df.columns)
+    if params.get("columns") and missing:
+        raise QueryError(400, f"unknown columns: {sorted(missing)}")
+    return df[[col for col in wanted if col in df.columns]]
+
+
+class QueryService:
+    """
+    Answers queries from one shared DataHandle, reloading it when the data version changes.
+    Rendered responses are kept in an LRU cache keyed by data version, endpoint,
+    normalized parameters and format; every response carries an ETag so clients
+    can revalidate with If-None-Match and get a 304 back.
+    """
+
+    def __init__(self, file_path, loader=load_dashboard_data, cache_size=512):
+        self.file_path = file_path
+        self.cache_size = cache_size
+        self.stats = {"hits": 0, "misses": 0}
+        self._loader = loader
+        self._handle = None
+        self._lock = threading.Lock()
+        self._responses = OrderedDict()
+
+    def current_handle(self):
+        """Returns the DataHandle for the current data version, (re)loading it if needed"""
+        version = data_version(self.file_path)
+        with self._lock:
+            if self._handle is None or self._handle.version != version:
+                self._handle = DataHandle(*self._loader(self.file_path), version)
+                self._responses.clear()
+            return self._handle
+
+    def query(self, endpoint, params):
+        """
+        Runs one query against the current data
+        Args: endpoint name (e.g. "rankings"), dict of parameter name -> list of values
+        Returns: pandas DataFrame with the result
+        """
+        handle = self.current_handle()
+        frames = handle.views()
+        df_metrics, idx_metrics = frames[2], handle.indexes[2]
+        year = _first(params, "year", cast=int)
+        if endpoint in ("rankings", "top"):
+            if year is None:
+                year = idx_metrics.values("year")[-1]
+            result = select_rows(df_metrics, idx_metrics, year=year).sort_values("rank")
+            if endpoint == "top":
+                k = _first(params, "k", 5, int)
+                if k < 1:
+                    raise QueryError(400, f"k must be at least 1, not {k}")
+                result = result.head(k)
+            return _columns(result, params, RANKING_COLUMNS)
+        if endpoint == "timeseries":
+            location = _first(params, "location")
+            if location is None:
+                raise QueryError(400, "timeseries needs a location")
+            result = select_rows(df_metrics, idx_metrics, location=location).sort_values("year")
+            return _columns(result, params)
+        if endpoint == "indicators":
+            source = _first(params, "source", "who")
+            if source not in SOURCES:
+                raise QueryError(400, f"source must be one of {sorted(SOURCES)}")
+            df, index = frames[SOURCES[source]], handle.indexes[SOURCES[source]]
+            filters = {"year": year, "location": params.get("location")}
+            if index.region_col is not None:
+                filters[index.region_col] = params.get("region")
+            if source == "ihme":
+                filters.update(cause=params.get("cause"), sex=params.get("sex"),
+                               age=params.get("age"))
+            return _columns(select_rows(df, index, **filters), params)
+        raise QueryError(404, f"unknown endpoint: /{endpoint}")
+
+    def version_info(self):
+        """Data version and row counts, as a small dict"""
+        handle = self.current_handle()
+        ihme, who, metrics = handle.views()
+        return {"version": handle.version, "ihme_rows": len(ihme), "who_rows": len(who),
+                "metrics_rows": len(metrics)}
+
+    def response_key(self, endpoint, params, fmt=JSON_TYPE):
+        """
+        Cache key and ETag of a request for the current data version
+        Returns: (key tuple, quoted ETag string)
+        """
+        version = self.current_handle().version
+        params_key = tuple(sorted((name, tuple(sorted(values))) for name, values in params.items()
+                                  if name != "format"))
+        key = (version, endpoint, params_key, fmt)
+        return key, '"' + hashlib.sha1(repr(key).encode("utf-8")).hexdigest()[:20] + '"'
+
+    def respond(self, endpoint, params, fmt=JSON_TYPE, if_none_match=None):
+        """
+        Builds the full response for a request, using the ETag and the response cache
+        Returns: (status, headers dict, body bytes)
+        """
+        if fmt == ARROW_TYPE and pa is None:
+            raise QueryError(406, "Arrow responses need pyarrow installed")
+        key, etag = self.response_key(endpoint, params, fmt)
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+
+        # the body comes from the cache or is rendered before the ETag is compared, so an
+        # unknown endpoint or invalid parameters give their error and not a 304
+        with self._lock:
+            body = self._responses.get(key)
+            if body is not None:
+                self._responses.move_to_end(key)
+                self.stats["hits"] += 1
+        if body is None:
+            body = self._render(endpoint, params, fmt)
+            with self._lock:
+                self.stats["misses"] += 1
+                self._responses[key] = body
+                while len(self._responses) > self.cache_size:
+                    self._responses.popitem(last=False)
+        if if_none_match is not None and etag in [tag.strip() for tag in if_none_match.split(",")]:
+            return 304, headers, b""
+        headers["Content-Type"] = fmt
+        return 200, headers, body
+
+    def _render(self, endpoint, params, fmt):
+        """Serializes the result of one query to JSON or Arrow IPC stream bytes"""
+        if endpoint == "version":
+            info = self.version_info()
+            if fmt == ARROW_TYPE:
+                # one row with the same fields as the JSON object
+                return _arrow_stream(pa.Table.from_pylist([info]))
+            return json.dumps(info).encode("utf-8")
+        result = self.query(endpoint, params)
+        if fmt == ARROW_TYPE:
+            return _arrow_stream(pa.Table.from_pandas(result, preserve_index=False))
+        return widen_floats(result).to_json(orient="records").encode("utf-8")
+
+
+def _arrow_stream(table):
+    """Arrow IPC stream bytes of a pyarrow Table"""
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue()
+
+
+def make_handler(service, quiet=True):
+    """Builds a request handler class bound to a QueryService"""
+
+    class QueryHandler(BaseHTTPRequestHandler):
+        """Routes GET requests to the query service"""
+
+        def do_GET(self):  # pylint: disable=invalid-name
+            """Answers one GET request"""
+            url = urlsplit(self.path)
+            params = parse_qs(url.query)
+            wanted = _first(params, "format", "") or self.headers.get("Accept", "")
+            fmt = ARROW_TYPE if "arrow" in wanted else JSON_TYPE
+            try:
+                status, headers, body = service.respond(
+                    url.path.strip("/"), params, fmt, self.headers.get("If-None-Match"))
+            except QueryError as err:
+                status, headers = err.status, {"Content-Type": JSON_TYPE}
+                body = json.dumps({"error": str(err)}).encode("utf-8")
+            self.send_response(status)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+            """Only logs requests when the server is not quiet"""
+            if not quiet:
+                super().log_message(format, *args)
+
+    return QueryHandler
+
+
+class QueryServer(ThreadingHTTPServer):
+    """Threaded HTTP server with a listen backlog big enough for concurrent clients"""
+    daemon_threads = True
+    request_queue_size = 128
+
+
+def make_server(file_path, host="127.0.0.1", port=8000, quiet=True):
+    """
+    Creates (but does not start) a threaded HTTP server for the data in file_path.
+    The data is loaded here so the first requests do not wait for the pipeline.
+    """
+    service = QueryService(file_path)
+    service.current_handle()
+    return QueryServer((host, port), make_handler(service, quiet))
+
+
+def run_load(base_url, paths=None, n_requests=1000, concurrency=8, revalidate=False):
+    """
+    Local load generator: sends n_requests GETs spread over paths from concurrency threads
+    Args: server base url, list of request paths, number of requests, number of threads,
+        revalidate=True to send If-None-Match with the ETag of the first answer
+    Returns: dict with throughput (requests/s), latency percentiles in ms and error count
+    """
+    paths = paths or DEFAULT_BENCH_PATHS
+    etags = {}
+
+    def fetch(number):
+        path = paths[number % len(paths)]
+        request = urllib.request.Request(base_url.rstrip("/") + path)
+        if revalidate and path in etags:
+            request.add_header("If-None-Match", etags[path])
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request) as response:
+                response.read()
+                etags.setdefault(path, response.headers.get("ETag"))
+            ok = True
+        except urllib.error.HTTPError as err:
+            ok = err.code == 304
+        return time.perf_counter() - start, ok
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(fetch, range(n_requests)))
+    elapsed = time.perf_counter() - start
+    latencies = np.array([latency for latency, _ in results]) * 1000
+    return {
+        "requests": n_requests,
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 3),
+        "requests_per_second": round(n_requests / elapsed, 1),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 2),
+        "p95_ms": round(float(np.percentile(latencies, 95)), 2),
+        "p99_ms": round(float(np.percentile(latencies, 99)), 2),
+        "errors": sum(not ok for _, ok in results),
+    }
+
+
+def main(argv=None):
+    """Command line entry point: serve the data or benchmark a running server"""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n", maxsplit=1)[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    serve_cmd = commands.add_parser("serve", help="run the query service")
+    serve_cmd.add_argument("--data", default="data/", help="folder with the source files")
+    serve_cmd.add_argument("--host", default="127.0.0.1")
+    serve_cmd.add_argument("--port", type=int, default=8000)
+    serve_cmd.add_argument("--verbose", action="store_true", help="log every request")
+    bench_cmd = commands.add_parser("bench", help="load test a running query service")
+    bench_cmd.add_argument("--url", default="http://127.0.0.1:8000")
+    bench_cmd.add_argument("--path", action="append", help="request path (repeatable)")
+    bench_cmd.add_argument("--requests", type=int, default=1000)
+    bench_cmd.add_argument("--concurrency", type=int, default=8)
+    bench_cmd.add_argument("--revalidate", action="store_true",
+                           help="send If-None-Match to measure 304 responses")
+    args = parser.parse_args(argv)
+
+    if args.command == "serve":
+        server = make_server(args.data, args.host, args.port, quiet=not args.verbose)
+        print(f"Serving {args.data} on http://{args.host}:{server.server_port}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            server.shutdown()
+    else:
+        print(json.dumps(run_load(args.url, args.path, args.requests, args.concurrency,
+                                  args.revalidate), indent=2))
+
+
+if __name__ == '__main__':
+    main()
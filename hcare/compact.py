@@ -0,0 +1,99 @@
+"""
+Memory compaction of the processed frames.
+Repeated strings (locations, causes, regions, sex) become categoricals, integer columns
+such as the year are downcast to the smallest integer type that holds them, and float
+columns become float32 when that keeps every value within a relative tolerance.
+Column names and values are unchanged, so filtering, isin, groupby and the figure
+builders work on the compacted frames as before.
+"""
+import numpy as np
+import pandas as pd
+
+FRAME_NAMES = ("ihme", "who", "metrics")
+# a string column becomes categorical when it has at most this share of distinct values
+MAX_CATEGORY_RATIO = 0.5
+# largest relative change a float64 -> float32 conversion may cause in any value
+FLOAT32_RTOL = 1e-6
+
+
+def _compact_strings(series, max_ratio):
+    """Categorical version of a low-cardinality string column, else the column itself"""
+    if len(series) == 0 or series.nunique(dropna=True) > max_ratio * len(series):
+        return series
+    return series.astype("category")
+
+
+def _compact_floats(series, rtol):
+    """float32 version of a float64 column if every value survives the conversion"""
+    values = series.to_numpy()
+    with np.errstate(over="ignore"):
+        narrow = values.astype(np.float32)
+    finite = np.isfinite(values)
+    if not np.array_equal(finite, np.isfinite(narrow)):
+        return series
+    error = np.abs(narrow[finite].astype(np.float64) - values[finite])
+    if np.any(error > rtol * np.abs(values[finite])):
+        return series
+    return pd.Series(narrow, index=series.index, name=series.name)
+
+
+def compact_frame(df, max_category_ratio=MAX_CATEGORY_RATIO, float_rtol=FLOAT32_RTOL):
+    """
+    Compacts the dtypes of one dataframe (see the module docstring)
+    Args: pandas DataFrame, largest distinct/rows ratio of a string column turned into a
+        categorical, largest relative error allowed when downcasting floats to float32
+    Returns: new pandas DataFrame with the same index, columns and values
+    """
+    columns = {}
+    for position in range(df.shape[1]):
+        series = df.iloc[:, position]
+        if pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series):
+            series = _compact_strings(series, max_category_ratio)
+        elif pd.api.types.is_bool_dtype(series):
+            pass
+        elif pd.api.types.is_integer_dtype(series):
+            series = pd.to_numeric(series, downcast="integer")
+        elif series.dtype == np.float64:
+            series = _compact_floats(series, float_rtol)
+        columns[position] = series
+    compacted = pd.DataFrame(columns, index=df.index, copy=False)
+    compacted.columns = df.columns
+    compacted.attrs = df.attrs
+    return compacted
+
+
+def memory_report(before, after, names=FRAME_NAMES):
+    """
+    Deep memory usage of each frame before and after compaction
+    Args: sequences of the original and compacted frames, frame names
+    Returns: pandas DataFrame with one row per frame (bytes before/after, saved share)
+    """
+    rows = []
+    for name, old, new in zip(names, before, after):
+        old_bytes = int(old.memory_usage(deep=True).sum())
+        new_bytes = int(new.memory_usage(deep=True).sum())
+        rows.append({"frame": name, "rows": len(new), "bytes_before": old_bytes,
+                     "bytes_after": new_bytes,
+                     "saved": 1 - new_bytes / old_bytes if old_bytes else 0.0})
+    return pd.DataFrame(rows)
+
+
+def compact_frames(*frames):
+    """
+    Compacts several frames, e.g. the (IHME, WHO, metrics) frames of the dashboard
+    Returns: (tuple of compacted frames, memory report as returned by memory_report)
+    """
+    compacted = tuple(compact_frame(df) for df in frames)
+    return compacted, memory_report(frames, compacted, FRAME_NAMES[:len(frames)])
+
+
+def widen_floats(df):
+    """
+    Turns float32 columns back into float64 with their shortest decimal value (12.34, not
+    12.3400001526), for text output such as JSON
+    Returns: the dataframe, or a copy with widened float columns
+    """
+    narrow = [col for col, dtype in df.dtypes.items() if dtype == np.float32]
+    if not narrow:
+        return df
+    return df.assign(**{col: df[col].astype(str).astype(np.float64) for col in narrow})
@@ -0,0 +1,8 @@
+"""
+Statistical constants shared by the modules that compute intervals: the regression
+confidence intervals (panel.py), the forecast intervals (forecast.py) and the draws of the
+IHME uncertainty intervals (uncertainty.py).
+"""
+
+# two-sided 95% normal quantile
+Z_95 = 1.959964
@@ -0,0 +1,182 @@
+"""
+Correlations between the workforce indicators and the IHME outcomes of the merged panel.
+Pearson and Spearman coefficients are computed for every (workforce, outcome) pair pooled
+over all rows, per year and per region, with batched array operations: one pass of
+einsum over a group indicator matrix gives the pairwise sums of every group at once.
+Rows missing either value of a pair are left out of that pair (pairwise complete).
+For Spearman, values are ranked within each group (average ranks for ties) before the
+Pearson formula is applied.
+
+The panel must hold the raw values (see outcome_panel). The dashboard's metrics frame does
+not: its columns are the ranking's inputs, min-max scaled within each year and with deaths
+and incidence flipped to 1 - x, which turns the sign of every workforce-outcome pair.
+"""
+import numpy as np
+import pandas as pd
+
+try:
+    from .figure_cache import cached_table
+    from .cube import ranking_age
+except ImportError:
+    from figure_cache import cached_table
+    from cube import ranking_age
+
+WORKFORCE_COLUMNS = ["medical_doctors_per_10000", "nurses_midwifes_per_10000",
+                     "pharmacists_per_10000", "dentists_per_10000"]
+OUTCOME_COLUMNS = ["deaths", "incidence"]
+METHODS = ("pearson", "spearman")
+# scope name -> column the rows are grouped by (None = all rows together)
+SCOPES = {"pooled": None, "year": "year", "region": "region"}
+POOLED_GROUP = "All"
+TABLE_COLUMNS = ["method", "scope", "group", "workforce", "outcome", "r", "n"]
+
+
+def ranking_rows(df_ihme, sex="Both"):
+    """Rows of the IHME frame for one sex group and the age group the ranking uses"""
+    rows = df_ihme[df_ihme["sex"] == sex]
+    if "age" in rows.columns:
+        rows = rows[rows["age"] == ranking_age(rows["age"].unique())]
+    return rows
+
+
+def workforce_panel(df_who):
+    """
+    Raw workforce indicators of the dashboard's WHO frame, one row per location and year
+    Returns: pandas DataFrame with location (str), year, region and the workforce columns
+    """
+    df = df_who.rename(columns={"Region": "region"})
+    keep = ["location", "year", "region"] + WORKFORCE_COLUMNS
+    return df[[col for col in keep if col in df.columns]].astype({"location": str})
+
+
+def outcome_panel(df_who, df_ihme, outcomes=None):
+    """
+    Panel of the raw workforce indicators and IHME outcome rates for correlation_table and
+    panel.lagged_regressions: the outcomes are summed over the causes for both sexes and
+    the ranking's age group, as the merge before the ranking does, but not rescaled
+    Args: the dashboard's WHO and IHME frames, outcome columns (default: deaths and
+        incidence)
+    Returns: pandas DataFrame with one row per location-year of both frames: location
+        (categorical), year, region, the workforce and the outcome columns
+    """
+    outcomes = [col for col in (outcomes or OUTCOME_COLUMNS) if col in df_ihme.columns]
+    totals = ranking_rows(df_ihme).groupby(["location", "year"], observed=True)[outcomes] \
+        .sum(min_count=1).reset_index().astype({"location": str})
+    panel = pd.merge(workforce_panel(df_who), totals, on=["location", "year"], how="inner")
+    return panel.astype({"location": "category"})
+
+
+def _group_codes(df, by):
+    """Group number of every row (-1 = no group) and the sorted group labels"""
+    if by is None:
+        return np.zeros(len(df), dtype=np.int64), [POOLED_GROUP]
+    codes, labels = pd.factorize(df[by], sort=True)
+    return codes, labels.tolist()
+
+
+def _centered(values):
+    """
+    Values minus their column means with 0 for missing values, and the 1/0 mask of
+    present values (centering keeps the sums small without changing r)
+    """
+    present = ~np.isnan(values)
+    if len(values):
+        values = np.where(present, values - np.nanmean(values, axis=0), 0.0)
+    return values, present.astype(np.float64)
+
+
+# pylint: disable-next=too-many-locals
+def batched_pearson(x, y, codes, n_groups):
+    """
+    Pairwise-complete Pearson coefficients of every column of x with every column of y,
+    within every group at once
+    Args: float arrays x (rows x p) and y (rows x q) with NaN for missing values,
+        group number of each row (-1 = left out), number of groups
+    Returns: (r, n) arrays of shape (groups, p, q); r is NaN with fewer than 3 rows
+        or a constant column
+    """
+    x0, has_x = _centered(x)
+    y0, has_y = _centered(y)
+    rows = np.flatnonzero(codes >= 0)
+    groups = np.zeros((n_groups, len(x)))
+    groups[codes[rows], rows] = 1.0
+
+    def pair_sums(left, right):
+        return np.einsum("gn,ni,nj->gij", groups, left, right, optimize=True)
+
+    count = pair_sums(has_x, has_y)
+    sum_x, sum_y = pair_sums(x0, has_y), pair_sums(has_x, y0)
+    squares = pair_sums(x0 ** 2, has_y), pair_sums(has_x, y0 ** 2)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        var_x = squares[0] - sum_x ** 2 / count
+        var_y = squares[1] - sum_y ** 2 / count
+        r = (pair_sums(x0, y0) - sum_x * sum_y / count) / np.sqrt(var_x * var_y)
+    # constant columns leave round-off in the variances instead of exact zeros
+    tiny = 1e-12 * np.maximum(*squares)
+    r[(count < 3) | (var_x <= tiny) | (var_y <= tiny)] = np.nan
+    return np.clip(r, -1.0, 1.0), count.astype(np.int64)
+
+
+def _ranks(df, columns, by):
+    """Average ranks of the columns within each group (NaN stays NaN)"""
+    if by is None:
+        return df[columns].rank(method="average")
+    return df.groupby(by, observed=True)[columns].rank(method="average")
+
+
+def correlation_table(df, workforce=None, outcomes=None, methods=METHODS):
+    """
+    Correlations of every workforce indicator with every outcome, pooled, per year and
+    per region
+    Args: panel of raw values (see outcome_panel), workforce and outcome column
+        lists (default: the four workforce indicators, deaths and incidence), methods
+    Returns: pandas DataFrame with columns method, scope, group, workforce, outcome, r, n
+    """
+    workforce = [col for col in (workforce or WORKFORCE_COLUMNS) if col in df.columns]
+    outcomes = [col for col in (outcomes or OUTCOME_COLUMNS) if col in df.columns]
+    parts = []
+    for scope, by in SCOPES.items():
+        if by is not None and by not in df.columns:
+            continue
+        codes, labels = _group_codes(df, by)
+        for method in methods:
+            values = df[workforce + outcomes] if method == "pearson" else \
+                _ranks(df, workforce + outcomes, by)
+            values = values.to_numpy(dtype=np.float64)
+            r, count = batched_pearson(values[:, :len(workforce)], values[:, len(workforce):],
+                                       codes, len(labels))
+            n_pairs = len(workforce) * len(outcomes)
+            parts.append(pd.DataFrame({
+                "method": method,
+                "scope": scope,
+                "group": np.repeat(np.array(labels, dtype=object), n_pairs),
+                "workforce": np.tile(np.repeat(workforce, len(outcomes)), len(labels)),
+                "outcome": np.tile(outcomes, len(labels) * len(workforce)),
+                "r": r.ravel(),
+                "n": count.ravel(),
+            }))
+    if not parts:
+        return pd.DataFrame(columns=TABLE_COLUMNS)
+    return pd.concat(parts, ignore_index=True)[TABLE_COLUMNS]
+
+
+def correlation_matrix(table, method="pearson", scope="pooled", group=POOLED_GROUP):
+    """
+    One workforce x outcome matrix out of a correlation table
+    Returns: (r, n) pandas DataFrames indexed by workforce indicator, one column per outcome
+    """
+    rows = table[(table["method"] == method) & (table["scope"] == scope)
+                 & (table["group"] == group)]
+    order = {"index": list(dict.fromkeys(rows["workforce"])),
+             "columns": list(dict.fromkeys(rows["outcome"]))}
+    r = rows.pivot(index="workforce", columns="outcome", values="r")
+    n = rows.pivot(index="workforce", columns="outcome", values="n")
+    return r.reindex(**order), n.reindex(**order)
+
+
+def cached_correlation_table(df, version, workforce=None, outcomes=None):
+    """
+    correlation_table, computed once per data version and column lists and shared by
+    every caller in the process
+    """
+    return cached_table(correlation_table, df, version, workforce, outcomes)
@@ -0,0 +1,222 @@
+"""
+Multi-dimensional store of the IHME data over location x year x sex x age x cause x measure.
+
+The pipeline keeps the IHME age groups in the IHME frame (the ranking uses the ranking_age
+rows). IHMECube holds that frame as one dense float32 array with an axis per dimension,
+plus a last axis for the value and its uncertainty bounds when the data has them. Every
+axis is integer-coded: position i on the location axis is the i-th label of
+cube.labels("location"). Combinations missing from the data are NaN. A selection is a set
+of positions per axis, so slicing and summing a selection costs time in proportion to the
+selection, without scanning the long table. IHME exports are dense over their axes (every
+location, year, sex, age group and cause of the query), which is what makes the dense
+array compact.
+"""
+import re
+
+import numpy as np
+import pandas as pd
+
+AXES = ("location", "year", "sex", "age", "cause", "measure")
+# the value and the bounds of its uncertainty interval, named like the IHME frame columns:
+# <measure> for the value and <measure>_upper / <measure>_lower for the bounds
+STATS = ("val", "upper", "lower")
+# age groups the ranking uses, in order of preference
+RANKING_AGES = ("All ages", "Age-standardized")
+AGGREGATIONS = ("sum", "mean")
+# years per unit of the IHME age band labels ("<28 days", "1-5 months", "15-49 years")
+AGE_UNITS = {"day": 1 / 365, "month": 1 / 12}
+
+
+def ranking_age(ages):
+    """
+    Age group the ranking and the default charts use
+    Args: age group labels of the IHME data
+    Returns: the first of RANKING_AGES in the data, else its only age group
+    """
+    ages = list(ages)
+    for age in RANKING_AGES:
+        if age in ages:
+            return age
+    if len(ages) == 1:
+        return ages[0]
+    raise ValueError(f"the IHME data has several age groups ({ages}) but none of "
+                     f"{list(RANKING_AGES)} to rank on")
+
+
+def _age_bounds(age):
+    """
+    Sort key of an age band label: (lower bound, upper bound) in years, with "<5 years" and
+    "Under 5" starting at 0 and "70+ years" ending at infinity; labels without a number last
+    """
+    numbers = [float(number) for number in re.findall(r"\d+(?:\.\d+)?", age)]
+    if not numbers:
+        return (np.inf, np.inf)
+    scale = next((years for unit, years in AGE_UNITS.items() if unit in age.lower()), 1.0)
+    if age.lstrip().startswith("<") or age.lower().startswith("under"):
+        return (0.0, numbers[0] * scale)
+    upper = numbers[1] if len(numbers) > 1 else np.inf
+    return (numbers[0] * scale, upper * scale)
+
+
+def age_order(ages):
+    """
+    Age group labels in age order: the all-ages groups (RANKING_AGES) first, then the age
+    bands by their lower and upper bounds
+    """
+    ages = list(ages)
+    first = [age for age in RANKING_AGES if age in ages]
+    bands = sorted((age for age in ages if age not in RANKING_AGES),
+                   key=lambda age: (*_age_bounds(age), age))
+    return first + bands
+
+
+def _stat_column(measure, stat):
+    """Name of the IHME frame column of one measure and stat"""
+    return measure if stat == "val" else f"{measure}_{stat}"
+
+
+def _axis_codes(series):
+    """Integer codes and sorted labels of one axis column (-1 = missing)"""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        categories = series.cat.categories
+        if categories.is_monotonic_increasing:
+            return series.cat.codes.to_numpy(), pd.Index(categories)
+    codes, labels = pd.factorize(series, sort=True)
+    return codes, pd.Index(labels)
+
+
+class IHMECube:
+    """
+    Dense array of the IHME values with integer-coded axes (see the module docstring).
+    Build it with from_frame; slice() and frame() answer the selections.
+    """
+
+    __slots__ = ("_labels", "_values", "_stats")
+
+    def __init__(self, labels, values, stats):
+        self._labels = dict(labels)
+        self._values = values
+        self._stats = tuple(stats)
+
+    @classmethod
+    def from_frame(cls, df):
+        """
+        Builds the cube from the IHME frame of the pipeline
+        Args: pandas DataFrame with location, year, sex, cause, optionally age, one column
+            per measure and optionally its _upper and _lower columns
+        Returns: IHMECube
+        """
+        codes, labels = {}, {}
+        for axis in AXES[:-1]:
+            if axis in df.columns:
+                codes[axis], labels[axis] = _axis_codes(df[axis])
+            else:
+                # data without age groups covers all ages
+                codes[axis], labels[axis] = np.zeros(len(df), dtype=np.int64), \
+                    pd.Index([RANKING_AGES[0]])
+        bound_names = {_stat_column(col, stat) for col in df.columns for stat in STATS[1:]}
+        measures = [col for col in df.columns if col not in AXES and col not in bound_names
+                    and pd.api.types.is_float_dtype(df[col])]
+        labels["measure"] = pd.Index(measures)
+        stats = [stat for stat in STATS
+                 if all(_stat_column(measure, stat) in df.columns for measure in measures)]
+
+        keep = np.logical_and.reduce([codes[axis] >= 0 for axis in AXES[:-1]])
+        positions = tuple(codes[axis][keep] for axis in AXES[:-1])
+        values = np.full([len(labels[axis]) for axis in AXES] + [len(stats)], np.nan,
+                         dtype=np.float32)
+        for measure_code, measure in enumerate(measures):
+            for stat_code, stat in enumerate(stats):
+                values[positions + (measure_code, stat_code)] = \
+                    df[_stat_column(measure, stat)].to_numpy(dtype=np.float32)[keep]
+        return cls(labels, values, stats)
+
+    @property
+    def shape(self):
+        """Length of every axis, in the order of AXES"""
+        return self._values.shape[:-1]
+
+    @property
+    def stats(self):
+        """Stats held for every cell: "val", and "upper" and "lower" with bounds"""
+        return self._stats
+
+    @property
+    def nbytes(self):
+        """Size of the value array in bytes"""
+        return self._values.nbytes
+
+    @property
+    def cache_token(self):
+        """Small hashable stand-in for this cube in figure cache keys"""
+        return ("IHMECube", self.shape, self._stats)
+
+    def labels(self, axis):
+        """Sorted labels of one axis"""
+        return self._labels[axis].tolist()
+
+    def _positions(self, axis, selected):
+        """Sorted positions on an axis of the selected labels (None or [] = the whole axis)"""
+        labels = self._labels[axis]
+        if selected is None or (isinstance(selected, (list, tuple, set, np.ndarray))
+                                and len(selected) == 0):
+            return np.arange(len(labels))
+        if not isinstance(selected, (list, tuple, set, np.ndarray, pd.Index)):
+            selected = [selected]
+        positions = labels.get_indexer(list(selected))
+        return np.unique(positions[positions >= 0])
+
+    def _select(self, selection):
+        """Positions on every axis of a selection (dict of axis -> label or labels)"""
+        unknown = set(selection) - set(AXES)
+        if unknown:
+            raise ValueError(f"unknown cube axes: {sorted(unknown)}")
+        return [self._positions(axis, selection.get(axis)) for axis in AXES]
+
+    def slice(self, stat="val", **selection):
+        """
+        Sub-array of a selection
+        Args: stat to return, then a label or list of labels per axis (e.g. year=2020,
+            cause=["Neoplasms"]); axes left out are kept whole
+        Returns: (array with one dimension per axis of AXES, dict of axis -> labels kept)
+        """
+        positions = self._select(selection)
+        stat_position = [self._stats.index(stat)]
+        values = self._values[np.ix_(*positions, stat_position)][..., 0]
+        return values, {axis: self._labels[axis][kept].tolist()
+                        for axis, kept in zip(AXES, positions)}
+
+    def frame(self, by, how="sum", **selection):
+        """
+        Aggregates a selection over every axis not in by
+        Args: axes to keep (list, in the column order wanted), "sum" or "mean", then the
+            selection as in slice(); cells without data do not count
+        Returns: pandas DataFrame with the by columns, then one column per measure and its
+            _upper and _lower columns (as in the IHME frame); combinations without any
+            data are left out
+        """
+        if how not in AGGREGATIONS:
+            raise ValueError(f"how must be one of {AGGREGATIONS}")
+        by = list(by)
+        if not by or not set(by) <= set(AXES[:-1]):
+            raise ValueError(f"by must list axes out of {AXES[:-1]}")
+        positions = self._select(selection)
+        values = self._values[np.ix_(*positions, np.arange(len(self._stats)))]
+        reduced = tuple(number for number, axis in enumerate(AXES[:-1]) if axis not in by)
+        counts = (~np.isnan(values)).sum(axis=reduced)
+        totals = np.nansum(values, axis=reduced)
+        if how == "mean":
+            totals = totals / np.maximum(counts, 1)
+        totals[counts == 0] = np.nan
+
+        # remaining axes: the by axes in AXES order, then measure and stat
+        kept = [axis for axis in AXES[:-1] if axis in by]
+        totals = np.moveaxis(totals, [kept.index(axis) for axis in by], range(len(by)))
+        measures = self._labels["measure"][positions[-1]]
+        index = pd.MultiIndex.from_product(
+            [self._labels[axis][positions[AXES.index(axis)]] for axis in by], names=by)
+        # columns: the values of every measure first, then each bound
+        columns = [_stat_column(measure, stat) for stat in self._stats for measure in measures]
+        result = pd.DataFrame(np.swapaxes(totals, -1, -2).reshape(len(index), len(columns)),
+                              index=index, columns=columns)
+        return result.dropna(how="all", subset=list(measures)).reset_index()
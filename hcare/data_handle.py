@@ -0,0 +1,151 @@
+"""
+Read-only handle on the processed dashboard data, shared by every streamlit session
+in a process instead of giving each session its own copy.
+"""
+import numpy as np
+import pandas as pd
+
+try:
+    from .filter_index import FilterIndex
+    from .cube import IHMECube
+    from .regional import materialized_views
+    from .correlation import outcome_panel
+except ImportError:
+    from filter_index import FilterIndex
+    from cube import IHMECube
+    from regional import materialized_views
+    from correlation import outcome_panel
+
+# columns the IHME frame needs for its cube
+CUBE_COLUMNS = {"location", "year", "sex", "cause"}
+# columns the WHO and metrics frames need for their regional aggregates
+REGIONAL_COLUMNS = ({"Region", "year"}, {"region", "year"})
+# columns the WHO and IHME frames need for the raw outcome panel
+PANEL_COLUMNS = ({"location", "year"}, CUBE_COLUMNS)
+
+
+def freeze_categorical(categorical):
+    """
+    Read-only version of a Categorical: in-place edits of its values raise a ValueError.
+    Categorical.codes is always a read-only view, so the array it views is checked: codes
+    that really are read-only (e.g. memory-mapped by publish.open_published) are shared,
+    others are copied and locked.
+    Args: pandas Categorical
+    Returns: pandas Categorical with the same values and dtype
+    """
+    base = categorical.codes.base
+    if isinstance(base, np.ndarray) and not base.flags.writeable:
+        return categorical
+    codes = categorical.codes.copy()
+    codes.flags.writeable = False
+    return pd.Categorical.from_codes(codes, dtype=categorical.dtype, validate=False)
+
+
+def freeze_frame(df):
+    """
+    Makes a read-only copy of a dataframe: every numpy-backed and categorical column gets
+    its writeable flag turned off, so in-place edits (df.loc[...] = ..., df.iloc[...] = ...)
+    raise a ValueError instead of silently changing the shared data.
+    Other extension-typed columns (e.g. strings) are copied but cannot be locked.
+    Columns that are already read-only (e.g. memory-mapped by publish.open_published) are
+    shared without a copy.
+    Args: pandas DataFrame
+    Returns: read-only pandas DataFrame with the same index, columns and values
+    """
+    columns = {}
+    for position in range(df.shape[1]):
+        series = df.iloc[:, position]
+        if isinstance(series.dtype, np.dtype):
+            values = series.to_numpy()
+            if values.flags.writeable:
+                values = values.copy()
+                values.flags.writeable = False
+        elif isinstance(series.dtype, pd.CategoricalDtype):
+            values = freeze_categorical(series.array)
+        else:
+            values = series.array.copy()
+        columns[position] = values
+    frozen = pd.DataFrame(columns, index=df.index, copy=False)
+    frozen.columns = df.columns
+    frozen.attrs = df.attrs
+    return frozen
+
+
+def read_only_view(df):
+    """
+    Gives a session its own view of a frozen frame without copying the data.
+    Adding or renaming columns on the view does not affect the shared frame,
+    and writing into existing values raises a ValueError.
+    """
+    return df.copy(deep=False)
+
+
+class DataHandle:
+    """
+    Immutable bundle of the three processed frames (IHME, WHO, merged metrics),
+    their filter indexes, the IHME cube, the regional aggregates, the raw outcome panel and
+    the data version they were built from.
+    Build one per data version and hand out views with views().
+    """
+
+    __slots__ = ("_frames", "_indexes", "_cube", "_regional", "_panel", "_version", "_locked")
+
+    def __init__(self, df_ihme, df_who, df_metrics, version):
+        self._frames = tuple(freeze_frame(df) for df in (df_ihme, df_who, df_metrics))
+        self._indexes = tuple(FilterIndex(df) for df in self._frames)
+        self._cube = IHMECube.from_frame(self._frames[0]) \
+            if CUBE_COLUMNS <= set(self._frames[0].columns) else None
+        # refreshed from the views of the previous data version: only changed years are redone
+        self._regional = materialized_views(self._frames[1], self._frames[2], version) \
+            if all(columns <= set(df.columns)
+                   for columns, df in zip(REGIONAL_COLUMNS, self._frames[1:])) else None
+        self._panel = freeze_frame(outcome_panel(self._frames[1], self._frames[0])) \
+            if all(columns <= set(df.columns)
+                   for columns, df in zip(PANEL_COLUMNS, self._frames[1::-1])) else None
+        self._version = version
+        self._locked = True
+
+    def __setattr__(self, name, value):
+        if getattr(self, "_locked", False):
+            raise AttributeError("DataHandle is read-only, build a new one to change the data")
+        object.__setattr__(self, name, value)
+
+    @property
+    def version(self):
+        """Data version the frames were built from"""
+        return self._version
+
+    @property
+    def indexes(self):
+        """Filter indexes of (IHME, WHO, metrics); row positions match the views"""
+        return self._indexes
+
+    @property
+    def cube(self):
+        """IHMECube of the IHME frame (None when the frame lacks the cube's axes)"""
+        return self._cube
+
+    @property
+    def regional(self):
+        """RegionalViews of the WHO and metrics frames (None when they lack a region)"""
+        return self._regional
+
+    @property
+    def panel(self):
+        """Raw workforce and outcome panel of the WHO and IHME frames for the correlations
+        and regressions (see correlation.outcome_panel; None when the frames lack its
+        columns)"""
+        return self._panel
+
+    def views(self):
+        """Returns read-only views of (IHME, WHO, metrics) for one session"""
+        return tuple(read_only_view(df) for df in self._frames)
+
+    def memory_usage(self):
+        """
+        Returns the deep memory usage in bytes of the shared frames, the outcome panel, the
+        IHME cube and the regional aggregates
+        """
+        extra = sum(0 if part is None else part.nbytes for part in (self._cube, self._regional))
+        frames = self._frames + (() if self._panel is None else (self._panel,))
+        return int(sum(df.memory_usage(deep=True).sum() for df in frames)) + extra
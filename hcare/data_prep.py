@@ -2,41 +2,125 @@
 Code to read in, clean, and merge data from the 
     Institute for Health Metrics and Evaluation (IHME) and the World Health Organization (WHO).
 """
+import argparse
+import hashlib
 import os
+import re
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from functools import reduce
 
 import pandas as pd
 
 try:
     # When running as a package (e.g., during testing)
     from .ranking import process_ranking_pipeline
+    from .compact import compact_frames
+    from .anomaly import screen_anomalies
+    from .locations import resolve_locations, load_aliases, save_aliases, ALIAS_FILE
+    from .manifest import load_manifest, source_files, ranking_columns, DEFAULT_MANIFEST
+    from .uncertainty import score_intervals
+    from .cube import ranking_age
 except ImportError:
     # When running as a top-level script (e.g., via streamlit)
     from ranking import process_ranking_pipeline
+    from compact import compact_frames
+    from anomaly import screen_anomalies
+    from locations import resolve_locations, load_aliases, save_aliases, ALIAS_FILE
+    from manifest import load_manifest, source_files, ranking_columns, DEFAULT_MANIFEST
+    from uncertainty import score_intervals
+    from cube import ranking_age
+
+# .zst sources need the zstandard package (pandas decompresses them with it)
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+WORKFORCE_COLUMNS = [entry["column"] for entry in DEFAULT_MANIFEST["who"]]
+# suffixes of the compressed sources import_data reads
+COMPRESSED_SUFFIXES = (".gz", ".zip", ".zst")
+CSV_OPTIONS = {"header": 0, "encoding": "utf-8", "na_values": ["NA", "null", "", "NaN"]}
 
 
 
 def import_data(data_path):
-    """Reads in data from the specified path and returns a dataframe of the data
-    Args: path to the data file
+    """Reads in data from the specified path and returns a dataframe of the data.
+    Compressed files (.gz, .zst) are decompressed as the CSV parser reads them, and every
+    CSV member of a .zip archive is read the same way, so no decompressed copy is written
+    Args: path to the data file (CSV, optionally compressed, or a zip archive of CSV files
+        with the same columns)
     Returns: pandas DataFrame"""
-    df = pd.read_csv(data_path, header=0, encoding = "utf-8", na_values=["NA", "null", "", "NaN"])
+    data_path = str(data_path)
+    if data_path.endswith(".zip"):
+        with zipfile.ZipFile(data_path) as archive:
+            members = [name for name in archive.namelist() if name.lower().endswith(".csv")
+                       and not name.startswith("__MACOSX/")]
+            if not members:
+                raise ValueError(f"{data_path} holds no CSV file")
+            parts = []
+            for name in members:
+                with archive.open(name) as member:
+                    parts.append(pd.read_csv(member, **CSV_OPTIONS))
+        df = parts[0] if len(parts) == 1 else pd.concat(parts, ignore_index=True)
+    else:
+        if data_path.endswith(".zst") and zstandard is None:
+            raise ImportError(f"reading {data_path} needs the zstandard package")
+        df = pd.read_csv(data_path, **CSV_OPTIONS)
     df = df.dropna(axis = 1, thresh=1)
     return df
 
+def source_path(file_path, name):
+    """Path of a source file in the data folder: the file itself, else its compressed copy
+    Args: path to the data folder, file name (e.g. IHME-1.csv)
+    Returns: path of the file, or of name + .gz, .zip or .zst when only that exists"""
+    path = os.path.join(file_path, name)
+    if not os.path.exists(path):
+        for suffix in COMPRESSED_SUFFIXES:
+            if os.path.exists(path + suffix):
+                return path + suffix
+    return path
+
+def source_name(name):
+    """Name of a source file without its compression suffix (IHME-1.csv.gz -> IHME-1.csv)"""
+    for suffix in COMPRESSED_SUFFIXES:
+        if name.endswith(suffix) and len(name) > len(suffix):
+            return name[:-len(suffix)]
+    return name
+
 def pivot_ihme(df):
     """Pivots the IHME data to have one row per location
-    Args: pandas DataFrame, should only be called on the IHME df
+    Args: pandas DataFrame, should only be called on the IHME df; when it has the upper
+        and lower columns, each measure also gets <measure>_upper and <measure>_lower columns,
+        and when it has the age column, each age group gets its own rows
     Returns: the updated pandas DataFrame"""
-    pivoted_df = df.pivot_table(index=['location', 'sex', 'cause', 'year'],
+    bounds = [col for col in ('upper', 'lower') if col in df.columns]
+    ages = ['age'] if 'age' in df.columns else []
+    pivoted_df = df.pivot_table(index=['location', 'sex'] + ages + ['cause', 'year'],
                             columns='measure',
-                            values='val',
+                            values=['val'] + bounds if bounds else 'val',
                             aggfunc='first')
+    if bounds:
+        # the values first, in the column order of the pivot without bounds
+        pivoted_df = pivoted_df[['val'] + bounds]
+        pivoted_df.columns = pd.Index(
+            [measure if value == 'val' else f"{measure}_{value}"
+             for value, measure in pivoted_df.columns], name='measure')
     # Reset the index if needed
     pivoted_df = pivoted_df.reset_index()
     # Rename the columns for clarity
     pivoted_df = pivoted_df.rename(columns={'death': 'death_rate', 'incidence': 'incidence_rate'})
     return pivoted_df
 
+def select_ranking_age(df):
+    """keeps the rows of the age group the ranking uses (see cube.ranking_age) and drops
+    the column labeling the age group
+    Args: pandas DataFrame, should only be called on IHME
+    Returns: the updated df (df itself when it has no age column)"""
+    if 'age' not in df.columns:
+        return df
+    return df[df['age'] == ranking_age(df['age'].unique())].drop('age', axis='columns')
+
 def drop_sex(df):
     """removes all rows with data specific to one sex and the column labeling sex group of data
     Args: pandas DataFrame, should only be called on IHME
@@ -55,8 +139,13 @@ def ag_over_cause(df):
     df = df.drop('cause',axis='columns')
     return df
 
-def reconcile_locations(who_df, who_col, ihme_df, ihme_col):
-    """renames countries in WHO and IHME to match before merging"""
+# pylint: disable-next=too-many-arguments
+def reconcile_locations(who_df, who_col, ihme_df, ihme_col, *, aliases=None, reports=None):
+    """renames countries in WHO and IHME to match before merging: the fixed aliases below,
+    then the WHO names the location resolver matches to an IHME name (see locations.py)
+    Args: WHO and IHME DataFrames and their location columns, optional alias table,
+        optional dict that receives the match report under the key "locations"
+    Returns: (WHO, IHME) DataFrames"""
     ihme_to_who = {
         "Micronesia (Federated States of)": "Micronesia",
         "Côte d'Ivoire": "Cote d'Ivoire",
@@ -77,72 +166,299 @@ def reconcile_locations(who_df, who_col, ihme_df, ihme_col):
     who_df[who_col] = who_df[who_col].replace(who_to_ihme)
     ihme_df[ihme_col] = ihme_df[ihme_col].replace(ihme_to_who)
 
+    renames, report = resolve_locations(who_df[who_col].unique(), ihme_df[ihme_col].unique(),
+                                        aliases)
+    if renames:
+        who_df[who_col] = who_df[who_col].replace(renames)
+    if reports is not None:
+        reports["locations"] = report
+
     return who_df, ihme_df
 
-def make_medical_data_df(med_df, nurse_df, pharm_df, dent_df):
-    """Merges the four medical provider DataFrames into one DataFrame
-    Args: four pandas DataFrames for each of the medical provider categories from WHO
+def make_medical_data_df(*indicator_dfs, names=None):
+    """Merges WHO indicator DataFrames (one indicator each) into one DataFrame
+    Args: pandas DataFrames in WHO GHO format, by default the four medical provider
+        categories (doctors, nurses and midwifes, pharmacists, dentists), and optionally
+        the column name for each indicator's values
     Returns: one pandas DataFrame with all information"""
+    names = WORKFORCE_COLUMNS if names is None else list(names)
+    if len(names) != len(indicator_dfs):
+        raise ValueError(f"got {len(indicator_dfs)} indicator DataFrames for {len(names)} names")
     keep_columns = ['ParentLocation', 'Location', 'Period', 'Value']
 
-    med_df = med_df[keep_columns]
-    nurse_df = nurse_df[keep_columns]
-    pharm_df = pharm_df[keep_columns]
-    dent_df = dent_df[keep_columns]
+    indicator_dfs = [df[keep_columns].rename(columns={'Value': name})
+                     for df, name in zip(indicator_dfs, names)]
 
-    med_df = med_df.rename(columns={'Value': 'Medical Doctors per 10,000'})
-    nurse_df = nurse_df.rename(columns={'Value': 'Nurses and Midwifes per 10,000'})
-    pharm_df = pharm_df.rename(columns={'Value': 'Pharmacists per 10,000'})
-    dent_df = dent_df.rename(columns={'Value': 'Dentists per 10,000'})
-
-    # Inner merging four DataFrames on 'ParentLocation', 'Location' and 'Period'
-    merged_df = med_df.merge(nurse_df, on=['ParentLocation', 'Location', 'Period'], how='inner') \
-                      .merge(pharm_df, on=['ParentLocation', 'Location', 'Period'], how='inner') \
-                      .merge(dent_df, on=['ParentLocation', 'Location', 'Period'], how='inner')
+    # Inner merging the DataFrames on 'ParentLocation', 'Location' and 'Period'
+    merged_df = reduce(lambda left, right: left.merge(
+        right, on=['ParentLocation', 'Location', 'Period'], how='inner'), indicator_dfs)
     merged_df = merged_df.rename(columns={'ParentLocation': 'Region'})
     return merged_df
 
-def process_healthcare_data(file_path):
-    """function that processes all data using the functions in this file"""
+def read_sources(file_path, files, max_workers=None):
+    """Reads several source files in parallel (pandas parses CSV without holding the GIL)
+    Args: path to the data folder, list of file names (a file that is only there
+        compressed is read from its compressed copy, see source_path), optional number of
+        threads
+    Returns: dict of file name -> pandas DataFrame"""
+    if max_workers is None:
+        max_workers = min(32, len(files)) or 1
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        frames = pool.map(lambda name: import_data(source_path(file_path, name)), files)
+        return dict(zip(files, frames))
 
-    # makes medical data dataframe (with all provider indicators)
-    med_docs = import_data(os.path.join(file_path, r'medical-doctors.csv'))
-    nurse_midwifes = import_data(os.path.join(file_path, r'nursery-midwifery.csv'))
-    pharms = import_data(os.path.join(file_path, r'pharmacists.csv'))
-    dentists = import_data(os.path.join(file_path, r'dentistry.csv'))
+def select_indicator(df, code):
+    """Keeps the rows of one IndicatorCode (files can hold several indicators)
+    Args: pandas DataFrame in WHO GHO format, IndicatorCode or None for all rows
+    Returns: pandas DataFrame"""
+    if code is None or 'IndicatorCode' not in df.columns:
+        return df
+    return df[df['IndicatorCode'] == code]
+
+def incomplete_location_years(df_ihme, measures):
+    """Location-years of the IHME data with a missing measure (e.g. set to missing by the
+    anomaly screen)
+    Args: IHME DataFrame by location, cause and year, measure columns
+    Returns: pandas MultiIndex of (location, year)"""
+    missing = df_ihme.loc[df_ihme[measures].isna().any(axis=1), ['location', 'year']]
+    return pd.MultiIndex.from_frame(missing.drop_duplicates())
+
+def data_version(file_path):
+    """Fingerprint of the source files in the data folder (names, sizes and modification times)
+    Args: path to the data folder
+    Returns: short hex string that changes whenever a source file is added, removed or edited"""
+    digest = hashlib.sha1()
+    if os.path.isdir(file_path):
+        for name in sorted(os.listdir(file_path)):
+            stat = os.stat(os.path.join(file_path, name))
+            digest.update(f"{name}:{stat.st_size}:{stat.st_mtime_ns};".encode("utf-8"))
+    return digest.hexdigest()[:16]
 
-    new_data_who = make_medical_data_df(med_docs, nurse_midwifes, pharms, dentists)
+def workforce_table(frames, manifest):
+    """Builds and screens the WHO table, one column per manifest indicator
+    Args: dict of file name -> DataFrame holding at least the manifest's WHO files, Manifest
+    Returns: (WHO DataFrame, anomaly report DataFrame)"""
+    # makes medical data dataframe (with all provider indicators)
+    new_data_who = make_medical_data_df(
+        *[select_indicator(frames[indicator.file], indicator.code)
+          for indicator in manifest.who],
+        names=[indicator.column for indicator in manifest.who])
+    return screen_anomalies(
+        new_data_who, [indicator.column for indicator in manifest.who], ["Location"], "Period",
+        source="WHO", **manifest.anomalies)
 
+def ihme_table(frames, manifest):
+    """Combines, pivots and screens the IHME files
+    Args: dict of file name -> DataFrame holding at least the manifest's IHME files, Manifest
+    Returns: (IHME DataFrame, anomaly report DataFrame)"""
     # read in Institute for Health Metrics and Evaluation
-    data_ihme_1 = import_data(os.path.join(file_path, "IHME-1.csv"))
-    data_ihme_2 = import_data(os.path.join(file_path, "IHME-2.csv"))
-    data_ihme_combined = pd.concat([data_ihme_1, data_ihme_2], axis=0, ignore_index=True)
-    data_ihme_combined = data_ihme_combined.drop(['age', 'metric', 'upper', 'lower'], axis=1)
+    data_ihme_combined = pd.concat([frames[name] for name in manifest.ihme_files],
+                                   axis=0, ignore_index=True)
+    data_ihme_combined = data_ihme_combined.drop(['metric'], axis=1)
 
     df_ihme = pivot_ihme(data_ihme_combined)
-    new_data_who, df_ihme = reconcile_locations(new_data_who, 'Location', df_ihme, 'location')
+    return screen_anomalies(
+        df_ihme, list(manifest.ihme_measures),
+        ["location", "sex"] + (["age"] if "age" in df_ihme.columns else []) + ["cause"], "year",
+        source="IHME", **manifest.anomalies)
+
+def join_sources(new_data_who, df_ihme, manifest, aliases=None, reports=None):
+    """Reconciles the location names of the WHO and IHME tables and merges them
+    Args: WHO and IHME tables (see workforce_table and ihme_table), Manifest, optional alias
+        table, optional dict that receives the location match report under "locations"
+    Returns: (WHO, IHME, merged) DataFrames, the merged one with one row per location-year
+        that can be ranked"""
+    new_data_who, df_ihme = reconcile_locations(
+        new_data_who, 'Location', df_ihme, 'location', aliases=aliases, reports=reports)
 
-    df_ihme_merge = drop_sex(df_ihme)
+    df_ihme_merge = drop_sex(select_ranking_age(df_ihme))
+    incomplete = incomplete_location_years(df_ihme_merge, list(manifest.ihme_measures)) \
+        if manifest.anomalies.get("policy") == "null" else None
     df_ihme_merge = ag_over_cause(df_ihme_merge)
 
     both_sources = pd.merge(df_ihme_merge, new_data_who, how="inner",
                             left_on=['location','year'],right_on=['Location','Period'])
     both_sources = both_sources.drop('Location',axis='columns')
     both_sources = both_sources.drop('Period',axis='columns')
+    if incomplete is not None:
+        # like incomplete WHO rows, location-years missing a value are not ranked
+        # (a cause total without the screened-out cause would be too low)
+        both_sources = both_sources[
+            ~pd.MultiIndex.from_frame(both_sources[['location', 'year']]).isin(incomplete)
+        ].dropna(subset=[indicator.column for indicator in manifest.who])
+    return new_data_who, df_ihme, both_sources
+
+def merge_sources(file_path, manifest, reports=None, frames=None):
+    """Reads, screens and merges the sources, everything process_healthcare_data does
+    before the ranking
+    Args: path to the data folder, Manifest, optional dict for the anomaly report (see
+        process_healthcare_data), optional dict of file name -> DataFrame to use instead of
+        reading the folder (e.g. a stored release, see snapshots.py; the alias table goes
+        under ALIAS_FILE)
+    Returns: (WHO, IHME, merged) DataFrames, the merged one with one row per location-year
+        that can be ranked"""
+    if frames is None:
+        # every source file listed in the manifest is read once, in parallel
+        frames = read_sources(file_path, source_files(manifest))
+        aliases = load_aliases(os.path.join(file_path, ALIAS_FILE))
+    else:
+        aliases = frames.get(ALIAS_FILE)
+
+    new_data_who, who_report = workforce_table(frames, manifest)
+    df_ihme, ihme_report = ihme_table(frames, manifest)
+    if reports is not None:
+        reports["anomalies"] = pd.concat([who_report, ihme_report], ignore_index=True)
+    return join_sources(new_data_who, df_ihme, manifest, aliases, reports)
+
+def rank_sources(both_sources, manifest):
+    """Ranks the merged sources on the manifest's indicators
+    Args: merged DataFrame (see merge_sources), Manifest
+    Returns: ranked DataFrame, with the score and rank intervals when the IHME values have
+        uncertainty bounds"""
+    # Integrate final ranking from ranking.py, with the manifest's indicators
+    positive_cols, negative_cols = ranking_columns(manifest)
+    # the IHME uncertainty bounds give intervals of the score and rank (see uncertainty.py)
+    intervals = score_intervals(both_sources, positive_cols, negative_cols)
+    both_sources = both_sources.drop(
+        columns=[col for col in both_sources.columns if col.endswith(('_upper', '_lower'))])
+    both_sources_rank = process_ranking_pipeline(both_sources, positive_cols, negative_cols)
+    if intervals is not None:
+        both_sources_rank = both_sources_rank.merge(intervals, how='left',
+                                                    on=['location', 'year'])
+    return both_sources_rank
+
+def process_healthcare_data(file_path, manifest=None, reports=None, frames=None):
+    """function that processes all data using the functions in this file
+    Args: path to the data folder, optional Manifest (default: the folder's manifest.json,
+        or the four WHO workforce files and two IHME files), optional dict that receives
+        the data-quality report of the anomaly screen under the key "anomalies",
+        optional source frames instead of the folder's files (see merge_sources)
+    Returns: (WHO, IHME, merged and ranked) DataFrames"""
+    if manifest is None:
+        manifest = load_manifest(file_path)
+    new_data_who, df_ihme, both_sources = merge_sources(file_path, manifest, reports, frames)
+    return new_data_who, df_ihme, rank_sources(both_sources, manifest)
+
+def snake_case(name):
+    """Dashboard name of an indicator column, e.g. 'Hospital beds (per 10,000)' ->
+    'hospital_beds_per_10000'"""
+    name = re.sub(r"(?<=\d),(?=\d)", "", name.strip().lower())
+    return re.sub(r"[^0-9a-z]+", "_", name).strip("_")
 
-    # Integrate final ranking from ranking.py
-    both_sources_rank = process_ranking_pipeline(both_sources)
+def _snake_case_indicators(df):
+    """Snake-cases the remaining indicator columns (names with spaces or commas),
+    e.g. the extra indicators of a data manifest"""
+    return df.rename(columns=lambda col: snake_case(col) if re.search(r"[\s,]", col) else col)
+
+def standardize_columns(df_who, df_ihme, df_met):
+    """Renames the columns of the three processed DataFrames to the names the dashboard uses
+    Args: WHO, IHME and merged/ranked DataFrames, as returned by process_healthcare_data
+    Returns: (IHME, WHO, merged) DataFrames with snake_case column names"""
+    df_ihme.columns = df_ihme.columns.str.strip().str.replace('"', '')
+    ihme_mapping = {
+        "location": "location",
+        "sex": "sex",
+        "cause": "cause",
+        "year": "year",
+        "Deaths": "deaths",
+        "Incidence": "incidence"
+    }
+    df_ihme = df_ihme.rename(columns=ihme_mapping)
+    # uncertainty bounds of the measures, e.g. Deaths_upper -> deaths_upper
+    df_ihme = df_ihme.rename(columns=lambda col: col.lower() if col.endswith(
+        ('_upper', '_lower')) else col)
+
+    # Check that all expected IHME columns are present:
+    expected_ihme = set(ihme_mapping.values())
+    if not expected_ihme.issubset(set(df_ihme.columns)):
+        raise ValueError(
+            f"final_IHME.csv is missing columns: {expected_ihme - set(df_ihme.columns)}")
+
+    # WHO data
+    df_who.columns = df_who.columns.str.strip().str.replace('"', '')
+    df_who = df_who.loc[:, ~df_who.columns.str.contains("^Unnamed")]
+    who_mapping = {
+        "Location": "location",
+        "Period": "year",
+        "Medical Doctors per 10,000": "medical_doctors_per_10000",
+        "Nurses and Midwifes per 10,000": "nurses_midwifes_per_10000",
+        "Pharmacists per 10,000": "pharmacists_per_10000",
+        "Dentists per 10,000": "dentists_per_10000"
+    }
+    df_who = _snake_case_indicators(df_who.rename(columns=who_mapping))
+    expected_who = set(who_mapping.values())
+    if not expected_who.issubset(set(df_who.columns)):
+        raise ValueError(
+            f"final_who.csv is missing columns: {expected_who - set(df_who.columns)}")
+
+    # inner merged data
+    df_met.columns = df_met.columns.str.strip().str.replace('"', '')
+    df_met = df_met.loc[:, ~df_met.columns.str.contains("^Unnamed")]
+    # The inner merged file should have the same workforce columns.
+    # It may use either "Period" or "year" for the time column.
+    # We want to standardize on "year".
+    if "Period" in df_met.columns and "year" not in df_met.columns:
+        df_met = df_met.rename(columns={"Period": "year"})
+    # In case it already uses "year", we leave it.
+    # Now, rename the workforce columns (assuming they match the WHO file):
+    metrics_mapping = {
+        "Location": "location",
+        "medical doctors per 10,000": "medical_doctors_per_10000",
+        "nurses and midwifes per 10,000": "nurses_midwifes_per_10000",
+        "pharmacists per 10,000": "pharmacists_per_10000",
+        "dentists per 10,000": "dentists_per_10000"
+    }
+    df_met = _snake_case_indicators(df_met.rename(columns=metrics_mapping))
+    # Ensure the time column is named "year"
+    if "year" not in df_met.columns:
+        raise ValueError(
+            "inner_merged_data.csv must contain a time column named either 'year' or 'Period'.")
+    expected_metrics = {"location", "year", "medical_doctors_per_10000",
+                        "nurses_midwifes_per_10000", "pharmacists_per_10000", "dentists_per_10000"}
+    if not expected_metrics.issubset(set(df_met.columns)):
+        raise ValueError(
+            f"inner_merged_data.csv missing columns: {expected_metrics - set(df_met.columns)}")
+            # removed "is" from above value error message for line length
+            # if this affects test passing, replace and split the above line into 2 lines
+    return df_ihme, df_who, df_met
 
-    return new_data_who, df_ihme, both_sources_rank
+def load_dashboard_data(file_path, compact=True):
+    """Runs the whole pipeline and standardizes the columns, without needing streamlit
+    Args: path to the data folder, compact=False to keep the pipeline dtypes
+        (object strings, float64) instead of categoricals and downcast numbers
+    Returns: (IHME, WHO, merged) DataFrames, the same frames the dashboard shows"""
+    frames = standardize_columns(*process_healthcare_data(file_path))
+    if compact:
+        frames, _ = compact_frames(*frames)
+    return frames
 
-def main():
+def main(argv=None):
     """Main function to run the data maninuplation pipeline"""
+    parser = argparse.ArgumentParser(description="Runs the data pipeline on data/")
+    parser.add_argument("--write-aliases", action="store_true",
+                        help=f"save the location matches as data/{ALIAS_FILE}")
+    args = parser.parse_args(argv)
     print(f"Current Directory: {os.getcwd()}")
     # ^Check your current working directory
     file_path = os.path.join(os.getcwd(), "data/")
 
     if os.path.exists(file_path):
-        process_healthcare_data(file_path)
+        reports = {}
+        frames = standardize_columns(*process_healthcare_data(file_path, reports=reports))
+        _, report = compact_frames(*frames)
+        print(report.to_string(index=False))
+        anomalies = reports["anomalies"]
+        print(f"{len(anomalies)} cells flagged by the anomaly screen")
+        if not anomalies.empty:
+            print(anomalies.groupby(["source", "column", "reason"]).size().to_string())
+        locations = reports["locations"]
+        print(f"{len(locations)} WHO location names without an exact IHME match")
+        if not locations.empty:
+            print(locations.to_string(index=False))
+        if args.write_aliases:
+            alias_path = os.path.join(file_path, ALIAS_FILE)
+            save_aliases(locations, alias_path, load_aliases(alias_path))
+            print(f"Saved {alias_path}")
     else:
         print(f"File NOT found: {file_path}")
 
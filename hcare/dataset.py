@@ -0,0 +1,250 @@
+"""
+Lazy access to the pipeline's stages for notebooks and scripts.
+
+process_healthcare_data runs every stage and returns the final frames. A Dataset computes
+each stage the first time one of its properties is read and keeps the result, and each stage
+only reads the stages it needs:
+
+    raw_who    the manifest's WHO files          (reads the WHO files)
+    workforce  screened WHO table                (raw_who)
+    raw_ihme   the manifest's IHME files         (reads the IHME files)
+    ihme_pivot pivoted, screened IHME table      (raw_ihme)
+    who, ihme, merged
+               location names reconciled, merged (workforce, ihme_pivot)
+    ranked     composite score and rank          (merged)
+
+so reading a workforce column never parses the IHME files or runs the ranking's PCA.
+When files of the folder change, Dataset.refresh gives a Dataset that keeps the results of
+the stages that do not depend on them (see watch.py).
+
+With a cache_dir, every stage is also pickled to cache_dir/<key>/<stage>.pkl and loaded
+from there by later Datasets. The key changes with the data folder's version (see
+data_prep.data_version) and the manifest, so edited data is never served from the cache.
+The pickles are only meant to be read back by this code.
+"""
+import hashlib
+import os
+
+import pandas as pd
+
+try:
+    from .data_prep import (data_version, ihme_table, join_sources, rank_sources, read_sources,
+                            source_name, workforce_table)
+    from .locations import ALIAS_FILE, load_aliases
+    from .manifest import MANIFEST_FILE, load_manifest
+except ImportError:
+    from data_prep import (data_version, ihme_table, join_sources, rank_sources, read_sources,
+                           source_name, workforce_table)
+    from locations import ALIAS_FILE, load_aliases
+    from manifest import MANIFEST_FILE, load_manifest
+
+# stage -> the names of its results, in the order the stage returns them
+STAGES = {
+    "raw_who": ("raw_who",),
+    "workforce": ("workforce", "who_anomalies"),
+    "raw_ihme": ("raw_ihme",),
+    "ihme_pivot": ("ihme_pivot", "ihme_anomalies"),
+    "merged": ("who", "ihme", "merged", "locations"),
+    "ranked": ("ranked",),
+}
+# stage -> the stages it reads (the raw stages read the data folder's files)
+STAGE_INPUTS = {
+    "raw_who": (),
+    "workforce": ("raw_who",),
+    "raw_ihme": (),
+    "ihme_pivot": ("raw_ihme",),
+    "merged": ("workforce", "ihme_pivot"),
+    "ranked": ("merged",),
+}
+
+
+def affected_stages(manifest, files):
+    """
+    Stages whose results depend on some of the data folder's files
+    Args: Manifest, names of changed, added or removed files (a compressed copy such as
+        IHME-1.csv.gz counts as the file it holds)
+    Returns: set of stage names (every stage when the manifest itself changed; none for
+        files the manifest does not read)
+    """
+    files = set(files) | {source_name(name) for name in files}
+    if MANIFEST_FILE in files:
+        return set(STAGES)
+    stale = set()
+    if files & {indicator.file for indicator in manifest.who}:
+        stale.add("raw_who")
+    if files & set(manifest.ihme_files):
+        stale.add("raw_ihme")
+    if ALIAS_FILE in files:
+        stale.add("merged")
+    # STAGE_INPUTS lists every stage after the stages it reads
+    for stage, inputs in STAGE_INPUTS.items():
+        if stale & set(inputs):
+            stale.add(stage)
+    return stale
+
+
+class Dataset:
+    """
+    Pipeline stages of one data folder, computed on demand and memoized (see the module
+    docstring). The properties return the memoized frames, not copies.
+    """
+
+    # pylint: disable-next=too-many-arguments
+    def __init__(self, file_path, manifest=None, cache_dir=None, *, results=None,
+                 kept_files=None):
+        self.file_path = file_path
+        self.manifest = load_manifest(file_path) if manifest is None else manifest
+        self.cache_dir = cache_dir
+        # stage results to start from and, per raw stage, files read by an earlier Dataset
+        # that are still current (both given by refresh)
+        self._results = dict(results or {})
+        self._kept_files = dict(kept_files or {})
+        self._key = None
+        # stages computed (not loaded from the cache) by this Dataset, in order
+        self.computed = []
+
+    @property
+    def key(self):
+        """Cache key of the data folder's version and the manifest"""
+        if self._key is None:
+            digest = hashlib.sha1(f"{data_version(self.file_path)}:{self.manifest!r}"
+                                  .encode("utf-8"))
+            self._key = digest.hexdigest()[:16]
+        return self._key
+
+    def _path(self, name):
+        """Pickle file of one stage result (None without a cache_dir)"""
+        if self.cache_dir is None:
+            return None
+        return os.path.join(self.cache_dir, self.key, f"{name}.pkl")
+
+    def _stage(self, stage, compute):
+        """
+        Results of a stage: memoized, else loaded from the cache, else computed
+        Args: stage name (a key of STAGES), function returning the stage's results
+        Returns: dict of result name -> result
+        """
+        names = STAGES[stage]
+        if names[0] not in self._results:
+            paths = [self._path(name) for name in names]
+            if all(path is not None and os.path.exists(path) for path in paths):
+                results = [pd.read_pickle(path) for path in paths]
+            else:
+                results = compute()
+                results = results if isinstance(results, tuple) else (results,)
+                self.computed.append(stage)
+                if self.cache_dir is not None:
+                    os.makedirs(os.path.dirname(paths[0]), exist_ok=True)
+                    for path, result in zip(paths, results):
+                        # written under a temporary name so readers never see a partial file
+                        pd.to_pickle(result, f"{path}.tmp")
+                        os.replace(f"{path}.tmp", path)
+            self._results.update(zip(names, results))
+        return {name: self._results[name] for name in names}
+
+    def refresh(self, files):
+        """
+        Dataset of the same folder after some of its files changed: it starts with the
+        results of every stage that does not depend on them, and its raw stages only read
+        the changed files again
+        Args: names of the changed, added or removed files
+        Returns: Dataset (a fresh one when the manifest changed)
+        """
+        if MANIFEST_FILE in files:
+            return Dataset(self.file_path, cache_dir=self.cache_dir)
+        files = set(files) | {source_name(name) for name in files}
+        stale = affected_stages(self.manifest, files)
+        results, kept_files = {}, {}
+        for stage, names in STAGES.items():
+            if stage not in stale and names[0] in self._results:
+                results.update((name, self._results[name]) for name in names)
+            elif stage in ("raw_who", "raw_ihme") and stage in self._results:
+                kept_files[stage] = {name: frame for name, frame in self._results[stage].items()
+                                     if name not in files}
+        return Dataset(self.file_path, self.manifest, self.cache_dir, results=results,
+                       kept_files=kept_files)
+
+    def _read(self, stage, files):
+        """Reads some of the data folder's files, reusing those kept by refresh"""
+        files = list(dict.fromkeys(files))
+        kept = self._kept_files.get(stage, {})
+        frames = read_sources(self.file_path, [name for name in files if name not in kept])
+        return {name: kept[name] if name in kept else frames[name] for name in files}
+
+    def _workforce(self):
+        """Results of the workforce stage (see workforce_table)"""
+        return workforce_table(self.raw_who, self.manifest)
+
+    def _ihme_pivot(self):
+        """Results of the ihme_pivot stage (see ihme_table)"""
+        return ihme_table(self.raw_ihme, self.manifest)
+
+    def _merge(self):
+        """Results of the merged stage (see join_sources)"""
+        reports = {}
+        aliases = load_aliases(os.path.join(self.file_path, ALIAS_FILE))
+        merged = join_sources(self.workforce, self.ihme_pivot, self.manifest, aliases, reports)
+        return merged + (reports["locations"],)
+
+    @property
+    def raw_who(self):
+        """dict of file name -> DataFrame of the manifest's WHO files, as read"""
+        return self._stage("raw_who", lambda: self._read(
+            "raw_who", (indicator.file for indicator in self.manifest.who)))["raw_who"]
+
+    @property
+    def workforce(self):
+        """WHO table with one column per manifest indicator, screened for anomalies, with
+        the WHO location names"""
+        return self._stage("workforce", self._workforce)["workforce"]
+
+    @property
+    def raw_ihme(self):
+        """dict of file name -> DataFrame of the manifest's IHME files, as read"""
+        return self._stage("raw_ihme", lambda: self._read(
+            "raw_ihme", self.manifest.ihme_files))["raw_ihme"]
+
+    @property
+    def ihme_pivot(self):
+        """IHME table with one column per measure, screened for anomalies, with the IHME
+        location names"""
+        return self._stage("ihme_pivot", self._ihme_pivot)["ihme_pivot"]
+
+    @property
+    def who(self):
+        """WHO table with reconciled location names (first frame of process_healthcare_data)"""
+        return self._stage("merged", self._merge)["who"]
+
+    @property
+    def ihme(self):
+        """IHME table with reconciled location names (second frame of
+        process_healthcare_data)"""
+        return self._stage("merged", self._merge)["ihme"]
+
+    @property
+    def merged(self):
+        """One row per location-year of both sources, before the ranking"""
+        return self._stage("merged", self._merge)["merged"]
+
+    @property
+    def ranked(self):
+        """Merged rows with the composite score and rank (third frame of
+        process_healthcare_data)"""
+        return self._stage("ranked",
+                           lambda: rank_sources(self.merged, self.manifest))["ranked"]
+
+    @property
+    def anomalies(self):
+        """Anomaly report of the WHO and IHME screens (see anomaly.py)"""
+        return pd.concat([self._stage("workforce", self._workforce)["who_anomalies"],
+                          self._stage("ihme_pivot", self._ihme_pivot)["ihme_anomalies"]],
+                         ignore_index=True)
+
+    @property
+    def locations(self):
+        """Match report of the WHO location names (see locations.py)"""
+        return self._stage("merged", self._merge)["locations"]
+
+    def frames(self):
+        """Returns (WHO, IHME, ranked) DataFrames, what process_healthcare_data returns"""
+        return self.who, self.ihme, self.ranked
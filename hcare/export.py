@@ -0,0 +1,167 @@
+"""
+Streaming export of the processed data (the ranked panel, WHO or IHME tables) or any
+filtered view of it, to CSV, Parquet or gzip-compressed JSON lines.
+Rows are written in fixed-size chunks, so only one chunk of output is in memory at a time.
+
+Command line:
+    python -m hcare.export --source metrics --format parquet --out rankings.parquet
+    python -m hcare.export --source ihme --year 2020 --cause "Digestive diseases" --out ihme.csv
+"""
+import argparse
+import gzip
+import io
+import os
+
+import numpy as np
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+try:
+    from .data_prep import load_dashboard_data
+    from .filter_index import row_mask
+    from .compact import widen_floats
+except ImportError:
+    from data_prep import load_dashboard_data
+    from filter_index import row_mask
+    from compact import widen_floats
+
+FORMATS = {
+    "csv": ("text/csv", ".csv"),
+    "parquet": ("application/vnd.apache.parquet", ".parquet"),
+    "jsonl.gz": ("application/gzip", ".jsonl.gz"),
+}
+SOURCES = ("ihme", "who", "metrics")
+CHUNK_ROWS = 50_000
+
+
+def iter_chunks(df, index=None, columns=None, chunk_rows=CHUNK_ROWS, **filters):
+    """
+    Yields the rows of df matching the filters in chunks of at most chunk_rows rows
+    Args: pandas DataFrame, optional FilterIndex built on df, optional list of columns,
+        chunk size, filters as in FilterIndex.mask (None / empty list = no filter)
+    Returns: generator of pandas DataFrames
+    """
+    positions = np.flatnonzero(row_mask(df, index, **filters))
+    col_positions = [df.columns.get_loc(col) for col in columns] if columns else \
+        list(range(df.shape[1]))
+    for start in range(0, len(positions), chunk_rows):
+        yield df.iloc[positions[start:start + chunk_rows], col_positions]
+
+
+def _write_csv(chunks, handle):
+    """Writes the chunks as CSV with a single header row"""
+    rows = 0
+    text = io.TextIOWrapper(handle, encoding="utf-8", newline="", write_through=True)
+    for chunk in chunks:
+        chunk.to_csv(text, header=rows == 0, index=False)
+        rows += len(chunk)
+    text.detach()
+    return rows
+
+
+def _write_jsonl_gz(chunks, handle):
+    """Writes the chunks as gzip-compressed JSON lines (one record per line)"""
+    rows = 0
+    with gzip.GzipFile(fileobj=handle, mode="wb") as zipped:
+        for chunk in chunks:
+            if len(chunk):
+                # to_json(lines=True) ends every record, including the last, with \n
+                zipped.write(widen_floats(chunk).to_json(orient="records", lines=True,
+                                           double_precision=15).encode("utf-8"))
+            rows += len(chunk)
+    return rows
+
+
+def _write_parquet(chunks, handle):
+    """Writes the chunks as a parquet file with one row group per chunk"""
+    rows = 0
+    writer = None
+    for chunk in chunks:
+        table = pa.Table.from_pandas(chunk, preserve_index=False)
+        if writer is None:
+            writer = pq.ParquetWriter(handle, table.schema)
+        writer.write_table(table.cast(writer.schema))
+        rows += len(chunk)
+    if writer is not None:
+        writer.close()
+    return rows
+
+
+WRITERS = {"csv": _write_csv, "jsonl.gz": _write_jsonl_gz, "parquet": _write_parquet}
+
+
+def write_chunks(chunks, out, fmt="csv"):
+    """
+    Writes an iterable of DataFrame chunks to a path or a binary file object
+    Args: iterable of pandas DataFrames with the same columns, output path or binary
+        file object, format ("csv", "parquet" or "jsonl.gz")
+    Returns: number of rows written
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"format must be one of {sorted(FORMATS)}")
+    if fmt == "parquet" and pq is None:
+        raise ImportError("parquet export needs pyarrow installed")
+    if isinstance(out, (str, os.PathLike)):
+        with open(out, "wb") as handle:
+            return WRITERS[fmt](chunks, handle)
+    return WRITERS[fmt](chunks, out)
+
+
+# pylint: disable-next=too-many-arguments
+def export_view(df, out, fmt="csv", *, index=None, columns=None, chunk_rows=CHUNK_ROWS,
+                **filters):
+    """
+    Streams the filtered view of df to out (see iter_chunks and write_chunks)
+    Returns: number of rows written
+    """
+    return write_chunks(iter_chunks(df, index, columns, chunk_rows, **filters), out, fmt)
+
+
+def export_bytes(df, fmt="csv", index=None, columns=None, **filters):
+    """Exports the filtered view of df into memory, e.g. for a download button"""
+    buffer = io.BytesIO()
+    export_view(df, buffer, fmt, index=index, columns=columns, **filters)
+    return buffer.getvalue()
+
+
+def main(argv=None):
+    """Command line entry point for the export"""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n", maxsplit=1)[0])
+    parser.add_argument("--data", default="data/", help="folder with the source files")
+    parser.add_argument("--source", choices=SOURCES, default="metrics",
+                        help="metrics is the ranked panel (default)")
+    parser.add_argument("--format", choices=sorted(FORMATS), default=None,
+                        help="defaults to the extension of --out, else csv")
+    parser.add_argument("--out", required=True, help="output file")
+    parser.add_argument("--year", type=int, action="append")
+    parser.add_argument("--region", action="append")
+    parser.add_argument("--location", action="append")
+    parser.add_argument("--cause", action="append")
+    parser.add_argument("--age", action="append", help="IHME age group (repeatable)")
+    parser.add_argument("--column", action="append", help="column to keep (repeatable)")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    args = parser.parse_args(argv)
+
+    fmt = args.format or next((name for name, (_, ext) in FORMATS.items()
+                               if args.out.endswith(ext)), "csv")
+    df = load_dashboard_data(args.data)[SOURCES.index(args.source)]
+    filters = {"year": args.year, "location": args.location}
+    region_col = "Region" if "Region" in df.columns else "region"
+    if region_col in df.columns:
+        filters[region_col] = args.region
+    if "cause" in df.columns:
+        filters["cause"] = args.cause
+    if "age" in df.columns:
+        filters["age"] = args.age
+    rows = export_view(df, args.out, fmt, columns=args.column, chunk_rows=args.chunk_rows,
+                       **filters)
+    print(f"Wrote {rows} rows to {args.out}")
+
+
+if __name__ == '__main__':
+    main()
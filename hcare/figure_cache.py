@@ -0,0 +1,170 @@
+"""
+Process-wide cache of plotly figures for the dashboard.
+Figures are keyed by the figure builder, the version of the data they were built from,
+and a normalized (hashable) form of the widget selections passed to the builder.
+The cache lives at module level, so every streamlit session served by the same
+process shares it. TableCache does the same for computed analysis tables.
+"""
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+def normalize_arg(value):
+    """
+    Turns a widget selection into a hashable value so equal selections give equal keys
+    Args: any argument passed to a figure builder (list, tuple, numpy scalar, dict, ...)
+    Returns: a hashable equivalent (lists become tuples, numpy scalars become python ones)
+    """
+    if hasattr(value, "cache_token"):
+        # objects standing in for data (e.g. filter indexes) provide their own small key
+        return value.cache_token
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        value = value.tolist()
+    if isinstance(value, (list, tuple)):
+        return tuple(normalize_arg(item) for item in value)
+    if isinstance(value, (set, frozenset)):
+        return tuple(sorted(normalize_arg(item) for item in value))
+    if isinstance(value, dict):
+        return tuple(sorted((key, normalize_arg(item)) for key, item in value.items()))
+    hash(value)
+    return value
+
+
+def make_key(builder, version, args, kwargs):
+    """
+    Builds the cache key for one call of a figure builder
+    Args: the builder function, the data version, positional and keyword arguments
+        (the dataframe itself is not part of the key, the data version stands in for it)
+    Returns: a hashable tuple
+    """
+    return (
+        f"{builder.__module__}.{builder.__qualname__}",
+        normalize_arg(version),
+        normalize_arg(args),
+        normalize_arg(kwargs),
+    )
+
+
+class FigureCache:
+    """
+    Thread-safe LRU cache of plotly figures, bounded by the serialized size of the figures.
+    Cached figures are shared between sessions and must be treated as read-only.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_build(self, builder, df, version, *args, **kwargs):
+        """
+        Returns the cached figure for this call, building (and storing) it on a miss
+        Args: figure builder, the dataframe it plots, a hashable data version identifying
+            the contents of df, then the remaining builder arguments
+        Returns: plotly figure
+        """
+        key = make_key(builder, version, args, kwargs)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        fig = builder(df, *args, **kwargs)
+        size = len(fig.to_json())
+        if size > self.max_bytes:
+            return fig
+
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = (fig, size)
+                self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                _, (_, old_size) = self._entries.popitem(last=False)
+                self.current_bytes -= old_size
+                self.evictions += 1
+        return fig
+
+    def stats(self):
+        """Returns the hit/miss counters and current size of the cache as a dict"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+    def clear(self):
+        """Drops every cached figure and resets the counters"""
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+
+FIGURE_CACHE = FigureCache()
+
+
+def cached_figure(builder, df, version, *args, **kwargs):
+    """Shortcut for FIGURE_CACHE.get_or_build"""
+    return FIGURE_CACHE.get_or_build(builder, df, version, *args, **kwargs)
+
+
+class TableCache:
+    """
+    Thread-safe LRU cache of computed tables (e.g. correlation or regression results),
+    keyed like the figure cache; the last max_entries tables are kept.
+    Cached tables are shared between sessions and must be treated as read-only.
+    """
+
+    def __init__(self, max_entries=8):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, func, df, version, *args, **kwargs):
+        """
+        Returns the cached result of func(df, *args, **kwargs), computing it on a miss
+        Args: function, the dataframe it reads, a hashable data version identifying the
+            contents of df, then the remaining function arguments
+        """
+        key = make_key(func, version, args, kwargs)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+        table = func(df, *args, **kwargs)
+        with self._lock:
+            self._entries[key] = table
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return table
+
+    def clear(self):
+        """Drops every cached table"""
+        with self._lock:
+            self._entries.clear()
+
+
+TABLE_CACHE = TableCache()
+
+
+def cached_table(func, df, version, *args, **kwargs):
+    """Shortcut for TABLE_CACHE.get_or_compute"""
+    return TABLE_CACHE.get_or_compute(func, df, version, *args, **kwargs)
@@ -0,0 +1,242 @@
+"""
+Precomputed filter indexes over the dashboard frames.
+Built once per data version so widget option lists and plot filters are answered by
+dictionary lookups and posting lists (the sorted row positions of every value) instead of
+scanning the full frames.
+
+query() is the selection the figure builders share: a builder declares its filters, the
+columns that must not be null and the columns it uses, and gets back only those rows and
+columns. With an index the rows come from the posting lists of the most selective filter,
+and the other filters and the null checks are only evaluated on those rows, so the cost
+grows with the size of the selection rather than with the size of the frame.
+"""
+import numpy as np
+import pandas as pd
+
+DEFAULT_COLUMNS = ("year", "location", "Region", "region", "cause", "sex", "age")
+
+
+class FilterIndex:
+    """
+    Index over the filter columns of one dataframe.
+    For each column: the sorted distinct values, the value code of every row and the
+    ascending row positions of every value.
+    For locations: year -> locations, region -> locations and (year, region) -> locations.
+    Row positions refer to the dataframe the index was built from (and its views).
+    """
+
+    def __init__(self, df, columns=None):
+        if columns is None:
+            columns = [col for col in DEFAULT_COLUMNS if col in df.columns]
+        self.n_rows = len(df)
+        self.columns = tuple(columns)
+        self._codes = {}
+        self._lookup = {}
+        self._sorted = {}
+        self._postings = {}
+        for col in self.columns:
+            self._add_column(col, df[col].to_numpy())
+        self._locations_by = self._build_location_maps()
+
+    @property
+    def region_col(self):
+        """Name of the region column ("Region" in WHO, "region" in the metrics) or None"""
+        return next((col for col in ("Region", "region") if col in self.columns), None)
+
+    def _add_column(self, col, raw_values):
+        """Factorizes one column and builds its posting lists"""
+        positions = np.flatnonzero(~pd.isna(raw_values))
+        uniques, codes = np.unique(raw_values[positions], return_inverse=True)
+        all_codes = np.full(self.n_rows, -1, dtype=np.int32)
+        all_codes[positions] = codes
+        self._codes[col] = all_codes
+        self._sorted[col] = uniques.tolist()
+        self._lookup[col] = {value: code for code, value in enumerate(self._sorted[col])}
+        # (rows, offsets): the rows of value code c are rows[offsets[c]:offsets[c + 1]],
+        # in ascending order
+        self._postings[col] = (
+            positions[np.argsort(codes, kind="stable")],
+            np.concatenate([[0], np.cumsum(np.bincount(codes, minlength=len(uniques)))]))
+
+    def _build_location_maps(self):
+        """Precomputes year -> locations, region -> locations and (year, region) -> locations"""
+        maps = {}
+        if "location" not in self.columns:
+            return maps
+        loc_codes = self._codes["location"]
+        locations = np.array(self._sorted["location"], dtype=object)
+        keys = [col for col in ("year", self.region_col) if col is not None]
+        for key_cols in [(col,) for col in keys] + ([tuple(keys)] if len(keys) == 2 else []):
+            key_codes = np.stack([self._codes[col] for col in key_cols] + [loc_codes])
+            key_codes = key_codes[:, (key_codes >= 0).all(axis=0)]
+            pairs = np.unique(key_codes, axis=1)
+            grouped = {}
+            for column in pairs.T:
+                key = tuple(self._sorted[col][code] for col, code in zip(key_cols, column[:-1]))
+                grouped.setdefault(key if len(key) > 1 else key[0], []).append(column[-1])
+            maps[key_cols] = {key: locations[codes].tolist() for key, codes in grouped.items()}
+        return maps
+
+    def values(self, col, **filters):
+        """
+        Sorted distinct non-null values of a column, optionally among the rows matching filters
+        Args: column name, filters as in mask()
+        Returns: sorted list of values
+        """
+        if not _active(filters):
+            return list(self._sorted[col])
+        codes = self._codes[col][self.positions(**filters)]
+        codes = np.unique(codes[codes >= 0])
+        return [self._sorted[col][code] for code in codes]
+
+    def locations(self, year=None, regions=None):
+        """
+        Sorted locations present for a year and/or a list of regions
+        (None means no filter, an empty list of regions matches nothing)
+        """
+        if regions is not None and len(regions) == 0:
+            return []
+        if year is None and regions is None:
+            return list(self._sorted["location"])
+        if regions is None:
+            return list(self._locations_by[("year",)].get(year, []))
+        if year is None:
+            lookup = self._locations_by[(self.region_col,)]
+            keys = regions
+        else:
+            lookup = self._locations_by[("year", self.region_col)]
+            keys = [(year, region) for region in regions]
+        found = set()
+        for key in keys:
+            found.update(lookup.get(key, []))
+        return sorted(found)
+
+    def _selected_codes(self, col, selected):
+        """Value codes of a filter (a single value or a list of values) in a column"""
+        if not isinstance(selected, (list, tuple, set, frozenset, np.ndarray)):
+            selected = [selected]
+        lookup = self._lookup[col]
+        return np.array(sorted({lookup[value] for value in selected if value in lookup}),
+                        dtype=np.intp)
+
+    def rows(self, col, selected):
+        """
+        Row positions whose value in col is one of selected
+        Args: column name, a single value or a list of values
+        Returns: ascending numpy array of row positions
+        """
+        return self._gather(col, self._selected_codes(col, selected))
+
+    def _gather(self, col, codes):
+        """Ascending row positions of the given value codes of a column"""
+        rows, offsets = self._postings[col]
+        parts = [rows[offsets[code]:offsets[code + 1]] for code in codes]
+        if len(parts) == 1:
+            return parts[0]
+        return np.sort(np.concatenate(parts)) if parts else np.empty(0, dtype=np.intp)
+
+    def positions(self, **filters):
+        """
+        Row positions matching all the filters, e.g. positions(year=2020, location=["India"]).
+        Filters set to None or to an empty list are ignored, as in the plot functions.
+        The filter matching the fewest rows gives the candidate rows and the other filters
+        are checked on those rows only.
+        Returns: ascending numpy array of row positions
+        """
+        active = [(col, self._selected_codes(col, selected))
+                  for col, selected in filters.items() if _is_active(selected)]
+        if not active:
+            return np.arange(self.n_rows)
+        sizes = [int(np.sum(np.diff(self._postings[col][1])[codes])) for col, codes in active]
+        col, codes = active.pop(int(np.argmin(sizes)))
+        candidates = self._gather(col, codes)
+        for col, codes in active:
+            # the last entry stays False: it is where the null code -1 points
+            allowed = np.zeros(len(self._sorted[col]) + 1, dtype=bool)
+            allowed[codes] = True
+            candidates = candidates[allowed[self._codes[col][candidates]]]
+        return candidates
+
+    def mask(self, **filters):
+        """
+        Boolean row mask for the given filters, e.g. mask(year=2020, location=["India"]).
+        Filters set to None or to an empty list are ignored, as in the plot functions.
+        Returns: numpy boolean array with one entry per row
+        """
+        if not _active(filters):
+            return np.ones(self.n_rows, dtype=bool)
+        mask = np.zeros(self.n_rows, dtype=bool)
+        mask[self.positions(**filters)] = True
+        return mask
+
+    @property
+    def cache_token(self):
+        """Small hashable stand-in for this index in figure cache keys"""
+        return ("FilterIndex", self.n_rows, self.columns)
+
+
+def _is_active(selected):
+    """True when a filter value actually restricts the rows"""
+    if selected is None:
+        return False
+    if isinstance(selected, (list, tuple, set, frozenset, np.ndarray)):
+        return len(selected) > 0
+    return True
+
+
+def _active(filters):
+    """True when at least one of the filters restricts the rows"""
+    return any(_is_active(selected) for selected in filters.values())
+
+
+def row_mask(df, index=None, **filters):
+    """
+    Boolean row mask of df for the filters (column=value or column=[values]).
+    Filters set to None or to an empty list are ignored.
+    Uses the precomputed index when one is given, otherwise falls back to column scans.
+    Args: pandas DataFrame, optional FilterIndex built on df, filters
+    Returns: numpy boolean array with one entry per row of df
+    """
+    if index is not None:
+        return index.mask(**filters)
+    mask = np.ones(len(df), dtype=bool)
+    for col, selected in filters.items():
+        if not _is_active(selected):
+            continue
+        if isinstance(selected, (list, tuple, set, frozenset, np.ndarray)):
+            mask &= df[col].isin(selected).to_numpy()
+        else:
+            mask &= (df[col] == selected).to_numpy()
+    return mask
+
+
+def query(df, index=None, columns=None, notnull=(), **filters):
+    """
+    Rows of df matching all the filters and with values in the notnull columns, keeping
+    only the given columns. With an index, the filters are answered from its posting lists
+    and the null checks only look at the matching rows (see the module docstring).
+    Args: pandas DataFrame, optional FilterIndex built on df, list of columns to return
+        (None = all), columns whose nulls drop the row, filters as in row_mask
+    Returns: new pandas DataFrame with the selected rows (original index) and columns
+    """
+    if index is not None:
+        positions = index.positions(**filters)
+    else:
+        positions = np.flatnonzero(row_mask(df, None, **filters))
+    for col in notnull:
+        positions = positions[~pd.isna(df[col].array.take(positions))]
+    if columns is None:
+        return df.take(positions)
+    # built from the columns' arrays: much cheaper than df.iloc[rows, cols] for small results
+    selected = pd.DataFrame({col: df[col].array.take(positions) for col in dict.fromkeys(columns)},
+                            index=df.index.take(positions), copy=False)
+    selected.columns.name = df.columns.name
+    return selected
+
+
+def select_rows(df, index=None, **filters):
+    """
+    Rows of df matching all the filters, see row_mask and query
+    Returns: the filtered pandas DataFrame
+    """
+    return query(df, index, **filters)
@@ -0,0 +1,250 @@
+"""
+Forecasts of the composite score, the rank and the indicators of every country.
+
+The series are laid out as a location x year matrix (see panel.panel_cube), one row per
+location and metric, and each model is fitted to all rows at once with array operations:
+
+    damped   exponential smoothing with a damped trend (Holt's method with a damping
+             factor phi), the smoothing and damping parameters chosen per row from a grid
+    linear   least squares trend line of each row
+    ses      simple exponential smoothing (a flat forecast at the smoothed level), its
+             smoothing parameter chosen per row from a grid
+
+The smoothing recursions loop over the years only: each step updates every row at every
+grid point together, and each row keeps the grid point with the lowest sum of squared
+one-step errors. Missing years are bridged by the model's own forecast. Rows with fewer
+than MIN_YEARS values get no forecast.
+
+The forecasts cover the HORIZON years after the last year of the data, with 95% prediction
+intervals (normal errors, with the usual h-step variance of each model). The rank forecast of
+a year ranks the composite score forecasts of all locations; its interval ranks the bounds
+of each location's score among the other locations' forecasts. cached_forecast computes
+the forecasts once per data version and model.
+"""
+import numpy as np
+import pandas as pd
+
+try:
+    from .constants import Z_95
+    from .panel import panel_cube
+    from .ranking import rank_within
+    from .correlation import WORKFORCE_COLUMNS, OUTCOME_COLUMNS
+    from .figure_cache import cached_table
+except ImportError:
+    from constants import Z_95
+    from panel import panel_cube
+    from ranking import rank_within
+    from correlation import WORKFORCE_COLUMNS, OUTCOME_COLUMNS
+    from figure_cache import cached_table
+
+MODELS = ("damped", "linear", "ses")
+HORIZON = 5
+MIN_YEARS = 3
+SCORE = "composite_score"
+FORECAST_COLUMNS = ["location", "year", "metric", "forecast", "lower", "upper"]
+# grid points (alpha, beta, phi) of the smoothing models
+SES_GRID = np.array([(alpha, 0.0, 1.0) for alpha in np.linspace(0.1, 1.0, 10)])
+DAMPED_GRID = np.array([(alpha, beta, phi) for alpha in (0.2, 0.4, 0.6, 0.8, 1.0)
+                        for beta in (0.05, 0.1, 0.2, 0.4) for phi in (0.8, 0.9, 0.98)])
+
+
+def _enough(array, n):
+    """array with NaN rows for the series with fewer than MIN_YEARS values"""
+    return np.where((n >= MIN_YEARS)[:, None], array, np.nan)
+
+
+def _trend_lines(values):
+    """
+    Least squares trend line of every row
+    Returns: (values per row, mean year position, mean value, slope, sum of squared year
+        deviations, residual standard deviation)
+    """
+    seen = ~np.isnan(values)
+    n = seen.sum(axis=1)
+    x = np.broadcast_to(np.arange(values.shape[1], dtype=np.float64), values.shape)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        x_mean = np.where(seen, x, 0).sum(axis=1) / n
+        y_mean = np.where(seen, values, 0).sum(axis=1) / n
+        dx = np.where(seen, x - x_mean[:, None], 0)
+        dy = np.where(seen, values - y_mean[:, None], 0)
+        sxx = (dx ** 2).sum(axis=1)
+        slope = (dx * dy).sum(axis=1) / sxx
+        sigma = np.sqrt(((dy - slope[:, None] * dx) ** 2).sum(axis=1) / (n - 2))
+    return n, x_mean, y_mean, slope, sxx, sigma
+
+
+def fit_linear(values, horizon):
+    """
+    Least squares trend line forecasts of every row
+    Args: array of rows x years (NaN = missing), number of years to forecast
+    Returns: (forecasts, standard errors of the forecasts) arrays of rows x horizon
+    """
+    n, x_mean, y_mean, slope, sxx, sigma = _trend_lines(values)
+    ahead = values.shape[1] - 1 + np.arange(1, horizon + 1) - x_mean[:, None]
+    forecasts = y_mean[:, None] + slope[:, None] * ahead
+    with np.errstate(invalid="ignore", divide="ignore"):
+        errors = sigma[:, None] * np.sqrt(1 + 1 / n[:, None] + ahead ** 2 / sxx[:, None])
+    return _enough(forecasts, n), _enough(errors, n)
+
+
+# pylint: disable-next=too-many-locals
+def _smooth(values, grid, initial_trend):
+    """
+    Runs the damped trend recursion over the years for every row and grid point
+    Returns: (level, trend, sum of squared one-step errors) arrays of grid points x rows,
+        and the position of the last value of every row
+    """
+    alpha, beta, phi = (grid[:, [column]] for column in range(3))
+    level = np.full((len(grid), values.shape[0]), np.nan)
+    trend = np.zeros_like(level)
+    sse = np.zeros_like(level)
+    last_seen = np.full(values.shape[0], -1)
+    for year, observed in enumerate(values.T):
+        seen = ~np.isnan(observed)
+        started = ~np.isnan(level[0])
+        predicted = level + phi * trend
+        error = np.where(seen & started, observed - predicted, 0.0)
+        sse += error ** 2
+        # a row starts at its first value; years without a value follow the forecast
+        level = np.where(started, predicted + alpha * error, np.where(seen, observed, np.nan))
+        trend = np.where(started, phi * trend + alpha * beta * error, initial_trend)
+        last_seen = np.where(seen, year, last_seen)
+    return level, trend, sse, last_seen
+
+
+# pylint: disable-next=too-many-locals
+def fit_smoothing(values, horizon, grid, initial_trend=None):
+    """
+    Exponential smoothing forecasts of every row with a damped trend (beta = 0 and no
+    initial trend give simple exponential smoothing), each row with the grid point of
+    lowest squared one-step error
+    Args: array of rows x years (NaN = missing), number of years to forecast, array of
+        (alpha, beta, phi) grid points, optional trend of each row at its first value
+    Returns: (forecasts, standard errors of the forecasts) arrays of rows x horizon
+    """
+    initial_trend = np.zeros(values.shape[0]) if initial_trend is None \
+        else np.nan_to_num(initial_trend)
+    level, trend, sse, last_seen = _smooth(values, grid, initial_trend)
+    rows = np.arange(values.shape[0])
+    best = np.argmin(sse, axis=0)
+    level, trend, sse = level[best, rows], trend[best, rows], sse[best, rows]
+    alpha, beta, phi = (grid[best, column][:, None] for column in range(3))
+
+    steps = np.arange(1, horizon + 1)
+    # phi + phi^2 + ... + phi^h: the damped trend added over h years
+    forecasts = level[:, None] + np.cumsum(phi ** steps, axis=1) * trend[:, None]
+    # years without a value after the last one count as forecast steps
+    ahead = steps + (values.shape[1] - 1 - last_seen)[:, None]
+    # h-step variance: sigma^2 (1 + c_1^2 + ... + c_(h-1)^2), c_j = alpha (1 + beta
+    # (phi + ... + phi^j))
+    j = np.arange(1, ahead.max() + 1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        damped_sums = np.where(phi == 1, j, phi * (1 - phi ** j) / np.where(phi == 1, 1, 1 - phi))
+        weights = np.cumsum((alpha * (1 + beta * damped_sums)) ** 2, axis=1)
+        weights = np.concatenate([np.zeros((len(rows), 1)), weights], axis=1)
+        n = (~np.isnan(values)).sum(axis=1)
+        sigma = np.sqrt(sse / (n - 1))
+        errors = sigma[:, None] * np.sqrt(1 + np.take_along_axis(weights, ahead - 1, axis=1))
+    return _enough(forecasts, n), _enough(errors, n)
+
+
+def forecast_series(values, horizon=HORIZON, model="damped"):
+    """
+    Forecasts every row of a rows x years array with one model (see the module docstring)
+    Returns: (forecasts, standard errors) arrays of rows x horizon
+    """
+    if model not in MODELS:
+        raise ValueError(f"model must be one of {MODELS}")
+    if model == "linear":
+        return fit_linear(values, horizon)
+    if model == "ses":
+        return fit_smoothing(values, horizon, SES_GRID)
+    # the damped trend starts from the slope of the row's trend line
+    return fit_smoothing(values, horizon, DAMPED_GRID, initial_trend=_trend_lines(values)[3])
+
+
+def _rank_rows(scores):
+    """Rank forecasts from the composite score forecasts (rows of forecast_table)"""
+    scores = scores.dropna(subset=["forecast"])
+    points = scores["forecast"].to_numpy()
+    years = scores["year"].to_numpy()
+    ranks = rank_within(points, years).astype(np.float64)
+    best, worst = ranks.copy(), ranks.copy()
+    for year in np.unique(years):
+        rows = years == year
+        ordered = np.sort(points[rows])
+        # other locations forecast above a bound value
+        above_upper = len(ordered) - np.searchsorted(ordered, scores["upper"].to_numpy()[rows],
+                                                     side="right")
+        above_lower = len(ordered) - np.searchsorted(ordered, scores["lower"].to_numpy()[rows],
+                                                     side="right")
+        above_lower -= points[rows] > scores["lower"].to_numpy()[rows]
+        best[rows] = np.minimum(ranks[rows], 1 + above_upper)
+        worst[rows] = np.maximum(ranks[rows], 1 + above_lower)
+    return scores.assign(metric="rank", forecast=ranks, lower=best, upper=worst)
+
+
+def forecast_table(df, columns=None, horizon=HORIZON, model="damped"):
+    """
+    Forecasts of every location's metrics for the years after the last year of df
+    Args: ranked metrics frame (location, year and the metric columns), metric columns
+        (default: the composite score and the workforce and outcome columns of df), number
+        of years, model (one of MODELS)
+    Returns: pandas DataFrame with FORECAST_COLUMNS, one row per location, metric and
+        forecast year with a forecast; "rank" rows come with a composite score forecast
+    """
+    if columns is None:
+        columns = [col for col in [SCORE] + WORKFORCE_COLUMNS + OUTCOME_COLUMNS
+                   if col in df.columns]
+    columns = list(columns)
+    locations, years, cube = panel_cube(df, columns)
+    # one row per location and metric
+    values = np.moveaxis(cube, 2, 1).reshape(-1, len(years))
+    forecasts, errors = forecast_series(values, horizon, model)
+    table = pd.DataFrame({
+        "location": np.repeat(np.asarray(locations, dtype=object), len(columns) * horizon),
+        "year": np.tile(years[-1] + np.arange(1, horizon + 1), len(values)),
+        "metric": np.tile(np.repeat(columns, horizon), len(locations)),
+        "forecast": forecasts.ravel(),
+        "lower": (forecasts - Z_95 * errors).ravel(),
+        "upper": (forecasts + Z_95 * errors).ravel(),
+    })
+    table = table.dropna(subset=["forecast"])
+    if SCORE in columns:
+        table = pd.concat([table, _rank_rows(table[table["metric"] == SCORE])])
+    return table.reset_index(drop=True)[FORECAST_COLUMNS]
+
+
+class Forecast:
+    """
+    Forecast table of one data version and model, with a small cache key so figure
+    builders can take it as an argument
+    """
+
+    __slots__ = ("table", "version", "model", "horizon")
+
+    def __init__(self, table, version, model, horizon):
+        self.table = table
+        self.version = version
+        self.model = model
+        self.horizon = horizon
+
+    @property
+    def cache_token(self):
+        """Small hashable stand-in for this forecast in figure cache keys"""
+        return ("Forecast", self.version, self.model, self.horizon)
+
+    def rows(self, metric, location):
+        """Forecast rows of one metric and location, by year"""
+        table = self.table
+        return table[(table["metric"] == metric) & (table["location"] == location)]
+
+
+def cached_forecast(df, version, model="damped", horizon=HORIZON):
+    """
+    Forecast of the metrics frame, computed once per data version, model and horizon and
+    shared by every caller in the process
+    Returns: Forecast
+    """
+    table = cached_table(forecast_table, df, version, horizon=horizon, model=model)
+    return Forecast(table, version, model, horizon)
@@ -4,322 +4,100 @@ Script to make the interactive dashboard for this project.
 import os
 
 import streamlit as st
-import plotly.graph_objects as go
-import plotly.express as px
 
 try:
     # When running as a package (e.g., during testing)
-    from .data_prep import process_healthcare_data
+    from .data_prep import process_healthcare_data, data_version, standardize_columns
+    from .compact import compact_frames
+    from .correlation import cached_correlation_table, METHODS
+    from .panel import cached_lagged_regressions
+    from .forecast import cached_forecast, MODELS as FORECAST_MODELS
+    from .figure_cache import cached_figure
+    from .data_handle import DataHandle
+    from .export import export_bytes
+    from .filter_index import query
+    from .publish import open_published, published_version
+    from .watch import DataWatcher
+    from .cube import age_order, ranking_age
+    from .plots import (
+        plot_compscore_over_time, plot_death_vs_docs, plot_ihme_data, plot_who_data,
+        plot_metrics_by_country, plot_metrics_over_time, country_spider,
+        plot_correlation_heatmap, plot_lagged_effects
+    )
 except ImportError:
     # When running as a top-level script (e.g., via streamlit)
-    from data_prep import process_healthcare_data
+    from data_prep import process_healthcare_data, data_version, standardize_columns
+    from compact import compact_frames
+    from correlation import cached_correlation_table, METHODS
+    from panel import cached_lagged_regressions
+    from forecast import cached_forecast, MODELS as FORECAST_MODELS
+    from figure_cache import cached_figure
+    from data_handle import DataHandle
+    from export import export_bytes
+    from filter_index import query
+    from publish import open_published, published_version
+    from watch import DataWatcher
+    from cube import age_order, ranking_age
+    from plots import (
+        plot_compscore_over_time, plot_death_vs_docs, plot_ihme_data, plot_who_data,
+        plot_metrics_by_country, plot_metrics_over_time, country_spider,
+        plot_correlation_heatmap, plot_lagged_effects
+    )
+
+# HCARE_DATA_DIR points the dashboard at another data folder (e.g. synthetic data)
+DATA_PATH = os.environ.get("HCARE_DATA_DIR", os.path.join(os.getcwd(), "data/"))
+# HCARE_PUBLISHED_DIR makes the dashboard map the frames published by hcare.publish
+# instead of running the pipeline itself
+PUBLISHED_PATH = os.environ.get("HCARE_PUBLISHED_DIR")
+# HCARE_WATCH reloads the data in the background when files in the data folder change,
+# recomputing only the pipeline stages that read them (see watch.py)
+WATCH = bool(os.environ.get("HCARE_WATCH")) and not PUBLISHED_PATH
 
 # pylint: disable=C0103
 # we have included the above pylint error disable because pylint was incorrectly
 # interpreting streamlit filter selection variables as constants, and flagging them
 # for not following the uppercase naming convention
-@st.cache_data
-def load_data():
+def load_data(version=None):
     """
     loads in the original data from our data folder,
     processes them into 3 dataframes using our data_prep.py module
-    and returns them to be used to generate dashboard figures
-    """
-    #file_path = "../data/"
-    file_path = os.path.join(os.getcwd(), "data/")
-    df_WHO, df_IHME, df_met = process_healthcare_data(file_path)
-
-    df_IHME.columns = df_IHME.columns.str.strip().str.replace('"', '')
-    ihme_mapping = {
-        "location": "location",
-        "sex": "sex",
-        "cause": "cause",
-        "year": "year",
-        "Deaths": "deaths",
-        "Incidence": "incidence"
-    }
-    df_IHME = df_IHME.rename(columns=ihme_mapping)
-
-    # Check that all expected IHME columns are present:
-    expected_IHME = set(ihme_mapping.values())
-    if not expected_IHME.issubset(set(df_IHME.columns)):
-        raise ValueError(
-            f"final_IHME.csv is missing columns: {expected_IHME - set(df_IHME.columns)}")
-
-    # Load final WHO data
-    # df_WHO = pd.read_csv("../data_prep/final_data/final_who.csv")
-    df_WHO.columns = df_WHO.columns.str.strip().str.replace('"', '')
-    df_WHO = df_WHO.loc[:, ~df_WHO.columns.str.contains("^Unnamed")]
-    who_mapping = {
-        "Location": "location",
-        "Period": "year",
-        "Medical Doctors per 10,000": "medical_doctors_per_10000",
-        "Nurses and Midwifes per 10,000": "nurses_midwifes_per_10000",
-        "Pharmacists per 10,000": "pharmacists_per_10000",
-        "Dentists per 10,000": "dentists_per_10000"
-    }
-    df_WHO = df_WHO.rename(columns=who_mapping)
-    expected_WHO = set(who_mapping.values())
-    if not expected_WHO.issubset(set(df_WHO.columns)):
-        raise ValueError(
-            f"final_who.csv is missing columns: {expected_WHO - set(df_WHO.columns)}")
-
-    # Load inner merged data
-    # df_met = pd.read_csv("../data_prep/final_data/inner_merged_data.csv")
-    df_met.columns = df_met.columns.str.strip().str.replace('"', '')
-    df_met = df_met.loc[:, ~
-                                df_met.columns.str.contains("^Unnamed")]
-    # The inner merged file should have the same workforce columns.
-    # It may use either "Period" or "year" for the time column.
-    # We want to standardize on "year".
-    if "Period" in df_met.columns and "year" not in df_met.columns:
-        df_met = df_met.rename(columns={"Period": "year"})
-    # In case it already uses "year", we leave it.
-    # Now, rename the workforce columns (assuming they match the WHO file):
-    metrics_mapping = {
-        "Location": "location",
-        "medical doctors per 10,000": "medical_doctors_per_10000",
-        "nurses and midwifes per 10,000": "nurses_midwifes_per_10000",
-        "pharmacists per 10,000": "pharmacists_per_10000",
-        "dentists per 10,000": "dentists_per_10000"
-    }
-    df_met = df_met.rename(columns=metrics_mapping)
-    # Ensure the time column is named "year"
-    if "year" not in df_met.columns:
-        raise ValueError(
-            "inner_merged_data.csv must contain a time column named either 'year' or 'Period'.")
-    expected_metrics = {"location", "year", "medical_doctors_per_10000",
-                        "nurses_midwifes_per_10000", "pharmacists_per_10000", "dentists_per_10000"}
-    if not expected_metrics.issubset(set(df_met.columns)):
-        raise ValueError(
-            f"inner_merged_data.csv missing columns: {expected_metrics - set(df_met.columns)}")
-            # removed "is" from above value error message for line length
-            # if this affects test passing, replace and split the above line into 2 lines
-    return df_IHME, df_WHO, df_met
-
-def plot_compscore_over_time(df, primary_metric="composite_score", selected_location=None):
-    """
-    Generates a line plot of the composite score over time for the chosen countries
-    """
-    if selected_location:
-        df = df[df["location"].isin(selected_location)]
-    fig = go.Figure()
-    for loc in df["location"].unique():
-        #df_loc = df[df["location"] == loc]
-            #.dropna(subset=[primary_metric])
-        fig.add_trace(go.Scatter(
-            x=df[df['location']==loc]["year"],
-            y=df[df['location']==loc][primary_metric],
-            mode="lines+markers",
-            name=f"{primary_metric.replace('_', ' ').capitalize()} - {loc}"
-        ))
-    fig.update_layout(
-        title=f"{primary_metric.replace('_', ' ').capitalize()} Over Time",
-        xaxis_title="Year",
-        yaxis_title=primary_metric.replace("_", " ").capitalize(),
-        template="plotly_white"
-    )
-    return fig
-
-def plot_death_vs_docs(df, primary_metric = "deaths",
-    secondary_metric = "medical_doctors_per_10000", selected_location = None):
-    """
-    Generates scatter plot of the number of deaths vs the rate of medical doctors in the
-    specified countries, with each point representing a different year
-    """
-    if selected_location:
-        df = df[df["location"].isin(selected_location)]
-    fig = px.scatter(
-        df,
-        x=secondary_metric,
-        y=primary_metric,
-        color="location",                         # Encode country with color
-        hover_data=["year", "location"],          # Show year and country on hover
-        title=f"{primary_metric} vs {secondary_metric} by Country (Each Point = Year)",
-    )
-    fig.update_traces(marker={"size": 10})      # Adjust dot size if needed
-    fig.update_layout(template="plotly_white")   # Use a clean layout
-    return fig
-
-def plot_ihme_data(df, metric="deaths", select_yr_and_sex=(None, None),
-    selected_location=None, selected_cause=None):
-    """
-    Generates a bar plot of the chosen disease metric for the chosen injury causes
-    for the selected year and countries
-    """
-    select_yr = select_yr_and_sex[0]
-    selected_sex = select_yr_and_sex[1]
-    # The IHME data now uses 'deaths' and 'incidence'
-    if metric not in ["deaths", "incidence"]:
-        raise ValueError("Metric must be 'deaths' or 'incidence'")
-
-    required_columns = {"location", "cause", "year", metric}
-    if not required_columns.issubset(set(df.columns)):
-        missing_cols = required_columns - set(df.columns)
-        raise ValueError(
-            f"Missing required columns in IHME data: {missing_cols}")
-
-    if select_yr is None:
-        select_yr = df["year"].max()
-    df_year = df[df["year"] == select_yr].dropna(
-        subset=["location", "cause", metric])
-
-    if selected_location:
-        df_year = df_year[df_year["location"].isin(selected_location)]
-    if selected_cause:
-        df_year = df_year[df_year["cause"].isin(selected_cause)]
-    if selected_sex:
-        df_year = df_year[df_year["sex"].isin(selected_sex)]
-
-    fig = px.bar(
-        df_year,
-        x="cause",
-        y=metric,
-        color="location",
-        barmode="group",
-        title=f"{metric.capitalize()} by Cause in {select_yr}"
-    )
-    fig.update_layout(xaxis_title="Cause",
-                      yaxis_title=metric.capitalize(), template="plotly_white")
-    return fig
-
-def plot_who_data(df, select_year=None, selected_location=None, selected_regions=None):
-    """
-    Generates a bar plot of all 4 workforce metrics from the WHO dataset for the locations
-    specified in the year specified
+    and returns them (with compacted dtypes) to be used to generate dashboard figures.
+    With HCARE_PUBLISHED_DIR set, maps the published frames of the given version instead
     """
-    if select_year is None:
-        select_year = df["year"].max()
-    df_year = df[df["year"] == select_year]
-    if selected_regions and len(selected_regions)>0:
-        df_year = df_year[df_year["Region"].isin(selected_regions)]
-    if selected_location and len(selected_location)>0:
-        df_year = df_year[df_year["location"].isin(selected_location)]
-
-    if df_year.empty:
-        st.write("No data available for the selected year,"
-            + " region(s), and countries combination, try another combination.")
+    if PUBLISHED_PATH:
+        return open_published(PUBLISHED_PATH, version)[0]
+    df_WHO, df_IHME, df_met = process_healthcare_data(DATA_PATH)
+    frames, _ = compact_frames(*standardize_columns(df_WHO, df_IHME, df_met))
+    return frames
 
-    categories = [
-        ("medical_doctors_per_10000", "Medical Doctors per 10000"),
-        ("nurses_midwifes_per_10000", "Nurses & Midwifes per 10000"),
-        ("pharmacists_per_10000", "Pharmacists per 10000"),
-        ("dentists_per_10000", "Dentists per 10000")
-    ]
-
-    fig = go.Figure()
-    for col, label in categories:
-        if col in df_year.columns:
-            fig.add_trace(go.Bar(
-                x=df_year["location"],
-                y=df_year[col],
-                name=label
-            ))
-    fig.update_layout(
-        title=f"Workforce Metrics by Country in {select_year}",
-        xaxis_title="Location",
-        yaxis_title="Per 10000 Population",
-        template="plotly_white",
-        barmode="group"
-    )
-    return fig
-
-def plot_metrics_by_country(df, primary_metric="medical_doctors_per_10000",
-    secondary_metric="nurses_midwifes_per_10000",
-    selected_yr=None,
-    selected_place=(None,None)):
+def download_button(df, index, key, **filters):
     """
-    Generates a bar plot of the primary metric with a line plot of the second metric
-    overlayed for the selected year and location(s)
+    Download button for the rows behind a chart (same filters as the chart).
+    The CSV is only generated when the button is clicked.
     """
-    selected_location = selected_place[0]
-    selected_region = selected_place[1]
-    if selected_yr is None:
-        selected_yr = df["year"].max()
-    df_year = df[df["year"] == selected_yr].dropna(
-        subset=["location", primary_metric, secondary_metric])
-    if selected_region and len(selected_region)>0:
-        df_year = df_year[df_year["region"].isin(selected_region)]
-    if selected_location:
-        df_year = df_year[df_year["location"].isin(selected_location)]
-    if df_year.empty:
-        st.write("No data available for the selected year and location, try another combination.")
+    st.download_button("Download data (CSV)",
+                       data=lambda: export_bytes(df, "csv", index, **filters),
+                       file_name=f"{key}.csv", mime="text/csv", key=f"download_{key}",
+                       on_click="ignore")
 
-    fig = go.Figure()
-    fig.add_trace(go.Bar(
-        x=df_year["location"],
-        y=df_year[primary_metric],
-        name=primary_metric.replace("_", " ").capitalize(),
-        marker_color="red"
-    ))
-    fig.add_trace(go.Scatter(
-        x=df_year["location"],
-        y=df_year[secondary_metric],
-        name=secondary_metric.replace("_", " ").capitalize(),
-        mode="lines+markers",
-        line={"color": 'blue', "dash": 'dash'}
-    ))
-    fig.update_layout(
-        title=f"{primary_metric.replace('_', ' ').capitalize()} & "
-            + f"{secondary_metric.replace('_', ' ').capitalize()} by Location in {selected_year}",
-        xaxis_title="Location",
-        yaxis_title=primary_metric.replace("_", " ").capitalize(),
-        template="plotly_white"
-    )
-    return fig
-
-def plot_metrics_over_time(df, primary_metric="medical_doctors_per_10000",
-    secondary_metric="nurses_midwifes_per_10000", selected_location=None):
+@st.cache_resource(max_entries=1)
+def get_data_handle(version):
     """
-    Generates a line plot of the 2 selected metrics over all years for the selected location(s)
+    Builds the read-only data handle for one data version. It is cached as a resource,
+    so every session in this process shares one copy of the frames instead of unpickling
+    its own. Sessions get cheap read-only views through DataHandle.views().
+    Reloading: when a file in data/ changes, data_version changes and the next rerun
+    builds a fresh handle (replacing the old one); get_data_handle.clear() forces a reload.
     """
-    if selected_location:
-        df = df[df["location"].isin(selected_location)]
-
-    fig = go.Figure()
-    for loc in df["location"].unique():
-        df_loc = df[df["location"] == loc].dropna(
-            subset=["year", primary_metric, secondary_metric])
-        fig.add_trace(go.Scatter(
-            x=df_loc["year"],
-            y=df_loc[primary_metric],
-            mode="lines+markers",
-            name=f"{primary_metric.replace('_', ' ').capitalize()} - {loc}"
-        ))
-        fig.add_trace(go.Scatter(
-            x=df_loc["year"],
-            y=df_loc[secondary_metric],
-            mode="lines+markers",
-            name=f"{secondary_metric.replace('_', ' ').capitalize()} - {loc}",
-            line={"dash": 'dash'}
-        ))
-    fig.update_layout(
-        title=f"{primary_metric.replace('_', ' ').capitalize()} & "
-            + f"{secondary_metric.replace('_', ' ').capitalize()} Over Time",
-        xaxis_title="Year",
-        yaxis_title=primary_metric.replace("_", " ").capitalize(),
-        template="plotly_white"
-    )
-    return fig
+    return DataHandle(*load_data(version), version)
 
-def country_spider(df, ctry, year):
+@st.cache_resource
+def get_watcher():
     """
-    Generates spider plot of healthcare workforce metrics for the specified country
-    in the specified year
+    Starts the one data watcher of this process (HCARE_WATCH). Its handle is swapped in the
+    background when the data changes; every rerun of a session reads the current one.
     """
-    # Create a spider plot for the country
-    # Get the row for the country
-    country_row = df[(df['location'] == ctry) & (df['year'] == year)]
-    # Get the metrics
-    thetas = ['medical_doctors_per_10000', 'nurses_midwifes_per_10000',
-     'pharmacists_per_10000', 'dentists_per_10000']
-    rads = country_row[thetas].values.flatten()
-    fig_spider = px.line_polar(r=rads, theta=thetas, line_close=True)
-    fig_spider.update_layout(title=f"{ctry} Workforce Metrics in {year}")
-    fig_spider.update_traces(fill='toself')
-    # below line not working for some reason
-    fig_spider.update_layout(legend={"font": {"color": 'black'}})
-    return fig_spider
+    return DataWatcher(DATA_PATH).start()
 
 
 # dahsboard layout
@@ -327,7 +105,16 @@ st.set_page_config(page_title="Global Healthcare", layout="wide")
 st.title("Global Healthcare")
 
 # Load data.
-df_ihme, df_who, df_metrics = load_data()
+# figures and data are cached per data version, so editing a source file invalidates them
+if WATCH:
+    data_handle = get_watcher().handle()
+    data_ver = data_handle.version
+else:
+    data_ver = published_version(PUBLISHED_PATH) if PUBLISHED_PATH else data_version(DATA_PATH)
+    data_handle = get_data_handle(data_ver)
+df_ihme, df_who, df_metrics = data_handle.views()
+# option lists and plot filters are answered from these instead of scanning the frames
+idx_ihme, idx_who, idx_metrics = data_handle.indexes
 
 
 # (Optional) Debug: Uncomment these lines to inspect standardized column names.
@@ -337,7 +124,8 @@ df_ihme, df_who, df_metrics = load_data()
 
 # Create tabs.
 tabs = st.tabs(
-    ["Home", "IHME Data", "WHO Data", "Data by Country", "Data Over Time", "Country Overview"])
+    ["Home", "IHME Data", "WHO Data", "Data by Country", "Data Over Time", "Country Overview",
+     "Correlations"])
 
 # --- Home Page ---
 with tabs[0]:
@@ -350,12 +138,13 @@ with tabs[0]:
     with col1:
         st.subheader("Top 5 Healthcare Systems by Year")
         # Dropdown to select the year
-        years = sorted(df_metrics["year"].unique())
+        years = idx_metrics.values("year")
         selected_year = st.selectbox("Select Year", years, key="home_year")
 
     with col2:
         # Drop down and ranking list
-        top_countries = df_metrics[df_metrics["year"] == selected_year].nsmallest(5, "rank")
+        top_countries = query(df_metrics, idx_metrics, ["location", "rank"],
+                              year=selected_year).nsmallest(5, "rank")
         st.subheader(f"Top 5 Countries in {selected_year}:")
         for i, row in top_countries.iterrows():
             st.write(f"**{row['rank']} {row['location']}**")
@@ -365,18 +154,25 @@ with tabs[0]:
     st.subheader("Composite Score or Ranking Over Time by Country")
     metric_choice = st.selectbox("Select Metric", options=[
                                      "composite_score", "rank"], key="home_metric")
-    available_locations = sorted(df_metrics["location"].dropna().unique())
+    available_locations = idx_metrics.values("location")
     location_choice = st.multiselect("Select Location(s)", options=available_locations,
                         default="United States of America", key="home_loc")
-    fig_scores_ranks = plot_compscore_over_time(df_metrics, primary_metric = metric_choice,
-                        selected_location = location_choice)
+    forecast_choice = st.selectbox("Forecast", options=("none",) + FORECAST_MODELS,
+                                   key="home_forecast")
+    forecast = None if forecast_choice == "none" else cached_forecast(
+        df_metrics, data_ver, model=forecast_choice)
+    fig_scores_ranks = cached_figure(plot_compscore_over_time, df_metrics, (data_ver, "metrics"),
+                        primary_metric = metric_choice, selected_location = location_choice,
+                        index = idx_metrics, forecast = forecast)
     st.plotly_chart(fig_scores_ranks, use_container_width=True)
+    download_button(df_metrics, idx_metrics, "rankings", location=location_choice)
     st.markdown("---")
     # Section 3
-    country_list = sorted(df_metrics["location"].dropna().unique())
+    country_list = idx_metrics.values("location")
     country_selection = st.multiselect("Select Location(s)", options=country_list,
                         default="United States of America", key="country1")
-    fig_death_vs_docs = plot_death_vs_docs(df_metrics, selected_location = country_selection)
+    fig_death_vs_docs = cached_figure(plot_death_vs_docs, df_metrics, (data_ver, "metrics"),
+                        selected_location = country_selection, index = idx_metrics)
     st.plotly_chart(fig_death_vs_docs, use_container_width=True)
     # Section 4
     st.write("DISCLAIMER: the fields used to generate these rankings are limited, therefore our "
@@ -385,34 +181,44 @@ with tabs[0]:
 # -------- IHME Data Tab --------
 with tabs[1]:
     st.header("Death or Incidence Rates by Cause")
-    col1, col2, col3, col4, col5 = st.columns(5)
+    col1, col2, col3, col4, col5, col6 = st.columns(6)
     year_choice = None
     with col1:
         measure_choice = st.selectbox("Select Measure", options=[
                                      "deaths", "incidence"], key="ihme_measure")
     with col2:
-        years = sorted(df_ihme["year"].unique())
+        years = idx_ihme.values("year")
         year_choice = st.selectbox(
             "Select Year", options=years, index=len(years)-1, key="ihme_year")
     with col3:
-        locations = sorted(df_ihme[df_ihme["year"]==(year_choice)]["location"].unique())
+        locations = idx_ihme.locations(year=year_choice)
         default = ["United States of America", "India", "China"]
         location_choice = st.multiselect(
             "Select Location(s)", options=locations, default=default, key="ihme_loc")
     with col4:
-        causes = sorted(df_ihme["cause"].unique())
+        causes = idx_ihme.values("cause")
         default = ["Cardiovascular diseases", "Digestive diseases"]
         cause_choice = st.multiselect(
             "Select Cause(s)", options=causes, default=default, key="ihm_cause")
     with col5:
-        sexes = sorted(df_ihme["sex"].unique())
+        sexes = idx_ihme.values("sex")
         sex_choice = st.multiselect(
             "Select Sex Group(s)", options=sexes, default="Both", key="ihm_sex")
-
-    fig_ihme = plot_ihme_data(df_ihme, metric=measure_choice,
+    with col6:
+        # the cube answers the chart's selection by age group and cause
+        ihme_cube = data_handle.cube
+        ages = age_order(ihme_cube.labels("age"))
+        age_choice = st.selectbox("Select Age Group", options=ages,
+                                  index=ages.index(ranking_age(ages)), key="ihme_age")
+
+    fig_ihme = cached_figure(plot_ihme_data, df_ihme, (data_ver, "ihme"), metric=measure_choice,
                 select_yr_and_sex=(year_choice, sex_choice),
-                selected_location=location_choice, selected_cause=cause_choice)
+                selected_location=location_choice, selected_cause=cause_choice, index=idx_ihme,
+                age=age_choice, cube=ihme_cube)
     st.plotly_chart(fig_ihme, use_container_width=True)
+    download_button(df_ihme, idx_ihme, "ihme", year=year_choice, location=location_choice,
+                    cause=cause_choice, sex=sex_choice,
+                    age=age_choice if "age" in df_ihme.columns else None)
 
 # -------- WHO Data Tab --------
 with tabs[2]:
@@ -421,21 +227,23 @@ with tabs[2]:
     year_choice = None
     region_choice = None
     with col1:
-        years_who = sorted(df_who["year"].unique())
+        years_who = idx_who.values("year")
         year_choice = st.selectbox(
             "Select Year", options=years_who, index=len(years_who)-1, key="who_year")
     with col2:
-        regions = sorted(df_who["Region"].unique())
+        regions = idx_who.values("Region")
         region_choice = st.multiselect("Select Region", options=regions, key="who_region")
     with col3:
-        hold = df_who[(df_who["year"]==(year_choice))&(df_who["Region"].isin(region_choice))]
-        countries_who = sorted(hold["location"].unique())
+        countries_who = idx_who.locations(year=year_choice, regions=region_choice)
         default = countries_who[:3]
         country_choice = st.multiselect(
             "Select Location(s)", options=countries_who, default=default, key="who_loc")
-    fig_who = plot_who_data(df_who, select_year=year_choice,
-        selected_location=country_choice, selected_regions = region_choice)
+    fig_who = cached_figure(plot_who_data, df_who, (data_ver, "who"), select_year=year_choice,
+        selected_location=country_choice, selected_regions = region_choice, index=idx_who,
+        regional=data_handle.regional)
     st.plotly_chart(fig_who, use_container_width=True)
+    download_button(df_who, idx_who, "who", year=year_choice, Region=region_choice,
+                    location=country_choice)
 
 # -------- Data by Country Tab --------
 with tabs[3]:
@@ -456,28 +264,31 @@ with tabs[3]:
         secondary_metric_choice = st.selectbox(
             "Secondary Metric", options=workforce_metrics, index=1, key="country_met_two")
     with col3:
-        years_metrics = sorted(df_metrics["year"].unique())
+        years_metrics = idx_metrics.values("year")
         year_choice = st.selectbox(
             "Select Year", options=years_metrics, index=len(years_metrics)-1, key="country_year")
     with col4:
-        regions = sorted(df_metrics["region"].unique())
+        regions = idx_metrics.values("region")
         region_choice = st.multiselect("Select Region", options=regions, key="country_region")
     with col5:
-        holder = df_metrics[(
-            df_metrics["year"]==(year_choice))&(df_metrics["region"].isin(region_choice))]
-        countries = sorted(holder["location"].unique())
+        countries = idx_metrics.locations(year=year_choice, regions=region_choice)
         end = min(10, len(countries)-1)
         default = countries[:end]
         countries_choice = st.multiselect(
             "Select Location(s)", options=countries, default=default, key="country_loc")
-    fig_country = plot_metrics_by_country(
+    fig_country = cached_figure(
+        plot_metrics_by_country,
         df_metrics,
+        (data_ver, "metrics"),
         primary_metric=primary_metric_choice,
         secondary_metric=secondary_metric_choice,
         selected_yr=year_choice,
-        selected_place=(countries_choice, region_choice)
+        selected_place=(countries_choice, region_choice),
+        index=idx_metrics
     )
     st.plotly_chart(fig_country, use_container_width=True)
+    download_button(df_metrics, idx_metrics, "metrics_by_country", year=year_choice,
+                    region=region_choice, location=countries_choice)
 
 # -------- Data Over Time Tab --------
 with tabs[4]:
@@ -491,41 +302,92 @@ with tabs[4]:
         secondary_metric_time = st.selectbox(
             "Secondary Metric", options=workforce_metrics, index=1, key="over_time_secondary")
     with col3:
-        regions = sorted(df_metrics["region"].unique())
+        regions = idx_metrics.values("region")
         region_choice = st.multiselect("Select Region",
             options=regions, default = "Africa", key="over_time_region")
     with col4:
-        available_locations = sorted(
-            df_metrics[df_metrics['region'].isin(region_choice)]["location"].dropna().unique())
+        available_locations = idx_metrics.locations(regions=region_choice)
         location_time_choice = st.multiselect(
             "Select Location(s)", options=available_locations, 
             default=available_locations[:3], key="over_time_loc")
-    fig_time = plot_metrics_over_time(
+    fig_time = cached_figure(
+        plot_metrics_over_time,
         df_metrics,
+        (data_ver, "metrics"),
         primary_metric=primary_metric_time,
         secondary_metric=secondary_metric_time,
-        selected_location=location_time_choice
+        selected_location=location_time_choice,
+        index=idx_metrics,
+        regions=region_choice,
+        regional=data_handle.regional
     )
     st.plotly_chart(fig_time, use_container_width=True)
+    download_button(df_metrics, idx_metrics, "metrics_over_time", location=location_time_choice)
 
 # --- Country Overview ---
 with tabs[5]:
     st.header("Country Overview")
-    countries = sorted(df_metrics["location"].dropna().unique())
+    countries = idx_metrics.values("location")
     country = st.selectbox("Select Country", options=countries, key="country_country")
 
     #col1 = st.columns(1)
     #with col1:
-    years = sorted(df_who[df_who["location"]==country]["year"].unique())
+    years = idx_who.values("year", location=country)
     year_choice = st.selectbox("Select Year", options=years, key="spider_year")
-    hldr = df_metrics[(df_metrics['location']==country)&(df_metrics['year']==year_choice)]
+    intervals = "rank_lower" in df_metrics.columns
+    hldr = query(df_metrics, idx_metrics, ["composite_score", "rank"]
+                 + (["rank_lower", "rank_upper"] if intervals else []),
+                 location=country, year=year_choice)
     st.subheader(f"{country} had a composite score of "
         + f"{hldr['composite_score'].values[0]} in {year_choice}")
     st.subheader(f"{country} was ranked "
-        + f"{hldr['rank'].values[0]} in {year_choice}")
+        + f"{hldr['rank'].values[0]} in {year_choice}"
+        + (f" (95% interval: {hldr['rank_lower'].values[0]} to {hldr['rank_upper'].values[0]})"
+           if intervals else ""))
 
-    fig_country = country_spider(df_who, country, year_choice)
+    fig_country = cached_figure(country_spider, df_who, (data_ver, "who"), country, year_choice,
+                                index=idx_who)
     st.plotly_chart(fig_country, use_container_width=False)
     #add graphs for country page here
     # print large: most recent algo ranking
     # line plot of score over time, can hover to see exact score for any year
+
+# --- Correlations ---
+with tabs[6]:
+    st.header("Workforce and Health Outcomes")
+    st.write("Correlation of each workforce indicator with death and incidence rates,"
+        + " over all countries and years, or within one year or one region.")
+    # computed once per data version for every year and region, the widgets only pick a slice
+    corr_table = cached_correlation_table(data_handle.panel, data_ver)
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        corr_method = st.selectbox("Method", options=[m.capitalize() for m in METHODS],
+                                   key="corr_method").lower()
+    with col2:
+        scope_labels = {"All countries and years": "pooled", "One year": "year",
+                        "One region": "region"}
+        corr_scope = scope_labels[st.selectbox("Compare Within", options=list(scope_labels),
+                                               key="corr_scope")]
+    with col3:
+        corr_group = "All"
+        if corr_scope != "pooled":
+            groups = idx_metrics.values(corr_scope)
+            corr_group = st.selectbox(f"Select {corr_scope.capitalize()}", options=groups,
+                                      index=len(groups) - 1 if corr_scope == "year" else 0,
+                                      key=f"corr_{corr_scope}")
+    fig_corr = cached_figure(plot_correlation_heatmap, corr_table, (data_ver, "correlations"),
+                             corr_method, corr_scope, corr_group)
+    st.plotly_chart(fig_corr, use_container_width=True)
+
+    st.subheader("Lagged Effects")
+    st.write("Staffing changes can take years to show up in health outcomes. Each line is the"
+        + " change in the outcome per change in one workforce indicator that many years"
+        + " earlier, from regressions with country and year fixed effects, in within-country"
+        + " standard deviations. Error bars are 95% intervals clustered by country.")
+    lag_outcome = st.selectbox("Outcome", options=["deaths", "incidence"], key="lag_outcome")
+    # year effects absorb a single year, so the year choice above falls back to all countries
+    lag_scope, lag_group = ("region", corr_group) if corr_scope == "region" else ("pooled", "All")
+    lag_table = cached_lagged_regressions(data_handle.panel, data_ver)
+    fig_lags = cached_figure(plot_lagged_effects, lag_table, (data_ver, "lagged_effects"),
+                             lag_outcome, lag_scope, lag_group)
+    st.plotly_chart(fig_lags, use_container_width=True)
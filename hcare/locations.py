@@ -0,0 +1,311 @@
+"""
+Country-name resolution between the WHO and IHME tables.
+WHO names that have no exact IHME counterpart are matched against the IHME names that have
+no WHO counterpart (so a name present in both tables is never renamed) through a NameIndex
+over the IHME names with three ways to match, scored from 0 to 1:
+- exact (1.0): the same words after normalizing accents, case, punctuation and word order,
+  or the same letters without spaces ("Korea, Republic of" / "Republic of Korea",
+  "Viet Nam" / "Vietnam")
+- qualifier (0.95): the same words once qualifiers in parentheses or after a comma are
+  dropped ("Bolivia (Plurinational State of)" / "Bolivia")
+- fuzzy (below 1): the mean of the word overlap (Jaccard) and the character trigram
+  overlap (Dice), both counted through inverted indexes for all names at once
+The best match is applied when it scores at least the threshold, leads the runner-up by at
+least the margin and no better-scoring name claims the same IHME name; other matches are
+only proposed. Results are cached per set of names, and the decisions can be kept in an
+alias table (location_aliases.csv in the data folder, written by
+python hcare/data_prep.py --write-aliases) where a proposal can be confirmed or a match
+rejected by editing its status.
+"""
+import os
+import re
+import unicodedata
+from collections import namedtuple
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+MATCH_THRESHOLD = 0.9
+MATCH_MARGIN = 0.05
+QUALIFIER_SCORE = 0.95
+STOPWORDS = frozenset({"the", "of", "and"})
+ALIAS_FILE = "location_aliases.csv"
+# alias table statuses that rename a WHO name; rejected pairs are never matched again
+APPLY_STATUSES = ("auto", "confirmed")
+METHODS = ("fuzzy", "qualifier", "exact")
+REPORT_COLUMNS = ["name", "match", "confidence", "method", "runner_up",
+                  "runner_up_confidence", "status"]
+
+
+@lru_cache(maxsize=8192)
+def name_tokens(name):
+    """Words of a name without accents, case, punctuation or stopwords, as a tuple"""
+    text = unicodedata.normalize("NFKD", str(name))
+    text = "".join(char for char in text if not unicodedata.combining(char)).lower()
+    text = re.sub(r"['’`]", "", text.replace("&", " and "))
+    return tuple(word for word in re.split(r"[^0-9a-z]+", text)
+                 if word and word not in STOPWORDS)
+
+
+def name_keys(name):
+    """
+    Exact-match keys of a name
+    Returns: (sorted words, letters without spaces, words without qualifiers)
+    """
+    tokens = name_tokens(name)
+    core = name_tokens(re.sub(r"\(.*?\)|,.*$", " ", str(name)))
+    return " ".join(sorted(tokens)), "".join(tokens), " ".join(sorted(core))
+
+
+@lru_cache(maxsize=8192)
+def trigrams(name):
+    """Character trigrams of the normalized name, padded with a space on each side"""
+    text = f" {' '.join(name_tokens(name))} "
+    return frozenset(text[start:start + 3] for start in range(len(text) - 2))
+
+
+Postings = namedtuple("Postings", ["vocabulary", "sizes", "starts", "candidates"])
+Postings.__doc__ = """
+Inverted index stored flat: feature -> code, number of features of every candidate, and
+the candidates with feature code c, candidates[starts[c]:starts[c + 1]]"""
+
+
+def build_postings(features):
+    """Inverted index of a list of feature sets, one per candidate (see Postings)"""
+    vocabulary, numbers = {}, {}
+    for number, items in enumerate(features):
+        for feature in items:
+            numbers.setdefault(vocabulary.setdefault(feature, len(vocabulary)), []).append(number)
+    lengths = np.array([len(numbers[code]) for code in range(len(vocabulary))], dtype=np.int64)
+    return Postings(vocabulary, np.array([len(items) for items in features]),
+                    np.concatenate([[0], np.cumsum(lengths)]),
+                    np.array([number for code in range(len(vocabulary))
+                              for number in numbers[code]], dtype=np.int64))
+
+
+def shared_features(postings, features, n_names):
+    """
+    Numbers of features shared by the (name, candidate) pairs that share any
+    Args: Postings of the candidates, list of feature sets, one per name, number of names
+    Returns: (sorted pair codes name * candidates + candidate, counts)
+    """
+    codes = [(row, postings.vocabulary[feature]) for row, items in enumerate(features)
+             for feature in items if feature in postings.vocabulary]
+    rows, codes = np.array(codes, dtype=np.int64).reshape(-1, 2).T
+    lengths = postings.starts[codes + 1] - postings.starts[codes]
+    # positions of every posting of every feature, without a python loop
+    offsets = np.repeat(postings.starts[codes] - np.cumsum(lengths) + lengths, lengths)
+    size = len(postings.sizes)
+    pairs = np.repeat(rows, lengths) * size + postings.candidates[offsets +
+                                                                  np.arange(lengths.sum())]
+    if size * n_names <= 4 * len(pairs):
+        counts = np.bincount(pairs, minlength=size * n_names)
+        pairs = np.flatnonzero(counts)
+        return pairs, counts[pairs]
+    return np.unique(pairs, return_counts=True)
+
+
+def _best_two(pairs, scores, size):
+    """
+    Best and second-best candidate of every name with any pair
+    Args: sorted pair codes, their scores, number of candidates
+    Returns: (name numbers, best positions in pairs, second-best positions or -1)
+    """
+    rows = pairs // size
+    starts = np.flatnonzero(np.r_[True, rows[1:] != rows[:-1]])
+    segment = np.repeat(np.arange(len(starts)), np.diff(np.r_[starts, len(rows)]))
+    positions = np.arange(len(rows))
+    top = np.maximum.reduceat(scores, starts)
+    best = np.minimum.reduceat(np.where(scores == top[segment], positions, len(rows)), starts)
+    rest = np.where(positions == best[segment], -np.inf, scores)
+    runner_up = np.maximum.reduceat(rest, starts)
+    second = np.minimum.reduceat(np.where((rest == runner_up[segment]) & (rest > -np.inf),
+                                          positions, len(rows)), starts)
+    return rows[starts], best, np.where(second < len(rows), second, -1)
+
+
+def _statuses(best, best_scores, second_scores, threshold, margin):
+    """Status of every name's best match (see resolve_names)"""
+    status = np.where(best_scores <= 0, "unmatched",
+                      np.where(best_scores < threshold, "proposed",
+                               np.where(best_scores - second_scores < margin, "ambiguous",
+                                        "auto"))).astype(object)
+    # one name per candidate: the best-scoring claim wins
+    claimed = set()
+    for row in np.argsort(-best_scores, kind="stable"):
+        if status[row] == "auto":
+            if best[row] in claimed:
+                status[row] = "conflict"
+            claimed.add(best[row])
+    return status
+
+
+class NameIndex:
+    """
+    Word, trigram and exact-key indexes over a list of candidate names, scoring many names
+    against all candidates at once (see the module docstring for the scores).
+    """
+
+    def __init__(self, candidates):
+        self.candidates = list(candidates)
+        self._words = build_postings([set(name_tokens(name)) for name in self.candidates])
+        self._trigrams = build_postings([trigrams(name) for name in self.candidates])
+        self._keys = [{}, {}, {}]
+        for number, name in enumerate(self.candidates):
+            for lookup, key in zip(self._keys, name_keys(name)):
+                lookup.setdefault(key, []).append(number)
+
+    def _keyed_pairs(self, names):
+        """Pair codes of the exact (method 2) and qualifier (method 1) matches of names"""
+        size, keyed = len(self.candidates), {}
+        for row, name in enumerate(names):
+            exact, compact, core = name_keys(name)
+            keyed.update({row * size + number: 1 for number in self._keys[2].get(core, [])})
+            keyed.update({row * size + number: 2 for number in
+                          self._keys[0].get(exact, []) + self._keys[1].get(compact, [])})
+        return np.array(list(keyed), dtype=np.int64), np.array(list(keyed.values()), np.int8)
+
+    # pylint: disable-next=too-many-locals
+    def scores(self, names):
+        """
+        Scores of the (name, candidate) pairs with any trigram or key in common
+        Returns: (pair codes name * candidates + candidate in increasing order, scores,
+            method numbers as positions in METHODS)
+        """
+        words = [set(name_tokens(name)) for name in names]
+        grams = [trigrams(name) for name in names]
+        pairs, shared_grams = shared_features(self._trigrams, grams, len(names))
+        word_pairs, shared = shared_features(self._words, words, len(names))
+        # a shared word means shared trigrams, so every word pair is a trigram pair
+        shared_words = np.zeros(len(pairs), dtype=np.int64)
+        shared_words[np.searchsorted(pairs, word_pairs)] = shared
+        rows, cols = np.divmod(pairs, len(self.candidates))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            jaccard = shared_words / (np.array([len(items) for items in words])[rows]
+                                      + self._words.sizes[cols] - shared_words)
+        dice = 2 * shared_grams / (np.array([len(items) for items in grams])[rows]
+                                   + self._trigrams.sizes[cols])
+        scores = np.nan_to_num((jaccard + dice) / 2)
+        methods = np.zeros(len(pairs), dtype=np.int8)
+        codes, keyed_methods = self._keyed_pairs(names)
+        missing = codes[~np.isin(codes, pairs)]
+        if len(missing):
+            # keys with no trigram in common (e.g. names made of stopwords only)
+            order = np.argsort(np.concatenate([pairs, missing]), kind="stable")
+            pairs = np.concatenate([pairs, missing])[order]
+            scores = np.concatenate([scores, np.zeros(len(missing))])[order]
+            methods = np.concatenate([methods, np.zeros(len(missing), np.int8)])[order]
+        positions = np.searchsorted(pairs, codes)
+        scores[positions] = np.where(keyed_methods == 2, 1.0, QUALIFIER_SCORE)
+        methods[positions] = keyed_methods
+        return pairs, scores, methods
+
+    # pylint: disable-next=too-many-locals
+    def resolve(self, names, threshold=MATCH_THRESHOLD, margin=MATCH_MARGIN, rejected=()):
+        """
+        Best and second-best candidate of every name, see resolve_names
+        Returns: tuple of report rows
+        """
+        size = len(self.candidates)
+        best_scores, second_scores = np.zeros(len(names)), np.zeros(len(names))
+        best, runner_up = np.full(len(names), -1), np.full(len(names), -1)
+        methods_of = np.zeros(len(names), dtype=np.int8)
+        pairs, scores, methods = self.scores(names) if names and size else ((),) * 3
+        numbers = {name: number for number, name in enumerate(names)}
+        lookup = {name: number for number, name in enumerate(self.candidates)}
+        rejected = [numbers[name] * size + lookup[match] for name, match in rejected
+                    if name in numbers and match in lookup]
+        if rejected:
+            keep = ~np.isin(pairs, rejected)
+            pairs, scores, methods = pairs[keep], scores[keep], methods[keep]
+        if len(pairs):
+            rows, first, second = _best_two(pairs, scores, size)
+            best_scores[rows], best[rows] = scores[first], pairs[first] % size
+            methods_of[rows] = methods[first]
+            rows, second = rows[second >= 0], second[second >= 0]
+            second_scores[rows], runner_up[rows] = scores[second], pairs[second] % size
+
+        status = _statuses(best, best_scores, second_scores, threshold, margin)
+        return tuple(
+            (name, self.candidates[best[row]] if best[row] >= 0 else None,
+             round(float(best_scores[row]), 4),
+             METHODS[methods_of[row]] if best[row] >= 0 else None,
+             self.candidates[runner_up[row]] if runner_up[row] >= 0 else None,
+             round(float(second_scores[row]), 4), status[row])
+            for row, name in enumerate(names))
+
+
+@lru_cache(maxsize=8)
+def _name_index(candidates):
+    """NameIndex of a tuple of candidates, built once per set of candidates"""
+    return NameIndex(candidates)
+
+
+@lru_cache(maxsize=32)
+def _resolve(names, candidates, rejected, threshold, margin):
+    """resolve_names on hashable arguments, cached"""
+    return _name_index(candidates).resolve(names, threshold, margin, rejected)
+
+
+def resolve_names(names, candidates, threshold=MATCH_THRESHOLD, margin=MATCH_MARGIN,
+                  rejected=()):
+    """
+    Best candidate for every name (see the module docstring)
+    Args: names to resolve, candidate names, minimum score and lead over the runner-up to
+        apply a match, (name, candidate) pairs never to match
+    Returns: pandas DataFrame with columns name, match, confidence, method, runner_up,
+        runner_up_confidence and status ("auto" = apply, "proposed" = below the threshold,
+        "ambiguous", "conflict" = another name took the match, "unmatched")
+    """
+    rows = _resolve(tuple(sorted(set(names))), tuple(sorted(set(candidates))),
+                    frozenset(map(tuple, rejected)), threshold, margin)
+    return pd.DataFrame(list(rows), columns=REPORT_COLUMNS)
+
+
+def load_aliases(path):
+    """
+    Reads an alias table written by save_aliases (an empty table when the file is missing)
+    Returns: pandas DataFrame with the report columns
+    """
+    if not os.path.exists(path):
+        return pd.DataFrame(columns=REPORT_COLUMNS)
+    return pd.read_csv(path, dtype={"name": str, "match": str, "status": str})
+
+
+def save_aliases(report, path, aliases=None):
+    """
+    Writes the matches of a report as an alias table, keeping the confirmed and rejected
+    rows of an earlier table
+    Args: report of resolve_locations, output path, earlier alias table
+    """
+    found = report[report["status"].isin(["auto", "proposed", "ambiguous", "conflict"])]
+    if aliases is not None:
+        kept = aliases[aliases["status"].isin(["confirmed", "rejected"])]
+        decided = pd.MultiIndex.from_frame(kept[["name", "match"]])
+        found = pd.concat([kept, found[~pd.MultiIndex.from_frame(
+            found[["name", "match"]]).isin(decided)]], ignore_index=True)
+    found.sort_values(["name", "match"]).to_csv(path, index=False)
+
+
+def resolve_locations(who_names, ihme_names, aliases=None, threshold=MATCH_THRESHOLD):
+    """
+    Renames for the WHO names so they match the IHME names
+    Args: WHO and IHME location names, alias table (see load_aliases), threshold
+    Returns: (dict of WHO name -> IHME name, match report DataFrame covering the alias
+        table's renames and every unmatched WHO name)
+    """
+    aliases = pd.DataFrame(columns=REPORT_COLUMNS) if aliases is None else aliases
+    ihme_names = set(ihme_names)
+    applied = aliases[aliases["status"].isin(APPLY_STATUSES) & aliases["match"].isin(ihme_names)]
+    renames = dict(zip(applied["name"], applied["match"]))
+    names = {renames.get(name, name) for name in who_names}
+    rejected = aliases.loc[aliases["status"] == "rejected", ["name", "match"]]
+    report = resolve_names(names - ihme_names, ihme_names - names, threshold,
+                           rejected=rejected.itertuples(index=False))
+    renames.update(zip(report.loc[report["status"] == "auto", "name"],
+                       report.loc[report["status"] == "auto", "match"]))
+    table_rows = applied.loc[applied["name"].isin(set(who_names)), REPORT_COLUMNS]
+    if table_rows.empty:
+        return renames, report
+    return renames, pd.concat([table_rows, report], ignore_index=True)
@@ -0,0 +1,144 @@
+"""
+Data manifest: which source files the pipeline reads and how their indicators are ranked.
+A data folder can describe its sources in a manifest.json file; without one, the pipeline
+uses DEFAULT_MANIFEST, which lists the four WHO workforce files and the two IHME files.
+
+manifest.json format:
+{
+    "who": [
+        {"file": "medical-doctors.csv", "indicator_code": "HWF_0001",
+         "column": "Medical Doctors per 10,000", "direction": "positive"},
+        ...
+    ],
+    "ihme": {
+        "files": ["IHME-1.csv", "IHME-2.csv"],
+        "measures": {"Deaths": "negative", "Incidence": "negative"}
+    },
+    "anomalies": {"policy": "keep", "z_threshold": 3.5, "ratio_threshold": 10}
+}
+Every WHO entry becomes one column of the merged data (rows of the file with that
+IndicatorCode; leave indicator_code out to use every row). "positive" indicators are better
+when higher, "negative" ones when lower. Every indicator listed is used in the ranking.
+The optional "anomalies" section configures the data-quality screen run at ingest
+(see anomaly.py); all of its keys are optional.
+"""
+import json
+import os
+from collections import namedtuple
+
+try:
+    from .anomaly import POLICIES
+except ImportError:
+    from anomaly import POLICIES
+
+MANIFEST_FILE = "manifest.json"
+DIRECTIONS = ("positive", "negative")
+
+# one WHO indicator: source file, IndicatorCode (or None), column name, ranking direction
+Indicator = namedtuple("Indicator", ["file", "code", "column", "direction"])
+# who: tuple of Indicators, ihme_files: tuple of file names,
+# ihme_measures: dict of IHME measure name -> ranking direction,
+# anomalies: keyword arguments for anomaly.screen_anomalies (policy and thresholds)
+Manifest = namedtuple("Manifest", ["who", "ihme_files", "ihme_measures", "anomalies"],
+                      defaults=[{}])
+
+DEFAULT_MANIFEST = {
+    "who": [
+        {"file": "medical-doctors.csv", "indicator_code": "HWF_0001",
+         "column": "Medical Doctors per 10,000", "direction": "positive"},
+        {"file": "nursery-midwifery.csv", "indicator_code": "HWF_0006",
+         "column": "Nurses and Midwifes per 10,000", "direction": "positive"},
+        {"file": "pharmacists.csv", "indicator_code": "HWF_0014",
+         "column": "Pharmacists per 10,000", "direction": "positive"},
+        {"file": "dentistry.csv", "indicator_code": "HWF_0010",
+         "column": "Dentists per 10,000", "direction": "positive"},
+    ],
+    "ihme": {
+        "files": ["IHME-1.csv", "IHME-2.csv"],
+        "measures": {"Deaths": "negative", "Incidence": "negative"},
+    },
+}
+
+
+def _check_direction(name, direction):
+    """Raises a ValueError for a ranking direction other than positive/negative"""
+    if direction not in DIRECTIONS:
+        raise ValueError(f"direction of {name} must be one of {DIRECTIONS}, not {direction!r}")
+
+
+def _parse_anomalies(raw):
+    """Validates the anomalies section, returning it as a dict"""
+    unknown = set(raw) - {"policy", "z_threshold", "ratio_threshold"}
+    if unknown:
+        raise ValueError(f"unknown anomalies settings in the manifest: {sorted(unknown)}")
+    if raw.get("policy", "keep") not in POLICIES:
+        raise ValueError(f"anomaly policy must be one of {POLICIES}, not {raw['policy']!r}")
+    if raw.get("z_threshold", 1) <= 0 or raw.get("ratio_threshold", 2) <= 1:
+        raise ValueError("z_threshold must be above 0 and ratio_threshold above 1")
+    return dict(raw)
+
+
+def parse_manifest(raw):
+    """
+    Validates a manifest given as a dict (the parsed manifest.json)
+    Args: dict in the manifest.json format
+    Returns: Manifest
+    """
+    if not isinstance(raw, dict) or "who" not in raw or "ihme" not in raw:
+        raise ValueError("manifest needs a 'who' list and an 'ihme' section")
+    indicators = []
+    for entry in raw["who"]:
+        missing = {"file", "column", "direction"} - set(entry)
+        if missing:
+            raise ValueError(f"manifest entry {entry} is missing {sorted(missing)}")
+        _check_direction(entry["column"], entry["direction"])
+        indicators.append(Indicator(entry["file"], entry.get("indicator_code"),
+                                    entry["column"], entry["direction"]))
+    if not indicators:
+        raise ValueError("manifest must list at least one WHO indicator")
+    columns = [indicator.column for indicator in indicators]
+    if len(set(columns)) != len(columns):
+        raise ValueError("WHO indicator columns in the manifest must be unique")
+
+    ihme = raw["ihme"]
+    if not ihme.get("files"):
+        raise ValueError("manifest must list at least one IHME file")
+    measures = dict(ihme.get("measures", {}))
+    for measure, direction in measures.items():
+        _check_direction(measure, direction)
+    clashes = {measure.lower() for measure in measures} & {col.lower() for col in columns}
+    if clashes:
+        raise ValueError(f"columns listed both as WHO and IHME indicators: {sorted(clashes)}")
+    return Manifest(tuple(indicators), tuple(ihme["files"]), measures,
+                    _parse_anomalies(raw.get("anomalies", {})))
+
+
+def load_manifest(file_path):
+    """
+    Reads manifest.json from the data folder, or returns the default manifest
+    Args: path to the data folder
+    Returns: Manifest
+    """
+    path = os.path.join(file_path, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return parse_manifest(DEFAULT_MANIFEST)
+    with open(path, encoding="utf-8") as handle:
+        return parse_manifest(json.load(handle))
+
+
+def source_files(manifest):
+    """Distinct files the manifest reads (WHO files first), in manifest order"""
+    files = [indicator.file for indicator in manifest.who] + list(manifest.ihme_files)
+    return list(dict.fromkeys(files))
+
+
+def ranking_columns(manifest):
+    """
+    Indicator lists for the ranking, in the lower case names it uses
+    Returns: (positive columns, negative columns)
+    """
+    directions = [(indicator.column, indicator.direction) for indicator in manifest.who]
+    directions += list(manifest.ihme_measures.items())
+    positive = [col.strip().lower() for col, direction in directions if direction == "positive"]
+    negative = [col.strip().lower() for col, direction in directions if direction == "negative"]
+    return positive, negative
@@ -0,0 +1,252 @@
+"""
+Lagged fixed-effects panel regressions of the IHME outcomes on the workforce indicators.
+The panel is laid out as a location x year cube, so lagging an indicator by L years is a
+shift along the year axis. For every lag, workforce indicator and outcome the model
+
+    outcome[c, t] = beta * indicator[c, t - lag] + location effect[c] + year effect[t] + error
+
+is fitted over all locations and within each region (year effects are then per region).
+All lags, indicators, outcomes and regions of a scope are fitted at once: the fixed effects
+are swept out of the stacked cubes by alternating demeaning, and the slopes and their
+cluster-robust (by location) standard errors come from grouped sums. Every (indicator,
+outcome) pair uses the location-years where both values are present. Large outcome lists
+(e.g. one column per cause, see cause_panel) are fitted in chunks of outcomes to bound
+memory.
+The panel must hold the raw values (see correlation.outcome_panel), so beta is in outcome
+units per unit of the indicator; the dashboard's metrics frame holds the ranking's
+per-year scaled inputs with the outcomes flipped.
+"""
+import numpy as np
+import pandas as pd
+
+try:
+    from .correlation import (WORKFORCE_COLUMNS, OUTCOME_COLUMNS, POOLED_GROUP, ranking_rows,
+                              workforce_panel)
+    from .constants import Z_95
+    from .figure_cache import cached_table
+except ImportError:
+    from correlation import (WORKFORCE_COLUMNS, OUTCOME_COLUMNS, POOLED_GROUP, ranking_rows,
+                             workforce_panel)
+    from constants import Z_95
+    from figure_cache import cached_table
+
+DEFAULT_LAGS = range(0, 6)
+TABLE_COLUMNS = ["lag", "scope", "group", "workforce", "outcome", "beta", "se",
+                 "ci_low", "ci_high", "beta_std", "se_std", "n", "clusters"]
+# values per working array; outcomes are fitted in chunks that stay below this
+MAX_CHUNK_VALUES = 2_000_000
+DEMEAN_TOL = 1e-10
+DEMEAN_MAX_ITER = 200
+
+
+def panel_cube(df, columns, entity="location", time="year"):
+    """
+    Lays columns of a long panel (one row per location and year) out as a cube
+    Args: pandas DataFrame, value columns, entity and time column names
+    Returns: (entity labels, array of every year from the first to the last,
+        float array of shape entities x years x columns with NaN for missing values)
+    """
+    codes, entities = pd.factorize(df[entity], sort=True)
+    years = df[time].to_numpy(dtype=np.int64)
+    first = years.min()
+    cube = np.full((len(entities), years.max() - first + 1, len(columns)), np.nan)
+    cube[codes, years - first] = df[columns].to_numpy(dtype=np.float64)
+    return list(entities), np.arange(first, years.max() + 1), cube
+
+
+def lag_stack(cube, lags):
+    """
+    Copies of a cube with the values moved lags years later along the year axis
+    Returns: array of shape lags x entities x years x columns (NaN where the lagged year
+        is before the first year)
+    """
+    stacked = np.full((len(lags),) + cube.shape, np.nan)
+    for number, lag in enumerate(lags):
+        stacked[number, :, lag:] = cube[:, :cube.shape[1] - lag]
+    return stacked
+
+
+def _divide(top, bottom):
+    """top / bottom with 0 where bottom is 0"""
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(bottom > 0, top / bottom, 0.0)
+
+
+def entity_sums(members, values):
+    """
+    Sums over the entities of each group: group x entity 0/1 matrix times an array of
+    shape lags x entities x ... (a matrix product, much faster than the equivalent einsum)
+    Returns: array of shape lags x groups x ...
+    """
+    flat = members @ values.reshape(values.shape[0], values.shape[1], -1)
+    return flat.reshape((values.shape[0], members.shape[0]) + values.shape[2:])
+
+
+def sweep_effects(arrays, weight, members=None, codes=None):
+    """
+    Removes the location means and, with members given, the year means within each group
+    from the present cells (weight 1) of arrays of shape lags x entities x years x p x q,
+    in place, by alternating demeaning until the year step is below DEMEAN_TOL
+    Args: list of arrays, 0/1 weight array of the same shape, group x entity 0/1 matrix
+        and group number of each entity (None: location effects only)
+    """
+    scale = max(max(np.abs(array).max(initial=0.0) for array in arrays), 1e-300)
+    location_count = weight.sum(axis=2, keepdims=True)
+    year_count = None
+    if members is not None:
+        year_count = entity_sums(members, weight)
+    for _ in range(DEMEAN_MAX_ITER):
+        for array in arrays:
+            array -= weight * _divide(array.sum(axis=2, keepdims=True), location_count)
+        if members is None:
+            return
+        change = 0.0
+        for array in arrays:
+            step = weight * _divide(entity_sums(members, array), year_count)[:, codes]
+            array -= step
+            change = max(change, np.abs(step).max(initial=0.0))
+        if change <= DEMEAN_TOL * scale:
+            return
+
+
+# pylint: disable-next=too-many-locals
+def fit_lagged(x, y, codes, n_groups, time_effects=True):
+    """
+    Within (fixed-effects) slopes of every y column on every lagged x column, per group
+    Args: lagged regressors (lags x entities x years x p), outcomes (entities x years x q),
+        group number of each entity (-1 = left out), number of groups, whether to add
+        year effects
+    Returns: dict of arrays of shape lags x groups x p x q: beta, se (clustered by entity,
+        with the G/(G-1) small-sample factor), beta_std and se_std (the same in within
+        standard deviations of x and y), n (observations) and clusters (entities with
+        observations)
+    """
+    codes = np.asarray(codes)
+    keep = (codes >= 0)[None, :, None, None, None]
+    weight = (~np.isnan(x)[..., None] & ~np.isnan(y)[None, :, :, None, :] & keep)
+    x_within = np.where(weight, x[..., None], 0.0)
+    y_within = np.where(weight, y[None, :, :, None, :], 0.0)
+    weight = weight.astype(np.float64)
+    members = np.zeros((n_groups, len(codes)))
+    members[codes[codes >= 0], np.flatnonzero(codes >= 0)] = 1.0
+
+    def group_sums(values):
+        return entity_sums(members, values)
+
+    # constant columns leave round-off instead of exact zeros after demeaning
+    tiny_x = 1e-12 * group_sums((x_within ** 2).sum(axis=2))
+    tiny_y = 1e-12 * group_sums((y_within ** 2).sum(axis=2))
+    sweep_effects([x_within, y_within], weight, members if time_effects else None, codes)
+
+    # per-entity sums over the years, then per-group sums over the entities
+    xx_entity = (x_within ** 2).sum(axis=2)
+    xy_entity = (x_within * y_within).sum(axis=2)
+    obs_entity = weight.sum(axis=2)
+    xx, xy, n = group_sums(xx_entity), group_sums(xy_entity), group_sums(obs_entity)
+    yy = group_sums((y_within ** 2).sum(axis=2))
+    clusters = group_sums((obs_entity > 0).astype(np.float64))
+    beta = _divide(xy, xx)
+    # each entity's score: sum over its years of x * residual
+    scores = xy_entity - beta[:, codes] * xx_entity
+    with np.errstate(invalid="ignore", divide="ignore"):
+        variance = group_sums(scores ** 2) / xx ** 2 * clusters / (clusters - 1)
+        to_std = np.sqrt(xx / yy)
+    invalid = (n < 3) | (clusters < 2) | (xx <= tiny_x) | (yy <= tiny_y)
+    beta[invalid] = np.nan
+    variance[invalid] = np.nan
+    return {"beta": beta, "se": np.sqrt(variance), "beta_std": beta * to_std,
+            "se_std": np.sqrt(variance) * to_std, "n": n.astype(np.int64),
+            "clusters": clusters.astype(np.int64)}
+
+
+def _region_codes(df, entities, entity="location"):
+    """Region number of every entity (-1 = no region) and the sorted region labels"""
+    if "region" not in df.columns:
+        return np.full(len(entities), -1), []
+    regions = df.dropna(subset=["region"]).groupby(entity, observed=True)["region"].first()
+    codes, labels = pd.factorize(regions.reindex(entities), sort=True)
+    return codes, list(labels)
+
+
+def _fit_frame(fit, axes, scope):
+    """
+    Long table of the arrays returned by fit_lagged
+    Args: dict of arrays, labels of their four axes (lags, groups, workforce, outcomes),
+        scope name
+    """
+    lags, groups, workforce, outcomes = axes
+    shape = (len(lags), len(groups), len(workforce), len(outcomes))
+    return pd.DataFrame({
+        "lag": np.repeat(lags, np.prod(shape[1:])),
+        "scope": scope,
+        "group": np.tile(np.repeat(np.array(groups, dtype=object), shape[2] * shape[3]),
+                         shape[0]),
+        "workforce": np.tile(np.repeat(workforce, shape[3]), shape[0] * shape[1]),
+        "outcome": np.tile(outcomes, np.prod(shape[:3])),
+    } | {key: value.ravel() for key, value in fit.items()})
+
+
+# pylint: disable-next=too-many-locals
+def lagged_regressions(df, lags=DEFAULT_LAGS, workforce=None, outcomes=None,
+                       time_effects=True):
+    """
+    Fixed-effects regressions of every outcome on every workforce indicator lagged by each
+    of the lags, over all locations and within each region
+    Args: panel of raw values with one row per location and year (correlation.outcome_panel
+        or cause_panel), lags in years (0 = same year), workforce and outcome column lists
+        (default: the four workforce indicators, deaths and incidence), whether to add
+        year effects next to the location effects
+    Returns: pandas DataFrame with columns lag, scope, group, workforce, outcome, beta, se,
+        ci_low, ci_high (95%), beta_std, se_std (in within standard deviations), n,
+        clusters
+    """
+    lags = sorted({int(lag) for lag in lags})
+    if any(lag < 0 for lag in lags):
+        raise ValueError("lags must be 0 or more years")
+    workforce = [col for col in (workforce or WORKFORCE_COLUMNS) if col in df.columns]
+    outcomes = [col for col in (outcomes or OUTCOME_COLUMNS) if col in df.columns]
+    if df.empty or not lags or not workforce or not outcomes:
+        return pd.DataFrame(columns=TABLE_COLUMNS)
+
+    entities, _, cube = panel_cube(df, workforce + outcomes)
+    x = lag_stack(cube[..., :len(workforce)], lags)
+    region_codes, regions = _region_codes(df, entities)
+    scopes = [("pooled", np.zeros(len(entities), dtype=np.int64), [POOLED_GROUP])]
+    if regions:
+        scopes.append(("region", region_codes, regions))
+    chunk = max(1, MAX_CHUNK_VALUES // x.size)
+    parts = []
+    for scope, codes, labels in scopes:
+        for start in range(len(workforce), cube.shape[2], chunk):
+            fit = fit_lagged(x, cube[..., start:start + chunk], codes, len(labels),
+                             time_effects)
+            names = outcomes[start - len(workforce):start - len(workforce) + chunk]
+            parts.append(_fit_frame(fit, (lags, labels, workforce, names), scope))
+    table = pd.concat(parts, ignore_index=True)
+    table["ci_low"] = table["beta"] - Z_95 * table["se"]
+    table["ci_high"] = table["beta"] + Z_95 * table["se"]
+    return table[TABLE_COLUMNS]
+
+
+def cause_panel(df_who, df_ihme, measures=tuple(OUTCOME_COLUMNS), sex="Both"):
+    """
+    Panel of the raw workforce indicators with one outcome column per IHME cause and
+    measure, named "<measure>: <cause>", for lagged_regressions
+    Args: the dashboard's WHO and IHME frames, IHME measures, sex group
+    Returns: (panel DataFrame, list of outcome column names)
+    """
+    wide = ranking_rows(df_ihme, sex).pivot_table(
+        index=["location", "year"], columns="cause", values=list(measures), aggfunc="first",
+        observed=True)
+    wide.columns = [f"{measure}: {cause}" for measure, cause in wide.columns]
+    wide = wide.reset_index().astype({"location": str})
+    panel = pd.merge(workforce_panel(df_who), wide, on=["location", "year"], how="outer")
+    return panel, list(wide.columns[2:])
+
+
+def cached_lagged_regressions(df, version, **kwargs):
+    """
+    lagged_regressions (keyword arguments as there), computed once per data version and
+    arguments and shared by every caller in the process
+    """
+    return cached_table(lagged_regressions, df, version, **kwargs)
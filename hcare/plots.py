@@ -0,0 +1,428 @@
+"""
+Figure builders for the dashboard.
+Every function takes a dataframe plus the widget selections and returns a plotly figure,
+without touching streamlit, so figures can be cached and reused outside the app.
+Each builder also takes an optional index (a FilterIndex built on the same frame)
+that answers its row filters without scanning the frame. Builders select their rows with
+filter_index.query, declaring their filters, the columns that must not be null and the
+columns they plot, so only that part of the frame is copied.
+"""
+import math
+
+import plotly.graph_objects as go
+import plotly.express as px
+
+try:
+    from .filter_index import query
+    from .correlation import correlation_matrix
+    from .constants import Z_95
+    from .uncertainty import bound_columns
+    from .cube import ranking_age
+except ImportError:
+    from filter_index import query
+    from correlation import correlation_matrix
+    from constants import Z_95
+    from uncertainty import bound_columns
+    from cube import ranking_age
+
+
+def interval_errors(df, metric):
+    """
+    Error bar lengths of a metric from its uncertainty bound columns (see uncertainty.py)
+    Args: pandas DataFrame, metric column
+    Returns: (above, below) Series, or None when df has no bounds for the metric
+    """
+    lower, upper = bound_columns(metric)
+    if lower not in df.columns or upper not in df.columns:
+        return None
+    return df[upper] - df[metric], df[metric] - df[lower]
+
+def add_no_data_note(fig, message):
+    """
+    Writes a message in the middle of an empty figure
+    (replaces the st.write warning the dashboard used to print)
+    """
+    fig.add_annotation(text=message, showarrow=False, xref="paper", yref="paper",
+                       x=0.5, y=0.5, font={"size": 14})
+    return fig
+
+def plot_compscore_over_time(df, primary_metric="composite_score", selected_location=None,
+    index=None, *, forecast=None):
+    """
+    Generates a line plot of the composite score over time for the chosen countries
+    (index: optional FilterIndex built on df, used for the row selection), with error bars
+    when df has uncertainty intervals of the metric; with forecast (forecast.Forecast) a
+    dashed line and a shaded 95% band extend each country past the last year of df
+    """
+    bounds = [col for col in bound_columns(primary_metric) if col in df.columns]
+    df = query(df, index, ["location", "year", primary_metric] + bounds,
+               location=selected_location)
+    fig = go.Figure()
+    palette = px.colors.qualitative.Plotly
+    for number, (loc, df_loc) in enumerate(df.groupby("location", sort=False, observed=True)):
+        errors = interval_errors(df_loc, primary_metric)
+        color = palette[number % len(palette)]
+        name = f"{primary_metric.replace('_', ' ').capitalize()} - {loc}"
+        fig.add_trace(go.Scatter(
+            x=df_loc["year"],
+            y=df_loc[primary_metric],
+            error_y=None if errors is None else {"type": "data", "array": errors[0],
+                                                 "arrayminus": errors[1]},
+            mode="lines+markers",
+            name=name,
+            legendgroup=name,
+            line={"color": color}
+        ))
+        if forecast is not None:
+            add_forecast(fig, forecast.rows(primary_metric, loc),
+                         df_loc.dropna(subset=[primary_metric]).tail(1), primary_metric,
+                         name=name, color=color)
+    fig.update_layout(
+        title=f"{primary_metric.replace('_', ' ').capitalize()} Over Time",
+        xaxis_title="Year",
+        yaxis_title=primary_metric.replace("_", " ").capitalize(),
+        template="plotly_white"
+    )
+    return fig
+
+# pylint: disable-next=too-many-arguments
+def add_forecast(fig, rows, last, metric, *, name, color):
+    """
+    Adds the forecast of one location to a line plot: a dashed line from the last value
+    through the forecasts and a shaded band between the interval bounds
+    Args: plotly Figure, forecast rows (see forecast.Forecast.rows), last row of the
+        location's data, metric column, legend name and color of the location's line
+    """
+    if rows.empty:
+        return
+    years = list(last["year"]) + list(rows["year"])
+    fig.add_trace(go.Scatter(
+        x=list(rows["year"]) + list(rows["year"])[::-1],
+        y=list(rows["upper"]) + list(rows["lower"])[::-1],
+        fill="toself",
+        fillcolor=color,
+        opacity=0.15,
+        line={"width": 0},
+        hoverinfo="skip",
+        showlegend=False,
+        legendgroup=name
+    ))
+    fig.add_trace(go.Scatter(
+        x=years,
+        y=list(last[metric]) + list(rows["forecast"]),
+        mode="lines",
+        name=f"{name} (forecast)",
+        legendgroup=name,
+        line={"dash": "dash", "color": color}
+    ))
+
+def plot_death_vs_docs(df, primary_metric = "deaths",
+    secondary_metric = "medical_doctors_per_10000", selected_location = None, index=None):
+    """
+    Generates scatter plot of the number of deaths vs the rate of medical doctors in the
+    specified countries, with each point representing a different year
+    """
+    df = query(df, index, ["location", "year", primary_metric, secondary_metric],
+               location=selected_location)
+    fig = px.scatter(
+        df,
+        x=secondary_metric,
+        y=primary_metric,
+        color="location",                         # Encode country with color
+        hover_data=["year", "location"],          # Show year and country on hover
+        title=f"{primary_metric} vs {secondary_metric} by Country (Each Point = Year)",
+    )
+    fig.update_traces(marker={"size": 10})      # Adjust dot size if needed
+    fig.update_layout(template="plotly_white")   # Use a clean layout
+    return fig
+
+def ihme_rows(df, metric, index=None, cube=None, **filters):
+    """
+    Rows of the IHME frame behind the IHME bar chart: location, sex, cause, the metric and
+    its bounds when the data has them
+    Args: IHME DataFrame, metric column, optional FilterIndex or IHMECube built on df,
+        filters (year, location, cause, sex, age)
+    Returns: pandas DataFrame
+    """
+    if cube is not None:
+        return cube.frame(["location", "sex", "cause"], measure=metric, **filters)
+    bounds = [col for col in bound_columns(metric) if col in df.columns]
+    return query(df, index, ["location", "cause", metric] + bounds,
+                 notnull=["location", "cause", metric], **filters)
+
+# the optional keyword-only index pushes these two builders over pylint's argument limit
+# pylint: disable-next=too-many-arguments
+def plot_ihme_data(df, metric="deaths", select_yr_and_sex=(None, None),
+    selected_location=None, selected_cause=None, *, index=None, age=None, cube=None):
+    """
+    Generates a bar plot of the chosen disease metric for the chosen injury causes
+    for the selected year, countries and age group (default: the ranking's age group)
+    (cube: optional IHMECube built on df; it answers the selection instead of the frame)
+    """
+    select_yr = select_yr_and_sex[0]
+    selected_sex = select_yr_and_sex[1]
+    # The IHME data now uses 'deaths' and 'incidence'
+    if metric not in ["deaths", "incidence"]:
+        raise ValueError("Metric must be 'deaths' or 'incidence'")
+
+    required_columns = {"location", "cause", "year", metric}
+    if not required_columns.issubset(set(df.columns)):
+        missing_cols = required_columns - set(df.columns)
+        raise ValueError(
+            f"Missing required columns in IHME data: {missing_cols}")
+
+    if select_yr is None:
+        select_yr = index.values("year")[-1] if index is not None else df["year"].max()
+    if age is None and cube is not None:
+        age = ranking_age(cube.labels("age"))
+    elif age is None and "age" in df.columns:
+        age = ranking_age(index.values("age") if index is not None else df["age"].unique())
+    df_year = ihme_rows(df, metric, index, cube, year=select_yr, location=selected_location,
+                        cause=selected_cause, sex=selected_sex, age=age)
+    # error bars span the 95% uncertainty interval when the data has its bounds
+    errors = interval_errors(df_year, metric)
+    if errors is not None:
+        df_year["error_above"], df_year["error_below"] = errors
+
+    fig = px.bar(
+        df_year,
+        x="cause",
+        y=metric,
+        color="location",
+        barmode="group",
+        error_y=None if errors is None else "error_above",
+        error_y_minus=None if errors is None else "error_below",
+        title=f"{metric.capitalize()} by Cause in {select_yr}" + (f" ({age})" if age else "")
+    )
+    fig.update_layout(xaxis_title="Cause",
+                      yaxis_title=metric.capitalize(), template="plotly_white")
+    return fig
+
+def regional_benchmark(regional, source, metric, regions, years=None):
+    """
+    Regional medians of a metric from the materialized views (see regional.py)
+    Args: RegionalViews or None, source ("who" or "metrics"), metric, regions, years
+    Returns: pandas DataFrame with region, year, indicator and value (None without views)
+    """
+    if regional is None or not regions:
+        return None
+    return regional.benchmark(source, metric, regions=regions, years=years)
+
+# pylint: disable-next=too-many-arguments
+def plot_who_data(df, select_year=None, selected_location=None, selected_regions=None,
+    index=None, *, regional=None):
+    """
+    Generates a bar plot of all 4 workforce metrics from the WHO dataset for the locations
+    specified in the year specified; with regional (RegionalViews) the regional medians of
+    the selected regions (or of the regions of the shown locations) are added as bars
+    """
+    if select_year is None:
+        select_year = index.values("year")[-1] if index is not None else df["year"].max()
+    categories = [
+        ("medical_doctors_per_10000", "Medical Doctors per 10000"),
+        ("nurses_midwifes_per_10000", "Nurses & Midwifes per 10000"),
+        ("pharmacists_per_10000", "Pharmacists per 10000"),
+        ("dentists_per_10000", "Dentists per 10000")
+    ]
+    df_year = query(df, index, ["location"] + (["Region"] if regional is not None else [])
+                    + [col for col, _ in categories if col in df],
+                    year=select_year, Region=selected_regions, location=selected_location)
+    if regional is not None and not selected_regions:
+        selected_regions = df_year["Region"].astype(str).unique().tolist()
+    medians = regional_benchmark(regional, "who", [col for col, _ in categories],
+                                 selected_regions, select_year)
+
+    fig = go.Figure()
+    for col, label in categories:
+        if col in df_year.columns:
+            x, y = df_year["location"].astype(str).tolist(), df_year[col].tolist()
+            if medians is not None:
+                rows = medians[medians["indicator"] == col]
+                x += [f"{region} median" for region in rows["region"]]
+                y += rows["value"].tolist()
+            fig.add_trace(go.Bar(
+                x=x,
+                y=y,
+                name=label
+            ))
+    fig.update_layout(
+        title=f"Workforce Metrics by Country in {select_year}",
+        xaxis_title="Location",
+        yaxis_title="Per 10000 Population",
+        template="plotly_white",
+        barmode="group"
+    )
+    if df_year.empty:
+        add_no_data_note(fig, "No data available for the selected year,"
+            + " region(s), and countries combination, try another combination.")
+    return fig
+
+# pylint: disable-next=too-many-arguments
+def plot_metrics_by_country(df, primary_metric="medical_doctors_per_10000",
+    secondary_metric="nurses_midwifes_per_10000",
+    selected_yr=None,
+    selected_place=(None,None), *, index=None):
+    """
+    Generates a bar plot of the primary metric with a line plot of the second metric
+    overlayed for the selected year and location(s)
+    """
+    selected_location = selected_place[0]
+    selected_region = selected_place[1]
+    if selected_yr is None:
+        selected_yr = index.values("year")[-1] if index is not None else df["year"].max()
+    needed = ["location", primary_metric, secondary_metric]
+    df_year = query(df, index, needed, notnull=needed, year=selected_yr,
+                    region=selected_region, location=selected_location)
+
+    fig = go.Figure()
+    fig.add_trace(go.Bar(
+        x=df_year["location"],
+        y=df_year[primary_metric],
+        name=primary_metric.replace("_", " ").capitalize(),
+        marker_color="red"
+    ))
+    fig.add_trace(go.Scatter(
+        x=df_year["location"],
+        y=df_year[secondary_metric],
+        name=secondary_metric.replace("_", " ").capitalize(),
+        mode="lines+markers",
+        line={"color": 'blue', "dash": 'dash'}
+    ))
+    fig.update_layout(
+        title=f"{primary_metric.replace('_', ' ').capitalize()} & "
+            + f"{secondary_metric.replace('_', ' ').capitalize()} by Location in {selected_yr}",
+        xaxis_title="Location",
+        yaxis_title=primary_metric.replace("_", " ").capitalize(),
+        template="plotly_white"
+    )
+    if df_year.empty:
+        add_no_data_note(fig,
+            "No data available for the selected year and location, try another combination.")
+    return fig
+
+# pylint: disable-next=too-many-arguments
+def plot_metrics_over_time(df, primary_metric="medical_doctors_per_10000",
+    secondary_metric="nurses_midwifes_per_10000", selected_location=None, index=None, *,
+    regions=None, regional=None):
+    """
+    Generates a line plot of the 2 selected metrics over all years for the selected location(s);
+    with regional (RegionalViews) a dotted line gives the regional median of the primary metric
+    for the selected regions (or the regions of the shown locations)
+    """
+    df = query(df, index, ["location", "year", primary_metric, secondary_metric]
+               + (["region"] if regional is not None else []), location=selected_location)
+
+    fig = go.Figure()
+    for loc, df_loc in df.groupby("location", sort=False, observed=True):
+        df_loc = df_loc.dropna(subset=["year", primary_metric, secondary_metric])
+        fig.add_trace(go.Scatter(
+            x=df_loc["year"],
+            y=df_loc[primary_metric],
+            mode="lines+markers",
+            name=f"{primary_metric.replace('_', ' ').capitalize()} - {loc}"
+        ))
+        fig.add_trace(go.Scatter(
+            x=df_loc["year"],
+            y=df_loc[secondary_metric],
+            mode="lines+markers",
+            name=f"{secondary_metric.replace('_', ' ').capitalize()} - {loc}",
+            line={"dash": 'dash'}
+        ))
+    if regional is not None and not regions:
+        regions = df["region"].astype(str).unique().tolist()
+    medians = regional_benchmark(regional, "metrics", primary_metric, regions)
+    if medians is not None:
+        for region, df_region in medians.groupby("region", sort=True):
+            fig.add_trace(go.Scatter(
+                x=df_region["year"],
+                y=df_region["value"],
+                mode="lines",
+                name=f"{primary_metric.replace('_', ' ').capitalize()} - {region} median",
+                line={"dash": 'dot', "color": "gray"}
+            ))
+    fig.update_layout(
+        title=f"{primary_metric.replace('_', ' ').capitalize()} & "
+            + f"{secondary_metric.replace('_', ' ').capitalize()} Over Time",
+        xaxis_title="Year",
+        yaxis_title=primary_metric.replace("_", " ").capitalize(),
+        template="plotly_white"
+    )
+    return fig
+
+def country_spider(df, ctry, year, index=None):
+    """
+    Generates spider plot of healthcare workforce metrics for the specified country
+    in the specified year
+    """
+    # Create a spider plot for the country
+    # Get the metrics
+    thetas = ['medical_doctors_per_10000', 'nurses_midwifes_per_10000',
+     'pharmacists_per_10000', 'dentists_per_10000']
+    # Get the row for the country
+    country_row = query(df, index, thetas, location=ctry, year=year)
+    rads = country_row[thetas].values.flatten()
+    fig_spider = px.line_polar(r=rads, theta=thetas, line_close=True)
+    fig_spider.update_layout(title=f"{ctry} Workforce Metrics in {year}")
+    fig_spider.update_traces(fill='toself')
+    # below line not working for some reason
+    fig_spider.update_layout(legend={"font": {"color": 'black'}})
+    return fig_spider
+
+def plot_correlation_heatmap(table, method="pearson", scope="pooled", group="All"):
+    """
+    Generates a heatmap of the correlations between the workforce indicators (rows)
+    and the IHME outcomes (columns) for one method and one group of a correlation table
+    (see correlation.correlation_table), with r and the number of rows in each cell
+    """
+    r, n = correlation_matrix(table, method, scope, group)
+    labels = [[f"n/a<br>n={count}" if math.isnan(value) else f"{value:.2f}<br>n={count}"
+               for value, count in zip(r_row, n_row)]
+              for r_row, n_row in zip(r.to_numpy(), n.to_numpy())]
+    fig = go.Figure(go.Heatmap(
+        z=r.to_numpy(),
+        x=[col.replace("_", " ").capitalize() for col in r.columns],
+        y=[row.replace("_", " ").capitalize() for row in r.index],
+        zmin=-1, zmax=1, colorscale="RdBu", reversescale=True,
+        text=labels, texttemplate="%{text}", colorbar={"title": "r"},
+    ))
+    where = "all countries and years" if scope == "pooled" else f"{scope} {group}"
+    fig.update_layout(
+        title=f"{method.capitalize()} correlation of workforce and outcomes ({where})",
+        xaxis_title="Outcome",
+        yaxis_title="Workforce indicator",
+        template="plotly_white"
+    )
+    if r.empty:
+        add_no_data_note(fig, "No data available for this selection.")
+    return fig
+
+
+def plot_lagged_effects(table, outcome="deaths", scope="pooled", group="All"):
+    """
+    Generates a line plot of the fixed-effects slope of one outcome on each workforce
+    indicator against the lag in years, in within standard deviations, with 95% error bars
+    (see panel.lagged_regressions)
+    """
+    rows = table[(table["outcome"] == outcome) & (table["scope"] == scope)
+                 & (table["group"] == group)].dropna(subset=["beta_std"])
+    fig = go.Figure()
+    for indicator, lines in rows.groupby("workforce", sort=False):
+        fig.add_trace(go.Scatter(
+            x=lines["lag"], y=lines["beta_std"], mode="lines+markers",
+            name=indicator.replace("_", " ").capitalize(),
+            error_y={"type": "data", "array": Z_95 * lines["se_std"], "visible": True},
+            customdata=lines[["n", "clusters"]],
+            hovertemplate="lag %{x}: %{y:.3f}<br>n=%{customdata[0]}, "
+                          "%{customdata[1]} countries",
+        ))
+    where = "all countries" if scope == "pooled" else group
+    fig.update_layout(
+        title=f"Effect of the workforce on {outcome} some years later ({where})",
+        xaxis_title="Lag (years)",
+        yaxis_title="Standardized effect",
+        template="plotly_white"
+    )
+    fig.add_hline(y=0, line_dash="dot", line_color="gray")
+    if rows.empty:
+        add_no_data_note(fig, "No data available for this selection.")
+    return fig
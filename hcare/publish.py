@@ -0,0 +1,170 @@
+"""
+Publishing of the processed dashboard frames (IHME, WHO, metrics) as Arrow IPC files, so the
+pipeline can run as a separate worker and every dashboard process on the host reads its
+output without parsing, unpickling or copying it.
+
+publish() writes the frames uncompressed to a folder named after the data version, then
+replaces CURRENT.json, the small manifest naming the current version, by writing it under a
+temporary name and renaming it. Readers therefore see either the old or the new version,
+never a partial one. open_published() memory-maps the files: numeric and categorical
+columns become read-only numpy arrays over the mapped pages, so all processes use the one
+copy of the data in the operating system's page cache (string columns that are not
+categorical are still converted to python objects in each process). Float columns are
+stored with NaN as a value rather than as a null, which is what lets them be mapped.
+The folders of older versions are deleted once KEEP_VERSIONS newer ones exist; a process
+that still has one mapped keeps reading it until it switches.
+
+Command line (the pipeline worker):
+    python -m hcare.publish --data data/ --out published/
+The dashboard reads the published frames when HCARE_PUBLISHED_DIR is set:
+    HCARE_PUBLISHED_DIR=published/ streamlit run hcare/hcare.py
+"""
+import argparse
+import json
+import os
+import shutil
+import time
+
+try:
+    from .compact import FRAME_NAMES
+    from .data_prep import data_version, load_dashboard_data
+except ImportError:
+    from compact import FRAME_NAMES
+    from data_prep import data_version, load_dashboard_data
+
+# the frames are written as Arrow IPC files
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+CURRENT_FILE = "CURRENT.json"
+# published versions kept besides the current one, for readers still using them
+KEEP_VERSIONS = 2
+COLUMNS_NAME_KEY = "hcare.columns_name"
+
+
+def to_arrow(df):
+    """
+    Arrow table of a processed frame, with NaN kept as a float value (not a null)
+    Args: pandas DataFrame with a RangeIndex (the index is not stored)
+    Returns: pyarrow Table
+    """
+    arrays = []
+    for position in range(df.shape[1]):
+        series = df.iloc[:, position]
+        if series.dtype.kind == "f":
+            arrays.append(pa.array(series.to_numpy(), from_pandas=False))
+        else:
+            arrays.append(pa.Array.from_pandas(series))
+    # the name of the column index (e.g. "measure" after the IHME pivot) goes in the metadata
+    return pa.Table.from_arrays(arrays, names=[str(col) for col in df.columns],
+                                metadata={COLUMNS_NAME_KEY: json.dumps(df.columns.name)})
+
+
+def read_current(out_dir):
+    """
+    Reads the manifest of the current published version
+    Returns: dict with version, published time and rows per frame, or None before the
+        first publish
+    """
+    path = os.path.join(out_dir, CURRENT_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as handle:
+        return json.load(handle)
+
+
+def published_version(out_dir):
+    """Version of the current published frames (None before the first publish)"""
+    current = read_current(out_dir)
+    return None if current is None else current["version"]
+
+
+def _prune(out_dir, keep):
+    """Deletes all but the keep most recent version folders besides the current one"""
+    current = published_version(out_dir)
+    folders = [entry for entry in os.scandir(out_dir)
+               if entry.is_dir() and not entry.name.startswith(".") and entry.name != current]
+    folders.sort(key=lambda entry: entry.stat().st_mtime_ns, reverse=True)
+    for entry in folders[keep:]:
+        shutil.rmtree(entry.path, ignore_errors=True)
+
+
+def publish(frames, out_dir, version, keep=KEEP_VERSIONS):
+    """
+    Publishes processed frames as the current version
+    Args: (IHME, WHO, metrics) DataFrames as returned by load_dashboard_data, output folder,
+        data version (e.g. data_version of the data folder), number of older versions kept
+    Returns: dict written to CURRENT.json
+    """
+    if pa is None:
+        raise ImportError("publishing the frames needs pyarrow installed")
+    version = str(version)
+    os.makedirs(out_dir, exist_ok=True)
+    staging = os.path.join(out_dir, f".{version}.tmp")
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+    for name, df in zip(FRAME_NAMES, frames):
+        table = to_arrow(df)
+        with pa.OSFile(os.path.join(staging, f"{name}.arrow"), "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+    folder = os.path.join(out_dir, version)
+    if os.path.exists(folder):
+        # a reader may still map the old files: they stay valid after being replaced
+        shutil.rmtree(folder)
+    os.replace(staging, folder)
+
+    current = {"version": version, "published": time.strftime("%Y-%m-%dT%H:%M:%S"),
+               "rows": {name: len(df) for name, df in zip(FRAME_NAMES, frames)}}
+    temporary = os.path.join(out_dir, f".{CURRENT_FILE}.tmp")
+    with open(temporary, "w", encoding="utf-8") as handle:
+        json.dump(current, handle)
+    os.replace(temporary, os.path.join(out_dir, CURRENT_FILE))
+    _prune(out_dir, keep)
+    return current
+
+
+def open_published(out_dir, version=None):
+    """
+    Memory-maps the published frames
+    Args: output folder of publish, version to open (default: the current one)
+    Returns: ((IHME, WHO, metrics) DataFrames with read-only columns, version)
+    """
+    if pa is None:
+        raise ImportError("reading published frames needs pyarrow installed")
+    if version is None or not os.path.isdir(os.path.join(out_dir, str(version))):
+        version = published_version(out_dir)
+        if version is None:
+            raise FileNotFoundError(f"nothing has been published to {out_dir}")
+    frames = []
+    for name in FRAME_NAMES:
+        source = pa.memory_map(os.path.join(out_dir, str(version), f"{name}.arrow"))
+        table = pa.ipc.open_file(source).read_all()
+        # split_blocks gives every column its own block, so pandas does not copy the
+        # columns of one dtype together into a 2D block
+        frame = table.to_pandas(split_blocks=True)
+        frame.columns.name = json.loads(table.schema.metadata[COLUMNS_NAME_KEY.encode()])
+        frames.append(frame)
+    return tuple(frames), version
+
+
+def main(argv=None):
+    """Command line entry point: runs the pipeline and publishes its frames"""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n", maxsplit=1)[0])
+    parser.add_argument("--data", default="data/", help="folder with the source files")
+    parser.add_argument("--out", default="published/", help="folder to publish to")
+    parser.add_argument("--keep", type=int, default=KEEP_VERSIONS,
+                        help="older versions to keep for readers still using them")
+    args = parser.parse_args(argv)
+    version = data_version(args.data)
+    if published_version(args.out) == version:
+        print(f"Version {version} is already published")
+        return
+    current = publish(load_dashboard_data(args.data), args.out, version, args.keep)
+    print(f"Published version {version}: {current['rows']}")
+
+
+if __name__ == '__main__':
+    main()
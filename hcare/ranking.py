@@ -69,29 +69,69 @@ def rank_countries(df, year_col='year', score_col='composite_score'):
     return df
 
 
-def process_ranking_pipeline(df):
+def pca_weights(values, starts):
+    """
+    Absolute loadings of the first principal component of each year's rows, scaled to sum
+    to 1 (the weights of get_pca_weights), all years in one eigendecomposition
+    Args: rows x indicators array sorted by year, row where each year starts
+    Returns: years x indicators array (equal weights for years with fewer than 2 rows)
+    """
+    counts = np.diff(np.append(starts, len(values)))
+    means = np.add.reduceat(values, starts, axis=0) / counts[:, None]
+    centered = values - np.repeat(means, counts, axis=0)
+    covariance = np.add.reduceat(centered[:, :, None] * centered[:, None, :], starts, axis=0)
+    # eigh sorts the eigenvalues in ascending order
+    loadings = np.abs(np.linalg.eigh(covariance)[1][:, :, -1])
+    weights = loadings / loadings.sum(axis=1, keepdims=True)
+    weights[counts < 2] = 1 / values.shape[1]
+    return weights
+
+
+def rank_within(scores, year_numbers):
+    """Rank of every score within its year, highest first, ties sharing the best rank"""
+    order = np.lexsort((-scores, year_numbers))
+    ordered, groups = scores[order], year_numbers[order]
+    positions = np.arange(len(order))
+    new_group = np.ones(len(order), dtype=bool)
+    new_group[1:] = groups[1:] != groups[:-1]
+    new_value = new_group.copy()
+    new_value[1:] |= ordered[1:] != ordered[:-1]
+    group_start = np.maximum.accumulate(np.where(new_group, positions, 0))
+    value_start = np.maximum.accumulate(np.where(new_value, positions, 0))
+    ranks = np.empty(len(order), dtype=np.int32)
+    ranks[order] = value_start - group_start + 1
+    return ranks
+
+
+def process_ranking_pipeline(df, positive_cols=None, negative_cols=None):
     """
     Process the entire ranking pipeline:
       1. Load data.
       2. Normalize indicators by year.
       3. Adjust negative indicators.
       4. For each year, derive PCA weights, compute composite score, and rank countries.
+    positive_cols / negative_cols are the indicators where higher / lower is better
+    (the data manifest provides them); they default to the workforce and IHME columns.
     Returns the final DataFrame with composite scores and ranks.
     """
     df.columns = df.columns.str.strip().str.lower()
 
     # Define indicator columns (ensure these column names match your CSV file):
-    negative_cols = [
-        'deaths',
-        'incidence'
-    ]
-
-    positive_cols = [
-        'medical doctors per 10,000',
-        'nurses and midwifes per 10,000',
-        'dentists per 10,000',
-        'pharmacists per 10,000'
-    ]
+    if negative_cols is None:
+        negative_cols = [
+            'deaths',
+            'incidence'
+        ]
+
+    if positive_cols is None:
+        positive_cols = [
+            'medical doctors per 10,000',
+            'nurses and midwifes per 10,000',
+            'dentists per 10,000',
+            'pharmacists per 10,000'
+        ]
+    negative_cols = [col.strip().lower() for col in negative_cols]
+    positive_cols = [col.strip().lower() for col in positive_cols]
     indicator_cols = negative_cols + positive_cols
 
     # Step 2: Normalize the indicators for each year.
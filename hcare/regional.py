@@ -0,0 +1,172 @@
+"""
+Materialized regional aggregates of the dashboard frames: for every region, year and
+indicator the mean, median, percentiles and number of countries, over the countries of the
+region (unweighted, no population weights). For the WHO frame the indicators are the
+workforce columns; for the ranked metrics they are the normalized indicators and the
+composite score, whose percentiles describe its distribution within each region.
+
+The views are computed once per data version. Every year is aggregated on its own (the
+ranking normalizes within years too), so a year whose rows did not change keeps its
+aggregates: RegionalViews.build takes the views of the previous data version and
+recomputes only the years whose fingerprint (a hash of the year's rows) changed.
+materialized_views keeps the latest views of the process for that purpose.
+"""
+import threading
+
+import numpy as np
+import pandas as pd
+
+# statistic -> quantile (None: not a quantile)
+STATS = {"mean": None, "median": 0.5, "p10": 0.1, "p25": 0.25, "p75": 0.75, "p90": 0.9,
+         "count": None}
+TABLE_COLUMNS = ["region", "year", "indicator"] + list(STATS)
+# frame -> its region column
+SOURCES = {"who": "Region", "metrics": "region"}
+
+_LATEST = {}
+_LOCK = threading.Lock()
+
+
+def indicator_columns(df):
+    """Indicator columns of a frame: its float columns except ranks and uncertainty bounds"""
+    return [col for col in df.columns if pd.api.types.is_float_dtype(df[col])
+            and not str(col).startswith("rank")
+            and not str(col).endswith(("_lower", "_upper"))]
+
+
+def year_fingerprints(df, columns, region_col):
+    """
+    Fingerprint of the rows of every year (independent of row order)
+    Args: pandas DataFrame, indicator columns, region column
+    Returns: dict of year -> (hash sum, number of rows)
+    """
+    keys = ["location", region_col, "year"] if "location" in df.columns \
+        else [region_col, "year"]
+    hashes = pd.util.hash_pandas_object(df[keys + columns], index=False).to_numpy()
+    years, codes = np.unique(df["year"].to_numpy(), return_inverse=True)
+    sums = np.zeros(len(years), dtype=np.uint64)
+    np.add.at(sums, codes, hashes)
+    counts = np.bincount(codes, minlength=len(years))
+    return {int(year): (int(total), int(count))
+            for year, total, count in zip(years, sums, counts)}
+
+
+def regional_table(df, columns, region_col):
+    """
+    Aggregates of every region, year and indicator
+    Args: pandas DataFrame, indicator columns, region column
+    Returns: pandas DataFrame with TABLE_COLUMNS, sorted by region, year and indicator
+    """
+    long = df[[region_col, "year"] + columns].melt(
+        id_vars=[region_col, "year"], var_name="indicator").dropna()
+    long = long.rename(columns={region_col: "region"}).astype({"region": str, "value": float})
+    groups = long.groupby(["region", "year", "indicator"], sort=True)["value"]
+    table = groups.agg(["mean", "count"])
+    quantiles = groups.quantile([q for q in STATS.values() if q is not None]).unstack()
+    for stat, q in STATS.items():
+        if q is not None:
+            table[stat] = quantiles[q]
+    return table.reset_index()[TABLE_COLUMNS]
+
+
+def _refresh(table, df, columns, region_col, changed):
+    """Aggregate table with the changed years of df recomputed and removed years dropped"""
+    years = df["year"].unique()
+    parts = [table[table["year"].isin(years) & ~table["year"].isin(changed)]]
+    if changed:
+        parts.append(regional_table(df[df["year"].isin(changed)], columns, region_col))
+    return pd.concat(parts, ignore_index=True).sort_values(
+        ["region", "year", "indicator"], ignore_index=True)
+
+
+class RegionalViews:
+    """
+    Regional aggregate tables of the WHO and metrics frames for one data version, with the
+    year fingerprints they were computed from (see the module docstring)
+    """
+
+    __slots__ = ("version", "_tables", "_fingerprints", "refreshed")
+
+    def __init__(self, version, tables, fingerprints, refreshed):
+        self.version = version
+        self._tables = tables
+        self._fingerprints = fingerprints
+        # years recomputed per source when the views were built
+        self.refreshed = refreshed
+
+    @classmethod
+    def build(cls, frames, version, previous=None):
+        """
+        Computes the views of a data version, reusing the unchanged years of previous
+        Args: dict of source name ("who", "metrics") -> DataFrame, data version,
+            optional RegionalViews of an earlier version
+        Returns: RegionalViews
+        """
+        tables, fingerprints, refreshed = {}, {}, {}
+        for source, df in frames.items():
+            columns = indicator_columns(df)
+            prints = year_fingerprints(df, columns, SOURCES[source])
+            old_columns, old_prints = (None, {}) if previous is None \
+                else previous.fingerprints(source)
+            if old_columns == columns:
+                changed = [year for year, value in prints.items()
+                           if old_prints.get(year) != value]
+                table = _refresh(previous.table(source), df, columns, SOURCES[source],
+                                 changed)
+            else:
+                # first build, or the indicators changed: every year is recomputed
+                changed = sorted(prints)
+                table = regional_table(df, columns, SOURCES[source])
+            tables[source], fingerprints[source] = table, (columns, prints)
+            refreshed[source] = sorted(changed)
+        return cls(version, tables, fingerprints, refreshed)
+
+    @property
+    def cache_token(self):
+        """Small hashable stand-in for these views in figure cache keys"""
+        return ("RegionalViews", self.version)
+
+    @property
+    def nbytes(self):
+        """Deep memory usage of the aggregate tables in bytes"""
+        return int(sum(table.memory_usage(deep=True).sum() for table in self._tables.values()))
+
+    def table(self, source):
+        """Aggregate table of a source ("who" or "metrics"), None if it was not built"""
+        return self._tables.get(source)
+
+    def fingerprints(self, source):
+        """Indicator columns and year fingerprints of a source ((None, {}) if not built)"""
+        return self._fingerprints.get(source, (None, {}))
+
+    # pylint: disable-next=too-many-arguments
+    def benchmark(self, source, indicators, regions=None, *, years=None, stat="median"):
+        """
+        One statistic of the regional aggregates
+        Args: source, indicator or list of indicators, regions and years (None = all),
+            statistic (a key of STATS)
+        Returns: pandas DataFrame with region, year, indicator and the statistic as value
+        """
+        table = self._tables[source]
+        indicators = [indicators] if isinstance(indicators, str) else list(indicators)
+        mask = table["indicator"].isin(indicators)
+        if regions is not None:
+            mask &= table["region"].isin([str(region) for region in regions])
+        if years is not None:
+            mask &= table["year"].isin(np.atleast_1d(years))
+        return table.loc[mask, ["region", "year", "indicator", stat]].rename(
+            columns={stat: "value"}).reset_index(drop=True)
+
+
+def materialized_views(df_who, df_metrics, version):
+    """
+    Regional views of a data version, refreshed from the latest views of this process
+    (only the changed years are recomputed) and kept as the new latest views
+    Args: the dashboard's WHO and metrics frames, data version
+    Returns: RegionalViews
+    """
+    with _LOCK:
+        views = RegionalViews.build({"who": df_who, "metrics": df_metrics}, version,
+                                    _LATEST.get("views"))
+        _LATEST["views"] = views
+        return views
@@ -0,0 +1,341 @@
+"""
+Static HTML report (country brief) for every location of the ranked data: the latest score
+and rank, the score and rank history, the workforce spider chart and the workforce of the
+country's regional peers.
+
+The data is loaded once. With several workers it is published as Arrow files (see
+publish.py) that every worker process memory-maps when it starts, so the pool shares one
+copy of the frames; each worker builds its filter indexes once. Locations are handed out
+in order of region, in chunks, so the workers see the countries of one region together:
+the regional chart is the same for all of them, and a worker builds it and renders its
+HTML once, then reuses it in every report of that region.
+
+Reports load plotly.js from one plotly.min.js in the output folder, so the folder works
+offline; --standalone embeds it in every file instead (about 4.5 MB per report). --images
+also writes every chart as a PNG (needs kaleido installed), shown where JavaScript is off.
+
+Command line:
+    python -m hcare.reports --data data/ --out reports/ --workers 8
+or, with frames already published by hcare.publish:
+    python -m hcare.reports --published published/ --out reports/
+"""
+import argparse
+import hashlib
+import html
+import multiprocessing
+import os
+import re
+import shutil
+import tempfile
+import time
+import unicodedata
+
+import plotly.offline
+
+try:
+    from .data_handle import DataHandle
+    from .data_prep import data_version, load_dashboard_data
+    from .figure_cache import make_key
+    from .plots import country_spider, plot_compscore_over_time, plot_metrics_by_country
+    from .publish import open_published, publish
+except ImportError:
+    from data_handle import DataHandle
+    from data_prep import data_version, load_dashboard_data
+    from figure_cache import make_key
+    from plots import country_spider, plot_compscore_over_time, plot_metrics_by_country
+    from publish import open_published, publish
+
+# static images are rendered by kaleido
+try:
+    import kaleido  # pylint: disable=unused-import
+except ImportError:
+    kaleido = None
+
+PLOTLY_JS = "plotly.min.js"
+INDEX_FILE = "index.html"
+IMAGE_DIR = "images"
+
+PAGE = """<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+{script}
+<style>
+body {{font-family: sans-serif; max-width: 1100px; margin: 2em auto; color: #222;}}
+table {{border-collapse: collapse;}}
+td, th {{padding: 0.3em 1em; border-bottom: 1px solid #ddd; text-align: left;}}
+</style>
+</head>
+<body>
+{body}
+</body>
+</html>
+"""
+
+# state of a worker process, set by _attach (or by run_reports when it runs in-process)
+_WORKER = {}
+
+
+def report_file(location):
+    """File name of a location's report, e.g. "Côte d'Ivoire" -> "cote-d-ivoire.html" """
+    text = unicodedata.normalize("NFKD", location)
+    text = "".join(char for char in text if not unicodedata.combining(char)).lower()
+    return re.sub(r"[^0-9a-z]+", "-", text).strip("-") + ".html"
+
+
+def _script(out_dir, standalone):
+    """<script> element that loads plotly.js (from out_dir, or embedded)"""
+    if standalone:
+        return f"<script>{plotly.offline.get_plotlyjs()}</script>"
+    path = os.path.join(out_dir, PLOTLY_JS)
+    if not os.path.exists(path):
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, "w", encoding="utf-8") as handle:
+            handle.write(plotly.offline.get_plotlyjs())
+        os.replace(temporary, path)
+    return f'<script src="{PLOTLY_JS}"></script>'
+
+
+def _write_image(fig, path):
+    """Writes a figure as PNG under a temporary name, unless it already exists"""
+    if not os.path.exists(path):
+        temporary = f"{path}.{os.getpid()}.tmp.png"
+        fig.write_image(temporary)
+        os.replace(temporary, path)
+
+
+# pylint: disable-next=too-many-arguments
+def _chart(name, builder, df, version, *args, out_dir, options, **kwargs):
+    """
+    HTML of one chart, from the worker's fragment cache when the same chart (builder and
+    arguments) was already rendered for an earlier report
+    Returns: (HTML fragment, True when it came from the cache)
+    """
+    fragments = _WORKER.setdefault("fragments", {})
+    key = make_key(builder, version, args, kwargs)
+    if key in fragments:
+        return fragments[key], True
+    fig = builder(df, *args, **kwargs)
+    fragment = fig.to_html(full_html=False, include_plotlyjs=False, div_id=f"chart-{name}")
+    if options.get("images"):
+        image = f"{name}-{hashlib.sha1(repr(key).encode()).hexdigest()[:12]}.png"
+        _write_image(fig, os.path.join(out_dir, IMAGE_DIR, image))
+        fragment += f'<noscript><img src="{IMAGE_DIR}/{image}" alt="{name}"></noscript>'
+    fragments[key] = fragment
+    return fragment, False
+
+
+def _summary(df_metrics, idx_metrics, location):
+    """Latest ranked year of a location as a dict of the report's summary values"""
+    year = idx_metrics.values("year", location=location)[-1]
+    row = df_metrics.iloc[idx_metrics.positions(location=location, year=year)[0]]
+    summary = {"year": int(year), "region": row.get("region"),
+               "score": float(row["composite_score"]), "rank": int(row["rank"]),
+               "ranked": len(idx_metrics.positions(year=year))}
+    if "rank_lower" in row.index:
+        summary["interval"] = (int(row["rank_lower"]), int(row["rank_upper"]))
+    return summary
+
+
+def _charts(handle, location, out_dir, options):
+    """(title, (HTML fragment, reused)) of every chart of a location's report"""
+    _, df_who, df_metrics = handle.views()
+    _, idx_who, idx_metrics = handle.indexes
+    chart_args = {"out_dir": out_dir, "options": options}
+    charts = [("Score history", _chart(
+        "score", plot_compscore_over_time, df_metrics, handle.version, "composite_score",
+        [location], index=idx_metrics, **chart_args)),
+              ("Rank history", _chart(
+        "rank", plot_compscore_over_time, df_metrics, handle.version, "rank", [location],
+        index=idx_metrics, **chart_args))]
+    who_years = idx_who.values("year", location=location)
+    if who_years:
+        charts.append(("Workforce", _chart(
+            "spider", country_spider, df_who, handle.version, location, who_years[-1],
+            index=idx_who, **chart_args)))
+        # the same chart for every country of the region: built once per worker
+        region = df_who["Region"].iloc[idx_who.positions(location=location)[0]]
+        peers = idx_who.locations(year=who_years[-1], regions=[region])
+        charts.append((f"Workforce in {region}", _chart(
+            "region", plot_metrics_by_country, df_who, handle.version,
+            selected_yr=who_years[-1], selected_place=(peers, None), index=idx_who,
+            **chart_args)))
+    return charts
+
+
+def render_report(handle, location, out_dir, options=None):
+    """
+    Writes the report of one location
+    Args: DataHandle of the processed frames, location, output folder, dict of options
+        (standalone, images)
+    Returns: dict with the location, file, summary values, seconds and the number of
+        charts reused from earlier reports
+    """
+    start_time = time.perf_counter()
+    options = options or {}
+    summary = _summary(handle.views()[2], handle.indexes[2], location)
+    charts = _charts(handle, location, out_dir, options)
+
+    interval = summary.get("interval")
+    rows = [("Region", summary["region"]), ("Year", summary["year"]),
+            ("Composite score", f"{summary['score']:.3f}"),
+            ("Rank", f"{summary['rank']} of {summary['ranked']}"
+             + (f" (95% interval: {interval[0]} to {interval[1]})" if interval else ""))]
+    body = [f"<h1>{html.escape(location)}</h1>", "<table>"]
+    body += [f"<tr><th>{name}</th><td>{html.escape(str(value))}</td></tr>"
+             for name, value in rows]
+    body.append("</table>")
+    for title, (fragment, _) in charts:
+        body += [f"<h2>{html.escape(title)}</h2>", fragment]
+    body.append(f"<p>Data version {html.escape(str(handle.version))}. "
+                + "The ranking is based on a limited set of indicators and is not definitive."
+                + "</p>")
+
+    file_name = report_file(location)
+    page = PAGE.format(title=html.escape(location),
+                       script=_script(out_dir, options.get("standalone")),
+                       body="\n".join(body))
+    with open(os.path.join(out_dir, file_name), "w", encoding="utf-8") as handle_out:
+        handle_out.write(page)
+    return {"location": location, "file": file_name, **summary,
+            "reused": sum(cached for _, (_, cached) in charts),
+            "seconds": round(time.perf_counter() - start_time, 3)}
+
+
+def _attach(published_dir, version, out_dir, options):
+    """Pool initializer: maps the published frames and builds their indexes once"""
+    frames, version = open_published(published_dir, version)
+    _WORKER.update(handle=DataHandle(*frames, version), out_dir=out_dir, options=options)
+
+
+def _render_task(location):
+    """Writes one report with the data of this worker process"""
+    return render_report(_WORKER["handle"], location, _WORKER["out_dir"], _WORKER["options"])
+
+
+def write_index(out_dir, results, version):
+    """Writes index.html: every report, by rank in its latest year"""
+    results = sorted(results, key=lambda result: (-result["year"], result["rank"]))
+    rows = "\n".join(
+        f'<tr><td>{result["rank"]}</td><td><a href="{result["file"]}">'
+        f'{html.escape(result["location"])}</a></td><td>{html.escape(str(result["region"]))}'
+        f'</td><td>{result["year"]}</td><td>{result["score"]:.3f}</td></tr>'
+        for result in results)
+    body = (f"<h1>Country reports</h1><p>Data version {html.escape(str(version))}</p>"
+            "<table><tr><th>Rank</th><th>Location</th><th>Region</th><th>Year</th>"
+            f"<th>Score</th></tr>\n{rows}</table>")
+    with open(os.path.join(out_dir, INDEX_FILE), "w", encoding="utf-8") as handle:
+        handle.write(PAGE.format(title="Country reports", script="", body=body))
+
+
+def _regions_first(handle, locations):
+    """Locations ordered by region (then name), so a region's reports run together"""
+    df_metrics = handle.views()[2]
+    regions = dict(zip(df_metrics["location"].astype(str), df_metrics["region"].astype(str)))
+    return sorted(locations, key=lambda location: (regions.get(location, ""), location))
+
+
+# pylint: disable-next=too-many-arguments,too-many-locals
+def run_reports(frames, out_dir, version, *, locations=None, workers=None, published=None,
+                options=None, progress=None):
+    """
+    Writes the report of every location and the index page
+    Args: (IHME, WHO, metrics) DataFrames as returned by load_dashboard_data, output folder,
+        data version, locations (default: every ranked location), number of worker
+        processes (default: one per CPU; 1 = run in this process), folder the frames are
+        already published to (default: a temporary one), options (standalone, images),
+        function called with each finished report's result and the count done so far
+    Returns: dict with the number of reports, the charts reused, the seconds of the run and
+        the mean seconds per report
+    """
+    options = options or {}
+    if options.get("images") and kaleido is None:
+        raise ImportError("writing static images needs kaleido installed")
+    start_time = time.perf_counter()
+    os.makedirs(os.path.join(out_dir, IMAGE_DIR) if options.get("images") else out_dir,
+                exist_ok=True)
+    handle = DataHandle(*frames, version)
+    ranked = handle.indexes[2].values("location")
+    if locations is None:
+        locations = ranked
+    unknown = set(locations) - set(ranked)
+    if unknown:
+        raise ValueError(f"no ranked data for {sorted(unknown)}")
+    locations = _regions_first(handle, locations)
+    workers = min(workers or os.cpu_count() or 1, max(len(locations), 1))
+
+    results, pool, temporary = [], None, None
+    try:
+        if workers <= 1:
+            _WORKER.update(handle=handle, out_dir=out_dir, options=options)
+            finished = map(_render_task, locations)
+        else:
+            if published is None:
+                temporary = tempfile.mkdtemp(prefix="hcare-reports-")
+                publish(frames, temporary, version)
+                published = temporary
+            # pylint: disable-next=consider-using-with
+            pool = multiprocessing.Pool(workers, _attach,
+                                        (published, version, out_dir, options))
+            # chunks keep neighbouring (same region) locations on one worker
+            finished = pool.imap_unordered(_render_task, locations,
+                                           chunksize=max(1, len(locations) // (workers * 4)))
+        for result in finished:
+            results.append(result)
+            if progress is not None:
+                progress(result, len(results), len(locations))
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+        if temporary is not None:
+            shutil.rmtree(temporary, ignore_errors=True)
+        _WORKER.clear()
+    write_index(out_dir, results, version)
+    seconds = time.perf_counter() - start_time
+    return {"reports": len(results), "reused": sum(result["reused"] for result in results),
+            "seconds": round(seconds, 3),
+            "seconds_per_report": round(sum(result["seconds"] for result in results)
+                                        / max(len(results), 1), 3)}
+
+
+def _print_progress(result, done, total):
+    """Progress line of one finished report"""
+    print(f"[{done}/{total}] {result['location']}: {result['seconds']:.2f} s", flush=True)
+
+
+def main(argv=None):
+    """Command line entry point for the report generator"""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n", maxsplit=1)[0])
+    parser.add_argument("--data", default="data/", help="folder with the source files")
+    parser.add_argument("--published", default=None,
+                        help="folder of frames published by hcare.publish (instead of --data)")
+    parser.add_argument("--out", default="reports/", help="output folder")
+    parser.add_argument("--workers", type=int, default=None, help="default: one per CPU")
+    parser.add_argument("--location", action="append",
+                        help="report only this location (repeatable)")
+    parser.add_argument("--standalone", action="store_true",
+                        help="embed plotly.js in every report")
+    parser.add_argument("--images", action="store_true",
+                        help="also write the charts as PNG images (needs kaleido)")
+    args = parser.parse_args(argv)
+
+    start_time = time.perf_counter()
+    if args.published:
+        frames, version = open_published(args.published)
+        published = args.published
+    else:
+        frames, version, published = load_dashboard_data(args.data), \
+            data_version(args.data), None
+    print(f"Loaded data version {version} in {time.perf_counter() - start_time:.1f} s")
+    summary = run_reports(frames, args.out, version, locations=args.location,
+                          workers=args.workers, published=published,
+                          options={"standalone": args.standalone, "images": args.images},
+                          progress=_print_progress)
+    print(f"{summary['reports']} reports written to {args.out} in {summary['seconds']} s "
+          f"({summary['seconds_per_report']} s per report, {summary['reused']} charts reused)")
+
+
+if __name__ == '__main__':
+    main()
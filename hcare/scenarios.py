@@ -0,0 +1,393 @@
+"""
+Scenario grid runner for the ranking: every scenario is one choice of indicators,
+normalization ("minmax" as in ranking.py, "zscore" or "rank"), weighting ("pca" as in
+ranking.py, or "equal") and year range, scored and ranked per year like
+process_ranking_pipeline.
+
+Normalizing is per year and per indicator, so every indicator subset and year range of a
+scenario is a slice of the same normalized matrix. That matrix (normalizations x rows x
+indicators, rows sorted by year) is computed once and placed in shared memory; the worker
+processes of the pool attach to it when they start, and the tasks only carry the few numbers
+that describe a scenario. The PCA weights of all years of a scenario come from one batched
+eigendecomposition of the per-year covariance matrices.
+
+Results (scenario_id, year, location, composite_score, rank) are streamed to Parquet files in
+the output folder as scenarios finish, each written to a hidden temporary name and renamed
+when complete. A rerun with the same folder skips the scenarios already in it, so an
+interrupted grid resumes where it stopped. pd.read_parquet(out_dir) reads all results;
+_grid.json lists the parameters of every scenario id.
+
+Command line:
+    python -m hcare.scenarios --grid grid.json --out scenarios/ --workers 8
+with a grid file giving the options to combine (null = all indicators / all years), e.g.
+    {"indicators": [null, ["deaths", "medical doctors per 10,000"]],
+     "normalization": ["minmax", "zscore", "rank"], "weighting": ["pca", "equal"],
+     "years": [null, [2010, 2019]]}
+"""
+import argparse
+import hashlib
+import itertools
+import json
+import multiprocessing
+import os
+import time
+from collections import namedtuple
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:
+    pq = None
+
+try:
+    from .data_prep import merge_sources
+    from .manifest import DEFAULT_MANIFEST, load_manifest, parse_manifest, ranking_columns
+    from .ranking import pca_weights, rank_within
+except ImportError:
+    from data_prep import merge_sources
+    from manifest import DEFAULT_MANIFEST, load_manifest, parse_manifest, ranking_columns
+    from ranking import pca_weights, rank_within
+
+NORMALIZATIONS = ("minmax", "zscore", "rank")
+WEIGHTINGS = ("pca", "equal")
+RESULT_COLUMNS = ["scenario_id", "year", "location", "composite_score", "rank"]
+GRID_FILE = "_grid.json"
+# scenarios per output file
+FLUSH_EVERY = 64
+
+Scenario = namedtuple("Scenario", ["indicators", "normalization", "weighting", "years"],
+                      defaults=[None, "minmax", "pca", None])
+Scenario.__doc__ = """
+One ranking scenario: tuple of indicator columns (None = all), normalization, weighting and
+(first, last) year range (None = all years)"""
+
+# normalized matrix and year boundaries of a worker process, set by _attach
+_WORKER = {}
+
+
+def expand_grid(spec):
+    """
+    Every combination of the options of a grid
+    Args: dict of Scenario field -> list of options (missing fields take the default)
+    Returns: list of Scenario
+    """
+    unknown = set(spec) - set(Scenario._fields)
+    if unknown:
+        raise ValueError(f"unknown scenario fields {sorted(unknown)}")
+    options = [spec.get(field, [default]) for field, default in Scenario()._asdict().items()]
+    scenarios = []
+    for indicators, normalization, weighting, years in itertools.product(*options):
+        scenarios.append(Scenario(
+            None if indicators is None else tuple(col.strip().lower() for col in indicators),
+            normalization, weighting, None if years is None else tuple(years)))
+    return scenarios
+
+
+def scenario_id(scenario):
+    """Stable short id of a scenario (the same parameters always give the same id)"""
+    text = json.dumps(list(scenario), separators=(",", ":"))
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:12]
+
+
+def _normalize(df, columns, method, year="year"):
+    """
+    Normalizes columns within each year
+    Returns: float array of rows x columns; minmax and rank (of the average ranks) are in
+        [0, 1] and zscore has mean 0 and standard deviation 1; constant columns give 0
+    """
+    groups = df.groupby(year)[columns]
+    values = df[columns]
+    if method == "minmax":
+        low = groups.transform("min")
+        spread = groups.transform("max") - low
+        # like MinMaxScaler, a zero range leaves the values minus the minimum (all 0)
+        return ((values - low) / spread.where(spread > 0, 1.0)).to_numpy(dtype=np.float64)
+    if method == "zscore":
+        spread = groups.transform(lambda col: col.std(ddof=0))
+        return ((values - groups.transform("mean")) /
+                spread.where(spread > 0, 1.0)).to_numpy(dtype=np.float64)
+    ranks = groups.rank() - 1
+    spread = groups.transform("count") - 1
+    return (ranks / spread.where(spread > 0, 1.0)).to_numpy(dtype=np.float64)
+
+
+def grid_indicators(scenarios):
+    """Indicator columns the scenarios use together (None when one of them uses all)"""
+    if any(scenario.indicators is None for scenario in scenarios):
+        return None
+    return sorted({col for scenario in scenarios for col in scenario.indicators})
+
+
+def prepare_inputs(df, positive_cols=None, negative_cols=None, indicators=None):
+    """
+    Normalized indicator matrix of the merged panel for every normalization, with the
+    negative indicators turned around so that higher always means better.
+    The rows are the location-years with a value for every indicator in indicators (the
+    ones the scenario grid uses, see grid_indicators), so every scenario of a grid ranks the
+    same rows and a location-year missing only indicators no scenario uses is kept.
+    Args: merged (not yet ranked) DataFrame with location, year and the indicator columns,
+        positive / negative indicator columns (default: those of the default manifest),
+        indicator columns a row must have (default: all)
+    Returns: dict with columns (indicator names, lower case), locations and years (per row,
+        sorted by year), year_values and starts (row where each year starts, plus the end)
+        and matrix (normalizations x rows x indicators)
+    """
+    if positive_cols is None or negative_cols is None:
+        defaults = ranking_columns(parse_manifest(DEFAULT_MANIFEST))
+        positive_cols = defaults[0] if positive_cols is None else positive_cols
+        negative_cols = defaults[1] if negative_cols is None else negative_cols
+    negative_cols = [col.strip().lower() for col in negative_cols]
+    columns = negative_cols + [col.strip().lower() for col in positive_cols]
+    df = df.rename(columns=lambda col: col.strip().lower())
+    # the ranking uses complete location-years only; unknown indicators are reported by
+    # _tasks
+    if indicators is not None:
+        indicators = {name.strip().lower() for name in indicators}
+    df = df.dropna(subset=[col for col in columns if indicators is None or col in indicators])
+    df = df.sort_values(["year", "location"], kind="stable")
+    df = df.reset_index(drop=True)
+    negative = np.isin(columns, negative_cols)
+    matrix = np.empty((len(NORMALIZATIONS), len(df), len(columns)))
+    for number, method in enumerate(NORMALIZATIONS):
+        values = _normalize(df, columns, method)
+        # ranking.py subtracts negative indicators from 1; a z-score changes sign
+        flipped = -values if method == "zscore" else 1 - values
+        matrix[number] = np.where(negative, flipped, values)
+    years = df["year"].to_numpy(dtype=np.int64)
+    year_values, starts = np.unique(years, return_index=True)
+    return {"columns": columns, "locations": df["location"].astype(str).to_numpy(),
+            "years": years, "year_values": year_values,
+            "starts": np.append(starts, len(years)), "matrix": matrix}
+
+
+def _tasks(scenarios, columns):
+    """
+    Tasks of the scenarios: (id, column positions, normalization number, weighting,
+    first year, last year)
+    """
+    tasks = []
+    for scenario in scenarios:
+        indicators = columns if scenario.indicators is None else scenario.indicators
+        missing = [col for col in indicators if col not in columns]
+        if missing or not indicators:
+            raise ValueError(f"scenario indicators must be some of {columns}, not {missing}")
+        if scenario.normalization not in NORMALIZATIONS:
+            raise ValueError(f"normalization must be one of {NORMALIZATIONS}")
+        if scenario.weighting not in WEIGHTINGS:
+            raise ValueError(f"weighting must be one of {WEIGHTINGS}")
+        first, last = scenario.years or (None, None)
+        tasks.append((scenario_id(scenario), tuple(columns.index(col) for col in indicators),
+                      NORMALIZATIONS.index(scenario.normalization), scenario.weighting,
+                      first, last))
+    return tasks
+
+
+# pylint: disable-next=too-many-locals
+def score_scenario(matrix, year_values, starts, task):
+    """
+    Composite scores and ranks of one scenario
+    Args: normalized matrix and year boundaries (see prepare_inputs), task (see _tasks)
+    Returns: (scenario id, first row, composite scores and ranks of the rows from the first
+        row on)
+    """
+    sid, cols, normalization, weighting, first, last = task
+    low = 0 if first is None else np.searchsorted(year_values, first, side="left")
+    high = len(year_values) if last is None else np.searchsorted(year_values, last,
+                                                                 side="right")
+    if high <= low:
+        return sid, 0, np.empty(0), np.empty(0, dtype=np.int32)
+    values = matrix[normalization, starts[low]:starts[high]][:, list(cols)]
+    year_starts = starts[low:high] - starts[low]
+    counts = np.diff(starts[low:high + 1])
+    if weighting == "pca":
+        weights = pca_weights(values, year_starts)
+    else:
+        weights = np.full((high - low, len(cols)), 1 / len(cols))
+    scores = (values * np.repeat(weights, counts, axis=0)).sum(axis=1)
+    return sid, starts[low], scores, rank_within(scores, np.repeat(np.arange(high - low),
+                                                                   counts))
+
+
+def _attach(name, shape, year_values, starts):
+    """Pool initializer: maps the shared normalized matrix into the worker process"""
+    block = shared_memory.SharedMemory(name=name)
+    _WORKER.update(block=block, matrix=np.ndarray(shape, dtype=np.float64, buffer=block.buf),
+                   year_values=year_values, starts=starts)
+
+
+def _run_task(task):
+    """Scores one scenario on the matrix of this worker process"""
+    return score_scenario(_WORKER["matrix"], _WORKER["year_values"], _WORKER["starts"], task)
+
+
+def _fingerprint(inputs):
+    """Hash of the prepared inputs, to tell whether an output folder was written from them"""
+    digest = hashlib.sha1(json.dumps(inputs["columns"]).encode("utf-8"))
+    digest.update("\n".join(inputs["locations"]).encode("utf-8"))
+    for key in ("years", "matrix"):
+        digest.update(np.ascontiguousarray(inputs[key]).tobytes())
+    return digest.hexdigest()
+
+
+def _part_files(out_dir):
+    """Finished result files of an output folder, in the order they were written"""
+    return sorted(os.path.join(out_dir, name) for name in os.listdir(out_dir)
+                  if name.startswith("part-") and name.endswith(".parquet"))
+
+
+def finished_ids(out_dir):
+    """Ids of the scenarios with results in an output folder"""
+    done = set()
+    for path in _part_files(out_dir):
+        done.update(pq.read_table(path, columns=["scenario_id"]).column(0).unique().to_pylist())
+    return done
+
+
+def _write_json(path, content):
+    """Writes a JSON file through a temporary file, so it is never left half written"""
+    temporary = os.path.join(os.path.dirname(path), "." + os.path.basename(path) + ".tmp")
+    with open(temporary, "w", encoding="utf-8") as handle:
+        json.dump(content, handle, indent=1)
+    os.replace(temporary, path)
+
+
+def _open_output(out_dir, inputs, scenarios):
+    """
+    Creates or checks the output folder and records the scenarios in its grid file
+    Returns: number of the next result file
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    path = os.path.join(out_dir, GRID_FILE)
+    grid = {"fingerprint": _fingerprint(inputs), "indicators": inputs["columns"],
+            "scenarios": {}}
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as handle:
+            grid = json.load(handle)
+        if grid["fingerprint"] != _fingerprint(inputs):
+            raise ValueError(f"{out_dir} holds results of different data; use a new folder")
+    grid["scenarios"].update({scenario_id(scenario): scenario._asdict()
+                              for scenario in scenarios})
+    _write_json(path, grid)
+    # leftovers of an interrupted write
+    for name in os.listdir(out_dir):
+        if name.startswith(".part-"):
+            os.remove(os.path.join(out_dir, name))
+    parts = _part_files(out_dir)
+    return int(os.path.basename(parts[-1])[5:-8]) + 1 if parts else 0
+
+
+def _write_part(out_dir, number, results, inputs):
+    """
+    Writes the results of finished scenarios to the next result file
+    Returns: number of rows written
+    """
+    lengths = [len(scores) for _, _, scores, _ in results]
+    rows = np.concatenate([np.arange(start, start + length)
+                           for (_, start, _, _), length in zip(results, lengths)])
+    table = pd.DataFrame({
+        "scenario_id": np.repeat([sid for sid, *_ in results], lengths),
+        "year": inputs["years"][rows],
+        "location": inputs["locations"][rows],
+        "composite_score": np.concatenate([scores for _, _, scores, _ in results]),
+        "rank": np.concatenate([ranks for *_, ranks in results]),
+    }, columns=RESULT_COLUMNS)
+    name = f"part-{number:05d}.parquet"
+    temporary = os.path.join(out_dir, "." + name + ".tmp")
+    table.to_parquet(temporary, engine="pyarrow", index=False)
+    os.replace(temporary, os.path.join(out_dir, name))
+    return len(rows)
+
+
+# pylint: disable-next=too-many-arguments,too-many-locals
+def run_grid(df, scenarios, out_dir, *, positive_cols=None, negative_cols=None,
+             workers=None, flush_every=FLUSH_EVERY):
+    """
+    Scores and ranks every scenario and streams the results to out_dir, skipping the
+    scenarios already there
+    Args: merged (not yet ranked) DataFrame, list of Scenario, output folder, indicator
+        directions as in prepare_inputs, number of worker processes (default: one per CPU;
+        1 = run in this process), scenarios per result file
+    Returns: dict with the number of scenarios, skipped scenarios (already done or listed
+        twice), rows written and seconds
+    """
+    if pq is None:
+        raise ImportError("the scenario runner needs pyarrow installed")
+    start_time = time.perf_counter()
+    inputs = prepare_inputs(df, positive_cols, negative_cols, grid_indicators(scenarios))
+    tasks = _tasks(scenarios, inputs["columns"])
+    number = _open_output(out_dir, inputs, scenarios)
+    done = finished_ids(out_dir)
+    # the same scenario listed twice runs once
+    todo = list({task[0]: task for task in tasks if task[0] not in done}.values())
+    workers = min(workers or os.cpu_count() or 1, max(len(todo), 1))
+
+    rows, buffer, block, pool = 0, [], None, None
+    try:
+        if workers <= 1:
+            _WORKER.update(matrix=inputs["matrix"], year_values=inputs["year_values"],
+                           starts=inputs["starts"])
+            results = map(_run_task, todo)
+        else:
+            block = shared_memory.SharedMemory(create=True, size=inputs["matrix"].nbytes)
+            np.ndarray(inputs["matrix"].shape, dtype=np.float64,
+                       buffer=block.buf)[:] = inputs["matrix"]
+            # pylint: disable-next=consider-using-with
+            pool = multiprocessing.Pool(workers, _attach, (
+                block.name, inputs["matrix"].shape, inputs["year_values"], inputs["starts"]))
+            results = pool.imap_unordered(_run_task, todo,
+                                          chunksize=max(1, len(todo) // (workers * 8)))
+        for result in results:
+            buffer.append(result)
+            if len(buffer) >= flush_every:
+                rows += _write_part(out_dir, number, buffer, inputs)
+                number, buffer = number + 1, []
+    finally:
+        # finished scenarios are kept even when the run is interrupted
+        if buffer:
+            rows += _write_part(out_dir, number, buffer, inputs)
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+        if block is not None:
+            block.close()
+            block.unlink()
+        _WORKER.clear()
+    return {"scenarios": len(tasks), "skipped": len(tasks) - len(todo), "rows": rows,
+            "seconds": round(time.perf_counter() - start_time, 3)}
+
+
+def read_grid(out_dir):
+    """
+    Parameters of every scenario of an output folder
+    Returns: pandas DataFrame indexed by scenario_id
+    """
+    with open(os.path.join(out_dir, GRID_FILE), encoding="utf-8") as handle:
+        scenarios = json.load(handle)["scenarios"]
+    return pd.DataFrame.from_dict(scenarios, orient="index").rename_axis("scenario_id")
+
+
+def main(argv=None):
+    """Command line entry point for the scenario runner"""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n", maxsplit=1)[0])
+    parser.add_argument("--data", default="data/", help="folder with the source files")
+    parser.add_argument("--grid", required=True, help="JSON file with the scenario options")
+    parser.add_argument("--out", required=True, help="output folder (reruns resume it)")
+    parser.add_argument("--workers", type=int, default=None, help="default: one per CPU")
+    args = parser.parse_args(argv)
+
+    with open(args.grid, encoding="utf-8") as handle:
+        scenarios = expand_grid(json.load(handle))
+    manifest = load_manifest(args.data)
+    _, _, merged = merge_sources(args.data, manifest)
+    positive_cols, negative_cols = ranking_columns(manifest)
+    summary = run_grid(merged, scenarios, args.out, positive_cols=positive_cols,
+                       negative_cols=negative_cols, workers=args.workers)
+    print(f"{summary['scenarios']} scenarios ({summary['skipped']} already done), "
+          f"{summary['rows']} rows written to {args.out} in {summary['seconds']} s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,429 @@
+"""
+Versioned snapshot store of the WHO and IHME source files. Every ingested release (e.g. a
+WHO "December 2024 update" together with an IHME GBD round) stays available, so two releases
+can be compared and the ranking can be rerun on an old release without its CSV files.
+
+Each source file is reduced to the columns the pipeline reads, sorted by its key
+(indicator, location, period) and cut into blocks of a few locations of one indicator. The
+cut points are the locations whose name hash is divisible by BLOCK_LOCATIONS, so adding,
+removing or editing a country only changes the block it falls in. A block is named by the
+hash of its contents and stored once, however many releases contain it: the blocks that are
+new in an ingest are written together to one Parquet pack (packs/<hash>.parquet), index.json
+gives the pack and rows of every block, and a release (releases/<name>.json) lists the
+block hashes of each of its files with the manifest and location aliases it was read with.
+
+Two releases are compared block by block. Blocks with the same hash are skipped without
+being read, so the cost of a diff grows with the blocks that changed, not with the size of
+the releases.
+
+Command line:
+    python -m hcare.snapshots ingest --data data/ --name 2024-12
+    python -m hcare.snapshots list
+    python -m hcare.snapshots diff 2024-06 2024-12
+    python -m hcare.snapshots ranks 2024-06 2024-12
+"""
+import argparse
+import hashlib
+import json
+import os
+import time
+from collections import namedtuple
+from functools import reduce
+
+import numpy as np
+import pandas as pd
+
+try:
+    from .data_prep import read_sources, process_healthcare_data
+    from .locations import ALIAS_FILE, REPORT_COLUMNS, load_aliases
+    from .manifest import DEFAULT_MANIFEST, MANIFEST_FILE, parse_manifest, source_files
+except ImportError:
+    from data_prep import read_sources, process_healthcare_data
+    from locations import ALIAS_FILE, REPORT_COLUMNS, load_aliases
+    from manifest import DEFAULT_MANIFEST, MANIFEST_FILE, parse_manifest, source_files
+
+# the store is written as Parquet files
+try:
+    import pyarrow.parquet as pq
+except ImportError:
+    pq = None
+
+STORE_DIR = "snapshots"
+INDEX_FILE = "index.json"
+# expected number of locations per block
+BLOCK_LOCATIONS = 16
+DIFF_COLUMNS = ["file", "indicator", "location", "period", "change", "column", "old", "new"]
+
+# columns kept from a source file: the ones naming the indicator, the location and period
+# columns, and the value columns compared between releases
+Schema = namedtuple("Schema", ["indicator", "location", "period", "values"])
+SCHEMAS = {
+    "who": Schema(["IndicatorCode"], "Location", "Period", ["ParentLocation", "Value"]),
+    "ihme": Schema(["measure", "cause", "sex", "age", "metric"], "location", "year",
+                   ["val", "upper", "lower"]),
+}
+
+
+def file_schema(file_name, manifest):
+    """Schema of a source file of the manifest (IHME files or WHO GHO files)"""
+    return SCHEMAS["ihme" if file_name in manifest.ihme_files else "who"]
+
+
+def canonical_table(df, schema):
+    """
+    Keeps the schema's columns of a source file and sorts the rows by key
+    Args: pandas DataFrame as read from the file, Schema
+    Returns: pandas DataFrame (indicator columns the file does not have are left out)
+    """
+    missing = {schema.location, schema.period} - set(df.columns)
+    if missing:
+        raise ValueError(f"source file is missing the key columns {sorted(missing)}")
+    indicator = [col for col in schema.indicator if col in df.columns]
+    keys = indicator + [schema.location, schema.period]
+    table = df[keys + [col for col in schema.values if col in df.columns]]
+    return table.sort_values(keys, kind="stable").reset_index(drop=True)
+
+
+def block_bounds(table, schema):
+    """
+    Cuts a canonical table into blocks: a new block starts at every indicator and at every
+    location whose name hash is divisible by BLOCK_LOCATIONS
+    Returns: numpy array of the start rows of the blocks, followed by the number of rows
+    """
+    if table.empty:
+        return np.array([0])
+    indicator = [col for col in schema.indicator if col in table.columns]
+    location = table[schema.location].astype(str).to_numpy(dtype=object)
+    series = table.groupby(indicator + [schema.location], sort=False, dropna=False).ngroup()
+    starts = np.diff(series.to_numpy(), prepend=-1) != 0
+    starts &= pd.util.hash_array(location) % BLOCK_LOCATIONS == 0
+    if indicator:
+        groups = table.groupby(indicator, sort=False, dropna=False).ngroup().to_numpy()
+        starts |= np.diff(groups, prepend=-1) != 0
+    starts[0] = True
+    return np.append(np.flatnonzero(starts), len(table))
+
+
+def block_hash(block):
+    """Content hash of a block (its column names and values)"""
+    digest = hashlib.sha1(json.dumps(list(block.columns)).encode("utf-8"))
+    digest.update(pd.util.hash_pandas_object(block, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def _read_json(path, default=None):
+    """Parsed JSON file, or default when it does not exist"""
+    if not os.path.exists(path):
+        return default
+    with open(path, encoding="utf-8") as handle:
+        return json.load(handle)
+
+
+def _write_json(path, content):
+    """Writes a JSON file under a temporary name and renames it when complete"""
+    temporary = f"{path}.tmp"
+    with open(temporary, "w", encoding="utf-8") as handle:
+        json.dump(content, handle, indent=1)
+    os.replace(temporary, path)
+
+
+def _release_path(store_dir, name):
+    """Path of the JSON file of a release"""
+    return os.path.join(store_dir, "releases", f"{name}.json")
+
+
+def read_release(store_dir, name):
+    """
+    Reads the description of a stored release
+    Returns: dict with the release's name, labels, manifest, aliases and block lists
+    """
+    release = _read_json(_release_path(store_dir, name))
+    if release is None:
+        raise KeyError(f"no release {name!r} in {store_dir}")
+    return release
+
+
+def _write_pack(store_dir, blocks, index):
+    """Writes the new blocks of one schema to a pack file and adds them to the index"""
+    hashes = [digest for digest, _ in blocks]
+    name = hashlib.sha1("".join(hashes).encode("utf-8")).hexdigest()[:16]
+    path = os.path.join(store_dir, "packs", f"{name}.parquet")
+    pack = pd.concat([block for _, block in blocks], ignore_index=True)
+    pack.to_parquet(f"{path}.tmp", engine="pyarrow", index=False)
+    os.replace(f"{path}.tmp", path)
+    start = 0
+    for digest, block in blocks:
+        index[digest] = [name, start, len(block)]
+        start += len(block)
+
+
+def _store_blocks(df, schema, index, new_blocks):
+    """
+    Cuts the canonical table of a source file into blocks and collects the blocks the index
+    does not have
+    Args: pandas DataFrame as read from the file, its Schema, the store index, dict of
+        columns -> {hash: block} that receives the new blocks
+    Returns: dict with the file's columns, number of rows and block hashes
+    """
+    table = canonical_table(df, schema)
+    bounds = block_bounds(table, schema)
+    blocks = []
+    for start, stop in zip(bounds[:-1], bounds[1:]):
+        block = table.iloc[start:stop].reset_index(drop=True)
+        digest = block_hash(block)
+        blocks.append(digest)
+        if digest not in index:
+            new_blocks.setdefault(tuple(table.columns), {})[digest] = block
+    return {"columns": list(table.columns), "rows": len(table), "blocks": blocks}
+
+
+def ingest(file_path, name, store_dir=STORE_DIR):
+    """
+    Stores the source files of a data folder as a release
+    Args: path to the data folder, release name (e.g. "2024-12"), path to the store
+    Returns: dict describing the release, with the number of rows that were new to the store
+    """
+    if pq is None:
+        raise ImportError("the snapshot store needs pyarrow installed")
+    if os.path.exists(_release_path(store_dir, name)):
+        raise ValueError(f"release {name!r} already exists in {store_dir}")
+    raw_manifest = _read_json(os.path.join(file_path, MANIFEST_FILE), DEFAULT_MANIFEST)
+    manifest = parse_manifest(raw_manifest)
+    frames = read_sources(file_path, source_files(manifest))
+    os.makedirs(os.path.join(store_dir, "packs"), exist_ok=True)
+    os.makedirs(os.path.join(store_dir, "releases"), exist_ok=True)
+    index = _read_json(os.path.join(store_dir, INDEX_FILE), {})
+
+    files, new_blocks, labels = {}, {}, set()
+    for file_name, df in frames.items():
+        if "DataSource" in df.columns:
+            labels.update(df["DataSource"].dropna().astype(str).unique())
+        files[file_name] = _store_blocks(df, file_schema(file_name, manifest), index,
+                                         new_blocks)
+    for blocks in new_blocks.values():
+        _write_pack(store_dir, list(blocks.items()), index)
+    _write_json(os.path.join(store_dir, INDEX_FILE), index)
+
+    aliases = load_aliases(os.path.join(file_path, ALIAS_FILE))
+    release = {
+        "name": name,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "labels": sorted(labels),
+        "new_rows": sum(len(block) for blocks in new_blocks.values()
+                        for block in blocks.values()),
+        "manifest": raw_manifest,
+        "aliases": aliases.astype(object).where(aliases.notna(), None).to_dict("records"),
+        "files": files,
+    }
+    _write_json(_release_path(store_dir, name), release)
+    return release
+
+
+def list_releases(store_dir=STORE_DIR):
+    """
+    Lists the stored releases, oldest first
+    Returns: pandas DataFrame with name, created, labels, rows and new_rows per release
+    """
+    folder = os.path.join(store_dir, "releases")
+    names = [name[:-len(".json")] for name in os.listdir(folder) if name.endswith(".json")] \
+        if os.path.isdir(folder) else []
+    rows = []
+    for name in names:
+        release = read_release(store_dir, name)
+        rows.append({"name": name, "created": release["created"],
+                     "labels": "; ".join(release["labels"]),
+                     "rows": sum(entry["rows"] for entry in release["files"].values()),
+                     "new_rows": release["new_rows"]})
+    columns = ["name", "created", "labels", "rows", "new_rows"]
+    return pd.DataFrame(rows, columns=columns).sort_values(["created", "name"],
+                                                           ignore_index=True)
+
+
+class BlockReader:
+    """Reads blocks of a store, reading each pack file once"""
+
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+        self.index = _read_json(os.path.join(store_dir, INDEX_FILE), {})
+        self.packs = {}
+
+    def pack(self, name):
+        """Arrow table of a pack file (read on first use)"""
+        if name not in self.packs:
+            self.packs[name] = pq.read_table(
+                os.path.join(self.store_dir, "packs", f"{name}.parquet"))
+        return self.packs[name]
+
+    def read(self, hashes, columns):
+        """
+        Rows of several blocks, in the order given
+        Args: list of block hashes, columns of the file they belong to
+        Returns: pandas DataFrame
+        """
+        # consecutive blocks of the same pack are taken from it at once, and only the
+        # rows taken are converted to pandas
+        runs = []
+        for digest in hashes:
+            pack, start, rows = self.index[digest]
+            if not runs or runs[-1][0] != pack:
+                runs.append((pack, []))
+            runs[-1][1].append(np.arange(start, start + rows))
+        parts = [self.pack(pack).take(np.concatenate(ranges)).to_pandas()
+                 for pack, ranges in runs]
+        if not parts:
+            return pd.DataFrame(columns=columns)
+        return pd.concat(parts, ignore_index=True)[columns]
+
+
+def load_release(name, store_dir=STORE_DIR):
+    """
+    Rebuilds the source frames of a stored release
+    Args: release name, path to the store
+    Returns: (dict of file name -> DataFrame, with the alias table under ALIAS_FILE, Manifest)
+    """
+    if pq is None:
+        raise ImportError("the snapshot store needs pyarrow installed")
+    release = read_release(store_dir, name)
+    reader = BlockReader(store_dir)
+    frames = {file_name: reader.read(entry["blocks"], entry["columns"])
+              for file_name, entry in release["files"].items()}
+    frames[ALIAS_FILE] = pd.DataFrame(release["aliases"], columns=REPORT_COLUMNS)
+    return frames, parse_manifest(release["manifest"])
+
+
+def release_data(name, store_dir=STORE_DIR, reports=None):
+    """
+    Runs process_healthcare_data on a stored release instead of the data folder
+    Returns: (WHO, IHME, merged and ranked) DataFrames
+    """
+    frames, manifest = load_release(name, store_dir)
+    return process_healthcare_data(None, manifest, reports, frames=frames)
+
+
+def _label(table, columns):
+    """Indicator label of every row: its indicator columns joined by '|'"""
+    if not columns:
+        return pd.Series("", index=table.index)
+    return reduce(lambda left, right: left + "|" + right,
+                  [table[col].astype(str) for col in columns])
+
+
+def _diff_file(file_name, old_rows, new_rows, schema):
+    """Changed cells of one file, given the rows of the blocks found in one release only"""
+    keys = [col for col in schema.indicator
+            if col in old_rows.columns and col in new_rows.columns]
+    keys += [schema.location, schema.period]
+    values = [col for col in schema.values if col in old_rows.columns or col in new_rows.columns]
+    # numbers repeated keys, so duplicate rows are matched one to one
+    old_rows = old_rows.assign(_n=old_rows.groupby(keys, dropna=False).cumcount())
+    new_rows = new_rows.assign(_n=new_rows.groupby(keys, dropna=False).cumcount())
+    merged = pd.merge(old_rows, new_rows, how="outer", on=keys + ["_n"],
+                      suffixes=("_old", "_new"), indicator=True)
+    change = merged["_merge"].map({"left_only": "removed", "right_only": "added",
+                                   "both": "changed"}).astype(str)
+    parts = []
+    for col in values:
+        old = merged.get(f"{col}_old", pd.Series(np.nan, index=merged.index))
+        new = merged.get(f"{col}_new", pd.Series(np.nan, index=merged.index))
+        differs = ~((old == new) | (old.isna() & new.isna())) | (change != "changed")
+        rows = merged[differs]
+        parts.append(pd.DataFrame({
+            "file": file_name, "indicator": _label(rows, keys[:-2]),
+            "location": rows[schema.location], "period": rows[schema.period],
+            "change": change[differs], "column": col,
+            "old": old[differs].astype(object), "new": new[differs].astype(object)}))
+    return pd.concat(parts, ignore_index=True) if parts else None
+
+
+def _unshared_rows(reader, old_entry, new_entry):
+    """
+    Rows of the blocks of a file that are in one of two releases only
+    Args: BlockReader, the file's entries in the old and new release
+    Returns: (old rows, new rows) DataFrames, or None when the file did not change
+    """
+    shared = set(old_entry["blocks"]) & set(new_entry["blocks"])
+    if len(shared) == len(old_entry["blocks"]) == len(new_entry["blocks"]):
+        return None
+    columns = old_entry["columns"] or new_entry["columns"]
+    return tuple(reader.read([digest for digest in entry["blocks"] if digest not in shared],
+                             entry["columns"] or columns)
+                 for entry in (old_entry, new_entry))
+
+
+def diff_releases(old, new, store_dir=STORE_DIR):
+    """
+    Compares two stored releases cell by cell, reading only the blocks that differ
+    Args: names of the old and new release, path to the store
+    Returns: pandas DataFrame with one row per added, removed or changed value: file,
+        indicator, location, period, change, column, old and new value
+    """
+    if pq is None:
+        raise ImportError("the snapshot store needs pyarrow installed")
+    old_release, new_release = read_release(store_dir, old), read_release(store_dir, new)
+    manifest = parse_manifest(new_release["manifest"])
+    reader = BlockReader(store_dir)
+    empty = {"columns": [], "blocks": []}
+    parts = []
+    for file_name in dict.fromkeys([*old_release["files"], *new_release["files"]]):
+        rows = _unshared_rows(reader, old_release["files"].get(file_name, empty),
+                              new_release["files"].get(file_name, empty))
+        if rows is not None:
+            parts.append(_diff_file(file_name, *rows, file_schema(file_name, manifest)))
+    parts = [part for part in parts if part is not None and not part.empty]
+    if not parts:
+        return pd.DataFrame(columns=DIFF_COLUMNS)
+    return pd.concat(parts, ignore_index=True)[DIFF_COLUMNS]
+
+
+def ranking_diff(old, new, store_dir=STORE_DIR):
+    """
+    How the country ranks moved between two stored releases
+    Args: names of the old and new release, path to the store
+    Returns: pandas DataFrame with location, year, old_rank, new_rank and rank_change
+        (positive when the country moved up), for the location-years ranked in either
+    """
+    ranks = []
+    for name, suffix in ((old, "old"), (new, "new")):
+        _, _, ranked = release_data(name, store_dir)
+        ranks.append(ranked[["location", "year", "rank", "composite_score"]].rename(
+            columns={"rank": f"{suffix}_rank", "composite_score": f"{suffix}_score"}))
+    moved = pd.merge(ranks[0], ranks[1], how="outer", on=["location", "year"])
+    moved["rank_change"] = moved["old_rank"] - moved["new_rank"]
+    return moved.sort_values(["year", "new_rank"], ignore_index=True)
+
+
+def main(argv=None):
+    """Command line entry point for the snapshot store"""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n", maxsplit=1)[0])
+    parser.add_argument("--store", default=STORE_DIR, help="folder of the snapshot store")
+    commands = parser.add_subparsers(dest="command", required=True)
+    ingest_parser = commands.add_parser("ingest", help="store the files of a data folder")
+    ingest_parser.add_argument("--data", default="data/", help="folder with the source files")
+    ingest_parser.add_argument("--name", required=True, help="release name, e.g. 2024-12")
+    commands.add_parser("list", help="list the stored releases")
+    for command in ("diff", "ranks"):
+        command_parser = commands.add_parser(
+            command, help="changed values" if command == "diff" else "rank changes")
+        command_parser.add_argument("old")
+        command_parser.add_argument("new")
+    args = parser.parse_args(argv)
+
+    if args.command == "ingest":
+        release = ingest(args.data, args.name, args.store)
+        rows = sum(entry["rows"] for entry in release["files"].values())
+        print(f"Stored release {args.name}: {rows} rows, {release['new_rows']} new to the store")
+    elif args.command == "list":
+        print(list_releases(args.store).to_string(index=False))
+    elif args.command == "diff":
+        changes = diff_releases(args.old, args.new, args.store)
+        print(f"{len(changes)} values changed")
+        if not changes.empty:
+            print(changes.groupby(["file", "change", "column"]).size().to_string())
+    else:
+        moved = ranking_diff(args.old, args.new, args.store)
+        moved = moved[moved["rank_change"].fillna(1) != 0]
+        print(moved.to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
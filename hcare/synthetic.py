@@ -0,0 +1,194 @@
+"""
+Deterministic synthetic data in the WHO GHO and IHME GBD export formats.
+Writes the same files the pipeline reads from data/ (the four WHO workforce files plus
+IHME-1.csv and IHME-2.csv) at any scale, for benchmarks, load tests and offline runs.
+
+Command line:
+    python -m hcare.synthetic --out bench_data/ --locations 200 --years 34 --causes 20
+"""
+import argparse
+import os
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+# file name -> (IndicatorCode, Indicator, typical value per 10,000)
+WHO_FILES = {
+    "medical-doctors.csv": ("HWF_0001", "Medical doctors (per 10,000)", 15.0),
+    "nursery-midwifery.csv": ("HWF_0006", "Nursing and midwifery personnel (per 10,000)", 40.0),
+    "pharmacists.csv": ("HWF_0014", "Pharmacists  (per 10,000)", 4.0),
+    "dentistry.csv": ("HWF_0010", "Dentists (per 10,000)", 3.0),
+}
+REGIONS = [("AFR", "Africa"), ("AMR", "Americas"), ("EMR", "Eastern Mediterranean"),
+           ("EUR", "Europe"), ("SEAR", "South-East Asia"), ("WPR", "Western Pacific")]
+# real names first, so the dashboard's default selections exist in synthetic data too
+KNOWN_LOCATIONS = [("United States of America", 1), ("India", 4), ("China", 5),
+                   ("Nigeria", 0), ("Brazil", 1), ("Germany", 3), ("Egypt", 2), ("Japan", 5)]
+CAUSES = ["Cardiovascular diseases", "Digestive diseases", "Neoplasms",
+          "Chronic respiratory diseases", "Diabetes and kidney diseases",
+          "Respiratory infections and tuberculosis", "Neurological disorders",
+          "Maternal and neonatal disorders", "Transport injuries", "Mental disorders"]
+SEXES = ["Both", "Male", "Female"]
+AGES = ["All ages", "<5 years", "5-14 years", "15-49 years", "50-69 years", "70+ years"]
+WHO_COLUMNS = ["IndicatorCode", "Indicator", "ValueType", "ParentLocationCode", "ParentLocation",
+               "Location type", "SpatialDimValueCode", "Location", "Period type", "Period",
+               "IsLatestYear", "DataSource", "FactValueNumeric", "Value", "Language",
+               "DateModified"]
+IHME_COLUMNS = ["measure", "location", "sex", "age", "cause", "metric", "year", "val",
+                "upper", "lower"]
+
+# size of a synthetic data set: number of locations, years (iterable), causes, sexes (max 3)
+# and age groups; the IHME table has 2 x locations x years x causes x sexes x ages rows
+Scale = namedtuple("Scale", ["locations", "years", "causes", "sexes", "ages"],
+                   defaults=[50, range(1990, 2024), 2, 3, 1])
+
+
+def make_locations(n_locations):
+    """
+    Location names with their WHO region
+    Args: number of locations
+    Returns: list of (location, region code, region name)
+    """
+    locations = [(name, *REGIONS[region]) for name, region in KNOWN_LOCATIONS[:n_locations]]
+    for number in range(len(locations), n_locations):
+        locations.append((f"Country {number:04d}", *REGIONS[number % len(REGIONS)]))
+    return locations
+
+
+def _labels(known, count, prefix):
+    """The first count known labels, padded with numbered ones"""
+    return known[:count] + [f"{prefix} {number:03d}" for number in range(len(known), count)]
+
+
+def _who_indicator(rng, locations, years, indicator, missing):
+    """One WHO indicator in GHO export format, for every location and year"""
+    code, name, typical = indicator
+    loc_idx, year_idx = (grid.ravel() for grid in np.meshgrid(
+        np.arange(len(locations)), np.arange(len(years)), indexing="ij"))
+    level = typical * rng.lognormal(0.0, 0.8, len(locations))
+    growth = rng.normal(0.02, 0.015, len(locations))
+    values = level[loc_idx] * np.exp(growth[loc_idx] * (years[year_idx] - years[0]))
+    values = np.round(values * rng.lognormal(0.0, 0.03, len(values)), 2)
+    df = pd.DataFrame({
+        "IndicatorCode": code,
+        "Indicator": name,
+        "ValueType": "numeric",
+        "ParentLocationCode": locations[loc_idx, 1],
+        "ParentLocation": locations[loc_idx, 2],
+        "Location type": "Country",
+        "SpatialDimValueCode": [f"C{number:03d}" for number in loc_idx],
+        "Location": locations[loc_idx, 0],
+        "Period type": "Year",
+        "Period": years[year_idx],
+        "IsLatestYear": np.where(years[year_idx] == years.max(), "true", "false"),
+        "DataSource": "Synthetic NHWA data",
+        "FactValueNumeric": values,
+        "Value": values,
+        "Language": "EN",
+        "DateModified": "2025-01-14T08:00:00.000Z",
+    })
+    return df[rng.random(len(df)) >= missing][WHO_COLUMNS].reset_index(drop=True)
+
+
+def generate_who(scale=Scale(), missing=0.1, seed=0):
+    """
+    Generates the four WHO workforce indicators in GHO export format
+    Args: Scale (only locations and years are used), share of (location, year) rows to
+        leave out (WHO series have gaps), random seed
+    Returns: dict of file name -> pandas DataFrame
+    """
+    rng = np.random.default_rng(seed)
+    locations = np.array(make_locations(scale.locations), dtype=object).reshape(-1, 3)
+    years = np.asarray(list(scale.years))
+    return {file_name: _who_indicator(rng, locations, years, indicator, missing)
+            for file_name, indicator in WHO_FILES.items()}
+
+
+def generate_ihme(scale=Scale(), seed=0):
+    """
+    Generates IHME GBD results (deaths and incidence rates) in long export format,
+    one row per location x sex x age x cause x year x measure
+    Args: Scale, random seed
+    Returns: pandas DataFrame
+    """
+    rng = np.random.default_rng(seed + 1)
+    axes = [
+        np.array(["Deaths", "Incidence"], dtype=object),
+        np.array([loc[0] for loc in make_locations(scale.locations)], dtype=object),
+        np.array(SEXES[:scale.sexes], dtype=object),
+        np.array(_labels(AGES, scale.ages, "Age group"), dtype=object),
+        np.array(_labels(CAUSES, scale.causes, "Cause"), dtype=object),
+        np.asarray(list(scale.years)),
+    ]
+    shape = [len(axis) for axis in axes]
+    # rate = measure scale x location level x cause level x trend, with noise
+    log_rate = (np.log([60.0, 600.0]).reshape(2, 1, 1, 1, 1, 1)
+                + rng.normal(0, 0.5, (1, shape[1], 1, 1, 1, 1))
+                + rng.normal(0, 1.0, (1, 1, 1, 1, shape[4], 1))
+                + rng.normal(0, 0.3, (1, 1, 1, shape[3], 1, 1))
+                - 0.01 * (axes[5] - axes[5][0]).reshape(1, 1, 1, 1, 1, -1)
+                + rng.normal(0, 0.05, shape))
+    val = np.exp(log_rate).ravel()
+    spread = rng.uniform(0.05, 0.25, val.shape)
+    codes = np.unravel_index(np.arange(val.size), shape)
+    df = pd.DataFrame({
+        "measure": axes[0][codes[0]],
+        "location": axes[1][codes[1]],
+        "sex": axes[2][codes[2]],
+        "age": axes[3][codes[3]],
+        "cause": axes[4][codes[4]],
+        "metric": "Rate",
+        "year": axes[5][codes[5]],
+        "val": val,
+        "upper": val * (1 + spread),
+        "lower": val * (1 - spread),
+    })
+    return df[IHME_COLUMNS]
+
+
+def write_synthetic_data(out_dir, scale=Scale(), seed=0, compression=None):
+    """
+    Writes a full synthetic data folder (WHO files, IHME-1.csv and IHME-2.csv)
+    Args: output folder (created if needed), Scale, random seed, optional compression
+        suffix ("gz", "zip" or "zst") added to every file name (e.g. IHME-1.csv.gz)
+    Returns: dict of file name -> number of rows written
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    suffix = f".{compression}" if compression else ""
+    written = {}
+    for file_name, df in generate_who(scale, seed=seed).items():
+        df.to_csv(os.path.join(out_dir, file_name + suffix), index=False)
+        written[file_name] = len(df)
+    ihme = generate_ihme(scale, seed)
+    # GBD downloads come split over several files, like the real IHME-1 / IHME-2
+    half = len(ihme) // 2
+    for file_name, part in (("IHME-1.csv", ihme.iloc[:half]), ("IHME-2.csv", ihme.iloc[half:])):
+        part.to_csv(os.path.join(out_dir, file_name + suffix), index=False)
+        written[file_name] = len(part)
+    return written
+
+
+def main(argv=None):
+    """Command line entry point for the generator"""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n", maxsplit=1)[0])
+    parser.add_argument("--out", required=True, help="output folder")
+    parser.add_argument("--locations", type=int, default=50)
+    parser.add_argument("--first-year", type=int, default=1990)
+    parser.add_argument("--years", type=int, default=34)
+    parser.add_argument("--causes", type=int, default=2)
+    parser.add_argument("--sexes", type=int, default=3, choices=[1, 2, 3])
+    parser.add_argument("--ages", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--compression", choices=["gz", "zip", "zst"],
+                        help="write compressed files (e.g. IHME-1.csv.gz)")
+    args = parser.parse_args(argv)
+    scale = Scale(args.locations, range(args.first_year, args.first_year + args.years),
+                  args.causes, args.sexes, args.ages)
+    written = write_synthetic_data(args.out, scale, args.seed, args.compression)
+    for file_name, rows in written.items():
+        print(f"{file_name}: {rows} rows")
+
+
+if __name__ == '__main__':
+    main()
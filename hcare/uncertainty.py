@@ -0,0 +1,119 @@
+"""
+Uncertainty intervals of the composite score and rank.
+
+IHME publishes every value with the bounds of its 95% uncertainty interval (upper and
+lower). The pipeline keeps them through the pivot, as <measure>_upper and <measure>_lower
+columns, and through the sum over causes. There the bounds are summed too, which treats
+the errors of the causes as fully correlated: the intervals err on the wide side.
+
+score_intervals draws DRAWS versions of the IHME measures of every location-year from a
+split normal distribution centered on the published value, with the bounds as its 2.5% and
+97.5% points. It then ranks every draw the way ranking.py does: min-max normalization per
+year, negative indicators turned around, PCA weights per year. The draws are computed
+together in arrays of draws x rows x indicators, CHUNK_DRAWS at a time to bound memory.
+The 2.5% and 97.5% points of the scores and ranks of the draws are the intervals. The WHO
+workforce values come without uncertainty and are the same in every draw.
+"""
+import numpy as np
+import pandas as pd
+
+try:
+    from .constants import Z_95
+    from .ranking import pca_weights, rank_within
+except ImportError:
+    from constants import Z_95
+    from ranking import pca_weights, rank_within
+
+DRAWS = 100
+CHUNK_DRAWS = 20
+INTERVAL_COLUMNS = ["composite_score_lower", "composite_score_upper",
+                    "rank_lower", "rank_upper"]
+
+
+def bound_columns(measure):
+    """Names of the lower and upper bound columns of an IHME measure column"""
+    return f"{measure}_lower", f"{measure}_upper"
+
+
+def sample_measure(values, lower, upper, draws, rng):
+    """
+    Draws of a measure from split normal distributions: below the value the spread comes
+    from the lower bound, above it from the upper bound
+    Args: arrays of values and bounds (NaN bound = no uncertainty on that side), number
+        of draws, numpy random Generator
+    Returns: draws x rows array
+    """
+    below = np.nan_to_num(np.maximum(values - lower, 0)) / Z_95
+    above = np.nan_to_num(np.maximum(upper - values, 0)) / Z_95
+    normal = rng.standard_normal((draws, len(values)))
+    return values + normal * np.where(normal < 0, below, above)
+
+
+def score_draws(draws, negative, starts):
+    """
+    Composite scores and ranks of several draws of the indicator matrix, as in
+    process_ranking_pipeline
+    Args: draws x rows x indicators array with the rows sorted by year, boolean array of
+        the negative indicators, row where each year starts
+    Returns: (scores, ranks) arrays of draws x rows
+    """
+    n_draws, n_rows, n_cols = draws.shape
+    counts = np.diff(np.append(starts, n_rows))
+    low = np.repeat(np.minimum.reduceat(draws, starts, axis=1), counts, axis=1)
+    spread = np.repeat(np.maximum.reduceat(draws, starts, axis=1), counts, axis=1) - low
+    # like MinMaxScaler, a zero range leaves the values minus the minimum (all 0)
+    normalized = (draws - low) / np.where(spread > 0, spread, 1.0)
+    normalized = np.where(negative, 1 - normalized, normalized).reshape(-1, n_cols)
+    # every year of every draw is one group of rows
+    group_starts = (np.arange(n_draws)[:, None] * n_rows + starts).ravel()
+    weights = np.repeat(pca_weights(normalized, group_starts),
+                        np.tile(counts, n_draws), axis=0)
+    scores = (normalized * weights).sum(axis=1)
+    groups = np.repeat(np.arange(len(group_starts)), np.tile(counts, n_draws))
+    ranks = rank_within(scores, groups)
+    return scores.reshape(n_draws, n_rows), ranks.reshape(n_draws, n_rows)
+
+
+# pylint: disable-next=too-many-arguments,too-many-locals
+def score_intervals(df, positive_cols, negative_cols, *, draws=DRAWS, seed=0, level=0.95):
+    """
+    Intervals of the composite score and rank of every location-year from the IHME
+    uncertainty bounds (see the module docstring)
+    Args: merged (not yet ranked) DataFrame with location, year, the indicator columns and
+        the bound columns, positive / negative indicator columns, number of draws, random
+        seed, probability covered by the intervals
+    Returns: pandas DataFrame with location, year and INTERVAL_COLUMNS, or None when the
+        data has no bound columns
+    """
+    df = df.rename(columns=lambda col: col.strip().lower())
+    negative_cols = [col.strip().lower() for col in negative_cols]
+    columns = negative_cols + [col.strip().lower() for col in positive_cols]
+    bounded = [col for col in columns if set(bound_columns(col)) <= set(df.columns)]
+    if not bounded:
+        return None
+    df = df.dropna(subset=columns).sort_values(["year", "location"], kind="stable")
+    df = df.reset_index(drop=True)
+    years = df["year"].to_numpy()
+    starts = np.flatnonzero(np.append(True, years[1:] != years[:-1]))
+    values = df[columns].to_numpy(dtype=np.float64)
+    negative = np.isin(columns, negative_cols)
+
+    rng = np.random.default_rng(seed)
+    scores, ranks = [], []
+    for first in range(0, draws, CHUNK_DRAWS):
+        chunk = np.repeat(values[None], min(CHUNK_DRAWS, draws - first), axis=0)
+        for col in bounded:
+            lower, upper = (df[name].to_numpy(dtype=np.float64) for name in bound_columns(col))
+            chunk[:, :, columns.index(col)] = sample_measure(
+                values[:, columns.index(col)], lower, upper, len(chunk), rng)
+        chunk_scores, chunk_ranks = score_draws(chunk, negative, starts)
+        scores.append(chunk_scores)
+        ranks.append(chunk_ranks)
+    tails = [(1 - level) / 2, (1 + level) / 2]
+    score_bounds = np.quantile(np.concatenate(scores), tails, axis=0)
+    rank_bounds = np.quantile(np.concatenate(ranks), tails, axis=0, method="inverted_cdf")
+    return pd.DataFrame({"location": df["location"].to_numpy(), "year": years,
+                         "composite_score_lower": score_bounds[0],
+                         "composite_score_upper": score_bounds[1],
+                         "rank_lower": rank_bounds[0].astype(np.int64),
+                         "rank_upper": rank_bounds[1].astype(np.int64)})
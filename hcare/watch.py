@@ -0,0 +1,190 @@
+"""
+Hot reload of the dashboard data when files in the data folder change.
+
+A DataWatcher polls the data folder. When a file is added, removed or edited, and then
+stays unchanged for a short while (so half-copied files are not read), the watcher maps the
+changed files to the pipeline stages that read them (see dataset.affected_stages):
+
+    WHO file   -> raw_who -> workforce -> merged -> ranked
+    IHME file  -> raw_ihme -> ihme_pivot -> merged (cause aggregate) -> ranked
+    aliases    -> merged -> ranked
+    manifest   -> every stage
+
+and recomputes only those stages, in a background thread, from a Dataset that keeps the
+results of the other stages (Dataset.refresh). The new DataHandle is then swapped in with one
+reference assignment: sessions that are running keep the handle they started with, and the
+next rerun of every session gets the new one. If the pipeline fails on the new files (e.g. a
+half-written CSV), the current data stays in place, the error is kept in last_error and the
+files are read again with the next change (of any file), so the data never mixes files that
+are older than the folder with ones that are current.
+
+The dashboard runs a watcher when HCARE_WATCH is set:
+    HCARE_WATCH=1 streamlit run hcare/hcare.py
+Command line (a pipeline worker that republishes on every change, see publish.py):
+    python -m hcare.watch --data data/ --out published/
+"""
+import argparse
+import os
+import threading
+import time
+
+try:
+    from .compact import compact_frames
+    from .data_handle import DataHandle
+    from .data_prep import data_version, standardize_columns
+    from .dataset import Dataset, affected_stages
+    from .publish import publish
+except ImportError:
+    from compact import compact_frames
+    from data_handle import DataHandle
+    from data_prep import data_version, standardize_columns
+    from dataset import Dataset, affected_stages
+    from publish import publish
+
+# seconds between two polls of the data folder
+POLL_SECONDS = 2.0
+# seconds changed files must stay unchanged before they are read
+SETTLE_SECONDS = 0.5
+
+
+def file_stats(file_path):
+    """
+    Size and modification time of every file in the data folder
+    Args: path to the data folder
+    Returns: dict of file name -> (size, modification time in ns)
+    """
+    stats = {}
+    with os.scandir(file_path) as entries:
+        for entry in entries:
+            if entry.is_file():
+                stat = entry.stat()
+                stats[entry.name] = (stat.st_size, stat.st_mtime_ns)
+    return stats
+
+
+def changed_files(old, new):
+    """Names of the files added, removed or edited between two file_stats results"""
+    return {name for name in set(old) | set(new) if old.get(name) != new.get(name)}
+
+
+def dashboard_frames(dataset):
+    """
+    Frames the dashboard shows, from the stages of a Dataset
+    Returns: (IHME, WHO, metrics) DataFrames, as load_dashboard_data
+    """
+    # shallow copies: standardize_columns renames columns in place and the stage results
+    # are shared with the Datasets refreshed from this one
+    frames = standardize_columns(*(df.copy(deep=False) for df in dataset.frames()))
+    return compact_frames(*frames)[0]
+
+
+# pylint: disable-next=too-many-instance-attributes
+class DataWatcher:
+    """
+    Polls a data folder and keeps a DataHandle of its current files (see the module
+    docstring). Read the current data with handle(); start() runs the polling thread.
+    """
+
+    def __init__(self, file_path, *, interval=POLL_SECONDS, cache_dir=None, on_swap=None):
+        self.file_path = file_path
+        self.interval = interval
+        # called with the new DataHandle and the stages recomputed, after every swap
+        self.on_swap = on_swap
+        self.last_error = None
+        self._lock = threading.Lock()
+        self._stats = file_stats(file_path)
+        # files changed since the current handle whose reload failed
+        self._pending = set()
+        self._dataset = Dataset(file_path, cache_dir=cache_dir)
+        self._handle = DataHandle(*dashboard_frames(self._dataset), data_version(file_path))
+        # stages computed for the current handle
+        self.last_stages = list(self._dataset.computed)
+        self._stop = threading.Event()
+        self._thread = None
+
+    def handle(self):
+        """DataHandle of the data folder as of the last reload"""
+        return self._handle
+
+    def check(self):
+        """
+        Reloads the data if files changed since the last reload and then stay unchanged for
+        SETTLE_SECONDS
+        Returns: list of the stages recomputed (empty when nothing was reloaded)
+        """
+        with self._lock:
+            stats = file_stats(self.file_path)
+            files = changed_files(self._stats, stats)
+            if not files:
+                return []
+            # a file that is still being written is picked up by a later poll
+            time.sleep(min(self.interval, SETTLE_SECONDS))
+            if file_stats(self.file_path) != stats:
+                return []
+            files |= self._pending
+            dataset = self._dataset.refresh(files)
+            try:
+                handle = DataHandle(*dashboard_frames(dataset), data_version(self.file_path))
+            except Exception as err:  # pylint: disable=broad-exception-caught
+                # the current handle has none of these files: they are read again with the
+                # next change
+                self._stats, self._pending, self.last_error = stats, files, err
+                return []
+            self._stats, self._dataset, self.last_error = stats, dataset, None
+            self._pending = set()
+            self.last_stages = list(dataset.computed)
+            self._handle = handle
+        if self.on_swap is not None:
+            self.on_swap(handle, self.last_stages)
+        return self.last_stages
+
+    def affected(self, files):
+        """Stages a change of these files would recompute"""
+        return affected_stages(self._dataset.manifest, files)
+
+    def _run(self):
+        """Polling loop of the background thread"""
+        while not self._stop.wait(self.interval):
+            self.check()
+
+    def start(self):
+        """Starts polling in a daemon thread; returns self"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="hcare-watch", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """Stops the polling thread"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+def main(argv=None):
+    """Command line entry point: publishes the data folder's frames on every change"""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n", maxsplit=1)[0])
+    parser.add_argument("--data", default="data/", help="folder with the source files")
+    parser.add_argument("--out", default="published/", help="folder to publish to")
+    parser.add_argument("--interval", type=float, default=POLL_SECONDS,
+                        help="seconds between two polls of the data folder")
+    args = parser.parse_args(argv)
+
+    def republish(handle, stages):
+        publish(handle.views(), args.out, handle.version)
+        print(f"Published version {handle.version} (recomputed: {', '.join(stages)})",
+              flush=True)
+
+    watcher = DataWatcher(args.data, interval=args.interval, on_swap=republish)
+    republish(watcher.handle(), watcher.last_stages)
+    try:
+        watcher.start()
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        watcher.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+"""
+Unit tests for the anomaly screen anomaly.py
+"""
+import json
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from hcare.anomaly import screen_anomalies, series_codes
+from hcare.data_prep import process_healthcare_data
+from hcare.manifest import DEFAULT_MANIFEST, parse_manifest
+from hcare.synthetic import Scale, write_synthetic_data
+
+
+class TestAnomaly(unittest.TestCase):
+    """Tests for the robust z-score and year-over-year ratio checks."""
+
+    def setUp(self):
+        """Set up three trending series: one with a spike, one with a unit change."""
+        rng = np.random.default_rng(0)
+        years = np.arange(2000, 2020)
+        rows = []
+        for location in ("Trend", "Spike", "Units"):
+            values = 20 + 0.8 * (years - 2000) + rng.normal(0, 0.3, len(years))
+            if location == "Spike":
+                values[8] *= 3
+            if location == "Units":
+                values[12:] *= 100
+            rows.append(pd.DataFrame({"Location": location, "Period": years, "Value": values}))
+        self.df = pd.concat(rows, ignore_index=True)
+
+    def screen(self, **kwargs):
+        """Screens the Value column of the test panel"""
+        return screen_anomalies(self.df, ["Value"], ["Location"], "Period", **kwargs)
+
+    def test_flags(self):
+        """The spike is flagged by its robust z-score, the unit change by its ratio."""
+        _, report = self.screen()
+        self.assertNotIn("Trend", set(report["series"]))
+        spike = report[report["series"] == "Spike"]
+        self.assertEqual(spike["year"].tolist(), [2008])
+        self.assertTrue(spike["reason"].iloc[0].startswith("robust_z"))
+        units = report[(report["series"] == "Units") & (report["reason"].str.contains("ratio"))]
+        self.assertEqual(units["year"].tolist(), [2012])
+        self.assertGreater(units["ratio"].iloc[0], 10)
+
+    def test_policies(self):
+        """keep leaves the data alone, null blanks flagged cells, winsorize clips them."""
+        kept, report = self.screen(policy="keep")
+        self.assertIs(kept, self.df)
+        nulled, _ = self.screen(policy="null")
+        flagged = self.df.index[self.df.set_index(["Location", "Period"]).index.isin(
+            list(zip(report["series"], report["year"])))]
+        self.assertTrue(nulled.loc[flagged, "Value"].isna().all())
+        self.assertEqual(nulled["Value"].isna().sum(), len(report))
+        self.assertTrue(self.df["Value"].notna().all())
+        winsorized, report = self.screen(policy="winsorize")
+        # the unit change is clipped to ten times the previous value, the spike (three
+        # times its neighbours, which the ratio check allows) is reported and kept
+        units = (winsorized["Location"] == "Units") & (winsorized["Period"] == 2012)
+        previous = self.df.loc[units.to_numpy().nonzero()[0][0] - 1, "Value"]
+        self.assertAlmostEqual(winsorized.loc[units, "Value"].iloc[0], previous * 10)
+        changed = winsorized["Value"] != self.df["Value"]
+        self.assertListEqual(changed[changed].index.tolist(), units[units].index.tolist())
+        self.assertTrue((report["new_value"] <= report["value"] * 10).all())
+        with self.assertRaises(ValueError):
+            self.screen(policy="drop")
+
+    def screen_series(self, values, **kwargs):
+        """Flagged years of one series of the given values from 2000 on, and the screened
+        values"""
+        df = pd.DataFrame({"Location": "A", "Period": 2000 + np.arange(len(values)),
+                           "Value": values})
+        screened, report = screen_anomalies(df, ["Value"], ["Location"], "Period", **kwargs)
+        return report["year"].tolist(), screened["Value"].to_numpy()
+
+    def test_spike_and_step(self):
+        """A spike is flagged alone; a level shift is a break and flags nothing, or only
+        its first year when the ratio check catches it; clean neighbours keep their values."""
+        rng = np.random.default_rng(1)
+        base = 30 + rng.normal(0, 0.5, 16)
+        spike = base.copy()
+        spike[6] *= 3
+        self.assertListEqual(self.screen_series(spike)[0], [2006])
+        # the jump back from a spike a hundred times its neighbours is not flagged
+        spike[6] *= 100 / 3
+        years, values = self.screen_series(spike, policy="winsorize")
+        self.assertListEqual(years, [2006])
+        self.assertAlmostEqual(values[6], base[5] * 10)
+        np.testing.assert_array_equal(np.delete(values, 6), np.delete(base, 6))
+        for factor, expected in ((2, []), (100, [2008])):
+            step = base.copy()
+            step[8:] *= factor
+            years, values = self.screen_series(step, policy="winsorize")
+            self.assertListEqual(years, expected)
+            np.testing.assert_array_equal(values[:8], base[:8])
+            np.testing.assert_array_equal(values[9:], step[9:])
+
+    def test_short_and_missing(self):
+        """Series with fewer than 5 values get no z-score; missing values are skipped."""
+        short = self.df[self.df["Period"] < 2004].copy()
+        short.loc[short.index[1], "Value"] *= 5
+        _, report = screen_anomalies(short, ["Value"], ["Location"], "Period")
+        self.assertTrue(report["robust_z"].isna().all())
+        gappy = self.df.copy()
+        gappy.loc[gappy["Period"] == 2011, "Value"] = np.nan
+        _, report = screen_anomalies(gappy, ["Value"], ["Location"], "Period")
+        units = report[(report["series"] == "Units") & (report["reason"].str.contains("ratio"))]
+        self.assertEqual(units["year"].tolist(), [2012])
+
+    def test_series_codes(self):
+        """Shuffled rows fall back to grouping and give the same series."""
+        shuffled = self.df.sample(frac=1, random_state=1)
+        codes = series_codes(shuffled, ["Location"])
+        expected = shuffled.groupby("Location", sort=False).ngroup().to_numpy()
+        np.testing.assert_array_equal(codes, expected)
+        np.testing.assert_array_equal(series_codes(self.df, ["Location"]),
+                                      np.repeat([0, 1, 2], 20))
+        _, report = screen_anomalies(shuffled, ["Value"], ["Location"], "Period")
+        self.assertEqual(len(report), len(self.screen()[1]))
+
+    def test_pipeline(self):
+        """The pipeline reports anomalies and applies the manifest's policy."""
+        with tempfile.TemporaryDirectory() as tmp:
+            write_synthetic_data(tmp, Scale(12, range(2000, 2020)))
+            path = os.path.join(tmp, "medical-doctors.csv")
+            doctors = pd.read_csv(path)
+            location = doctors["Location"].iloc[0]
+            jump = (doctors["Location"] == location) & (doctors["Period"] == 2010)
+            doctors.loc[jump, "Value"] *= 1000
+            doctors.to_csv(path, index=False)
+
+            reports = {}
+            df_who, _, _ = process_healthcare_data(tmp, reports=reports)
+            anomalies = reports["anomalies"]
+            found = anomalies[(anomalies["series"] == location) & (anomalies["year"] == 2010)]
+            self.assertEqual(found["column"].tolist(), ["Medical Doctors per 10,000"])
+            self.assertEqual(set(anomalies["source"]) - {"WHO", "IHME"}, set())
+
+            manifest = dict(DEFAULT_MANIFEST, anomalies={"policy": "null"})
+            with open(os.path.join(tmp, "manifest.json"), "w", encoding="utf-8") as handle:
+                json.dump(manifest, handle)
+            df_who, _, _ = process_healthcare_data(tmp)
+            row = df_who[(df_who["Location"] == location) & (df_who["Period"] == 2010)]
+            self.assertTrue(row["Medical Doctors per 10,000"].isna().all())
+
+        for bad in ({"policy": "drop"}, {"ratio_threshold": 1}, {"window": 3}):
+            with self.assertRaises(ValueError):
+                parse_manifest(dict(DEFAULT_MANIFEST, anomalies=bad))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,133 @@
+"""
+Unit tests for the headless query service api.py
+"""
+import json
+import tempfile
+import threading
+import unittest
+import urllib.request
+
+import pandas as pd
+
+from hcare.api import QueryService, QueryError, make_handler, QueryServer, ARROW_TYPE, pa
+
+
+class TestQueryService(unittest.TestCase):
+    """Tests for the query service and its HTTP front end."""
+
+    def setUp(self):
+        """Set up a stub loader returning small dashboard frames."""
+        self.df_metrics = pd.DataFrame({
+            'year': [2000, 2000, 2001, 2001],
+            'location': ['CountryA', 'CountryB', 'CountryA', 'CountryB'],
+            'region': ['Region1', 'Region2', 'Region1', 'Region2'],
+            'composite_score': [0.5, 0.7, 0.6, 0.4],
+            'rank': [2.0, 1.0, 1.0, 2.0],
+        })
+        self.df_who = pd.DataFrame({
+            'year': [2000, 2000, 2001, 2001],
+            'location': ['CountryA', 'CountryB', 'CountryA', 'CountryB'],
+            'Region': ['Region1', 'Region2', 'Region1', 'Region2'],
+            'medical_doctors_per_10000': [30.0, 40.0, 35.0, 45.0],
+        })
+        self.df_ihme = pd.DataFrame({
+            'year': [2000, 2001], 'location': ['CountryA', 'CountryA'],
+            'cause': ['Cause1', 'Cause1'], 'sex': ['Both', 'Both'],
+            'deaths': [10.0, 12.0], 'incidence': [1.0, 2.0],
+        })
+        self.tmp = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.loads = 0
+        self.service = QueryService(self.tmp.name, loader=self.loader)
+
+    def tearDown(self):
+        """Remove the temporary data folder."""
+        self.tmp.cleanup()
+
+    def loader(self, _):
+        """Stub for load_dashboard_data."""
+        self.loads += 1
+        return self.df_ihme, self.df_who, self.df_metrics
+
+    def test_rankings_default_to_latest_year(self):
+        """Rankings come sorted by rank for the latest year."""
+        result = self.service.query("rankings", {})
+        self.assertEqual(result['location'].tolist(), ['CountryA', 'CountryB'])
+        self.assertEqual(set(result['year']), {2001})
+
+    def test_top_k_and_timeseries(self):
+        """Top-k limits the rows and the time series covers every year."""
+        top = self.service.query("top", {'year': ['2000'], 'k': ['1']})
+        self.assertEqual(top['location'].tolist(), ['CountryB'])
+        series = self.service.query("timeseries", {'location': ['CountryA']})
+        self.assertEqual(series['year'].tolist(), [2000, 2001])
+
+    def test_indicator_slice(self):
+        """Indicator slices filter by region and year and keep the requested columns."""
+        result = self.service.query("indicators", {
+            'region': ['Region2'], 'year': ['2001'],
+            'columns': ['location', 'medical_doctors_per_10000']})
+        self.assertEqual(result.to_dict('records'),
+                         [{'location': 'CountryB', 'medical_doctors_per_10000': 45.0}])
+
+    def test_bad_requests(self):
+        """Unknown endpoints and missing parameters raise a QueryError with a status."""
+        with self.assertRaises(QueryError) as err:
+            self.service.query("nothing", {})
+        self.assertEqual(err.exception.status, 404)
+        with self.assertRaises(QueryError) as err:
+            self.service.query("timeseries", {})
+        self.assertEqual(err.exception.status, 400)
+        for k in ('0', '-2'):
+            with self.assertRaises(QueryError) as err:
+                self.service.query("top", {'k': [k]})
+            self.assertEqual(err.exception.status, 400)
+
+    def test_etag_and_response_cache(self):
+        """Equal requests hit the cache and a matching If-None-Match gives a 304 for valid
+        requests only."""
+        status, headers, body = self.service.respond("rankings", {'year': ['2000']})
+        self.assertEqual(status, 200)
+        self.assertEqual(json.loads(body)[0]['location'], 'CountryB')
+        status, _, _ = self.service.respond("rankings", {'year': ['2000']})
+        self.assertEqual(self.service.stats['hits'], 1)
+        status, _, body = self.service.respond("rankings", {'year': ['2000']},
+                                               if_none_match=headers['ETag'])
+        self.assertEqual((status, body), (304, b""))
+        self.assertEqual(self.loads, 1)
+        # a matching ETag does not turn an invalid request into a 304
+        for endpoint, params, expected in (("nothing", {}, 404), ("top", {'k': ['0']}, 400)):
+            _, etag = self.service.response_key(endpoint, params)
+            with self.assertRaises(QueryError) as err:
+                self.service.respond(endpoint, params, if_none_match=etag)
+            self.assertEqual(err.exception.status, expected)
+
+    @unittest.skipIf(pa is None, "pyarrow is not installed")
+    def test_arrow_response(self):
+        """Arrow responses, /version included, decode back to the same rows."""
+        _, headers, body = self.service.respond("top", {'k': ['2']}, ARROW_TYPE)
+        self.assertEqual(headers['Content-Type'], ARROW_TYPE)
+        table = pa.ipc.open_stream(body).read_all()
+        self.assertEqual(table.column('location').to_pylist(), ['CountryA', 'CountryB'])
+        _, headers, body = self.service.respond("version", {}, ARROW_TYPE)
+        self.assertEqual(headers['Content-Type'], ARROW_TYPE)
+        info = pa.ipc.open_stream(body).read_all().to_pylist()
+        self.assertEqual(info, [json.loads(self.service.respond("version", {})[2])])
+        self.assertEqual(info[0]['metrics_rows'], 4)
+
+    def test_http_round_trip(self):
+        """The HTTP handler serves JSON over a real socket."""
+        server = QueryServer(('127.0.0.1', 0), make_handler(self.service))
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            url = f"http://127.0.0.1:{server.server_port}/top?k=1"
+            with urllib.request.urlopen(url) as response:
+                rows = json.loads(response.read())
+        finally:
+            server.shutdown()
+            server.server_close()
+        self.assertEqual(rows[0]['location'], 'CountryA')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+"""
+Unit tests for the memory compaction module compact.py
+"""
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from hcare.compact import compact_frame, compact_frames, widen_floats
+
+
+class TestCompact(unittest.TestCase):
+    """Tests for the categorical and downcast dtypes of the processed frames."""
+
+    def setUp(self):
+        """Set up a frame shaped like the ranked metrics data."""
+        self.df = pd.DataFrame({
+            'location': ['CountryA', 'CountryB', 'CountryA', 'CountryB'] * 3,
+            'region': ['Region1', 'Region2', 'Region1', 'Region2'] * 3,
+            'year': [2000, 2000, 2001, 2001] * 3,
+            'medical_doctors_per_10000': [30.25, 40.5, 35.75, 12.34] * 3,
+            'note': [f'row {i}' for i in range(12)],
+        })
+
+    def test_dtypes(self):
+        """Repeated strings become categoricals, years int16 and values float32."""
+        compacted = compact_frame(self.df)
+        self.assertEqual(compacted['location'].dtype, 'category')
+        self.assertEqual(compacted['region'].dtype, 'category')
+        self.assertEqual(compacted['year'].dtype, np.int16)
+        self.assertEqual(compacted['medical_doctors_per_10000'].dtype, np.float32)
+        # every value is distinct, so a categorical would not save anything
+        self.assertEqual(compacted['note'].dtype, object)
+
+    def test_values_unchanged(self):
+        """Compaction keeps the columns, index and values."""
+        compacted = compact_frame(self.df)
+        pd.testing.assert_frame_equal(compacted, self.df, check_dtype=False,
+                                      check_categorical=False, rtol=1e-6)
+
+    def test_floats_kept_when_precision_lost(self):
+        """Floats that float32 cannot hold within the tolerance stay float64."""
+        df = pd.DataFrame({'tiny': [1.234e-42, 2.0, np.nan], 'big': [1e300, 1.0, 2.0],
+                           'rate': [1.0 + 1e-9, 2.0, np.nan]})
+        compacted = compact_frame(df)
+        self.assertEqual(compacted['tiny'].dtype, np.float64)
+        self.assertEqual(compacted['big'].dtype, np.float64)
+        self.assertEqual(compacted['rate'].dtype, np.float32)
+
+    def test_downstream_operations(self):
+        """isin, groupby and comparisons give the same results on the compacted frame."""
+        compacted = compact_frame(self.df)
+        selected = ['CountryA']
+        np.testing.assert_array_equal(compacted['location'].isin(selected),
+                                      self.df['location'].isin(selected))
+        np.testing.assert_array_equal(compacted['location'] == 'CountryB',
+                                      self.df['location'] == 'CountryB')
+        grouped = compacted.groupby('year')['medical_doctors_per_10000'].mean()
+        expected = self.df.groupby('year')['medical_doctors_per_10000'].mean()
+        np.testing.assert_allclose(grouped.to_numpy(), expected.to_numpy(), rtol=1e-6)
+
+    def test_memory_report(self):
+        """The report has one row per frame and shows the saved memory."""
+        frames, report = compact_frames(self.df, self.df, self.df)
+        self.assertEqual(len(frames), 3)
+        self.assertEqual(list(report['frame']), ['ihme', 'who', 'metrics'])
+        self.assertTrue((report['bytes_after'] < report['bytes_before']).all())
+        self.assertTrue(((report['saved'] > 0) & (report['saved'] < 1)).all())
+
+    def test_widen_floats(self):
+        """float32 columns come back as float64 with their short decimal values."""
+        widened = widen_floats(compact_frame(self.df))
+        self.assertEqual(widened['medical_doctors_per_10000'].dtype, np.float64)
+        self.assertEqual(widened['medical_doctors_per_10000'].iloc[3], 12.34)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+"""
+Unit tests for the workforce/outcome correlation module correlation.py
+"""
+import unittest
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+from hcare.correlation import (
+    batched_pearson, cached_correlation_table, correlation_matrix, correlation_table,
+    WORKFORCE_COLUMNS, OUTCOME_COLUMNS
+)
+from hcare.data_handle import DataHandle
+from hcare.plots import plot_correlation_heatmap
+
+
+class TestCorrelation(unittest.TestCase):
+    """Tests for the batched correlation engine."""
+
+    def setUp(self):
+        """Set up a random panel of raw workforce and outcome values."""
+        rng = np.random.default_rng(0)
+        n_rows = 240
+        doctors = rng.lognormal(2, 0.5, n_rows)
+        self.df = pd.DataFrame({
+            'location': [f'Country{i % 40}' for i in range(n_rows)],
+            'year': np.repeat(np.arange(2000, 2006), 40),
+            'region': [['Africa', 'Europe', 'Americas'][i % 3] for i in range(n_rows)],
+            'medical_doctors_per_10000': doctors,
+            'nurses_midwifes_per_10000': rng.lognormal(3, 0.5, n_rows),
+            'pharmacists_per_10000': rng.lognormal(1, 0.5, n_rows),
+            'dentists_per_10000': rng.lognormal(0.5, 0.5, n_rows),
+            'deaths': 500 - 8 * doctors + rng.normal(0, 20, n_rows),
+            'incidence': rng.lognormal(6, 0.3, n_rows),
+        })
+        self.df.loc[[3, 50, 101], 'deaths'] = np.nan
+
+    def reference(self, df, method):
+        """pandas' correlation of the workforce columns with the outcomes."""
+        corr = df[WORKFORCE_COLUMNS + OUTCOME_COLUMNS].corr(method=method)
+        return corr.loc[WORKFORCE_COLUMNS, OUTCOME_COLUMNS].to_numpy()
+
+    def test_pearson_matches_pandas(self):
+        """Pooled, per-year and per-region Pearson coefficients equal pandas' corr."""
+        table = correlation_table(self.df)
+        r, n = correlation_matrix(table, 'pearson')
+        np.testing.assert_allclose(r.to_numpy(), self.reference(self.df, 'pearson'))
+        self.assertEqual(n.loc['medical_doctors_per_10000', 'deaths'], 237)
+        for scope, group in (('year', 2003), ('region', 'Europe')):
+            r, _ = correlation_matrix(table, 'pearson', scope, group)
+            subset = self.df[self.df[scope] == group]
+            np.testing.assert_allclose(r.to_numpy(), self.reference(subset, 'pearson'))
+
+    def test_spearman_matches_pandas(self):
+        """Spearman coefficients equal pandas' corr on complete data."""
+        df = self.df.dropna()
+        table = correlation_table(df)
+        r, _ = correlation_matrix(table, 'spearman')
+        np.testing.assert_allclose(r.to_numpy(), self.reference(df, 'spearman'))
+        r, _ = correlation_matrix(table, 'spearman', 'region', 'Africa')
+        np.testing.assert_allclose(
+            r.to_numpy(), self.reference(df[df['region'] == 'Africa'], 'spearman'))
+
+    def test_table_layout(self):
+        """The table holds every method, group and indicator pair once."""
+        table = correlation_table(self.df)
+        # 2 methods x (1 pooled + 6 years + 3 regions) groups x 4 x 2 pairs
+        self.assertEqual(len(table), 2 * 10 * 8)
+        self.assertFalse(table.duplicated(['method', 'scope', 'group', 'workforce',
+                                           'outcome']).any())
+        self.assertLess(table.loc[(table['scope'] == 'pooled')
+                                  & (table['workforce'] == 'medical_doctors_per_10000')
+                                  & (table['outcome'] == 'deaths'), 'r'].iloc[0], -0.5)
+
+    def test_small_and_constant_groups(self):
+        """Groups with fewer than 3 rows or a constant column give NaN."""
+        x = np.array([[1.0], [2.0], [3.0], [4.0], [5.0]])
+        y = np.array([[2.0], [1.0], [7.0], [7.0], [7.0]])
+        r, n = batched_pearson(x, y, np.array([0, 0, 1, 1, 1]), 2)
+        self.assertEqual(n[:, 0, 0].tolist(), [2, 3])
+        self.assertTrue(np.isnan(r).all())
+
+    def test_outcome_panel_sign(self):
+        """Correlations of the raw outcome panel keep the sign of the raw values."""
+        df = self.df.dropna()
+        df_who = df[['region', 'location', 'year'] + WORKFORCE_COLUMNS] \
+            .rename(columns={'region': 'Region'})
+        # deaths split over two causes, and male rows the panel must leave out
+        causes = [df.assign(cause=cause, sex='Both', deaths=df['deaths'] * share)
+                  for cause, share in (('A', 0.25), ('B', 0.75))]
+        male = df.assign(cause='A', sex='Male', deaths=df['medical_doctors_per_10000'])
+        df_ihme = pd.concat(causes + [male])[['location', 'sex', 'cause', 'year']
+                                             + OUTCOME_COLUMNS]
+        df_ihme = df_ihme.assign(incidence=df_ihme['incidence'] / 2)
+        panel = DataHandle(df_ihme, df_who, df, 'v1').panel
+        self.assertEqual(len(panel), len(df))
+        table = correlation_table(panel)
+        r, _ = correlation_matrix(table)
+        expected = self.reference(df, 'pearson')
+        np.testing.assert_allclose(r.to_numpy(), expected, atol=1e-12)
+        self.assertLess(r.loc['medical_doctors_per_10000', 'deaths'], -0.5)
+        self.assertListEqual(sorted(table['group'][table['scope'] == 'region'].unique()),
+                             ['Africa', 'Americas', 'Europe'])
+
+    def test_cache_per_version(self):
+        """The table is computed once per data version."""
+        first = cached_correlation_table(self.df, 'test-v1')
+        self.assertIs(cached_correlation_table(self.df, 'test-v1'), first)
+        self.assertIsNot(cached_correlation_table(self.df, 'test-v2'), first)
+
+    def test_heatmap(self):
+        """The heatmap shows one row per workforce indicator and one column per outcome."""
+        fig = plot_correlation_heatmap(correlation_table(self.df), 'spearman', 'year', 2001)
+        self.assertIsInstance(fig, go.Figure)
+        self.assertEqual(np.asarray(fig.data[0].z).shape, (4, 2))
+        self.assertIn('2001', fig.layout.title.text)
+
+
+if __name__ == '__main__':
+    unittest.main()
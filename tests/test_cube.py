@@ -0,0 +1,120 @@
+"""
+Unit tests for the IHME cube cube.py
+"""
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from hcare.cube import IHMECube, age_order, ranking_age
+from hcare.data_handle import DataHandle
+from hcare.data_prep import load_dashboard_data, select_ranking_age
+from hcare.filter_index import query
+from hcare.synthetic import Scale, write_synthetic_data
+
+
+class TestCube(unittest.TestCase):
+    """Tests for the location x year x sex x age x cause x measure store."""
+
+    @classmethod
+    def setUpClass(cls):
+        """Process a small synthetic data set with three age groups once."""
+        with tempfile.TemporaryDirectory() as data_dir:
+            write_synthetic_data(data_dir, Scale(8, range(2000, 2004), causes=3, ages=3))
+            cls.frames = load_dashboard_data(data_dir)
+        cls.df_ihme = cls.frames[0]
+        cls.cube = IHMECube.from_frame(cls.df_ihme)
+
+    def test_pipeline_keeps_ages(self):
+        """The IHME frame keeps every age group and the ranking uses All ages."""
+        self.assertEqual(sorted(self.df_ihme["age"].unique()),
+                         ["5-14 years", "<5 years", "All ages"])
+        self.assertEqual(len(self.df_ihme), 8 * 4 * 3 * 3 * 3)
+        self.assertEqual(ranking_age(["<5 years", "All ages"]), "All ages")
+        self.assertEqual(ranking_age(["Age-standardized", "<5 years"]), "Age-standardized")
+        self.assertEqual(ranking_age(["15-49 years"]), "15-49 years")
+        with self.assertRaises(ValueError):
+            ranking_age(["<5 years", "5-14 years"])
+        self.assertEqual(age_order(self.cube.labels("age")),
+                         ["All ages", "<5 years", "5-14 years"])
+        self.assertEqual(age_order(["70+ years", "15-49 years", "Age-standardized", "1-5 months",
+                                    "5-14 years", "<28 days", "<5 years", "All ages"]),
+                         ["All ages", "Age-standardized", "<28 days", "<5 years", "1-5 months",
+                          "5-14 years", "15-49 years", "70+ years"])
+        ranked_rows = select_ranking_age(self.df_ihme)
+        self.assertNotIn("age", ranked_rows.columns)
+        self.assertEqual(len(ranked_rows), 8 * 4 * 3 * 3)
+
+    def test_storage(self):
+        """Axes are integer-coded and values are float32 with the bounds as a last axis."""
+        self.assertEqual(self.cube.shape, (8, 4, 3, 3, 3, 2))
+        self.assertEqual(self.cube.stats, ("val", "upper", "lower"))
+        self.assertEqual(self.cube.labels("measure"), ["deaths", "incidence"])
+        self.assertEqual(self.cube.nbytes, 8 * 4 * 3 * 3 * 3 * 2 * 3 * 4)
+        values, labels = self.cube.slice(year=2002, sex="Both", age="All ages",
+                                         measure="deaths")
+        self.assertEqual(values.dtype, np.float32)
+        self.assertEqual(values.shape, (8, 1, 1, 1, 3, 1))
+        self.assertEqual(labels["cause"], sorted(self.df_ihme["cause"].unique()))
+        row = self.df_ihme[(self.df_ihme["location"] == labels["location"][0])
+                           & (self.df_ihme["year"] == 2002) & (self.df_ihme["sex"] == "Both")
+                           & (self.df_ihme["age"] == "All ages")
+                           & (self.df_ihme["cause"] == labels["cause"][1])]
+        self.assertEqual(values[0, 0, 0, 0, 1, 0], row["deaths"].iloc[0])
+        with self.assertRaises(ValueError):
+            self.cube.slice(region="Africa")
+
+    def test_frame_matches_query(self):
+        """A selection by the cube gives the rows the filter index selects."""
+        handle = DataHandle(*self.frames, "v1")
+        locations = sorted(self.df_ihme["location"].unique())[:3]
+        filters = {"year": 2001, "location": locations[::-1], "sex": ["Both", "Male"],
+                   "age": "<5 years"}
+        expected = query(self.df_ihme, handle.indexes[0],
+                         ["location", "sex", "cause", "deaths", "deaths_upper",
+                          "deaths_lower"], **filters)
+        result = handle.cube.frame(["location", "sex", "cause"], measure="deaths", **filters)
+        self.assertListEqual(result["location"].tolist(), expected["location"].tolist())
+        self.assertListEqual(result["cause"].tolist(), expected["cause"].tolist())
+        for col in ("deaths", "deaths_upper", "deaths_lower"):
+            np.testing.assert_array_equal(result[col], expected[col])
+
+    def test_aggregate(self):
+        """Summing over causes gives the totals of the ranking's cause aggregation."""
+        totals = self.cube.frame(["location", "year"], sex="Both", age="All ages")
+        rows = self.df_ihme[(self.df_ihme["sex"] == "Both")
+                            & (self.df_ihme["age"] == "All ages")]
+        expected = rows.groupby(["location", "year"], observed=True)[
+            ["deaths", "incidence_upper"]].sum().reset_index()
+        self.assertEqual(len(totals), len(expected))
+        np.testing.assert_allclose(totals["deaths"], expected["deaths"], rtol=1e-5)
+        np.testing.assert_allclose(totals["incidence_upper"], expected["incidence_upper"],
+                                   rtol=1e-5)
+        means = self.cube.frame(["age"], how="mean", measure="deaths", year=2003)
+        self.assertListEqual(list(means.columns),
+                             ["age", "deaths", "deaths_upper", "deaths_lower"])
+        np.testing.assert_allclose(
+            means["deaths"],
+            self.df_ihme[self.df_ihme["year"] == 2003].groupby("age", observed=True)[
+                "deaths"].mean(), rtol=1e-5)
+        with self.assertRaises(ValueError):
+            self.cube.frame(["measure"])
+
+    def test_missing_cells(self):
+        """Cells missing from the frame are NaN and do not count in aggregates."""
+        df = pd.DataFrame({"location": ["A", "A", "B"], "year": [2000, 2001, 2000],
+                           "sex": "Both", "cause": ["c1", "c2", "c1"],
+                           "deaths": [1.0, 2.0, np.nan]})
+        cube = IHMECube.from_frame(df)
+        self.assertEqual(cube.shape, (2, 2, 1, 1, 2, 1))
+        self.assertEqual(cube.stats, ("val",))
+        self.assertEqual(cube.labels("age"), ["All ages"])
+        totals = cube.frame(["location"])
+        self.assertListEqual(totals["location"].tolist(), ["A"])
+        self.assertListEqual(totals["deaths"].tolist(), [3.0])
+        self.assertTrue(cube.frame(["year"], location="C").empty)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+"""
+Unit tests for the shared read-only data module data_handle.py
+"""
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from hcare.data_handle import DataHandle, freeze_frame, read_only_view
+
+
+class TestDataHandle(unittest.TestCase):
+    """Tests for the shared, read-only data handle."""
+
+    def setUp(self):
+        """Set up small frames shaped like the dashboard data."""
+        self.df_who = pd.DataFrame({
+            'year': [2000, 2000, 2001],
+            'location': ['CountryA', 'CountryB', 'CountryA'],
+            'Region': ['Region1', 'Region1', 'Region2'],
+            'medical_doctors_per_10000': [30.0, 40.0, 35.0],
+        })
+        self.handle = DataHandle(self.df_who, self.df_who, self.df_who, "v1")
+
+    def test_freeze_frame_keeps_values(self):
+        """Freezing keeps columns, index and values."""
+        frozen = freeze_frame(self.df_who)
+        pd.testing.assert_frame_equal(frozen, self.df_who)
+
+    def test_in_place_write_raises(self):
+        """Writing into a view of shared data raises instead of mutating it."""
+        _, df_who, _ = self.handle.views()
+        with self.assertRaises(ValueError):
+            df_who.loc[0, 'medical_doctors_per_10000'] = 0.0
+        _, fresh, _ = self.handle.views()
+        self.assertEqual(fresh.loc[0, 'medical_doctors_per_10000'], 30.0)
+
+    def test_categorical_write_raises(self):
+        """Writing into a categorical column of a view changes neither the shared frame,
+        its filter index nor the caller's frame."""
+        df = self.df_who.astype({'location': 'category'})
+        handle = DataHandle(df, df, df, "v1")
+        _, _, view = handle.views()
+        with self.assertRaises(ValueError):
+            view.loc[0, 'location'] = 'CountryB'
+        _, _, fresh = handle.views()
+        self.assertEqual(fresh.loc[0, 'location'], 'CountryA')
+        self.assertEqual(df.loc[0, 'location'], 'CountryA')
+        self.assertListEqual(list(handle.indexes[2].positions(location='CountryA')), [0, 2])
+
+    def test_new_column_stays_in_view(self):
+        """Adding a column to one session's view does not leak into other views."""
+        _, view_one, _ = self.handle.views()
+        view_one['extra'] = 1
+        _, view_two, _ = self.handle.views()
+        self.assertNotIn('extra', view_two.columns)
+
+    def test_views_share_memory(self):
+        """Views do not copy the underlying arrays."""
+        _, view_one, _ = self.handle.views()
+        _, view_two, _ = self.handle.views()
+        self.assertTrue(np.shares_memory(
+            view_one['medical_doctors_per_10000'].to_numpy(),
+            view_two['medical_doctors_per_10000'].to_numpy()))
+
+    def test_filtering_still_works(self):
+        """Read-only views support the usual filtering used by the dashboard."""
+        view = read_only_view(freeze_frame(self.df_who))
+        subset = view[(view['year'] == 2000) & (view['Region'].isin(['Region1']))]
+        self.assertEqual(sorted(subset['location'].unique()), ['CountryA', 'CountryB'])
+
+    def test_handle_is_immutable(self):
+        """The handle itself cannot be rebound to new data."""
+        self.assertEqual(self.handle.version, "v1")
+        with self.assertRaises(AttributeError):
+            self.handle.version = "v2"
+
+
+if __name__ == '__main__':
+    unittest.main()
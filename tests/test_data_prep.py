@@ -1,13 +1,20 @@
 """
 Unit tests for the data preparation module data_prep.py
 """
+import os
+import tempfile
 import unittest
+import zipfile
 from unittest.mock import patch
 import pandas as pd
+from hcare import data_prep
 from hcare.data_prep import (
     import_data, pivot_ihme, drop_sex, ag_over_cause, reconcile_locations,
-    make_medical_data_df, process_healthcare_data
+    make_medical_data_df, process_healthcare_data, source_name
 )
+from hcare.dataset import affected_stages
+from hcare.manifest import load_manifest
+from hcare.synthetic import Scale, write_synthetic_data
 
 
 class TestHealthcare(unittest.TestCase):
@@ -136,5 +143,67 @@ class TestHealthcare(unittest.TestCase):
         mock_ag_over_cause.assert_called_once()
 
 
+class TestCompressedSources(unittest.TestCase):
+    """Test cases for reading gzip, zip and zstandard compressed sources."""
+
+    def setUp(self):
+        """Set up a plain synthetic data folder."""
+        self.tmp = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.plain = os.path.join(self.tmp.name, "plain")
+        write_synthetic_data(self.plain, Scale(8, range(2000, 2003)))
+
+    def tearDown(self):
+        """Remove the data folders."""
+        self.tmp.cleanup()
+
+    def test_compressed_folder(self):
+        """A folder of .gz or .zip copies gives the frames of the plain CSV files."""
+        expected = process_healthcare_data(self.plain)
+        for compression in ("gz", "zip"):
+            folder = os.path.join(self.tmp.name, compression)
+            write_synthetic_data(folder, Scale(8, range(2000, 2003)), compression=compression)
+            self.assertIn(f"IHME-1.csv.{compression}", os.listdir(folder))
+            for frame, wanted in zip(process_healthcare_data(folder), expected):
+                pd.testing.assert_frame_equal(frame, wanted)
+            # nothing is decompressed to disk
+            self.assertEqual(len(os.listdir(folder)), 6)
+
+    def test_multi_member_zip(self):
+        """Every CSV member of a zip archive is read and the members concatenated."""
+        archive_path = os.path.join(self.tmp.name, "IHME-GBD.zip")
+        with zipfile.ZipFile(archive_path, "w", zipfile.ZIP_DEFLATED) as archive:
+            for name in ("IHME-1.csv", "IHME-2.csv"):
+                archive.write(os.path.join(self.plain, name), f"results/{name}")
+            archive.writestr("citation.txt", "IHME GBD")
+        expected = pd.concat([import_data(os.path.join(self.plain, name))
+                              for name in ("IHME-1.csv", "IHME-2.csv")], ignore_index=True)
+        pd.testing.assert_frame_equal(import_data(archive_path), expected)
+        empty_path = os.path.join(self.tmp.name, "empty.zip")
+        with zipfile.ZipFile(empty_path, "w") as archive:
+            archive.writestr("readme.txt", "no data")
+        with self.assertRaises(ValueError):
+            import_data(empty_path)
+
+    def test_zstandard(self):
+        """.zst sources are read with zstandard, and need it installed."""
+        path = os.path.join(self.tmp.name, "dentistry.csv.zst")
+        if data_prep.zstandard is None:
+            with open(path, "wb") as handle:
+                handle.write(b"")
+            with self.assertRaises(ImportError):
+                import_data(path)
+            return
+        plain = import_data(os.path.join(self.plain, "dentistry.csv"))
+        plain.to_csv(path, index=False)
+        pd.testing.assert_frame_equal(import_data(path), plain)
+
+    def test_source_names(self):
+        """Compressed copies count as the file they hold when mapping changes to stages."""
+        self.assertEqual(source_name("IHME-1.csv.gz"), "IHME-1.csv")
+        self.assertEqual(source_name("dentistry.csv"), "dentistry.csv")
+        self.assertEqual(affected_stages(load_manifest(self.plain), ["dentistry.csv.zst"]),
+                         {"raw_who", "workforce", "merged", "ranked"})
+
+
 if __name__ == '__main__':
     unittest.main()
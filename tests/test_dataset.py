@@ -0,0 +1,87 @@
+"""
+Unit tests for the lazy pipeline stages dataset.py
+"""
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import pandas as pd
+
+import hcare
+from hcare.data_prep import process_healthcare_data
+from hcare.dataset import STAGES, Dataset
+from hcare.synthetic import Scale, write_synthetic_data
+
+
+class TestDataset(unittest.TestCase):
+    """Tests for computing, memoizing and persisting the pipeline stages."""
+
+    def setUp(self):
+        """Set up a synthetic data folder and a cache folder."""
+        self.tmp = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.data = os.path.join(self.tmp.name, "data")
+        self.cache = os.path.join(self.tmp.name, "cache")
+        write_synthetic_data(self.data, Scale(10, range(2000, 2004)))
+
+    def tearDown(self):
+        """Remove the folders."""
+        self.tmp.cleanup()
+
+    def test_frames_match_pipeline(self):
+        """The stages give the frames and reports of process_healthcare_data."""
+        reports = {}
+        expected = process_healthcare_data(self.data, reports=reports)
+        dataset = hcare.Dataset(self.data)
+        for frame, wanted in zip(dataset.frames(), expected):
+            pd.testing.assert_frame_equal(frame, wanted)
+        pd.testing.assert_frame_equal(dataset.anomalies, reports["anomalies"])
+        pd.testing.assert_frame_equal(dataset.locations, reports["locations"])
+        self.assertEqual(dataset.computed, list(STAGES))
+
+    def test_workforce_skips_ihme(self):
+        """The WHO stages neither read the IHME files nor rank."""
+        for name in ("IHME-1.csv", "IHME-2.csv"):
+            os.remove(os.path.join(self.data, name))
+        dataset = Dataset(self.data)
+        with patch("hcare.dataset.rank_sources") as rank:
+            doctors = dataset.workforce["Medical Doctors per 10,000"]
+            rank.assert_not_called()
+        self.assertFalse(doctors.empty)
+        self.assertEqual(sorted(dataset.raw_who), ["dentistry.csv", "medical-doctors.csv",
+                                                    "nursery-midwifery.csv", "pharmacists.csv"])
+        self.assertEqual(dataset.computed, ["raw_who", "workforce"])
+        with self.assertRaises(FileNotFoundError):
+            _ = dataset.ihme_pivot
+
+    def test_memoized(self):
+        """Each stage is computed once and shared by the stages that need it."""
+        dataset = Dataset(self.data)
+        with patch("hcare.dataset.read_sources", wraps=hcare.dataset.read_sources) as read:
+            self.assertIs(dataset.merged, dataset.merged)
+            self.assertIs(dataset.who, dataset.who)
+            _ = dataset.ranked
+        self.assertEqual(read.call_count, 2)
+        self.assertEqual(dataset.computed, ["raw_who", "workforce", "raw_ihme", "ihme_pivot",
+                                            "merged", "ranked"])
+
+    def test_persistence(self):
+        """Stages are read back from the cache until the data changes."""
+        first = Dataset(self.data, cache_dir=self.cache)
+        ranked = first.ranked
+        second = Dataset(self.data, cache_dir=self.cache)
+        pd.testing.assert_frame_equal(second.ranked, ranked)
+        _ = second.workforce
+        self.assertEqual(second.computed, [])
+        self.assertTrue(os.path.exists(os.path.join(self.cache, first.key, "ranked.pkl")))
+
+        path = os.path.join(self.data, "dentistry.csv")
+        pd.read_csv(path).head(-1).to_csv(path, index=False)
+        changed = Dataset(self.data, cache_dir=self.cache)
+        self.assertNotEqual(changed.key, first.key)
+        _ = changed.workforce
+        self.assertEqual(changed.computed, ["raw_who", "workforce"])
+
+
+if __name__ == '__main__':
+    unittest.main()
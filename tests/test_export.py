@@ -0,0 +1,91 @@
+"""
+Unit tests for the streaming export module export.py
+"""
+import gzip
+import io
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+
+from hcare.export import iter_chunks, export_view, export_bytes, main, pq
+from hcare.filter_index import FilterIndex
+
+
+class TestExport(unittest.TestCase):
+    """Tests for chunked export of filtered views."""
+
+    def setUp(self):
+        """Set up a ranked-panel-like frame."""
+        self.df = pd.DataFrame({
+            'year': [2000, 2000, 2001, 2001, 2002],
+            'location': ['CountryA', 'CountryB', 'CountryA', 'CountryB', 'CountryA'],
+            'region': ['Region1', 'Region2', 'Region1', 'Region2', 'Region1'],
+            'composite_score': [0.5, 0.7, 0.6, 0.8, 0.65],
+            'rank': [2.0, 1.0, 2.0, 1.0, 1.0],
+        })
+        self.tmp = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+
+    def tearDown(self):
+        """Remove exported files."""
+        self.tmp.cleanup()
+
+    def test_chunks_are_bounded(self):
+        """No chunk is larger than chunk_rows and all matching rows are covered."""
+        chunks = list(iter_chunks(self.df, chunk_rows=2))
+        self.assertEqual([len(chunk) for chunk in chunks], [2, 2, 1])
+        pd.testing.assert_frame_equal(pd.concat(chunks), self.df)
+
+    def test_filters_with_and_without_index(self):
+        """Filtered chunks are the same whether or not an index is used."""
+        filters = {'location': ['CountryA'], 'year': [2000, 2002]}
+        scanned = pd.concat(iter_chunks(self.df, **filters))
+        indexed = pd.concat(iter_chunks(self.df, FilterIndex(self.df), **filters))
+        pd.testing.assert_frame_equal(scanned, indexed)
+        self.assertEqual(scanned['year'].tolist(), [2000, 2002])
+
+    def test_csv_round_trip(self):
+        """CSV export writes a single header and every row."""
+        data = export_bytes(self.df, 'csv', columns=['location', 'rank'], region=['Region2'])
+        result = pd.read_csv(io.BytesIO(data))
+        self.assertEqual(result.columns.tolist(), ['location', 'rank'])
+        self.assertEqual(result['location'].tolist(), ['CountryB', 'CountryB'])
+
+    def test_jsonl_gz_round_trip(self):
+        """Compressed JSON lines decode back to the exported rows."""
+        path = os.path.join(self.tmp.name, 'out.jsonl.gz')
+        rows = export_view(self.df, path, 'jsonl.gz', chunk_rows=2)
+        with gzip.open(path, 'rt', encoding='utf-8') as handle:
+            result = pd.read_json(handle, lines=True)
+        self.assertEqual(rows, 5)
+        self.assertEqual(result['location'].tolist(), self.df['location'].tolist())
+        np.testing.assert_allclose(result['composite_score'], self.df['composite_score'])
+
+    @unittest.skipIf(pq is None, "pyarrow is not installed")
+    def test_parquet_round_trip(self):
+        """Parquet export writes one row group per chunk."""
+        path = os.path.join(self.tmp.name, 'out.parquet')
+        export_view(self.df, path, 'parquet', chunk_rows=2)
+        self.assertEqual(pq.ParquetFile(path).num_row_groups, 3)
+        pd.testing.assert_frame_equal(pd.read_parquet(path), self.df)
+
+    def test_unknown_format(self):
+        """Unsupported formats raise a ValueError."""
+        with self.assertRaises(ValueError):
+            export_bytes(self.df, 'xlsx')
+
+    @patch('hcare.export.load_dashboard_data')
+    def test_command_line(self, mock_load):
+        """The command line exports the chosen source with its filters."""
+        mock_load.return_value = (None, None, self.df)
+        path = os.path.join(self.tmp.name, 'ranks.csv')
+        main(['--out', path, '--year', '2001', '--region', 'Region1'])
+        result = pd.read_csv(path)
+        self.assertEqual(result['location'].tolist(), ['CountryA'])
+
+
+if __name__ == '__main__':
+    unittest.main()
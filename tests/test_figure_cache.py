@@ -0,0 +1,87 @@
+"""
+Unit tests for the figure cache module figure_cache.py
+"""
+import unittest
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+from hcare.figure_cache import FigureCache, normalize_arg, make_key
+from hcare.plots import plot_compscore_over_time, plot_who_data
+
+
+class TestFigureCache(unittest.TestCase):
+    """Tests for the shared figure cache."""
+
+    def setUp(self):
+        """Set up a small metrics frame and a fresh cache."""
+        self.df = pd.DataFrame({
+            'year': [2000, 2000, 2001, 2001],
+            'location': ['CountryA', 'CountryB', 'CountryA', 'CountryB'],
+            'composite_score': [0.5, 0.7, 0.6, 0.8],
+        })
+        self.cache = FigureCache()
+        self.calls = 0
+
+    def counting_builder(self, df, selected_location=None):
+        """Figure builder that records how often it was called."""
+        self.calls += 1
+        return plot_compscore_over_time(df, selected_location=selected_location)
+
+    def test_normalize_arg(self):
+        """Lists, numpy scalars and sets become hashable and comparable."""
+        self.assertEqual(normalize_arg(['A', 'B']), ('A', 'B'))
+        self.assertEqual(normalize_arg(np.int64(2000)), 2000)
+        self.assertEqual(normalize_arg({'B', 'A'}), ('A', 'B'))
+        self.assertEqual(normalize_arg((np.int64(1), ['x'])), (1, ('x',)))
+
+    def test_make_key_ignores_container_type(self):
+        """A list and a tuple with the same selections give the same key."""
+        key_list = make_key(plot_who_data, "v1", (), {'selected_location': ['A']})
+        key_tuple = make_key(plot_who_data, "v1", (), {'selected_location': ('A',)})
+        self.assertEqual(key_list, key_tuple)
+        key_other = make_key(plot_who_data, "v2", (), {'selected_location': ['A']})
+        self.assertNotEqual(key_list, key_other)
+
+    def test_hit_and_miss(self):
+        """The builder only runs once for repeated equal selections."""
+        fig = self.cache.get_or_build(self.counting_builder, self.df, "v1",
+                                      selected_location=['CountryA'])
+        again = self.cache.get_or_build(self.counting_builder, self.df, "v1",
+                                        selected_location=('CountryA',))
+        self.assertIsInstance(fig, go.Figure)
+        self.assertIs(fig, again)
+        self.assertEqual(self.calls, 1)
+        stats = self.cache.stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+
+    def test_new_data_version_rebuilds(self):
+        """Changing the data version is a cache miss."""
+        self.cache.get_or_build(self.counting_builder, self.df, "v1")
+        self.cache.get_or_build(self.counting_builder, self.df, "v2")
+        self.assertEqual(self.calls, 2)
+
+    def test_lru_eviction_by_size(self):
+        """The least recently used figure is evicted once the byte budget is exceeded."""
+        fig = self.cache.get_or_build(self.counting_builder, self.df, "v1")
+        self.cache.max_bytes = int(len(fig.to_json()) * 2.5)
+        self.cache.get_or_build(self.counting_builder, self.df, "v2")
+        self.cache.get_or_build(self.counting_builder, self.df, "v1")
+        self.cache.get_or_build(self.counting_builder, self.df, "v3")
+        stats = self.cache.stats()
+        self.assertEqual(stats['evictions'], 1)
+        self.assertLessEqual(stats['bytes'], self.cache.max_bytes)
+        self.cache.get_or_build(self.counting_builder, self.df, "v1")
+        self.assertEqual(self.calls, 3)
+
+    def test_clear(self):
+        """Clearing empties the cache and resets the counters."""
+        self.cache.get_or_build(self.counting_builder, self.df, "v1")
+        self.cache.clear()
+        self.assertEqual(self.cache.stats()['entries'], 0)
+        self.assertEqual(self.cache.stats()['misses'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+"""
+Unit tests for the filter index module filter_index.py
+"""
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from hcare.filter_index import FilterIndex, query, select_rows
+from hcare.plots import plot_ihme_data
+
+
+class TestFilterIndex(unittest.TestCase):
+    """Tests for the precomputed filter indexes."""
+
+    def setUp(self):
+        """Set up a small WHO-like frame and an IHME-like frame."""
+        self.df_who = pd.DataFrame({
+            'year': [2000, 2000, 2001, 2001, 2001],
+            'location': ['CountryA', 'CountryB', 'CountryA', 'CountryC', None],
+            'Region': ['Region1', 'Region2', 'Region1', 'Region2', 'Region2'],
+            'medical_doctors_per_10000': [30, 40, 35, 45, 50],
+        })
+        self.index = FilterIndex(self.df_who)
+        self.df_ihme = pd.DataFrame({
+            'year': [2000, 2000, 2000, 2001],
+            'location': ['CountryA', 'CountryB', 'CountryA', 'CountryA'],
+            'cause': ['Cause1', 'Cause1', 'Cause2', 'Cause1'],
+            'sex': ['Both', 'Both', 'Male', 'Both'],
+            'deaths': [10, 20, 5, 15],
+            'incidence': [1, 2, 1, 2],
+        })
+
+    def test_sorted_values(self):
+        """Distinct values come back sorted and without nulls."""
+        self.assertEqual(self.index.values('year'), [2000, 2001])
+        self.assertEqual(self.index.values('location'), ['CountryA', 'CountryB', 'CountryC'])
+        self.assertEqual(self.index.values('year', location='CountryC'), [2001])
+
+    def test_location_maps(self):
+        """Year and region lookups match the equivalent dataframe filters."""
+        self.assertEqual(self.index.locations(year=2000), ['CountryA', 'CountryB'])
+        self.assertEqual(self.index.locations(regions=['Region2']), ['CountryB', 'CountryC'])
+        self.assertEqual(self.index.locations(year=2001, regions=['Region1', 'Region2']),
+                         ['CountryA', 'CountryC'])
+        self.assertEqual(self.index.locations(year=2001, regions=[]), [])
+
+    def test_mask_matches_scan(self):
+        """Posting list intersections give the same rows as boolean masks."""
+        mask = self.index.mask(year=2001, Region=['Region2'])
+        expected = (self.df_who['year'] == 2001) & self.df_who['Region'].isin(['Region2'])
+        np.testing.assert_array_equal(mask, expected.to_numpy())
+
+    def test_positions(self):
+        """Row positions match the scanned filters for any combination of filters."""
+        rng = np.random.default_rng(0)
+        df = pd.DataFrame({'year': rng.integers(2000, 2010, 500),
+                           'location': rng.choice(['A', 'B', 'C', 'D', None], 500),
+                           'sex': rng.choice(['Both', 'Male', 'Female'], 500)})
+        index = FilterIndex(df)
+        for filters in [{'year': 2003}, {'location': ['A', 'D'], 'sex': 'Male'},
+                        {'year': [2001, 2009], 'location': 'B', 'sex': ['Both', 'Male']},
+                        {'year': 1999, 'location': 'A'}, {'location': None}]:
+            expected = np.ones(len(df), dtype=bool)
+            for col, selected in filters.items():
+                if selected is not None:
+                    expected &= df[col].isin(np.atleast_1d(selected)).to_numpy()
+            np.testing.assert_array_equal(index.positions(**filters), np.flatnonzero(expected))
+        np.testing.assert_array_equal(index.rows('location', ['C', 'A']),
+                                      np.flatnonzero(df['location'].isin(['A', 'C'])))
+
+    def test_query(self):
+        """query keeps the requested columns and drops rows with nulls in notnull."""
+        df = self.df_who.assign(medical_doctors_per_10000=[30, np.nan, 35, 45, 50])
+        for index in (None, FilterIndex(df)):
+            result = query(df, index, ['location', 'medical_doctors_per_10000'],
+                           notnull=['location', 'medical_doctors_per_10000'],
+                           Region=['Region2'])
+            self.assertEqual(list(result.columns), ['location', 'medical_doctors_per_10000'])
+            self.assertEqual(result.index.tolist(), [3])
+            self.assertEqual(query(df, index, ['year'], year=2001).index.tolist(), [2, 3, 4])
+
+    def test_empty_filters_are_ignored(self):
+        """None and empty lists do not restrict the rows."""
+        self.assertTrue(self.index.mask(location=[], year=None).all())
+        self.assertFalse(self.index.mask(location=['Nowhere']).any())
+
+    def test_select_rows_with_and_without_index(self):
+        """select_rows returns the same rows with or without an index."""
+        scanned = select_rows(self.df_who, None, year=2000, location=['CountryB'])
+        indexed = select_rows(self.df_who, self.index, year=2000, location=['CountryB'])
+        pd.testing.assert_frame_equal(scanned, indexed)
+
+    def test_plot_with_index(self):
+        """A plot built with an index shows the same data as one built without."""
+        index = FilterIndex(self.df_ihme)
+        args = {'metric': 'deaths', 'select_yr_and_sex': (2000, ['Both']),
+                'selected_location': ['CountryA', 'CountryB'], 'selected_cause': ['Cause1']}
+        fig_scan = plot_ihme_data(self.df_ihme, **args)
+        fig_index = plot_ihme_data(self.df_ihme, index=index, **args)
+        self.assertEqual(fig_scan.to_json(), fig_index.to_json())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+"""
+Unit tests for the composite score and indicator forecasts forecast.py
+"""
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from hcare.data_prep import load_dashboard_data
+from hcare.forecast import (FORECAST_COLUMNS, HORIZON, cached_forecast, forecast_series,
+                            forecast_table)
+from hcare.plots import plot_compscore_over_time
+from hcare.synthetic import Scale, write_synthetic_data
+
+
+class TestForecast(unittest.TestCase):
+    """Tests for the batched forecast models, their intervals and the rank forecast."""
+
+    @classmethod
+    def setUpClass(cls):
+        """Process a small synthetic data set once."""
+        with tempfile.TemporaryDirectory() as data_dir:
+            write_synthetic_data(data_dir, Scale(12, range(2000, 2006)))
+            cls.df_metrics = load_dashboard_data(data_dir)[2]
+
+    def test_linear(self):
+        """The linear model matches a least squares fit and skips missing years."""
+        values = np.array([[1.0, 2.0, np.nan, 4.5, 5.0, 6.5],
+                           [2.0, 4.0, 6.0, 8.0, 10.0, 12.0]])
+        forecasts, errors = forecast_series(values, 3, "linear")
+        seen = ~np.isnan(values[0])
+        line = np.polyfit(np.arange(6)[seen], values[0, seen], 1)
+        np.testing.assert_allclose(forecasts[0], np.polyval(line, [6, 7, 8]))
+        np.testing.assert_allclose(forecasts[1], [14.0, 16.0, 18.0])
+        np.testing.assert_allclose(errors[1], 0.0, atol=1e-12)
+        self.assertTrue(np.all(np.diff(errors[0]) > 0))
+
+    def test_smoothing(self):
+        """ses forecasts a flat level; the damped trend flattens; intervals widen."""
+        values = np.array([[1.0, 3.0, 2.0, 4.0, 3.0, 5.0],
+                           [1.0, 2.0, 3.0, 4.0, 5.0, 6.0],
+                           [1.0, np.nan, np.nan, np.nan, 2.0, np.nan]])
+        flat, flat_errors = forecast_series(values, HORIZON, "ses")
+        self.assertTrue(np.all(flat[:2] == flat[:2, [0]]))
+        damped, damped_errors = forecast_series(values, HORIZON, "damped")
+        steps = np.diff(damped[1])
+        self.assertTrue(np.all(steps > 0) and np.all(np.diff(steps) <= 1e-12))
+        self.assertTrue(np.all(np.diff(flat_errors[0]) > 0))
+        self.assertTrue(np.all(np.diff(damped_errors[0]) > 0))
+        # fewer than MIN_YEARS values: no forecast
+        self.assertTrue(np.isnan(damped[2]).all() and np.isnan(flat[2]).all())
+        with self.assertRaises(ValueError):
+            forecast_series(values, HORIZON, "arima")
+
+    def test_table(self):
+        """The table has a row per location, metric and year after the data's last year."""
+        table = forecast_table(self.df_metrics, model="damped")
+        self.assertListEqual(list(table.columns), FORECAST_COLUMNS)
+        last = self.df_metrics["year"].max()
+        self.assertListEqual(sorted(table["year"].unique()),
+                             list(range(last + 1, last + HORIZON + 1)))
+        self.assertIn("medical_doctors_per_10000", set(table["metric"]))
+        self.assertTrue((table["lower"] <= table["forecast"]).all())
+        self.assertTrue((table["forecast"] <= table["upper"]).all())
+        series = self.df_metrics[self.df_metrics["location"] == table["location"].iloc[0]]
+        expected = forecast_series(
+            series.set_index("year")["composite_score"].reindex(
+                range(self.df_metrics["year"].min(), last + 1)).to_numpy()[None, :])[0][0]
+        np.testing.assert_allclose(
+            table[(table["metric"] == "composite_score")
+                  & (table["location"] == table["location"].iloc[0])]["forecast"], expected)
+
+    def test_rank(self):
+        """Rank forecasts rank the score forecasts; the interval holds the point rank."""
+        table = forecast_table(self.df_metrics, model="linear")
+        scores = table[table["metric"] == "composite_score"]
+        ranks = table[table["metric"] == "rank"]
+        self.assertEqual(len(ranks), len(scores))
+        for _, year_scores in scores.groupby("year"):
+            year_ranks = ranks.set_index(["location", "year"]).loc[
+                list(zip(year_scores["location"], year_scores["year"]))]
+            expected = year_scores["forecast"].rank(ascending=False, method="min")
+            np.testing.assert_array_equal(year_ranks["forecast"], expected)
+        self.assertTrue((ranks["lower"] <= ranks["forecast"]).all())
+        self.assertTrue((ranks["forecast"] <= ranks["upper"]).all())
+        self.assertTrue((ranks["upper"] <= ranks.groupby("year")["location"]
+                         .transform("size")).all())
+
+    def test_plot(self):
+        """The plot extends each location with a dashed line and a band, and is cached."""
+        forecast = cached_forecast(self.df_metrics, "v1", model="ses")
+        self.assertIs(cached_forecast(self.df_metrics, "v1", model="ses").table, forecast.table)
+        self.assertEqual(forecast.cache_token, ("Forecast", "v1", "ses", HORIZON))
+        # locations with enough composite scores for a forecast
+        table = forecast.table
+        locations = list(pd.unique(table[table["metric"] == "composite_score"]["location"]))[:2]
+        fig = plot_compscore_over_time(self.df_metrics, selected_location=locations,
+                                       forecast=forecast)
+        dashed = [trace for trace in fig.data if trace.line.dash == "dash"]
+        self.assertEqual(len(dashed), 2)
+        self.assertEqual(len(fig.data), 6)
+        last = self.df_metrics[(self.df_metrics["location"] == locations[0])
+                               & self.df_metrics["composite_score"].notna()]["year"].max()
+        self.assertEqual(dashed[0].x[0], last)
+        self.assertEqual(dashed[0].line.color, fig.data[0].line.color)
+        self.assertEqual(len(plot_compscore_over_time(self.df_metrics,
+                                                      selected_location=locations).data), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+"""
+Unit tests for the location name resolver locations.py
+"""
+import glob
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import pandas as pd
+
+from hcare import locations
+from hcare.data_prep import process_healthcare_data, reconcile_locations
+from hcare.locations import (load_aliases, name_keys, resolve_locations, resolve_names,
+                             save_aliases)
+from hcare.synthetic import Scale, write_synthetic_data
+
+WHO = ["Bolivia (Plurinational State of)", "Republic of Korea", "Viet Nam", "Côte d’Ivoire",
+       "United States of America", "Guinea", "Atlantis"]
+IHME = ["Bolivia", "Korea, Republic of", "Vietnam", "Cote d'Ivoire", "United States",
+        "Equatorial Guinea", "Guinea-Bissau", "Papua New Guinea"]
+
+
+class TestLocations(unittest.TestCase):
+    """Tests for matching WHO location names to IHME names."""
+
+    def report(self, names=None, candidates=None, **kwargs):
+        """Match report indexed by name (default: WHO against IHME)"""
+        return resolve_names(names or WHO, candidates or IHME, **kwargs).set_index("name")
+
+    def test_matches(self):
+        """Exact and qualifier matches are applied, weak fuzzy matches only proposed."""
+        self.assertEqual(name_keys("Korea, Republic of")[0], name_keys("Republic of Korea")[0])
+        report = self.report()
+        expected = {"Bolivia (Plurinational State of)": ("Bolivia", "qualifier", "auto"),
+                    "Republic of Korea": ("Korea, Republic of", "exact", "auto"),
+                    "Viet Nam": ("Vietnam", "exact", "auto"),
+                    "Côte d’Ivoire": ("Cote d'Ivoire", "exact", "auto"),
+                    "United States of America": ("United States", "fuzzy", "proposed"),
+                    "Atlantis": (None, None, "unmatched")}
+        for name, (match, method, status) in expected.items():
+            self.assertEqual(tuple(report.loc[name, ["match", "method", "status"]]),
+                             (match, method, status))
+        self.assertEqual(report.loc["Guinea", "status"], "proposed")
+        self.assertIn(report.loc["Guinea", "runner_up"], IHME)
+        self.assertGreater(report.loc["Guinea", "runner_up_confidence"], 0)
+
+    def test_ambiguous_and_conflicts(self):
+        """Ties are not applied, and a candidate goes to one name only."""
+        report = self.report(["Korea"], ["Korea, Republic of",
+                                         "Korea, Democratic People's Republic of"])
+        self.assertEqual(report.loc["Korea", "status"], "ambiguous")
+        report = self.report(["Iran (Islamic Republic of)", "Iran, Islamic Rep."], ["Iran"])
+        self.assertEqual(sorted(report["status"]), ["auto", "conflict"])
+        report = self.report(WHO, IHME, rejected=[("Viet Nam", "Vietnam")])
+        self.assertEqual(report.loc["Viet Nam", "status"], "unmatched")
+
+    def test_resolve_locations(self):
+        """Names found in both tables are kept; the others are renamed to the IHME name."""
+        renames, report = resolve_locations(["Niger", "Nigeria (Federal Republic of)"],
+                                            ["Niger", "Nigeria"])
+        self.assertEqual(renames, {"Nigeria (Federal Republic of)": "Nigeria"})
+        self.assertEqual(report["name"].tolist(), ["Nigeria (Federal Republic of)"])
+        # the second resolution of the same names comes from the cache
+        with mock.patch.object(locations, "NameIndex", side_effect=AssertionError):
+            self.assertEqual(resolve_locations(["Niger", "Nigeria (Federal Republic of)"],
+                                               ["Niger", "Nigeria"])[0], renames)
+
+    def test_alias_table(self):
+        """Confirmed aliases are applied and rejected ones never matched again."""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "location_aliases.csv")
+            _, report = resolve_locations(WHO, IHME)
+            save_aliases(report, path)
+            aliases = load_aliases(path)
+            self.assertNotIn("Atlantis", set(aliases["name"]))
+            aliases.loc[aliases["name"] == "United States of America", "status"] = "confirmed"
+            aliases.loc[aliases["name"] == "Viet Nam", "status"] = "rejected"
+            aliases.to_csv(path, index=False)
+
+            renames, report = resolve_locations(WHO, IHME, load_aliases(path))
+            self.assertEqual(renames["United States of America"], "United States")
+            self.assertNotIn("Viet Nam", renames)
+            save_aliases(report, path, load_aliases(path))
+            saved = load_aliases(path).set_index("name")
+            self.assertEqual(saved.loc["Viet Nam", "status"], "rejected")
+            self.assertEqual(saved.loc["United States of America", "status"], "confirmed")
+        self.assertTrue(load_aliases(os.path.join(tmp, "missing.csv")).empty)
+
+    def test_reconcile(self):
+        """reconcile_locations and the pipeline merge countries whose names differ."""
+        who = pd.DataFrame({"Location": ["Micronesia (Federated States of)", "Peru"]})
+        ihme = pd.DataFrame({"location": ["Micronesia (Federated States of)", "Peru"]})
+        reports = {}
+        who, ihme = reconcile_locations(who, "Location", ihme, "location", reports=reports)
+        self.assertEqual(who["Location"].tolist(), ihme["location"].tolist())
+        self.assertEqual(reports["locations"]["method"].tolist(), ["qualifier"])
+
+        with tempfile.TemporaryDirectory() as tmp:
+            write_synthetic_data(tmp, Scale(8, range(2000, 2005)))
+            for path in glob.glob(os.path.join(tmp, "IHME-*.csv")):
+                df = pd.read_csv(path)
+                df["location"] = df["location"].replace("Germany", "Germany (Federal Republic)")
+                df.to_csv(path, index=False)
+            reports = {}
+            _, _, ranked = process_healthcare_data(tmp, reports=reports)
+            self.assertIn("Germany (Federal Republic)", set(ranked["location"]))
+            self.assertEqual(reports["locations"]["status"].tolist(), ["auto"])
+
+
+if __name__ == '__main__':
+    unittest.main()
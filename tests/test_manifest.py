@@ -0,0 +1,101 @@
+"""
+Unit tests for the data manifest module manifest.py and manifest-driven ingestion
+"""
+import copy
+import json
+import os
+import tempfile
+import unittest
+
+import pandas as pd
+
+from hcare.data_prep import process_healthcare_data, snake_case, standardize_columns
+from hcare.manifest import (
+    DEFAULT_MANIFEST, load_manifest, parse_manifest, ranking_columns, source_files
+)
+from hcare.synthetic import Scale, generate_who, write_synthetic_data
+
+
+class TestManifest(unittest.TestCase):
+    """Tests for reading and validating data manifests."""
+
+    def setUp(self):
+        """Set up a synthetic data folder."""
+        self.tmp = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.data = os.path.join(self.tmp.name, "data")
+        write_synthetic_data(self.data, Scale(12, range(2015, 2020)))
+
+    def tearDown(self):
+        """Remove the synthetic data folder."""
+        self.tmp.cleanup()
+
+    def write_manifest(self, manifest):
+        """Writes manifest.json into the data folder."""
+        with open(os.path.join(self.data, "manifest.json"), "w", encoding="utf-8") as handle:
+            json.dump(manifest, handle)
+
+    def test_default_manifest(self):
+        """Without manifest.json the four WHO files and two IHME files are used."""
+        manifest = load_manifest(self.data)
+        self.assertEqual(source_files(manifest), [
+            "medical-doctors.csv", "nursery-midwifery.csv", "pharmacists.csv",
+            "dentistry.csv", "IHME-1.csv", "IHME-2.csv"])
+        positive, negative = ranking_columns(manifest)
+        self.assertEqual(negative, ["deaths", "incidence"])
+        self.assertIn("medical doctors per 10,000", positive)
+        self.assertEqual(len(positive), 4)
+
+    def test_invalid_manifests(self):
+        """Bad directions, duplicate columns and missing sections raise a ValueError."""
+        bad_direction = copy.deepcopy(DEFAULT_MANIFEST)
+        bad_direction["who"][0]["direction"] = "up"
+        duplicate = copy.deepcopy(DEFAULT_MANIFEST)
+        duplicate["who"][1]["column"] = duplicate["who"][0]["column"]
+        no_ihme = {"who": DEFAULT_MANIFEST["who"]}
+        for manifest in (bad_direction, duplicate, no_ihme):
+            with self.assertRaises(ValueError):
+                parse_manifest(manifest)
+
+    def test_extra_indicators(self):
+        """Indicators added to the manifest are merged, ranked and snake-cased."""
+        who = generate_who(Scale(12, range(2015, 2020)), missing=0.0, seed=7)
+        # one file holding two indicators, told apart by IndicatorCode
+        beds = who["medical-doctors.csv"].assign(IndicatorCode="BEDS", Value=lambda df:
+                                                 df["Value"] * 2)
+        density = who["dentistry.csv"].assign(IndicatorCode="DENSITY")
+        pd.concat([beds, density]).to_csv(os.path.join(self.data, "extra.csv"), index=False)
+        manifest = copy.deepcopy(DEFAULT_MANIFEST)
+        manifest["who"] += [
+            {"file": "extra.csv", "indicator_code": "BEDS",
+             "column": "Hospital beds (per 10,000)", "direction": "positive"},
+            {"file": "extra.csv", "indicator_code": "DENSITY",
+             "column": "Population density", "direction": "negative"},
+        ]
+        self.write_manifest(manifest)
+
+        df_who, df_ihme, ranked = process_healthcare_data(self.data)
+        self.assertIn("Hospital beds (per 10,000)", df_who.columns)
+        self.assertIn("hospital beds (per 10,000)", ranked.columns)
+        self.assertFalse(ranked["composite_score"].isna().any())
+        _, df_who, df_met = standardize_columns(df_who, df_ihme, ranked)
+        self.assertIn("hospital_beds_per_10000", df_who.columns)
+        self.assertIn("population_density", df_met.columns)
+        self.assertIn("Region", df_who.columns)
+
+    def test_ranking_follows_directions(self):
+        """Flipping an indicator's direction in the manifest changes the ranking."""
+        default = process_healthcare_data(self.data)[2]
+        manifest = copy.deepcopy(DEFAULT_MANIFEST)
+        manifest["ihme"]["measures"]["Deaths"] = "positive"
+        self.write_manifest(manifest)
+        flipped = process_healthcare_data(self.data)[2]
+        self.assertFalse(default["composite_score"].equals(flipped["composite_score"]))
+
+    def test_snake_case(self):
+        """Indicator names become the dashboard's snake_case column names."""
+        self.assertEqual(snake_case("Hospital beds (per 10,000)"), "hospital_beds_per_10000")
+        self.assertEqual(snake_case(" Pharmacists per 10,000 "), "pharmacists_per_10000")
+
+
+if __name__ == '__main__':
+    unittest.main()
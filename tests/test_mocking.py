@@ -160,6 +160,8 @@ class TestHCare(unittest.TestCase):
             'composite_score': [0.5, 0.7, 0.6, 0.8],
             'medical_doctors_per_10000': [30, 40, 35, 45],
             'nurses_midwifes_per_10000': [50, 60, 55, 65],
+            'pharmacists_per_10000': [2, 3, 2.5, 3.5],
+            'dentists_per_10000': [5, 6, 7, 8],
             'deaths': [10, 20, 5, 15],
         })
         self.df_ihme = pd.DataFrame({
@@ -184,8 +186,9 @@ class TestHCare(unittest.TestCase):
     @patch('hcare.hcare.process_healthcare_data')
     def test_load_data(self, mock_process):
         """Test data loading with a mocked process."""
+        # process_healthcare_data returns (WHO, IHME, merged metrics)
         mock_process.return_value = (
-            self.df_ihme.copy(), self.df_who.copy(), self.df_metrics.copy()
+            self.df_who.copy(), self.df_ihme.copy(), self.df_metrics.copy()
         )
         df_ihme_loaded, df_who_loaded, df_metrics = load_data()
         self.assertIn('location', df_ihme_loaded.columns)
@@ -0,0 +1,150 @@
+"""
+Unit tests for the lagged panel regression module panel.py
+"""
+import unittest
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+from hcare import panel
+from hcare.data_handle import DataHandle
+from hcare.panel import cached_lagged_regressions, cause_panel, lagged_regressions
+from hcare.plots import plot_lagged_effects
+
+
+def dummy_ols(df, x_col, y_col, time_effects=True):
+    """Slope and cluster-robust standard error from an OLS with one dummy per fixed effect"""
+    rows = df.dropna(subset=[x_col, y_col])
+    dummies = [pd.get_dummies(rows["location"], dtype=float)]
+    if time_effects:
+        dummies.append(pd.get_dummies(rows["year"], dtype=float, drop_first=True))
+    design = np.column_stack([rows[x_col].to_numpy()] + [d.to_numpy() for d in dummies])
+    coef, *_ = np.linalg.lstsq(design, rows[y_col].to_numpy(), rcond=None)
+    residuals = rows[y_col].to_numpy() - design @ coef
+    bread = np.linalg.pinv(design.T @ design)
+    scores = [design[members].T @ residuals[members]
+              for members in rows.groupby("location").indices.values()]
+    clusters = len(scores)
+    meat = sum(np.outer(score, score) for score in scores)
+    variance = bread @ meat @ bread * clusters / (clusters - 1)
+    return coef[0], np.sqrt(variance[0, 0]), len(rows)
+
+
+class TestPanel(unittest.TestCase):
+    """Tests for the lagged fixed-effects regressions."""
+
+    def setUp(self):
+        """Set up an unbalanced panel where deaths follow doctors two years later."""
+        rng = np.random.default_rng(1)
+        locations = [f"Country{i}" for i in range(30)]
+        df = pd.DataFrame([(loc, year) for loc in locations for year in range(2000, 2012)],
+                          columns=["location", "year"])
+        df["region"] = df["location"].map({loc: ["Africa", "Europe"][i % 2]
+                                           for i, loc in enumerate(locations)})
+        level = df["location"].map({loc: rng.normal(0, 5) for loc in locations})
+        df["medical_doctors_per_10000"] = level + rng.normal(10, 2, len(df))
+        df["nurses_midwifes_per_10000"] = rng.normal(30, 5, len(df))
+        earlier = df.groupby("location")["medical_doctors_per_10000"].shift(2)
+        df["deaths"] = 100 + 3 * level - 2 * earlier + df["year"] % 3 + rng.normal(0, 1, len(df))
+        df["incidence"] = rng.normal(500, 20, len(df))
+        self.df = df.drop(rng.choice(len(df), 40, replace=False)).reset_index(drop=True)
+        self.df.loc[rng.choice(len(self.df), 15, replace=False),
+                    "medical_doctors_per_10000"] = np.nan
+
+    def lagged(self, lag, x_col="medical_doctors_per_10000"):
+        """The panel with x_col moved lag years later"""
+        shifted = self.df[["location", "year", x_col]].assign(year=self.df["year"] + lag)
+        return self.df.drop(columns=x_col).merge(shifted, on=["location", "year"])
+
+    def row(self, table, lag, outcome="deaths", group="All"):
+        """One row of a regression table, for the doctors indicator"""
+        return table[(table["lag"] == lag) & (table["group"] == group)
+                     & (table["workforce"] == "medical_doctors_per_10000")
+                     & (table["outcome"] == outcome)].iloc[0]
+
+    def test_matches_dummy_variable_ols(self):
+        """Slopes and clustered errors equal an OLS with location and year dummies."""
+        table = lagged_regressions(self.df, lags=[0, 1, 2])
+        for lag in (0, 1, 2):
+            beta, se, n_obs = dummy_ols(self.lagged(lag), "medical_doctors_per_10000", "deaths")
+            row = self.row(table, lag)
+            self.assertAlmostEqual(row["beta"], beta, places=8)
+            self.assertAlmostEqual(row["se"], se, places=8)
+            self.assertEqual(row["n"], n_obs)
+        self.assertAlmostEqual(self.row(table, 2)["beta"], -2, delta=0.1)
+        self.assertLess(self.row(table, 2)["ci_high"], 0)
+
+    def test_location_effects_only(self):
+        """Without year effects the slope equals an OLS with location dummies only."""
+        table = lagged_regressions(self.df, lags=[2], time_effects=False)
+        beta, se, _ = dummy_ols(self.lagged(2), "medical_doctors_per_10000", "deaths",
+                                time_effects=False)
+        self.assertAlmostEqual(self.row(table, 2)["beta"], beta, places=8)
+        self.assertAlmostEqual(self.row(table, 2)["se"], se, places=8)
+
+    def test_regions_and_chunks(self):
+        """Regional fits equal fits on the region alone, whatever the outcome chunk size."""
+        table = lagged_regressions(self.df, lags=[1, 3])
+        europe = lagged_regressions(self.df[self.df["region"] == "Europe"], lags=[1, 3])
+        for lag in (1, 3):
+            self.assertAlmostEqual(self.row(table, lag, group="Europe")["beta"],
+                                   self.row(europe, lag)["beta"], places=8)
+        with mock.patch.object(panel, "MAX_CHUNK_VALUES", 1):
+            chunked = lagged_regressions(self.df, lags=[1, 3])
+        pd.testing.assert_frame_equal(
+            table.sort_values(list(table.columns[:5])).reset_index(drop=True),
+            chunked.sort_values(list(table.columns[:5])).reset_index(drop=True))
+        # 2 lags x (1 pooled + 2 regions) x 2 indicators x 2 outcomes
+        self.assertEqual(len(table), 24)
+
+    def test_bad_input(self):
+        """Negative lags raise a ValueError and a constant outcome gives NaN."""
+        with self.assertRaises(ValueError):
+            lagged_regressions(self.df, lags=[-1])
+        table = lagged_regressions(self.df.assign(incidence=5.0), lags=[0])
+        self.assertTrue(np.isnan(self.row(table, 0, "incidence")["beta"]))
+        self.assertTrue(lagged_regressions(self.df.iloc[:0]).empty)
+
+    def test_raw_panel(self):
+        """The data handle's panel gives the slope in raw units of the outcome totals."""
+        df_who = self.df.drop(columns=["deaths", "incidence"]).rename(
+            columns={"region": "Region"})
+        causes = [self.df.assign(cause=cause, sex="Both", deaths=self.df["deaths"] * share,
+                                 incidence=self.df["incidence"] * share)
+                  for cause, share in (("Cancer", 0.4), ("Injuries", 0.6))]
+        df_ihme = pd.concat(causes)[["location", "sex", "cause", "year", "deaths", "incidence"]]
+        raw = DataHandle(df_ihme, df_who, self.df, "v1").panel
+        table = lagged_regressions(raw, lags=[2])
+        expected = lagged_regressions(self.df, lags=[2])
+        self.assertAlmostEqual(self.row(table, 2)["beta"], self.row(expected, 2)["beta"])
+        self.assertAlmostEqual(self.row(table, 2)["beta"], -2, delta=0.1)
+        self.assertListEqual(sorted(table["group"].unique()), ["Africa", "All", "Europe"])
+
+    def test_cause_panel_and_cache(self):
+        """Cause-level outcomes get one column per measure and cause; tables are cached."""
+        ihme = pd.DataFrame({"location": ["Country0", "Country0", "Country1", "Country1"],
+                             "year": [2005, 2005, 2005, 2005], "sex": "Both",
+                             "cause": ["Cancer", "Injuries", "Cancer", "Injuries"],
+                             "deaths": [1.0, 2.0, 3.0, 4.0],
+                             "incidence": [5.0, 6.0, 7.0, 8.0]})
+        frame, outcomes = cause_panel(self.df.rename(columns={"region": "Region"}), ihme)
+        self.assertEqual(outcomes, ["deaths: Cancer", "deaths: Injuries",
+                                    "incidence: Cancer", "incidence: Injuries"])
+        self.assertEqual(frame.loc[(frame["location"] == "Country1") & (frame["year"] == 2005),
+                                   "deaths: Injuries"].tolist(), [4.0])
+        self.assertIn("region", frame.columns)
+        first = cached_lagged_regressions(self.df, "test-v1", lags=[0, 2])
+        self.assertIs(cached_lagged_regressions(self.df, "test-v1", lags=[0, 2]), first)
+
+    def test_plot(self):
+        """The plot has one line per workforce indicator with error bars."""
+        fig = plot_lagged_effects(lagged_regressions(self.df, lags=range(4)), "deaths")
+        self.assertIsInstance(fig, go.Figure)
+        self.assertEqual(len(fig.data), 2)
+        self.assertEqual(list(fig.data[0].x), [0, 1, 2, 3])
+
+
+if __name__ == '__main__':
+    unittest.main()
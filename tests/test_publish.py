@@ -0,0 +1,103 @@
+"""
+Unit tests for publishing the processed frames as Arrow files publish.py
+"""
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from hcare.data_handle import DataHandle
+from hcare.data_prep import load_dashboard_data
+from hcare.publish import main, open_published, publish, published_version
+from hcare.synthetic import Scale, write_synthetic_data
+
+
+class TestPublish(unittest.TestCase):
+    """Tests for publishing and memory-mapping the dashboard frames."""
+
+    @classmethod
+    def setUpClass(cls):
+        """Process a small synthetic data set once."""
+        cls.data_dir = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        write_synthetic_data(cls.data_dir.name, Scale(10, range(2000, 2006)))
+        cls.frames = load_dashboard_data(cls.data_dir.name)
+
+    @classmethod
+    def tearDownClass(cls):
+        """Remove the data folder."""
+        cls.data_dir.cleanup()
+
+    def setUp(self):
+        """Set up an empty output folder."""
+        self.tmp = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.out = self.tmp.name
+
+    def tearDown(self):
+        """Remove the output folder."""
+        self.tmp.cleanup()
+
+    def test_round_trip(self):
+        """The published frames read back with the same values and dtypes."""
+        frames = list(self.frames)
+        frames[2] = frames[2].copy()
+        frames[2].loc[0, "deaths"] = np.nan
+        publish(frames, self.out, "v1")
+        published, version = open_published(self.out)
+        self.assertEqual(version, "v1")
+        for expected, result in zip(frames, published):
+            pd.testing.assert_frame_equal(result, expected)
+
+    def test_zero_copy(self):
+        """Mapped columns are read-only and the data handle shares them without copying."""
+        publish(self.frames, self.out, "v1")
+        (df_ihme, _, df_metrics), _ = open_published(self.out)
+        self.assertFalse(df_metrics["deaths"].to_numpy().flags.writeable)
+        self.assertFalse(df_ihme["location"].array.codes.flags.writeable)
+        handle = DataHandle(df_ihme, df_ihme, df_metrics, "v1")
+        view_ihme, _, view_metrics = handle.views()
+        self.assertTrue(np.shares_memory(view_metrics["deaths"].to_numpy(),
+                                         df_metrics["deaths"].to_numpy()))
+        self.assertTrue(np.shares_memory(view_ihme["location"].array.codes,
+                                         df_ihme["location"].array.codes))
+        with self.assertRaises(ValueError):
+            view_metrics.loc[0, "deaths"] = 0.0
+
+    def test_version_switch(self):
+        """A new version replaces the current one while older mappings stay readable."""
+        self.assertIsNone(published_version(self.out))
+        with self.assertRaises(FileNotFoundError):
+            open_published(self.out)
+        publish(self.frames, self.out, "v1", keep=1)
+        (_, _, old_metrics), _ = open_published(self.out)
+        changed = (self.frames[0], self.frames[1], self.frames[2].head(5))
+        for version in ("v2", "v3"):
+            publish(changed, self.out, version, keep=1)
+        self.assertEqual(published_version(self.out), "v3")
+        self.assertEqual(sorted(name for name in os.listdir(self.out)),
+                         ["CURRENT.json", "v2", "v3"])
+        self.assertEqual(len(open_published(self.out)[0][2]), 5)
+        self.assertEqual(open_published(self.out, "v2")[1], "v2")
+        # a pruned version falls back to the current one; mapped data stays readable
+        self.assertEqual(open_published(self.out, "v1")[1], "v3")
+        self.assertEqual(len(old_metrics), len(self.frames[2]))
+        self.assertAlmostEqual(old_metrics["deaths"].sum(), self.frames[2]["deaths"].sum(),
+                               places=2)
+
+    def test_main(self):
+        """The command line publishes a data folder once per data version."""
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            main(["--data", self.data_dir.name, "--out", self.out])
+            main(["--data", self.data_dir.name, "--out", self.out])
+        self.assertIn("Published version", output.getvalue())
+        self.assertIn("already published", output.getvalue())
+        frames, _ = open_published(self.out)
+        pd.testing.assert_frame_equal(frames[1], self.frames[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+"""
+Unit tests for the materialized regional aggregates regional.py
+"""
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from hcare.data_handle import DataHandle
+from hcare.data_prep import load_dashboard_data
+from hcare.plots import plot_metrics_over_time, plot_who_data
+from hcare.regional import (RegionalViews, STATS, TABLE_COLUMNS, materialized_views,
+                            regional_table, year_fingerprints)
+from hcare.synthetic import Scale, write_synthetic_data
+
+
+class TestRegional(unittest.TestCase):
+    """Tests for the per region and year aggregates and their incremental refresh."""
+
+    @classmethod
+    def setUpClass(cls):
+        """Process a small synthetic data set once."""
+        with tempfile.TemporaryDirectory() as data_dir:
+            write_synthetic_data(data_dir, Scale(12, range(2000, 2004)))
+            cls.frames = load_dashboard_data(data_dir)
+        cls.df_who, cls.df_metrics = cls.frames[1], cls.frames[2]
+        cls.views = RegionalViews.build({"who": cls.df_who, "metrics": cls.df_metrics}, "v1")
+
+    def test_table(self):
+        """Every statistic matches a groupby of the frame; NaN values do not count."""
+        df = pd.DataFrame({"Region": ["A", "A", "A", "B"], "year": [2000] * 4,
+                           "x": [1.0, 2.0, 4.0, np.nan], "y": [1.0, 1.0, 1.0, 3.0]})
+        table = regional_table(df, ["x", "y"], "Region")
+        self.assertListEqual(list(table.columns), TABLE_COLUMNS)
+        self.assertListEqual(table["indicator"].tolist(), ["x", "y", "y"])
+        row = table.iloc[0]
+        self.assertAlmostEqual(row["mean"], 7 / 3)
+        self.assertEqual(row["median"], 2.0)
+        self.assertEqual(row["count"], 3)
+        self.assertAlmostEqual(row["p10"], 1.2)
+        self.assertEqual(table.iloc[2]["region"], "B")
+
+        who = self.views.table("who")
+        col = "dentists_per_10000"
+        expected = self.df_who.groupby(["Region", "year"], observed=True)[col].quantile(0.75)
+        got = who[who["indicator"] == col].set_index(["region", "year"])["p75"]
+        np.testing.assert_allclose(got.to_numpy(), expected.to_numpy())
+        metrics = self.views.table("metrics")
+        self.assertIn("composite_score", set(metrics["indicator"]))
+        self.assertNotIn("rank", set(metrics["indicator"]))
+
+    def test_incremental_refresh(self):
+        """Only changed, new or removed years are redone, with the result of a full build."""
+        df_who = self.df_who.copy()
+        df_who.loc[df_who["year"] == 2002, "pharmacists_per_10000"] *= 2
+        df_who = pd.concat([df_who[df_who["year"] != 2000],
+                            df_who[df_who["year"] == 2003].assign(year=2004)])
+        frames = {"who": df_who, "metrics": self.df_metrics}
+        views = RegionalViews.build(frames, "v2", self.views)
+        self.assertEqual(views.refreshed, {"who": [2002, 2004], "metrics": []})
+        full = RegionalViews.build(frames, "v2")
+        self.assertEqual(full.refreshed["who"], [2001, 2002, 2003, 2004])
+        for source in ("who", "metrics"):
+            pd.testing.assert_frame_equal(views.table(source), full.table(source))
+        # new indicator columns rebuild every year
+        df_metrics = self.df_metrics.assign(extra=1.0)
+        views = RegionalViews.build({"metrics": df_metrics}, "v3", self.views)
+        self.assertEqual(views.refreshed["metrics"], [2000, 2001, 2002, 2003])
+
+    def test_fingerprints(self):
+        """Fingerprints ignore row order and change with any value of their year."""
+        columns = ["medical_doctors_per_10000"]
+        prints = year_fingerprints(self.df_who, columns, "Region")
+        shuffled = self.df_who.sample(frac=1, random_state=0)
+        self.assertEqual(year_fingerprints(shuffled, columns, "Region"), prints)
+        changed = self.df_who.copy()
+        changed.loc[changed.index[0], columns[0]] += 1
+        new = year_fingerprints(changed, columns, "Region")
+        year = int(changed["year"].iloc[0])
+        self.assertNotEqual(new[year], prints[year])
+        self.assertEqual({y: v for y, v in new.items() if y != year},
+                         {y: v for y, v in prints.items() if y != year})
+
+    def test_handle_and_benchmark(self):
+        """The data handle holds the views and benchmark selects one statistic."""
+        handle = DataHandle(*self.frames, "v1")
+        views = handle.regional
+        # a new version with the same rows reuses every year
+        self.assertEqual(materialized_views(self.df_who, self.df_metrics, "v2").refreshed,
+                         {"who": [], "metrics": []})
+        regions = sorted(self.df_who["Region"].astype(str).unique())[:2]
+        median = views.benchmark("who", "medical_doctors_per_10000", regions, years=2003)
+        expected = self.df_who[self.df_who["year"] == 2003]["Region"].astype(str)
+        self.assertListEqual(median["region"].tolist(),
+                             sorted(set(expected) & set(regions)))
+        means = views.benchmark("metrics", ["composite_score"], stat="mean")
+        self.assertEqual(len(means), self.df_metrics.groupby(
+            ["region", "year"], observed=True).ngroups)
+        self.assertGreater(handle.memory_usage(), views.nbytes)
+        self.assertEqual(set(STATS), set(TABLE_COLUMNS[3:]))
+
+    def test_plots(self):
+        """The WHO and over time charts add the regional medians of the shown regions."""
+        rows = self.df_who[self.df_who["year"] == 2003]
+        locations = sorted(rows["location"].unique())[:2]
+        fig = plot_who_data(self.df_who, 2003, locations, regional=self.views)
+        regions = rows[rows["location"].isin(locations)]["Region"].astype(str).unique()
+        self.assertEqual(len(fig.data[0].x), len(locations) + len(regions))
+        self.assertTrue(fig.data[0].x[-1].endswith(" median"))
+        self.assertEqual(len(plot_who_data(self.df_who, 2003, locations).data[0].x),
+                         len(locations))
+        fig = plot_metrics_over_time(self.df_metrics, selected_location=locations,
+                                     regions=["Africa"], regional=self.views)
+        self.assertEqual(len(fig.data), 2 * len(locations) + 1)
+        self.assertIn("Africa median", fig.data[-1].name)
+        africa = self.df_metrics[self.df_metrics["region"] == "Africa"]
+        self.assertListEqual(list(fig.data[-1].x), sorted(africa["year"].unique()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+"""
+Unit tests for the country report generator reports.py
+"""
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+
+from hcare import reports
+from hcare.data_prep import load_dashboard_data
+from hcare.publish import publish
+from hcare.reports import main, report_file, run_reports
+from hcare.synthetic import Scale, write_synthetic_data
+
+
+class TestReports(unittest.TestCase):
+    """Tests for writing one HTML report per ranked location."""
+
+    @classmethod
+    def setUpClass(cls):
+        """Process a small synthetic data set once."""
+        cls.data_dir = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        write_synthetic_data(cls.data_dir.name, Scale(10, range(2000, 2004)))
+        cls.frames = load_dashboard_data(cls.data_dir.name)
+        cls.locations = sorted(cls.frames[2]["location"].astype(str).unique())
+
+    @classmethod
+    def tearDownClass(cls):
+        """Remove the data folder."""
+        cls.data_dir.cleanup()
+
+    def setUp(self):
+        """Set up an empty output folder."""
+        self.tmp = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.out = self.tmp.name
+
+    def tearDown(self):
+        """Remove the output folder."""
+        self.tmp.cleanup()
+
+    def test_in_process(self):
+        """Every ranked location gets a report with its charts, listed in the index."""
+        seen = []
+        summary = run_reports(self.frames, self.out, "v1", workers=1,
+                              progress=lambda result, done, total: seen.append((done, total)))
+        self.assertEqual(summary["reports"], len(self.locations))
+        self.assertEqual(seen[-1], (len(self.locations), len(self.locations)))
+        # the regional chart is built once per region and reused by its other countries
+        self.assertGreater(summary["reused"], 0)
+        files = set(os.listdir(self.out))
+        self.assertTrue({report_file(location) for location in self.locations} <= files)
+        self.assertIn(reports.PLOTLY_JS, files)
+        with open(os.path.join(self.out, reports.INDEX_FILE), encoding="utf-8") as handle:
+            index = handle.read()
+        for location in self.locations:
+            self.assertIn(report_file(location), index)
+        with open(os.path.join(self.out, report_file("India")), encoding="utf-8") as handle:
+            page = handle.read()
+        self.assertIn("<h1>India</h1>", page)
+        self.assertIn('<script src="plotly.min.js">', page)
+        for chart in ("chart-score", "chart-rank", "chart-spider", "chart-region"):
+            self.assertIn(chart, page)
+
+    def test_pool(self):
+        """Worker processes mapping the published frames write the same reports."""
+        published = os.path.join(self.out, "published")
+        publish(self.frames, published, "v1")
+        pages = os.path.join(self.out, "pages")
+        summary = run_reports(self.frames, pages, "v1", locations=self.locations[:4],
+                              workers=2, published=published)
+        self.assertEqual(summary["reports"], 4)
+        run_reports(self.frames, os.path.join(self.out, "serial"), "v1",
+                    locations=self.locations[:4], workers=1)
+        for location in self.locations[:4]:
+            with open(os.path.join(pages, report_file(location)), encoding="utf-8") as first, \
+                    open(os.path.join(self.out, "serial", report_file(location)),
+                         encoding="utf-8") as second:
+                self.assertEqual(first.read(), second.read())
+
+    def test_options(self):
+        """Standalone reports embed plotly.js; unknown locations are refused."""
+        run_reports(self.frames, self.out, "v1", locations=["India"], workers=1,
+                    options={"standalone": True})
+        self.assertNotIn(reports.PLOTLY_JS, os.listdir(self.out))
+        self.assertEqual(report_file("Côte d'Ivoire (Rep.)"), "cote-d-ivoire-rep.html")
+        with self.assertRaises(ValueError):
+            run_reports(self.frames, self.out, "v1", locations=["Atlantis"], workers=1)
+        if reports.kaleido is None:
+            with self.assertRaises(ImportError):
+                run_reports(self.frames, self.out, "v1", workers=1, options={"images": True})
+
+    def test_main(self):
+        """The command line reports progress and timing."""
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            main(["--data", self.data_dir.name, "--out", self.out, "--workers", "1",
+                  "--location", "India", "--location", "China"])
+        self.assertIn("[2/2]", output.getvalue())
+        self.assertIn("2 reports written", output.getvalue())
+        self.assertIn("china.html", os.listdir(self.out))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,147 @@
+"""
+Unit tests for the scenario grid runner scenarios.py
+"""
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+from hcare import scenarios
+from hcare.data_prep import merge_sources
+from hcare.manifest import load_manifest
+from hcare.ranking import process_ranking_pipeline
+from hcare.scenarios import Scenario, expand_grid, read_grid, run_grid, scenario_id
+from hcare.synthetic import Scale, write_synthetic_data
+
+GRID = {"indicators": [None, ["Deaths", "medical doctors per 10,000"]],
+        "normalization": ["minmax", "zscore", "rank"], "weighting": ["pca", "equal"],
+        "years": [None, [2003, 2005]]}
+
+
+class TestScenarios(unittest.TestCase):
+    """Tests for the scenario grid runner."""
+
+    @classmethod
+    def setUpClass(cls):
+        """Merge a small synthetic data set once."""
+        with tempfile.TemporaryDirectory() as tmp:
+            write_synthetic_data(tmp, Scale(15, range(2000, 2008)))
+            _, _, cls.merged = merge_sources(tmp, load_manifest(tmp))
+
+    def setUp(self):
+        """Set up an output folder."""
+        self.tmp = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.out = os.path.join(self.tmp.name, "out")
+
+    def tearDown(self):
+        """Remove the output folder."""
+        self.tmp.cleanup()
+
+    def results(self):
+        """All results of the output folder, in a fixed order"""
+        return pd.read_parquet(self.out).sort_values(
+            ["scenario_id", "year", "location"]).reset_index(drop=True)
+
+    def test_baseline_matches_ranking(self):
+        """The default scenario gives the scores and ranks of process_ranking_pipeline."""
+        run_grid(self.merged, [Scenario()], self.out, workers=1)
+        ranked = process_ranking_pipeline(self.merged.copy())
+        both = ranked.merge(self.results(), on=["location", "year"])
+        self.assertEqual(len(both), len(ranked))
+        np.testing.assert_allclose(both["composite_score_x"], both["composite_score_y"],
+                                   atol=1e-10)
+        np.testing.assert_array_equal(both["rank_x"], both["rank_y"])
+
+    def test_grid(self):
+        """The grid has every combination, with stable ids and checked options."""
+        grid = expand_grid(GRID)
+        self.assertEqual(len(grid), 24)
+        self.assertEqual(grid[-1], Scenario(("deaths", "medical doctors per 10,000"),
+                                            "rank", "equal", (2003, 2005)))
+        self.assertEqual(len({scenario_id(scenario) for scenario in grid}), 24)
+        self.assertEqual(scenario_id(expand_grid(json.loads(json.dumps(GRID)))[-1]),
+                         scenario_id(grid[-1]))
+        with self.assertRaises(ValueError):
+            expand_grid({"weights": ["pca"]})
+        for bad in (Scenario(("beds",)), Scenario(normalization="log"), Scenario(weighting="x")):
+            with self.assertRaises(ValueError):
+                run_grid(self.merged, [bad], self.out, workers=1)
+
+    def test_scenario_results(self):
+        """Year ranges and equal weights score the selected rows as expected."""
+        short = Scenario(("deaths", "medical doctors per 10,000"), "minmax", "equal",
+                         (2003, 2005))
+        run_grid(self.merged, [short], self.out, workers=1)
+        results = self.results()
+        self.assertEqual(sorted(results["year"].unique()), [2003, 2004, 2005])
+        merged = self.merged[self.merged["year"].between(2003, 2005)]
+        self.assertEqual(len(results), len(merged))
+        for _, year in results.groupby("year"):
+            self.assertEqual(sorted(year["rank"]), list(range(1, len(year) + 1)))
+            self.assertTrue(year["composite_score"].between(0, 1).all())
+        self.assertEqual(read_grid(self.out).loc[scenario_id(short), "weighting"], "equal")
+
+    def test_rows_of_subset_scenarios(self):
+        """A location-year missing only an indicator the grid does not use stays in it; a
+        grid with a scenario on all indicators leaves it out of every scenario."""
+        merged = self.merged.copy()
+        gap = merged.index[0]
+        merged.loc[gap, "Pharmacists per 10,000"] = np.nan
+        key = (merged.loc[gap, "location"], merged.loc[gap, "year"])
+        subset = Scenario(("deaths", "medical doctors per 10,000"))
+        run_grid(merged, [subset], self.out, workers=1)
+        results = self.results()
+        self.assertEqual(len(results), len(merged))
+        self.assertEqual(len(results[(results["location"] == key[0])
+                                     & (results["year"] == key[1])]), 1)
+        self.tmp.cleanup()
+        run_grid(merged, [subset, Scenario()], self.out, workers=1)
+        results = self.results()
+        self.assertEqual(results.groupby("scenario_id").size().tolist(),
+                         [len(merged) - 1] * 2)
+        self.assertFalse(((results["location"] == key[0]) & (results["year"] == key[1])).any())
+
+    def test_pool_matches_serial(self):
+        """Worker processes on the shared matrix give the results of a serial run."""
+        grid = expand_grid(GRID)
+        run_grid(self.merged, grid, self.out, workers=2, flush_every=5)
+        pooled = self.results()
+        self.assertEqual(pooled["scenario_id"].nunique(), 24)
+        self.assertEqual(len([name for name in os.listdir(self.out)
+                              if name.endswith(".parquet")]), 5)
+        self.tmp.cleanup()
+        run_grid(self.merged, grid, self.out, workers=1)
+        pd.testing.assert_frame_equal(self.results(), pooled)
+
+    def test_resume(self):
+        """An interrupted run keeps its finished scenarios and a rerun does the rest."""
+        grid = expand_grid(GRID)
+        run_task = scenarios._run_task  # pylint: disable=protected-access
+        calls = []
+
+        def interrupted(task):
+            calls.append(task)
+            if len(calls) > 7:
+                raise KeyboardInterrupt
+            return run_task(task)
+
+        with mock.patch.object(scenarios, "_run_task", interrupted), \
+                self.assertRaises(KeyboardInterrupt):
+            run_grid(self.merged, grid, self.out, workers=1, flush_every=3)
+        self.assertEqual(self.results()["scenario_id"].nunique(), 7)
+        summary = run_grid(self.merged, grid + grid[:2], self.out, workers=1)
+        self.assertEqual(summary["skipped"], 9)
+        resumed = self.results()
+        self.tmp.cleanup()
+        run_grid(self.merged, grid, self.out, workers=1)
+        pd.testing.assert_frame_equal(resumed, self.results())
+        with self.assertRaises(ValueError):
+            run_grid(self.merged.iloc[10:], grid, self.out, workers=1)
+
+
+if __name__ == '__main__':
+    unittest.main()
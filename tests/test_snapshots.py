@@ -0,0 +1,127 @@
+"""
+Unit tests for the snapshot store snapshots.py
+"""
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import pandas as pd
+
+from hcare import snapshots
+from hcare.data_prep import process_healthcare_data
+from hcare.snapshots import (SCHEMAS, block_bounds, block_hash, canonical_table,
+                             diff_releases, ingest, list_releases, load_release,
+                             ranking_diff, release_data)
+from hcare.synthetic import Scale, write_synthetic_data
+
+
+class TestSnapshots(unittest.TestCase):
+    """Tests for storing, comparing and reprocessing releases."""
+
+    def setUp(self):
+        """Write a synthetic data folder and an empty store."""
+        self.tmp = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.data = os.path.join(self.tmp.name, "data")
+        self.store = os.path.join(self.tmp.name, "store")
+        write_synthetic_data(self.data, Scale(12, range(2000, 2006)))
+
+    def tearDown(self):
+        """Remove the folders."""
+        self.tmp.cleanup()
+
+    def edit_doctors(self, edit):
+        """Applies edit to the medical doctors file of a copy of the data folder"""
+        data = os.path.join(self.tmp.name, "data2")
+        shutil.copytree(self.data, data)
+        path = os.path.join(data, "medical-doctors.csv")
+        edit(pd.read_csv(path)).to_csv(path, index=False)
+        return data
+
+    def test_blocks(self):
+        """Blocks follow the indicators, and an edit only changes the block it falls in."""
+        ihme = canonical_table(pd.read_csv(os.path.join(self.data, "IHME-1.csv")),
+                               SCHEMAS["ihme"])
+        self.assertEqual(list(ihme.columns), ["measure", "cause", "sex", "age", "metric",
+                                              "location", "year", "val", "upper", "lower"])
+        with mock.patch.object(snapshots, "BLOCK_LOCATIONS", 3):
+            bounds = block_bounds(ihme, SCHEMAS["ihme"])
+        blocks = [ihme.iloc[start:stop] for start, stop in zip(bounds[:-1], bounds[1:])]
+        self.assertGreater(len(blocks), ihme.groupby(["measure", "cause", "sex"]).ngroups)
+        for block in blocks:
+            self.assertEqual(len(block[["measure", "cause", "sex"]].drop_duplicates()), 1)
+
+        edited = ihme.copy()
+        edited.loc[bounds[1], "val"] += 1
+        changed = [block_hash(block) != block_hash(edited.iloc[start:stop])
+                   for block, start, stop in zip(blocks, bounds[:-1], bounds[1:])]
+        self.assertEqual(changed, [False, True] + [False] * (len(blocks) - 2))
+
+    def test_ingest(self):
+        """A release identical to a stored one adds no rows to the store."""
+        first = ingest(self.data, "2024-06", self.store)
+        self.assertEqual(first["labels"], ["Synthetic NHWA data"])
+        self.assertEqual(ingest(self.data, "2024-12", self.store)["new_rows"], 0)
+        releases = list_releases(self.store)
+        self.assertEqual(releases["name"].tolist(), ["2024-06", "2024-12"])
+        self.assertEqual(releases["new_rows"].tolist(), [releases["rows"][0], 0])
+        with self.assertRaises(ValueError):
+            ingest(self.data, "2024-06", self.store)
+        with self.assertRaises(KeyError):
+            load_release("2025-06", self.store)
+
+    def test_diff(self):
+        """The diff lists the added, removed and changed values."""
+        ingest(self.data, "old", self.store)
+
+        def edit(df):
+            df.loc[(df["Location"] == "Germany") & (df["Period"] == 2003), "Value"] = 99.5
+            return df[df["Location"] != "India"]
+        ingest(self.edit_doctors(edit), "new", self.store)
+
+        changes = diff_releases("old", "new", self.store)
+        self.assertEqual(set(changes["file"]), {"medical-doctors.csv"})
+        changed = changes[changes["change"] == "changed"]
+        self.assertEqual(changed[["location", "period", "column", "new"]].values.tolist(),
+                         [["Germany", 2003, "Value", 99.5]])
+        removed = changes[changes["change"] == "removed"]
+        self.assertEqual(set(removed["location"]), {"India"})
+        doctors = pd.read_csv(os.path.join(self.data, "medical-doctors.csv"))
+        self.assertEqual(len(removed), 2 * (doctors["Location"] == "India").sum())
+        added = diff_releases("new", "old", self.store)
+        self.assertEqual(sorted(added["change"].unique()), ["added", "changed"])
+        self.assertTrue(diff_releases("old", "old", self.store).empty)
+
+    def test_release_data(self):
+        """The pipeline gives the same result on a stored release as on its files."""
+        ingest(self.data, "2024-06", self.store)
+        expected = process_healthcare_data(self.data)
+        shutil.rmtree(self.data)
+        frames, _ = load_release("2024-06", self.store)
+        self.assertIn("location_aliases.csv", frames)
+        for result, frame in zip(release_data("2024-06", self.store), expected):
+            keys = [col for col in ("location", "Location", "sex", "cause", "year", "Period")
+                    if col in frame.columns]
+            pd.testing.assert_frame_equal(result.sort_values(keys, ignore_index=True),
+                                          frame.sort_values(keys, ignore_index=True),
+                                          check_like=True)
+
+    def test_ranking_diff(self):
+        """Ranks move when a country's indicator changes between releases."""
+        ingest(self.data, "old", self.store)
+
+        def edit(df):
+            df.loc[df["Location"] == "Germany", "Value"] *= 10
+            return df
+        ingest(self.edit_doctors(edit), "new", self.store)
+        moved = ranking_diff("old", "new", self.store)
+        self.assertEqual(list(moved.columns), ["location", "year", "old_rank", "old_score",
+                                               "new_rank", "new_score", "rank_change"])
+        germany = moved[moved["location"] == "Germany"]
+        self.assertTrue((germany["rank_change"] >= 0).all())
+        self.assertEqual(moved["rank_change"].sum(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
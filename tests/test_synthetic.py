@@ -0,0 +1,54 @@
+"""
+Unit tests for the synthetic data generator synthetic.py
+"""
+import os
+import tempfile
+import unittest
+
+import pandas as pd
+
+from hcare.synthetic import (
+    generate_who, generate_ihme, write_synthetic_data, Scale, WHO_FILES
+)
+from hcare.data_prep import process_healthcare_data
+
+
+class TestSynthetic(unittest.TestCase):
+    """Tests for the synthetic WHO/IHME generator."""
+
+    def test_deterministic(self):
+        """The same seed gives identical data."""
+        first = generate_ihme(Scale(5, range(2000, 2003)), seed=3)
+        second = generate_ihme(Scale(5, range(2000, 2003)), seed=3)
+        pd.testing.assert_frame_equal(first, second)
+
+    def test_ihme_scale(self):
+        """The IHME table has one row per location x sex x age x cause x year x measure."""
+        df = generate_ihme(Scale(locations=4, years=range(2000, 2005), causes=3, sexes=2,
+                                 ages=2))
+        self.assertEqual(len(df), 4 * 5 * 3 * 2 * 2 * 2)
+        self.assertTrue((df['lower'] <= df['val']).all() and (df['val'] <= df['upper']).all())
+        self.assertEqual(set(df['measure']), {'Deaths', 'Incidence'})
+
+    def test_who_format(self):
+        """WHO frames use the GHO export columns and keep the dashboard default countries."""
+        frames = generate_who(Scale(10, range(2000, 2010)), missing=0.0)
+        self.assertEqual(set(frames), set(WHO_FILES))
+        doctors = frames['medical-doctors.csv']
+        self.assertEqual(len(doctors), 100)
+        for column in ('IndicatorCode', 'ParentLocation', 'Location', 'Period', 'Value'):
+            self.assertIn(column, doctors.columns)
+        self.assertIn('United States of America', set(doctors['Location']))
+
+    def test_pipeline_runs_on_synthetic_data(self):
+        """process_healthcare_data runs end to end on a generated data folder."""
+        with tempfile.TemporaryDirectory() as tmp:
+            write_synthetic_data(tmp, Scale(8, range(2010, 2014)))
+            self.assertTrue(os.path.exists(os.path.join(tmp, 'IHME-2.csv')))
+            _, _, ranked = process_healthcare_data(tmp)
+        self.assertIn('rank', ranked.columns)
+        self.assertEqual(set(ranked['year']), {2010, 2011, 2012, 2013})
+
+
+if __name__ == '__main__':
+    unittest.main()
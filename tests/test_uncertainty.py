@@ -0,0 +1,103 @@
+"""
+Unit tests for the score and rank intervals uncertainty.py
+"""
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from hcare.data_prep import WORKFORCE_COLUMNS, load_dashboard_data
+from hcare.plots import plot_compscore_over_time, plot_ihme_data
+from hcare.ranking import process_ranking_pipeline
+from hcare.synthetic import Scale, write_synthetic_data
+from hcare.uncertainty import INTERVAL_COLUMNS, sample_measure, score_draws, score_intervals
+
+NEGATIVE = ["Deaths", "Incidence"]
+
+
+def merged_frame(spread, seed=0):
+    """Merged frame of 12 locations over 3 years with bounds at value * (1 -/+ spread)"""
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({"location": np.tile([f"Country {i}" for i in range(12)], 3),
+                       "year": np.repeat([2000, 2001, 2002], 12)})
+    for col in NEGATIVE + WORKFORCE_COLUMNS:
+        df[col] = rng.uniform(1, 100, len(df))
+    for col in NEGATIVE:
+        df[f"{col}_lower"] = df[col] * (1 - spread)
+        df[f"{col}_upper"] = df[col] * (1 + spread)
+    return df
+
+
+class TestUncertainty(unittest.TestCase):
+    """Tests for the intervals of the composite score and rank."""
+
+    def test_draw_matches_pipeline(self):
+        """Ranking one draw of the published values gives the pipeline's scores and ranks."""
+        df = merged_frame(0.1)
+        ranked = process_ranking_pipeline(df.copy(), WORKFORCE_COLUMNS, NEGATIVE)
+        columns = [col.lower() for col in NEGATIVE + WORKFORCE_COLUMNS]
+        ordered = df.rename(columns=str.lower).sort_values(["year", "location"])
+        scores, ranks = score_draws(ordered[columns].to_numpy()[None],
+                                    np.isin(columns, ["deaths", "incidence"]),
+                                    np.array([0, 12, 24]))
+        expected = ranked.sort_values(["year", "location"])
+        np.testing.assert_allclose(scores[0], expected["composite_score"], atol=1e-9)
+        np.testing.assert_array_equal(ranks[0], expected["rank"])
+
+    def test_no_uncertainty(self):
+        """Bounds equal to the values give intervals of width zero."""
+        df = merged_frame(0.0)
+        intervals = score_intervals(df, WORKFORCE_COLUMNS, NEGATIVE, draws=30)
+        ranked = process_ranking_pipeline(df.copy(), WORKFORCE_COLUMNS, NEGATIVE)
+        merged = ranked.merge(intervals, on=["location", "year"])
+        self.assertEqual(len(merged), len(df))
+        np.testing.assert_allclose(merged["composite_score_lower"], merged["composite_score"])
+        np.testing.assert_allclose(merged["composite_score_upper"], merged["composite_score"])
+        np.testing.assert_array_equal(merged["rank_lower"], merged["rank"])
+        np.testing.assert_array_equal(merged["rank_upper"], merged["rank"])
+
+    def test_intervals_widen(self):
+        """Wider bounds give wider intervals, and the intervals are reproducible."""
+        narrow = score_intervals(merged_frame(0.05), WORKFORCE_COLUMNS, NEGATIVE, draws=50)
+        wide = score_intervals(merged_frame(0.5), WORKFORCE_COLUMNS, NEGATIVE, draws=50)
+        self.assertListEqual(list(wide.columns), ["location", "year"] + INTERVAL_COLUMNS)
+        for df in (narrow, wide):
+            self.assertTrue((df["composite_score_lower"] <= df["composite_score_upper"]).all())
+            self.assertTrue((df["rank_lower"] <= df["rank_upper"]).all())
+        self.assertGreater((wide["rank_upper"] - wide["rank_lower"]).mean(),
+                           (narrow["rank_upper"] - narrow["rank_lower"]).mean())
+        pd.testing.assert_frame_equal(
+            wide, score_intervals(merged_frame(0.5), WORKFORCE_COLUMNS, NEGATIVE, draws=50))
+        self.assertIsNone(score_intervals(merged_frame(0.1).drop(columns=["Deaths_lower"])
+                                          .drop(columns=["Incidence_upper"]),
+                                          WORKFORCE_COLUMNS, NEGATIVE))
+
+    def test_sample_measure(self):
+        """The bounds are the 2.5% and 97.5% points of the draws, on each side."""
+        values = np.array([10.0, 50.0])
+        draws = sample_measure(values, np.array([8.0, 50.0]), np.array([16.0, np.nan]),
+                               40000, np.random.default_rng(1))
+        np.testing.assert_allclose(np.quantile(draws[:, 0], [0.025, 0.975]), [8, 16],
+                                   rtol=0.02)
+        np.testing.assert_array_equal(draws[:, 1], 50.0)
+
+    def test_dashboard_frames(self):
+        """The pipeline keeps the IHME bounds and the charts draw them as error bars."""
+        with tempfile.TemporaryDirectory() as data_dir:
+            write_synthetic_data(data_dir, Scale(10, range(2000, 2004)))
+            df_ihme, _, df_metrics = load_dashboard_data(data_dir)
+        self.assertTrue({"deaths_lower", "deaths_upper", "incidence_lower",
+                         "incidence_upper"} <= set(df_ihme.columns))
+        self.assertTrue(set(INTERVAL_COLUMNS) <= set(df_metrics.columns))
+        self.assertFalse(df_metrics[INTERVAL_COLUMNS].isna().any().any())
+        location = df_metrics["location"].iloc[0]
+        fig = plot_compscore_over_time(df_metrics, "rank", [location])
+        self.assertEqual(len(fig.data[0].error_y.array), len(fig.data[0].y))
+        fig = plot_ihme_data(df_ihme, select_yr_and_sex=(2003, "Both"),
+                             selected_location=[location])
+        self.assertTrue((np.asarray(fig.data[0].error_y.array) >= 0).all())
+
+
+if __name__ == '__main__':
+    unittest.main()
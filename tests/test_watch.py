@@ -0,0 +1,128 @@
+"""
+Unit tests for the data folder watcher watch.py and the stage refresh of dataset.py
+"""
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+import pandas as pd
+
+from hcare import dataset as dataset_module
+from hcare import watch
+from hcare.data_prep import load_dashboard_data, process_healthcare_data
+from hcare.dataset import STAGES, Dataset, affected_stages
+from hcare.locations import ALIAS_FILE
+from hcare.manifest import MANIFEST_FILE, load_manifest
+from hcare.synthetic import Scale, write_synthetic_data
+from hcare.watch import DataWatcher, changed_files, file_stats
+
+
+def edit_csv(path):
+    """Drops the last row of a CSV file (a corrected file dropped into the folder)."""
+    pd.read_csv(path).head(-1).to_csv(path, index=False)
+
+
+class TestWatch(unittest.TestCase):
+    """Tests for mapping file changes to stages and swapping in the reloaded data."""
+
+    def setUp(self):
+        """Set up a synthetic data folder."""
+        self.tmp = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.data = self.tmp.name
+        write_synthetic_data(self.data, Scale(10, range(2000, 2004)))
+
+    def tearDown(self):
+        """Remove the data folder."""
+        self.tmp.cleanup()
+
+    def test_affected_stages(self):
+        """Changed files map to the stages that read them and the stages after those."""
+        manifest = load_manifest(self.data)
+        self.assertEqual(affected_stages(manifest, ["dentistry.csv"]),
+                         {"raw_who", "workforce", "merged", "ranked"})
+        self.assertEqual(affected_stages(manifest, ["IHME-2.csv"]),
+                         {"raw_ihme", "ihme_pivot", "merged", "ranked"})
+        self.assertEqual(affected_stages(manifest, [ALIAS_FILE]), {"merged", "ranked"})
+        self.assertEqual(affected_stages(manifest, [MANIFEST_FILE]), set(STAGES))
+        self.assertEqual(affected_stages(manifest, ["notes.txt"]), set())
+        self.assertEqual(changed_files({"a": (1, 1), "b": (1, 1)}, {"a": (1, 2), "c": (1, 1)}),
+                         {"a", "b", "c"})
+
+    def test_refresh(self):
+        """A refreshed Dataset reads only the changed file and equals a full run."""
+        first = Dataset(self.data)
+        first.frames()
+        edit_csv(os.path.join(self.data, "pharmacists.csv"))
+        refreshed = first.refresh({"pharmacists.csv"})
+        with patch("hcare.dataset.read_sources",
+                   wraps=dataset_module.read_sources) as read:
+            frames = refreshed.frames()
+        read.assert_called_once_with(self.data, ["pharmacists.csv"])
+        self.assertEqual(refreshed.computed, ["raw_who", "workforce", "merged", "ranked"])
+        self.assertIs(refreshed.ihme_pivot, first.ihme_pivot)
+        for frame, expected in zip(frames, process_healthcare_data(self.data)):
+            pd.testing.assert_frame_equal(frame, expected)
+
+    def test_check(self):
+        """check() swaps in a new handle after a change and keeps it on a failure."""
+        watcher = DataWatcher(self.data, interval=0.01)
+        handle = watcher.handle()
+        self.assertEqual(watcher.check(), [])
+        edit_csv(os.path.join(self.data, "IHME-1.csv"))
+        self.assertEqual(watcher.check(), ["raw_ihme", "ihme_pivot", "merged", "ranked"])
+        self.assertIsNot(watcher.handle(), handle)
+        self.assertNotEqual(watcher.handle().version, handle.version)
+        for frame, expected in zip(watcher.handle().views(), load_dashboard_data(self.data)):
+            pd.testing.assert_frame_equal(frame, expected)
+
+        current = watcher.handle()
+        with open(os.path.join(self.data, "dentistry.csv"), "w", encoding="utf-8") as handle:
+            handle.write("not,a\nWHO,file\n")
+        self.assertEqual(watcher.check(), [])
+        self.assertIsInstance(watcher.last_error, KeyError)
+        self.assertIs(watcher.handle(), current)
+
+    def test_failed_reload_is_retried(self):
+        """A file that broke a reload is read again with the next change of another file."""
+        watcher = DataWatcher(self.data, interval=0.01)
+        dentistry = os.path.join(self.data, "dentistry.csv")
+        original = pd.read_csv(dentistry)
+        with open(dentistry, "w", encoding="utf-8") as handle:
+            handle.write("not,a\nWHO,file\n")
+        current = watcher.handle()
+        self.assertEqual(watcher.check(), [])
+        # the unrelated edit does not swap in data with the old dentistry file
+        edit_csv(os.path.join(self.data, "pharmacists.csv"))
+        self.assertEqual(watcher.check(), [])
+        self.assertIsInstance(watcher.last_error, KeyError)
+        self.assertIs(watcher.handle(), current)
+        original.head(-1).to_csv(dentistry, index=False)
+        self.assertEqual(watcher.check(), ["raw_who", "workforce", "merged", "ranked"])
+        self.assertIsNone(watcher.last_error)
+        for frame, expected in zip(watcher.handle().views(), load_dashboard_data(self.data)):
+            pd.testing.assert_frame_equal(frame, expected)
+
+    def test_background(self):
+        """The polling thread reloads the data without a call from the dashboard."""
+        swaps = []
+        watcher = DataWatcher(self.data, interval=0.05,
+                              on_swap=lambda handle, stages: swaps.append(stages))
+        version = watcher.handle().version
+        watcher.start()
+        try:
+            with patch.object(watch, "SETTLE_SECONDS", 0.01):
+                edit_csv(os.path.join(self.data, "medical-doctors.csv"))
+                deadline = time.monotonic() + 20
+                while watcher.handle().version == version and time.monotonic() < deadline:
+                    time.sleep(0.05)
+        finally:
+            watcher.stop()
+        self.assertNotEqual(watcher.handle().version, version)
+        self.assertEqual(swaps, [["raw_who", "workforce", "merged", "ranked"]])
+        self.assertIn("medical-doctors.csv", file_stats(self.data))
+
+
+if __name__ == '__main__':
+    unittest.main()